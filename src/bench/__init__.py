@@ -0,0 +1,4 @@
+"""
+性能基准与仿真工具包
+各基准均可通过 python -m src.bench.<模块名> 单独运行，并以JSON输出结果
+"""
@@ -0,0 +1,369 @@
+"""
+文件传输吞吐量基准
+功能：在回环网卡上启动两个进程内的聊天节点（接收方自动接受），
+依次传输不同大小的文件，测量：
+- 吞吐量：从发起发送到接收方写完文件的 MB/s
+- CPU时间：传输期间本进程消耗的用户态+内核态CPU秒数（收发双方之和）
+- 峰值内存：传输期间采样到的最大常驻内存
+- 新建线程数：传输期间通过threading创建的线程数
+
+小文件会重复传输多次，结果取每次传输的平均值；
+1GB及以上的测试文件以稀疏文件方式创建，不占用发送方磁盘空间。
+每次运行都会与基线结果对比，基线不存在时以本次结果作为基线。
+
+--encryption-overhead 交替测量明文和加密传输（各取多次中的最好成绩），
+加密传输的吞吐量比明文低MAX_ENCRYPTION_OVERHEAD以上时以非零状态退出。
+
+用法：
+    python -m src.bench.file_transfer [--sizes 1K,1M,100M,2G] [--json out.json]
+                                      [--baseline benchmarks/file_transfer.json]
+                                      [--update-baseline] [--plaintext]
+    python -m src.bench.file_transfer --encryption-overhead [--sizes 1M,100M] [--json out.json]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from ..common.config import SECURE_ENABLED
+from ..common.logger import setup_logging
+from ..core.content_store import ContentStore
+from ..core.file_transfer import FileTransfer
+from ..core.node import ChatNode
+from .metrics import (
+    LOOPBACK, compare_with_baseline, environment, free_udp_port, load_json, rss_bytes, write_json
+)
+
+DEFAULT_SIZES = ('1K', '1M', '100M', '2G')
+DEFAULT_BASELINE = os.path.join('benchmarks', 'file_transfer.json')
+SPARSE_THRESHOLD = 1 << 30  # 达到该大小的测试文件以稀疏文件创建
+RSS_SAMPLE_INTERVAL = 0.02  # 内存采样间隔（秒）
+MIN_RATE_MBPS = 5.0  # 估算超时时间时假定的最低吞吐量
+ROUND_TARGET_BYTES = 64 << 20  # 小文件重复传输，直到累计约这么多字节
+MAX_ROUNDS = 200  # 单个大小的最大重复次数
+OVERHEAD_SIZES = ('1M', '100M')
+OVERHEAD_REPEATS = 5  # 加密开销测量时明文和加密各运行的次数
+MAX_ENCRYPTION_OVERHEAD = 0.1  # 加密传输的吞吐量允许比明文低的比例
+
+_UNITS = {'': 1, 'B': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+# 对比规则：每个大小的结果以 cases.<大小>.<指标> 的形式参与对比
+CASE_RULES = {
+    'mb_per_s': ('higher', 0.3),
+    'cpu_seconds': ('lower', 0.5),
+    'peak_rss_bytes': ('lower', 0.5),
+    'threads_created': ('lower', 0.0),
+}
+
+
+def parse_size(text: str) -> int:
+    """
+    解析 1K、1M、100M、2G 形式的大小
+
+    Args:
+        text: 大小文本
+
+    Returns:
+        int: 字节数
+    """
+    text = text.strip().upper()
+    unit = text[-1] if text and text[-1] in _UNITS else ''
+    number = text[:-1] if unit else text
+    return int(float(number) * _UNITS[unit])
+
+
+def create_test_file(path: str, size: int):
+    """
+    创建测试文件：小文件写入随机数据，大文件创建为稀疏文件
+
+    Args:
+        path: 文件路径
+        size: 文件大小
+    """
+    with open(path, 'wb') as f:
+        if size >= SPARSE_THRESHOLD:
+            f.truncate(size)
+            return
+        block = os.urandom(min(size, 1 << 20))
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+class _ResourceMonitor:
+    """
+    传输期间的资源观测器
+    后台线程周期性采样RSS，并通过threading.settrace统计新建线程数
+    """
+
+    def __init__(self):
+        self.peak_rss = 0
+        self.threads_created = 0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._lock = threading.Lock()
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    def _on_thread_start(self, frame, event, arg):
+        # 新线程中第一次函数调用时触发，计数后立即关闭本线程的跟踪
+        sys.settrace(None)
+        with self._lock:
+            self.threads_created += 1
+        return None
+
+    def __enter__(self):
+        self.peak_rss = rss_bytes()
+        # 采样线程先于settrace启动，不计入新建线程数
+        self._sampler.start()
+        threading.settrace(self._on_thread_start)
+        return self
+
+    def __exit__(self, *exc):
+        threading.settrace(None)
+        self._stop.set()
+        self._sampler.join()
+        self.peak_rss = max(self.peak_rss, rss_bytes())
+        return False
+
+
+def rounds_for(size: int) -> int:
+    """
+    计算某个大小需要重复传输的次数，使小文件的测量不被计时抖动淹没
+
+    Args:
+        size: 文件大小
+
+    Returns:
+        int: 重复次数
+    """
+    return max(1, min(MAX_ROUNDS, ROUND_TARGET_BYTES // max(size, 1)))
+
+
+def measure_transfer(sender: FileTransfer, receiver: FileTransfer, path: str,
+                     size: int, rounds: int, timeout: float) -> dict:
+    """
+    依次发送同一个文件若干次并测量，结果为每次传输的平均值
+
+    Args:
+        sender: 发送方
+        receiver: 接收方（已自动接受）
+        path: 测试文件路径
+        size: 文件大小
+        rounds: 重复次数
+        timeout: 单次传输的超时时间（秒）
+
+    Returns:
+        dict: 传输结果
+    """
+    filename = os.path.basename(path)
+    done = threading.Event()
+    outcome = {'success': 0}
+
+    def _on_completed(name: str, success: bool):
+        if name == filename:
+            outcome['success'] += int(success)
+            done.set()
+
+    receiver.transfer_completed.connect(_on_completed)
+    try:
+        with _ResourceMonitor() as monitor:
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            for _ in range(rounds):
+                done.clear()
+                sender.send_file(path, receiver.local_member)
+                if not done.wait(timeout):
+                    break
+            elapsed = time.perf_counter() - start
+            cpu_seconds = time.process_time() - cpu_start
+    finally:
+        receiver.transfer_completed.disconnect(_on_completed)
+
+    success = outcome['success'] == rounds
+    return {
+        'bytes': size,
+        'rounds': rounds,
+        'success': success,
+        'seconds': elapsed / rounds,
+        'mb_per_s': size * rounds / (1 << 20) / elapsed if success and elapsed > 0 else 0.0,
+        'cpu_seconds': cpu_seconds / rounds,
+        'peak_rss_bytes': monitor.peak_rss,
+        'threads_created': monitor.threads_created / rounds,
+    }
+
+
+def run_file_transfer_benchmark(sizes: List[str], work_dir: Optional[str] = None,
+                                secure: bool = SECURE_ENABLED) -> dict:
+    """
+    运行文件传输吞吐量基准
+
+    Args:
+        sizes: 文件大小列表，如 ['1K', '1M']
+        work_dir: 临时文件目录，默认使用系统临时目录
+        secure: 是否加密传输（需要安装cryptography）
+
+    Returns:
+        dict: 基准结果，cases 以大小文本为键
+    """
+    root = tempfile.mkdtemp(prefix='ft-bench-', dir=work_dir)
+    source_dir = os.path.join(root, 'source')
+    download_dir = os.path.join(root, 'downloads')
+    os.makedirs(source_dir)
+    os.makedirs(download_dir)
+
+    byte_sizes = [parse_size(size) for size in sizes]
+    discovery_port = free_udp_port()
+    nodes = [
+        ChatNode(name, local_ip='127.0.0.1', download_dir=download_dir,
+                 interfaces=[LOOPBACK], discovery_port=discovery_port, secure=secure)
+        for name in ("BenchSender", "BenchReceiver")
+    ]
+    for node in nodes:
+        node.file_transfer.max_file_size = max(byte_sizes + [1])
+        # 不记录已接收的内容，每一轮都真正经网络传输
+        node.file_transfer.content_store = ContentStore(max_entries=0)
+        node.start()
+    sender, receiver = (node.file_transfer for node in nodes)
+    receiver.file_request_received.connect(receiver.accept_file)
+
+    cases = {}
+    try:
+        for label, size in zip(sizes, byte_sizes):
+            path = os.path.join(source_dir, f"bench_{label}.bin")
+            create_test_file(path, size)
+            timeout = 30 + size / (MIN_RATE_MBPS * (1 << 20))
+            cases[label] = measure_transfer(sender, receiver, path, size, rounds_for(size), timeout)
+            # 大文件测完立即删除，避免临时目录占满磁盘
+            os.remove(path)
+            for name in os.listdir(download_dir):
+                os.remove(os.path.join(download_dir, name))
+    finally:
+        for node in nodes:
+            node.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        'benchmark': 'file_transfer',
+        'cases': cases,
+        'environment': environment(),
+    }
+
+
+def run_encryption_overhead(sizes: List[str], work_dir: Optional[str] = None,
+                            repeats: int = OVERHEAD_REPEATS) -> dict:
+    """
+    测量加密传输相对明文传输的吞吐量损失
+    明文和加密交替运行repeats次，各取最好成绩，减少机器负载波动的影响
+
+    Args:
+        sizes: 文件大小列表
+        work_dir: 临时文件目录
+        repeats: 运行次数
+
+    Returns:
+        dict: 结果，cases.<大小> 中有明文和加密的MB/s、CPU秒数以及overhead（吞吐量降低的比例）
+    """
+    best = {False: {}, True: {}}
+    for _ in range(repeats):
+        for secure in (False, True):
+            result = run_file_transfer_benchmark(sizes, work_dir, secure=secure)
+            for label, case in result['cases'].items():
+                previous = best[secure].get(label)
+                if previous is None or case['mb_per_s'] > previous['mb_per_s']:
+                    best[secure][label] = case
+    cases = {}
+    for label in sizes:
+        plain, secure = best[False].get(label), best[True].get(label)
+        plain_rate = plain['mb_per_s'] if plain else 0.0
+        secure_rate = secure['mb_per_s'] if secure else 0.0
+        cases[label] = {
+            'plaintext_mb_per_s': plain_rate,
+            'encrypted_mb_per_s': secure_rate,
+            'overhead': 1 - secure_rate / plain_rate if plain_rate else 1.0,
+            'plaintext_cpu_seconds': plain['cpu_seconds'] if plain else 0.0,
+            'encrypted_cpu_seconds': secure['cpu_seconds'] if secure else 0.0,
+        }
+    return {
+        'benchmark': 'file_transfer_encryption',
+        'repeats': repeats,
+        'cases': cases,
+        'environment': environment(),
+    }
+
+
+def baseline_rules(result: dict) -> dict:
+    """
+    根据结果中包含的文件大小生成对比规则
+
+    Args:
+        result: 基准结果
+
+    Returns:
+        dict: 对比规则
+    """
+    return {
+        f"cases.{label}.{metric}": rule
+        for label in result.get('cases', {})
+        for metric, rule in CASE_RULES.items()
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="文件传输吞吐量基准")
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                        help="逗号分隔的文件大小，1G及以上创建为稀疏文件")
+    parser.add_argument('--work-dir', help="临时文件目录，需要能容纳最大的文件")
+    parser.add_argument('--json', help="结果输出文件")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="基线结果文件，不存在时以本次结果作为基线")
+    parser.add_argument('--update-baseline', action='store_true', help="用本次结果覆盖基线")
+    parser.add_argument('--plaintext', action='store_true', help="不加密传输")
+    parser.add_argument('--encryption-overhead', action='store_true',
+                        help="对比明文和加密传输的吞吐量（默认大小为%s）" % ','.join(OVERHEAD_SIZES))
+    args = parser.parse_args(argv)
+
+    setup_logging(level='WARNING')
+    if args.encryption_overhead:
+        sizes = args.sizes.split(',') if args.sizes != parser.get_default('sizes') else OVERHEAD_SIZES
+        result = run_encryption_overhead([size.strip() for size in sizes if size.strip()], args.work_dir)
+        write_json(result, args.json)
+        over = [label for label, case in result['cases'].items()
+                if case['overhead'] > MAX_ENCRYPTION_OVERHEAD]
+        for label in over:
+            print(f"加密开销过大: {label} {result['cases'][label]['overhead']:.1%}", file=sys.stderr)
+        if over:
+            sys.exit(1)
+        return
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    result = run_file_transfer_benchmark(sizes, args.work_dir, secure=not args.plaintext)
+    write_json(result, args.json)
+
+    failed = [label for label, case in result['cases'].items() if not case['success']]
+    for label in failed:
+        print(f"传输失败: {label}", file=sys.stderr)
+
+    baseline = load_json(args.baseline)
+    if args.update_baseline or baseline is None:
+        if not failed:
+            write_json(result, args.baseline, echo=False)
+    else:
+        regressions = compare_with_baseline(result, baseline, baseline_rules(result))
+        for line in regressions:
+            print(f"性能退化: {line}", file=sys.stderr)
+        failed += regressions
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+消息内存占用基准
+功能：模拟接收并保存大量聊天消息（来自若干成员），用tracemalloc统计保存下来的
+消息对象平均每条占用的字节数；同时用改造前的表示（普通dataclass、每条消息
+各自解析出新的Member）跑一遍作为对照
+
+用法：
+    python -m src.bench.memory [--messages 100000] [--peers 500] [--json out.json]
+                               [--baseline benchmarks/memory.json] [--update-baseline]
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from ..common.message_types import ChatMessage, MessageType
+from .metrics import compare_with_baseline, environment, load_json, write_json
+
+DEFAULT_MESSAGES = 100000
+DEFAULT_PEERS = 500
+DEFAULT_BASELINE = 'benchmarks/memory.json'
+
+RULES = {
+    'after.bytes_per_message': ('lower', 0.2),
+}
+
+
+@dataclass
+class _LegacyMember:
+    """改造前的Member：普通dataclass，每次解析都创建新实例"""
+    username: str
+    ip: str
+    udp_port: int
+    tcp_port: int
+    node_id: str = ''
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['username'], data['ip'], data['udp_port'], data['tcp_port'],
+                   data.get('node_id', ''))
+
+
+@dataclass
+class _LegacyChatMessage:
+    """改造前的ChatMessage"""
+    msg_type: MessageType
+    sender: _LegacyMember
+    content: str
+    receiver: Optional[_LegacyMember] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            msg_type=MessageType(data['msg_type']),
+            sender=_LegacyMember.from_dict(data['sender']),
+            content=data['content'],
+            receiver=_LegacyMember.from_dict(data['receiver']) if 'receiver' in data else None
+        )
+
+
+def _packets(messages: int, peers: int):
+    """按顺序生成收到的数据包（已序列化），发送者轮流来自peers个成员"""
+    receiver = {'username': 'me', 'ip': '10.0.0.1', 'udp_port': 40000, 'tcp_port': 40001,
+                'node_id': 'local000'}
+    for i in range(messages):
+        peer = i % peers
+        sender = {'username': f'user{peer}', 'ip': f'10.0.{peer // 250}.{peer % 250 + 2}',
+                  'udp_port': 40000 + peer, 'tcp_port': 50000 + peer, 'node_id': f'{peer:08x}'}
+        message = {'msg_type': MessageType.P2P_MESSAGE.value, 'sender': sender,
+                   'content': f'message {i} from user{peer}', 'receiver': receiver}
+        yield json.dumps(message).encode('utf-8')
+
+
+def measure(parse: Callable[[dict], object], messages: int, peers: int) -> dict:
+    """
+    解析并保存全部消息，统计保存下来的对象占用的内存
+
+    Args:
+        parse: 从消息字典创建消息对象的函数
+        messages: 消息数
+        peers: 发送者数
+
+    Returns:
+        dict: bytes_total、bytes_per_message、distinct_senders（不同的发送者对象数）
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        store: List[object] = []
+        for packet in _packets(messages, peers):
+            store.append(parse(json.loads(packet)))
+        gc.collect()
+        total = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return {
+        'bytes_total': total,
+        'bytes_per_message': total / messages if messages else 0.0,
+        'distinct_senders': len({id(message.sender) for message in store}),
+    }
+
+
+def run_memory_benchmark(messages: int = DEFAULT_MESSAGES, peers: int = DEFAULT_PEERS) -> dict:
+    """
+    分别用改造前和当前的消息表示运行基准
+
+    Returns:
+        dict: before、after两组结果及节省比例
+    """
+    legacy = measure(_LegacyChatMessage.from_dict, messages, peers)
+    current = measure(ChatMessage.from_dict, messages, peers)
+    return {
+        'environment': environment(),
+        'messages': messages,
+        'peers': peers,
+        'before': legacy,
+        'after': current,
+        'saving': 1 - current['bytes_total'] / legacy['bytes_total'] if legacy['bytes_total'] else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="消息内存占用基准")
+    parser.add_argument('--messages', type=int, default=DEFAULT_MESSAGES, help="保存的消息数")
+    parser.add_argument('--peers', type=int, default=DEFAULT_PEERS, help="发送者数")
+    parser.add_argument('--json', help="结果输出文件")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="基线结果文件，不存在时以本次结果作为基线")
+    parser.add_argument('--update-baseline', action='store_true', help="用本次结果覆盖基线")
+    args = parser.parse_args(argv)
+
+    result = run_memory_benchmark(args.messages, args.peers)
+    write_json(result, args.json)
+
+    baseline = load_json(args.baseline)
+    if args.update_baseline or baseline is None:
+        write_json(result, args.baseline, echo=False)
+        return
+    regressions = compare_with_baseline(result, baseline, RULES)
+    for line in regressions:
+        print(f"性能退化: {line}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
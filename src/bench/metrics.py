@@ -0,0 +1,166 @@
+"""
+基准测试公共工具
+提供分位数统计、内存测量、结果输出以及与基线结果对比的功能
+"""
+
+import json
+import math
+import os
+import platform
+import socket
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..common.utils import NetworkInterface
+
+# 对比规则：指标名 -> (方向, 允许的相对变化)
+# 方向为 'lower' 表示越小越好，'higher' 表示越大越好
+Rules = Dict[str, Tuple[str, float]]
+
+# 基准中的节点都运行在回环网卡上
+LOOPBACK = NetworkInterface("lo", "127.0.0.1", "255.0.0.0")
+
+
+def free_udp_port() -> int:
+    """
+    获取一个空闲UDP端口，作为基准节点的发现端口，避免干扰真实实例
+
+    Returns:
+        int: 端口号
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """
+    计算分位数（最近秩法）
+
+    Args:
+        values: 数据
+        pct: 百分位，0~100
+
+    Returns:
+        float: 分位数，没有数据时返回0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def rss_bytes() -> int:
+    """
+    获取当前进程的常驻内存（RSS）
+
+    Returns:
+        int: 字节数，无法获取时返回峰值RSS
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """
+    获取当前进程的峰值常驻内存
+
+    Returns:
+        int: 字节数，不支持的平台返回0
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def environment() -> dict:
+    """
+    运行环境信息，随结果一起保存，便于判断基线是否可比
+
+    Returns:
+        dict: Python版本、平台、CPU数量
+    """
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write_json(result: dict, path: Optional[str], echo: bool = True):
+    """
+    输出结果到标准输出，并可选写入文件
+
+    Args:
+        result: 结果字典
+        path: 输出文件路径，None表示只打印
+        echo: 是否打印到标准输出
+    """
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if path:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if echo:
+        print(text)
+
+
+def load_json(path: str) -> Optional[dict]:
+    """
+    读取JSON结果文件
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        dict: 结果字典，文件不存在时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _lookup(result: dict, key: str):
+    """按 a.b.c 形式的路径读取嵌套字段"""
+    value = result
+    for part in key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare_with_baseline(result: dict, baseline: dict, rules: Rules) -> List[str]:
+    """
+    与基线结果对比，找出超出允许范围的退化
+
+    Args:
+        result: 本次结果
+        baseline: 基线结果
+        rules: 对比规则
+
+    Returns:
+        List[str]: 退化说明，空列表表示没有退化
+    """
+    regressions = []
+    for key, (direction, tolerance) in rules.items():
+        current, base = _lookup(result, key), _lookup(baseline, key)
+        if not isinstance(current, (int, float)) or not isinstance(base, (int, float)) or base <= 0:
+            continue
+        if direction == 'lower' and current > base * (1 + tolerance):
+            regressions.append(f"{key}: {current:.4g} > 基线 {base:.4g} (+{tolerance:.0%})")
+        elif direction == 'higher' and current < base * (1 - tolerance):
+            regressions.append(f"{key}: {current:.4g} < 基线 {base:.4g} (-{tolerance:.0%})")
+    return regressions
@@ -0,0 +1,274 @@
+"""
+多节点回环仿真与规模基准
+功能：在回环网卡上启动N个无界面节点（单进程或分布在多个进程中），测量：
+- 发现收敛时间：从所有节点启动到每个节点都发现其余N-1个节点
+- 广播扇出延迟：广播消息从发送到各节点收到的延迟（p50/p99）
+- 包速率：广播阶段每秒处理的消息数
+- 单节点内存：启动并收敛后每个节点增加的常驻内存
+
+用法：
+    python -m src.bench.simulation --nodes 100 [--processes 4] [--json out.json]
+                                   [--baseline baseline.json] [--update-baseline]
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from ..common.logger import setup_logging
+from ..core.node import ChatNode
+from .metrics import (
+    LOOPBACK, compare_with_baseline, environment, free_udp_port, load_json,
+    percentile, rss_bytes, write_json
+)
+
+MESSAGE_PREFIX = "SIM"  # 仿真广播消息前缀，内容为 "SIM <发送时间> <序号>"
+
+# 与基线对比的规则：指标 -> (方向, 允许的相对变化)
+BASELINE_RULES = {
+    'discovery_convergence_s': ('lower', 0.5),
+    'broadcast_latency_ms.p99': ('lower', 0.5),
+    'packets_per_second': ('higher', 0.3),
+    'memory_per_node_bytes': ('lower', 0.3),
+}
+
+
+def _wait_until(condition, timeout: float, interval: float = 0.01) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+class _NodeProbe:
+    """
+    单个仿真节点的观测器
+    记录发现收敛时刻和收到仿真广播消息的延迟
+    """
+
+    def __init__(self, node: ChatNode, total_nodes: int):
+        self.node = node
+        self.total_nodes = total_nodes
+        self.converged_at: Optional[float] = None
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+        node.member_manager.member_list_updated.connect(self._on_members)
+        node.message_broadcast.broadcast_received.connect(self._on_broadcast)
+
+    def _on_members(self, members: list):
+        if self.converged_at is None and len(members) >= self.total_nodes - 1:
+            self.converged_at = time.time()
+
+    def _on_broadcast(self, message):
+        received_at = time.time()
+        parts = message.content.split()
+        if len(parts) != 3 or parts[0] != MESSAGE_PREFIX:
+            return
+        with self._lock:
+            self.latencies.append(received_at - float(parts[1]))
+
+    @property
+    def received(self) -> int:
+        return len(self.latencies)
+
+
+def _run_worker(worker_index: int, first_node: int, count: int, total_nodes: int,
+                senders: int, messages: int, interval: float, timeout: float,
+                discovery_port: int, barrier, result_queue):
+    """
+    仿真工作单元：在当前进程中运行一组节点，并把观测结果放入result_queue
+    单进程模式直接调用，多进程模式作为子进程入口
+
+    Args:
+        worker_index: 工作单元编号
+        first_node: 本组第一个节点的全局序号
+        count: 本组节点数
+        total_nodes: 全部节点数
+        senders: 发送广播的节点数（全局序号最小的若干节点）
+        messages: 每个发送节点发送的广播条数
+        interval: 同一节点两次广播之间的间隔（秒）
+        timeout: 每个阶段的超时时间（秒）
+        discovery_port: 共享的发现端口
+        barrier: 各工作单元之间的阶段同步屏障
+        result_queue: 结果队列
+    """
+    setup_logging(level='WARNING')
+    # 每个节点使用自己的下载目录，内容索引和离线消息等按目录保存的状态互不影响
+    work_dir = tempfile.mkdtemp(prefix=f'chat-sim-{worker_index}-')
+    try:
+        rss_before = rss_bytes()
+        nodes = [
+            ChatNode(f"Sim{first_node + i}", local_ip='127.0.0.1',
+                     download_dir=os.path.join(work_dir, str(first_node + i)),
+                     interfaces=[LOOPBACK], discovery_port=discovery_port)
+            for i in range(count)
+        ]
+        probes = [_NodeProbe(node, total_nodes) for node in nodes]
+
+        # 阶段一：所有节点同时启动，等待发现收敛
+        barrier.wait()
+        started_at = time.time()
+        for node in nodes:
+            node.start()
+        _wait_until(lambda: all(p.converged_at for p in probes), timeout)
+        memory = rss_bytes() - rss_before
+
+        # 阶段二：发送节点广播带时间戳的消息
+        barrier.wait()
+        phase_start = time.time()
+        local_senders = [
+            node for i, node in enumerate(nodes) if first_node + i < senders
+        ]
+
+        def _send(node: ChatNode):
+            for seq in range(messages):
+                node.message_broadcast.send_broadcast_message(
+                    f"{MESSAGE_PREFIX} {time.time():.6f} {seq}")
+                if interval:
+                    time.sleep(interval)
+
+        threads = [threading.Thread(target=_send, args=(node,)) for node in local_senders]
+        for thread in threads:
+            thread.start()
+
+        def _expected(global_index: int) -> int:
+            return messages * (senders - (1 if global_index < senders else 0))
+
+        _wait_until(lambda: all(
+            p.received >= _expected(first_node + i) for i, p in enumerate(probes)), timeout)
+        for thread in threads:
+            thread.join()
+        phase_end = time.time()
+
+        barrier.wait()
+        for node in nodes:
+            node.stop()
+
+        result_queue.put({
+            'worker': worker_index,
+            'started_at': started_at,
+            'converged_at': [p.converged_at for p in probes],
+            'latencies': [lat for p in probes for lat in p.latencies],
+            'expected': sum(_expected(first_node + i) for i in range(count)),
+            'phase_start': phase_start,
+            'phase_end': phase_end,
+            'memory': memory,
+        })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_simulation(nodes: int = 10, processes: int = 1, senders: int = 1, messages: int = 10,
+                   interval: float = 0.01, timeout: float = 30.0) -> dict:
+    """
+    运行一次多节点仿真
+
+    Args:
+        nodes: 节点总数
+        processes: 进程数，1表示所有节点在当前进程中运行
+        senders: 发送广播的节点数
+        messages: 每个发送节点发送的广播条数
+        interval: 同一节点两次广播之间的间隔（秒）
+        timeout: 每个阶段的超时时间（秒）
+
+    Returns:
+        dict: 仿真结果
+    """
+    processes = max(1, min(processes, nodes))
+    senders = max(0, min(senders, nodes))
+    discovery_port = free_udp_port()
+    sizes = [nodes // processes + (1 if i < nodes % processes else 0) for i in range(processes)]
+    starts = [sum(sizes[:i]) for i in range(processes)]
+    args = (nodes, senders, messages, interval, timeout, discovery_port)
+
+    if processes == 1:
+        result_queue = queue.Queue()
+        _run_worker(0, 0, nodes, *args, threading.Barrier(1), result_queue)
+        reports = [result_queue.get()]
+    else:
+        barrier = multiprocessing.Barrier(processes)
+        result_queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=_run_worker,
+                args=(i, starts[i], sizes[i]) + args + (barrier, result_queue),
+                daemon=True
+            )
+            for i in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        reports = [result_queue.get(timeout=timeout * 3 + 30) for _ in workers]
+        for worker in workers:
+            worker.join(timeout=10)
+
+    started_at = min(r['started_at'] for r in reports)
+    converged = [t for r in reports for t in r['converged_at'] if t is not None]
+    latencies_ms = [lat * 1000 for r in reports for lat in r['latencies']]
+    deliveries = len(latencies_ms)
+    phase = max(r['phase_end'] for r in reports) - min(r['phase_start'] for r in reports)
+
+    return {
+        'benchmark': 'simulation',
+        'nodes': nodes,
+        'processes': processes,
+        'senders': senders,
+        'messages_per_sender': messages,
+        'converged_nodes': len(converged),
+        'discovery_convergence_s': (max(converged) - started_at) if len(converged) == nodes else None,
+        'broadcast_latency_ms': {
+            'p50': percentile(latencies_ms, 50),
+            'p99': percentile(latencies_ms, 99),
+            'max': max(latencies_ms) if latencies_ms else 0.0,
+        },
+        'deliveries': deliveries,
+        'expected_deliveries': sum(r['expected'] for r in reports),
+        'packets_per_second': deliveries / phase if phase > 0 else 0.0,
+        'memory_per_node_bytes': sum(r['memory'] for r in reports) / nodes,
+        'environment': environment(),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="多节点回环仿真与规模基准")
+    parser.add_argument('--nodes', type=int, default=50, help="节点总数")
+    parser.add_argument('--processes', type=int, default=1, help="进程数")
+    parser.add_argument('--senders', type=int, default=5, help="发送广播的节点数")
+    parser.add_argument('--messages', type=int, default=20, help="每个发送节点的广播条数")
+    parser.add_argument('--interval', type=float, default=0.01, help="广播间隔（秒）")
+    parser.add_argument('--timeout', type=float, default=60.0, help="每个阶段的超时时间（秒）")
+    parser.add_argument('--json', help="结果输出文件")
+    parser.add_argument('--baseline', help="基线结果文件，存在时与之对比")
+    parser.add_argument('--update-baseline', action='store_true', help="用本次结果覆盖基线")
+    args = parser.parse_args(argv)
+
+    result = run_simulation(
+        nodes=args.nodes, processes=args.processes, senders=args.senders,
+        messages=args.messages, interval=args.interval, timeout=args.timeout
+    )
+    write_json(result, args.json)
+
+    if args.baseline:
+        if args.update_baseline:
+            write_json(result, args.baseline, echo=False)
+            return
+        baseline = load_json(args.baseline)
+        if baseline:
+            regressions = compare_with_baseline(result, baseline, BASELINE_RULES)
+            for line in regressions:
+                print(f"性能退化: {line}", file=sys.stderr)
+            if regressions:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+启动耗时基准
+功能：用 -X importtime 统计各入口模块的导入耗时，
+并测量从启动进程到主窗口首次绘制完成的墙钟时间
+
+用法：python -m src.bench.startup [--json 输出文件]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+FIRST_FRAME_MARKER = "FIRST_FRAME"  # 子进程首次绘制完成后输出的标记
+
+# 需要统计导入耗时的入口模块
+IMPORT_TARGETS = ('src.common', 'src.core', 'src.core.node', 'src.daemon', 'src.ui.main_window')
+
+
+def _run_python(args: List[str], env: Optional[dict] = None,
+                timeout: float = 60) -> Tuple[subprocess.CompletedProcess, float]:
+    """
+    在项目根目录下运行一个Python子进程
+
+    Returns:
+        Tuple: (进程结果, 墙钟耗时秒数)
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable] + args,
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    return proc, time.perf_counter() - start
+
+
+def parse_importtime(output: str) -> Dict[str, Tuple[int, int]]:
+    """
+    解析 -X importtime 的输出
+
+    Args:
+        output: 子进程的标准错误输出
+
+    Returns:
+        Dict: 模块名 -> (自身耗时us, 累计耗时us)
+    """
+    result = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        result[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return result
+
+
+def measure_import(module: str) -> dict:
+    """
+    测量在全新解释器中导入一个模块的耗时
+
+    Args:
+        module: 模块名
+
+    Returns:
+        dict: wall_seconds（含解释器启动）、import_us（该模块累计导入耗时）、modules（被导入的模块列表）
+    """
+    proc, wall = _run_python(['-X', 'importtime', '-c', f'import {module}'])
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败: {proc.stderr.strip().splitlines()[-1:]}")
+    times = parse_importtime(proc.stderr)
+    return {
+        'module': module,
+        'wall_seconds': wall,
+        'import_us': times.get(module, (0, 0))[1],
+        'modules': sorted(times),
+    }
+
+
+def _first_frame_child():
+    """
+    子进程入口：创建并显示主窗口，首次绘制完成后输出标记并退出
+    不会启动网络服务
+    """
+    sys.path.insert(0, PROJECT_ROOT)
+    from PyQt6.QtCore import QEvent, QObject, QTimer
+    from PyQt6.QtWidgets import QApplication
+    from src.ui.main_window import MainWindow
+
+    app = QApplication(sys.argv)
+    window = MainWindow()
+
+    class _PaintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint:
+                print(FIRST_FRAME_MARKER, flush=True)
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    watcher = _PaintWatcher()
+    window.installEventFilter(watcher)
+    window.show()
+    QTimer.singleShot(10000, app.quit)
+    app.exec()
+
+
+def measure_first_frame() -> Optional[dict]:
+    """
+    测量从启动进程到主窗口首次绘制完成的墙钟时间
+    无显示器时使用Qt的offscreen平台
+
+    Returns:
+        dict: wall_seconds，未安装PyQt6时返回None
+    """
+    if importlib.util.find_spec('PyQt6') is None:
+        return None
+    env = dict(os.environ)
+    if not env.get('DISPLAY') and sys.platform.startswith('linux'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    proc, wall = _run_python(
+        ['-c', 'from src.bench.startup import _first_frame_child; _first_frame_child()'],
+        env=env
+    )
+    if FIRST_FRAME_MARKER not in proc.stdout:
+        raise RuntimeError(f"主窗口未完成首次绘制: {proc.stderr.strip()[-500:]}")
+    return {'wall_seconds': wall}
+
+
+def run_startup_benchmark() -> dict:
+    """
+    运行完整的启动耗时基准
+
+    Returns:
+        dict: imports（各入口模块导入耗时）与 first_frame（首帧耗时）
+    """
+    imports = {}
+    for module in IMPORT_TARGETS:
+        try:
+            result = measure_import(module)
+        except RuntimeError as e:
+            imports[module] = {'error': str(e)}
+            continue
+        result.pop('modules')
+        imports[module] = result
+    return {'imports': imports, 'first_frame': measure_first_frame()}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument('--json', help="结果输出文件")
+    args = parser.parse_args(argv)
+
+    result = run_startup_benchmark()
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
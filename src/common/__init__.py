@@ -1,8 +1,17 @@
 """
 公共模块包
+子模块在首次访问时才导入（如 src.common.Member 会按需加载 message_types），
+各模块请直接从子模块导入，例如 from src.common.config import DEFAULT_UDP_PORT
 """
 
-from .config import *
-from .message_types import *
-from .utils import *
+import importlib
 
+_SUBMODULES = ('config', 'message_types', 'utils')
+
+
+def __getattr__(name):
+    for module_name in _SUBMODULES:
+        module = importlib.import_module(f'.{module_name}', __name__)
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,110 @@
+"""
+消息编解码模块
+功能：消息字典与JSON字节之间的转换。安装了orjson或msgspec时使用它们
+（编码、解码都比标准库快数倍），否则使用标准库json；
+各实现输出的都是标准UTF-8 JSON，不同实现的节点之间可以互通，
+由tests/test_codec.py中的共享语料验证
+"""
+
+import json
+from typing import Callable, Dict, Optional
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Codec:
+    """
+    编解码器
+    encode把消息字典编码为UTF-8 JSON字节；decode把JSON字节解码为Python对象，格式错误时抛出异常
+    """
+
+    name = ''
+
+    def encode(self, message_dict: dict) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> dict:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """标准库json（总是可用）"""
+
+    name = 'json'
+
+    def encode(self, message_dict: dict) -> bytes:
+        return json.dumps(message_dict, ensure_ascii=False).encode('utf-8')
+
+    def decode(self, data: bytes) -> dict:
+        return json.loads(data.decode('utf-8'))
+
+
+class OrjsonCodec(Codec):
+    """orjson"""
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.encode = orjson.dumps
+        self.decode = orjson.loads
+
+
+class MsgspecCodec(Codec):
+    """msgspec（复用编码器和解码器实例）"""
+
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+        self.encode = msgspec.json.Encoder().encode
+        self.decode = msgspec.json.Decoder().decode
+
+
+# 名称 -> 实现，auto时按此顺序选择第一个可用的
+CODECS: Dict[str, Callable[[], Codec]] = {
+    'orjson': OrjsonCodec,
+    'msgspec': MsgspecCodec,
+    'json': JsonCodec,
+}
+
+
+def available_codecs() -> Dict[str, Codec]:
+    """
+    创建所有可用的编解码器
+
+    Returns:
+        Dict[str, Codec]: 名称 -> 编解码器，未安装的库不在其中
+    """
+    codecs = {}
+    for name, factory in CODECS.items():
+        try:
+            codecs[name] = factory()
+        except ImportError:
+            pass
+    return codecs
+
+
+def select_codec(name: Optional[str] = 'auto') -> Codec:
+    """
+    选择编解码器
+
+    Args:
+        name: 'auto'（选择最快的可用实现）或CODECS中的名称；指定的库未安装时退回标准库json
+
+    Returns:
+        Codec: 编解码器
+    """
+    names = list(CODECS) if name in (None, 'auto') else [name]
+    for candidate in names:
+        factory = CODECS.get(candidate)
+        if factory is None:
+            logger.warning("未知的消息编解码器: %s", candidate)
+            continue
+        try:
+            return factory()
+        except ImportError:
+            logger.info("未安装 %s，使用标准库json编解码消息", candidate)
+    return JsonCodec()
@@ -4,11 +4,26 @@
 """
 
 # 网络配置
-DEFAULT_UDP_PORT = 8888  # UDP通信端口
-DEFAULT_TCP_PORT = 8889  # TCP文件传输端口
+DEFAULT_UDP_PORT = 8888  # UDP发现端口（同机多个实例通过SO_REUSEPORT共享，只用于接收广播）
+DEFAULT_MESSAGE_PORT = 0  # 本实例UDP消息端口，0表示由系统动态分配，通过Member.udp_port通告
+DEFAULT_TCP_PORT = 0  # TCP文件传输端口，0表示由系统动态分配，通过Member.tcp_port通告
 BROADCAST_ADDRESS = '255.255.255.255'  # 广播地址
 BUFFER_SIZE = 4096  # 接收缓冲区大小
-FILE_CHUNK_SIZE = 8192  # 文件传输块大小
+NETWORK_INTERFACES = []  # 指定使用的网卡名称，为空表示使用所有已启用的非回环网卡
+INTERFACE_EXCLUDE_PREFIXES = ('docker', 'br-', 'veth', 'virbr')  # 自动选择网卡时忽略的虚拟网卡前缀
+UDP_BATCH_WINDOW = 0.002  # 发往同一地址的UDP消息合并发送的等待窗口（秒），0表示每条消息立即单独发送
+UDP_BATCH_MTU = 1400  # 合并后的UDP数据报大小上限（字节），不超过以太网MTU以免IP分片
+MESSAGE_CODEC = 'auto'  # 消息JSON编解码实现：auto（依次尝试orjson、msgspec，都未安装时用标准库json）、orjson、msgspec、json
+RATE_LIMIT_SOURCE_RATE = 200  # 每个来源地址(IP, 端口)每秒处理的UDP数据报数上限，超出的在解析前丢弃，0表示不限速
+RATE_LIMIT_SOURCE_BURST = 400  # 每个来源地址的突发上限
+RATE_LIMIT_TYPES = {  # 每个来源地址各类消息的(每秒条数, 突发上限)，需要回复或显示的消息单独限速
+    'REFRESH': (2, 10),
+    'DISCOVERY': (5, 20),
+    'BROADCAST_MESSAGE': (50, 100),
+    'KEY_EXCHANGE': (5, 20),
+}
+RATE_LIMIT_MAX_SOURCES = 4096  # 限速时最多记录的来源地址数，超出时淘汰最久未出现的
+RATE_LIMIT_WARNING_INTERVAL = 10.0  # 丢弃数据报时记录警告日志的最小间隔（秒）
 
 # 消息关键字
 DISCOVERY_KEYWORD = "CHAT_DISCOVER"  # 发现组员关键字
@@ -19,13 +34,75 @@ REFRESH_KEYWORD = "CHAT_REFRESH"  # 刷新请求关键字
 # 超时设置
 SOCKET_TIMEOUT = 5  # socket超时时间（秒）
 DISCOVERY_TIMEOUT = 3  # 发现组员超时时间（秒）
+MEMBER_LOOKUP_RETRY = 1.0  # 收到未知节点ID的消息时，向对方查询成员信息的重发间隔（秒）
+MEMBER_LOOKUP_TIMEOUT = 5.0  # 查询不到发送者时，等待中的消息在该时间（秒）后丢弃
+MEMBER_LOOKUP_MAX_PENDING = 100  # 每个未知发送者最多暂存的消息数
+MEMBER_REFRESH_INTERVAL = 30.0  # 自动刷新成员列表的间隔（秒），0表示只手动刷新
+MEMBER_MISSED_REFRESHES = 3  # 连续该次数的自动刷新都没有回应的成员视为已离线（对方睡眠或断网时不会发送离开消息）
+
+# 离线消息配置
+OUTBOX_FILE = "outbox.json"  # 发给离线成员的消息（位于状态目录中）
+OUTBOX_MAX_MESSAGES = 100  # 每个离线成员最多暂存的消息数，超出时丢弃最早的
+OUTBOX_MAX_PEERS = 100  # 最多为多少个离线成员暂存消息，也是记住的已离开成员数
+OUTBOX_MAX_AGE = 7 * 24 * 3600  # 离线消息最长保留时间（秒）
+
+# 加密配置（需要安装cryptography，未安装时所有消息和文件都以明文传输）
+SECURE_ENABLED = True  # 与对方协商会话密钥，加密一对一消息、广播消息、文件传输控制消息和文件数据
+SECURE_REQUIRED = False  # 为True时不与无法协商密钥的成员通信，并丢弃收到的明文聊天和文件消息
+SECURE_CIPHER = 'aes-128-gcm'  # 发起协商时选用的AEAD算法：aes-128-gcm（有AES硬件加速时最快）、aes-256-gcm或chacha20-poly1305
+SECURE_SESSION_TTL = 3600  # 会话密钥有效期（秒），过期后发送下一条消息时重新协商
+SECURE_HANDSHAKE_TIMEOUT = 2.0  # 等待对方回复密钥协商的时间（秒），超时后以明文发送等待中的消息
+SECURE_PLAINTEXT_RETRY = 60  # 对方未回复密钥协商（不支持加密）时，该时间（秒）内直接以明文发送
+SECURE_MAX_PENDING = 100  # 协商期间每个成员最多暂存的待发消息数
+FILE_TLS_ENABLED = False  # 文件数据连接改用TLS（自签名证书，指纹随发现消息通告），接收方也开启时才生效
+FILE_TLS_SESSION_CACHE = 256  # 发送方按对方地址缓存的TLS会话数，再次连接时恢复会话，省去完整握手
 
 # 界面配置
 WINDOW_TITLE = "简易即时通信工具"
 WINDOW_WIDTH = 1000
 WINDOW_HEIGHT = 700
+UI_QUEUE_CONTROL_CAPACITY = 1000  # 网络线程到界面的控制事件（文件请求、传输状态、成员列表）队列容量，满时拒绝新事件
+UI_QUEUE_P2P_CAPACITY = 1000  # 一对一消息队列容量，满时丢弃最早的消息
+UI_QUEUE_BROADCAST_CAPACITY = 200  # 广播消息队列容量（优先级最低），满时丢弃最早的消息
+UI_DRAIN_BATCH = 200  # 界面每次事件循环最多处理的网络事件数，其余留到下一轮，保证界面及时响应
+UI_CHAT_MAX_LINES = 5000  # 聊天窗口保留的最大行数
 
 # 文件传输配置
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 最大文件大小 100MB
 DOWNLOAD_DIR = "downloads"  # 下载文件保存目录
+STATE_DIR = ".chat_state"  # 程序状态（离线消息等）保存目录，与下载目录分开
+PROGRESS_MIN_INTERVAL = 0.1  # 传输进度的最小上报间隔（秒）
+PROGRESS_MIN_STEP = 1  # 进度每增加该百分比也会上报一次
+MAX_CONCURRENT_SENDS = 3  # 同时进行的发送数上限
+MAX_CONCURRENT_RECEIVES = 3  # 同时进行的接收数上限
+MAX_TRANSFERS_PER_PEER = 2  # 与同一成员同时进行的传输数上限（发送和接收分别计算）
+FILE_STALL_TIMEOUT = 300  # 数据连接持续该时间（秒）没有任何进展即放弃传输（对方暂停超过该时间也会失败），0表示不限
+TRANSFER_BANDWIDTH_LIMIT = 0  # 所有传输合计的带宽上限（字节/秒），0表示不限速
+MAX_FINISHED_TRANSFERS = 100  # 保留的已结束传输记录数
+FILE_OFFER_RETRY_INTERVAL = 2.0  # 文件传输请求未获回应时的重发间隔（秒）
+FILE_OFFER_TIMEOUT = 300  # 文件传输请求等待对方处理、接受后等待对方连接的超时时间（秒）
+MANIFEST_BLOCK_SIZE = 1024 * 1024  # 分块清单的块大小（逐块校验、重传和多人分发的单位）
+MANIFEST_CACHE_SIZE = 256  # 发送方缓存的分块清单数
+MANIFEST_MAX_REPAIRS = 3  # 校验失败的块最多重传几轮
+CONTENT_INDEX_FILE = ".content_index.json"  # 已接收文件的内容索引（位于下载目录中）
+CONTENT_CACHE_MAX_ENTRIES = 1000  # 内容索引最多记录的文件数
+CONTENT_CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024  # 内容索引记录的文件总大小上限 20GB
+SWARM_PARALLEL_PIECES = 4  # 多人分发时每个接收方同时下载分块的连接数
+SWARM_STALL_TIMEOUT = 30  # 多人分发时接收方持续该时间（秒）没有拿到新分块即放弃
+FILE_CHUNK_MIN = 16 * 1024  # 文件传输块大小下限（实际块大小按测得的速率自动调整）
+FILE_CHUNK_MAX = 4 * 1024 * 1024  # 文件传输块大小上限
+FILE_CHUNK_TARGET_TIME = 0.005  # 按当前速率每块大约耗时（秒）：块越大系统调用开销越小，块越小暂停和限速越及时
+FILE_LINK_RATE_GUESS = 125 * 1024 * 1024  # 还没有测得对方速率时假设的带宽（字节/秒），约1Gbit/s
+TCP_BUFFER_MAX = 16 * 1024 * 1024  # 按带宽时延积调大socket缓冲区的上限（仍受系统net.core.*mem_max限制）
+TCP_NODELAY_ENABLED = True  # 数据连接关闭Nagle算法，确认和重传请求等小包立即发出
+TCP_NOTSENT_LOWAT = 0  # 发送方内核中未发出数据的水位（字节），减少排队时延，0表示不设置
+TCP_POOL_IDLE_TIMEOUT = 30  # 传输结束后保留数据连接供下次复用的时间（秒），接收方保留两倍时间
+TCP_POOL_MAX_IDLE = MAX_TRANSFERS_PER_PEER  # 每个成员最多保留的空闲数据连接数，0表示不复用
+
 
+# 日志配置
+LOG_LEVEL = "INFO"  # 默认日志级别
+LOG_MODULE_LEVELS = {}  # 按模块覆盖日志级别，如 {"core.file_transfer": "DEBUG"}
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"  # 日志格式
+LOG_QUEUE_SIZE = 10000  # 日志队列容量（队列满时丢弃新日志，保证网络线程不阻塞）
+LOG_RATE_LIMIT_INTERVAL = 5.0  # 相同日志的最小输出间隔（秒）
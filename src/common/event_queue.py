@@ -0,0 +1,151 @@
+"""
+有界事件队列模块
+功能：网络线程与界面主线程之间的多优先级有界队列。
+每个通道容量固定，满时按通道的丢弃策略丢弃事件，消息洪泛时内存和界面延迟都有上限；
+带键的事件（进度、成员列表等只关心最新值的状态）在队列中按键合并，只保留最新的一个
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+DROP_OLDEST = 'drop_oldest'  # 丢弃队列中最早的事件，保留最新的（适合聊天消息）
+DROP_NEWEST = 'drop_newest'  # 拒绝新事件，保留已排队的（适合文件请求等控制事件）
+
+
+class _Lane:
+    """一个优先级通道"""
+
+    __slots__ = ('name', 'capacity', 'policy', 'entries', 'keyed',
+                 'enqueued', 'delivered', 'dropped', 'coalesced', 'high_water')
+
+    def __init__(self, name: str, capacity: int, policy: str):
+        self.name = name
+        self.capacity = capacity
+        self.policy = policy
+        # 每个条目为[键, 事件, 入队时间]，键为None表示不合并
+        self.entries: Deque[list] = deque()
+        self.keyed: Dict[Hashable, list] = {}
+        self.enqueued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+
+    def pop(self) -> list:
+        entry = self.entries.popleft()
+        if entry[0] is not None:
+            del self.keyed[entry[0]]
+        return entry
+
+
+class LaneQueue:
+    """
+    多优先级有界队列（线程安全）
+    取出时总是先取高优先级通道的事件；队列由空变为非空时调用on_ready通知消费者
+    """
+
+    def __init__(self, lanes: List[Tuple[str, int, str]],
+                 on_ready: Optional[Callable[[], None]] = None):
+        """
+        初始化队列
+
+        Args:
+            lanes: 按优先级从高到低排列的(通道名, 容量, 丢弃策略)
+            on_ready: 队列由空变为非空时调用（在put的调用线程中执行）
+        """
+        self._lanes = [_Lane(name, capacity, policy) for name, capacity, policy in lanes]
+        self._by_name = {lane.name: lane for lane in self._lanes}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.on_ready = on_ready
+        self.max_latency = 0.0  # 事件从入队到取出的最长等待时间（秒）
+
+    def put(self, lane_name: str, item: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        放入一个事件
+
+        Args:
+            lane_name: 通道名
+            item: 事件
+            key: 合并键，队列中已有同键事件时直接替换它（保持原来的位置）
+
+        Returns:
+            bool: 事件是否进入队列（被丢弃时为False）
+        """
+        lane = self._by_name[lane_name]
+        with self._lock:
+            lane.enqueued += 1
+            if key is not None and key in lane.keyed:
+                lane.keyed[key][1] = item
+                lane.coalesced += 1
+                return True
+            if len(lane.entries) >= lane.capacity:
+                if lane.policy == DROP_NEWEST or not lane.entries:
+                    lane.dropped += 1
+                    return False
+                lane.pop()
+                lane.dropped += 1
+                self._size -= 1
+            entry = [key, item, time.monotonic()]
+            lane.entries.append(entry)
+            if key is not None:
+                lane.keyed[key] = entry
+            lane.high_water = max(lane.high_water, len(lane.entries))
+            self._size += 1
+            became_ready = self._size == 1
+        if became_ready and self.on_ready:
+            self.on_ready()
+        return True
+
+    def get_batch(self, max_items: int) -> Tuple[List[Any], bool]:
+        """
+        按优先级取出至多max_items个事件
+
+        Args:
+            max_items: 最多取出的事件数
+
+        Returns:
+            Tuple[List[Any], bool]: 事件列表，以及取出后队列中是否还有事件
+        """
+        items = []
+        now = time.monotonic()
+        with self._lock:
+            for lane in self._lanes:
+                while lane.entries and len(items) < max_items:
+                    _, item, enqueued_at = lane.pop()
+                    items.append(item)
+                    lane.delivered += 1
+                    self.max_latency = max(self.max_latency, now - enqueued_at)
+            self._size -= len(items)
+            return items, self._size > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._size
+
+    def dropped(self) -> int:
+        """所有通道累计丢弃的事件数"""
+        with self._lock:
+            return sum(lane.dropped for lane in self._lanes)
+
+    def stats(self) -> dict:
+        """
+        队列统计
+
+        Returns:
+            dict: 通道名 -> depth（当前深度）、high_water（最大深度）、enqueued、delivered、
+            dropped、coalesced；以及max_latency
+        """
+        with self._lock:
+            result = {lane.name: {
+                'depth': len(lane.entries),
+                'high_water': lane.high_water,
+                'enqueued': lane.enqueued,
+                'delivered': lane.delivered,
+                'dropped': lane.dropped,
+                'coalesced': lane.coalesced,
+            } for lane in self._lanes}
+            result['max_latency'] = self.max_latency
+            return result
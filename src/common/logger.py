@@ -0,0 +1,174 @@
+"""
+日志模块
+提供基于队列的分级日志：调用线程只把日志记录放入有界队列，
+由后台QueueListener线程负责实际输出，网络线程不会被I/O阻塞
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .config import (
+    LOG_LEVEL, LOG_MODULE_LEVELS, LOG_FORMAT,
+    LOG_QUEUE_SIZE, LOG_RATE_LIMIT_INTERVAL
+)
+
+ROOT_LOGGER_NAME = "chat"  # 所有模块日志的根logger名称
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DropQueueHandler"] = None
+
+
+class DropQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞队列日志处理器
+    队列已满时直接丢弃新记录并计数，保证调用线程永不阻塞
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0  # 因队列满被丢弃的记录数
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    重复日志限流过滤器
+    相同logger、相同级别、相同内容的日志在interval秒内只输出一次，
+    被抑制的条数会附加在下一次输出的日志末尾
+    """
+
+    MAX_KEYS = 1024  # 记录的不同日志条目上限，超过后清空重新计数
+
+    def __init__(self, interval: float = LOG_RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._lock = threading.Lock()
+        # key -> (上次输出时间, 期间被抑制的条数)
+        self._seen: Dict[Tuple[str, int, str], Tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            last = self._seen.get(key)
+            if last is not None and now - last[0] < self.interval:
+                self._seen[key] = (last[0], last[1] + 1)
+                return False
+            if len(self._seen) >= self.MAX_KEYS:
+                self._seen.clear()
+            self._seen[key] = (now, 0)
+        suppressed = last[1] if last else 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} (已抑制 {suppressed} 条重复日志)"
+            record.args = None
+        return True
+
+
+def _parse_level(level) -> int:
+    """把字符串或数字形式的日志级别转换为数字"""
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    return value if isinstance(value, int) else logging.INFO
+
+
+def setup_logging(level=None, module_levels: Optional[Dict[str, str]] = None,
+                  stream=None, rate_limit_interval: Optional[float] = None):
+    """
+    配置日志系统（可重复调用，后一次调用覆盖前一次的配置）
+
+    Args:
+        level: 默认日志级别，默认使用配置文件中的LOG_LEVEL
+        module_levels: 按模块覆盖的日志级别，如 {"core.file_transfer": "DEBUG"}
+        stream: 日志输出流，默认sys.stderr
+        rate_limit_interval: 相同日志的最小输出间隔（秒），0表示不限流
+    """
+    global _listener, _queue_handler
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(_parse_level(level if level is not None else LOG_LEVEL))
+        root.propagate = False
+        if _queue_handler is not None:
+            root.removeHandler(_queue_handler)
+
+        levels = dict(LOG_MODULE_LEVELS)
+        if module_levels:
+            levels.update(module_levels)
+        for name, module_level in levels.items():
+            logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}").setLevel(_parse_level(module_level))
+
+        output = stream if stream is not None else sys.stderr
+        if output is None:
+            # 无控制台的打包程序中sys.stderr为None
+            target: logging.Handler = logging.NullHandler()
+        else:
+            target = logging.StreamHandler(output)
+        target.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = DropQueueHandler(log_queue)
+        _queue_handler.addFilter(RateLimitFilter(
+            LOG_RATE_LIMIT_INTERVAL if rate_limit_interval is None else rate_limit_interval
+        ))
+        root.addHandler(_queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging():
+    """停止后台日志线程并输出队列中剩余的日志"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    获取模块logger，首次调用时自动完成默认配置
+
+    Args:
+        name: 模块名，一般传入__name__（如 src.core.message_dispatcher）
+
+    Returns:
+        logging.Logger: 名为 chat.core.message_dispatcher 形式的logger
+    """
+    if _listener is None and _queue_handler is None:
+        setup_logging()
+    parts = name.split(".", 1)
+    suffix = parts[1] if len(parts) > 1 else parts[0]
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{suffix}")
+
+
+def get_dropped_count() -> int:
+    """
+    获取因队列满而被丢弃的日志条数
+
+    Returns:
+        int: 丢弃条数
+    """
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+atexit.register(shutdown_logging)
@@ -3,6 +3,7 @@
 定义所有消息类型和数据结构
 """
 
+import weakref
 from enum import Enum
 from dataclasses import dataclass
 from typing import Optional
@@ -20,15 +21,54 @@ class MessageType(Enum):
     FILE_REQUEST = "FILE_REQUEST"  # 文件传输请求
     FILE_ACCEPT = "FILE_ACCEPT"  # 接受文件传输
     FILE_REJECT = "FILE_REJECT"  # 拒绝文件传输
+    FILE_CANCEL = "FILE_CANCEL"  # 发送方撤回文件传输请求
+    FILE_HAVE = "FILE_HAVE"  # 接收方本地已有相同内容，无需传输
+    KEY_EXCHANGE = "KEY_EXCHANGE"  # 会话密钥协商
+
+
+# 按值查找消息类型，比调用MessageType(value)快一个数量级（解码每个数据包都要查一次）
+_MESSAGE_TYPES = {msg_type.value: msg_type for msg_type in MessageType}
 
 
-@dataclass
 class Member:
-    """组员信息数据类"""
+    """
+    组员信息（不可变）
+    每收到一个数据包都要解析一次发送者，因此使用__slots__且不可修改：
+    from_dict按(ip, udp_port)复用已有实例，同一成员的所有消息共享一个对象；
+    需要修改字段时用replace生成新实例
+    """
+    __slots__ = ('username', 'ip', 'udp_port', 'tcp_port', 'node_id', 'tls_fingerprint', '__weakref__')
+
     username: str  # 用户名
     ip: str  # IP地址
     udp_port: int  # UDP端口
     tcp_port: int  # TCP端口
+    node_id: str  # 节点实例ID（每次启动随机生成，用于识别自己发出的消息）
+    tls_fingerprint: str  # 文件传输TLS证书的SHA-256指纹，未启用TLS时为空
+
+    def __init__(self, username: str, ip: str, udp_port: int, tcp_port: int, node_id: str = '',
+                 tls_fingerprint: str = ''):
+        _set = object.__setattr__
+        _set(self, 'username', username)
+        _set(self, 'ip', ip)
+        _set(self, 'udp_port', udp_port)
+        _set(self, 'tcp_port', tcp_port)
+        _set(self, 'node_id', node_id)
+        _set(self, 'tls_fingerprint', tls_fingerprint)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Member不可修改，请使用replace({name}=...)")
+
+    def __delattr__(self, name):
+        raise AttributeError("Member不可修改")
+
+    def __reduce__(self):
+        return Member, (self.username, self.ip, self.udp_port, self.tcp_port, self.node_id,
+                        self.tls_fingerprint)
+
+    def __repr__(self):
+        return (f"Member(username={self.username!r}, ip={self.ip!r}, udp_port={self.udp_port!r}, "
+                f"tcp_port={self.tcp_port!r}, node_id={self.node_id!r})")
     
     def __eq__(self, other):
         """判断两个成员是否相同"""
@@ -39,34 +79,117 @@ class Member:
     def __hash__(self):
         """用于set和dict"""
         return hash((self.ip, self.udp_port))
+
+    def replace(self, **changes) -> 'Member':
+        """
+        生成修改了部分字段的新实例
+
+        Args:
+            **changes: 要修改的字段
+
+        Returns:
+            Member: 新实例（已登记到复用表）
+        """
+        fields = {name: getattr(self, name) for name in _MEMBER_FIELDS}
+        fields.update(changes)
+        return _member_registry.intern(**fields)
     
     def to_dict(self):
         """转换为字典"""
-        return {
+        data = {
             'username': self.username,
             'ip': self.ip,
             'udp_port': self.udp_port,
-            'tcp_port': self.tcp_port
+            'tcp_port': self.tcp_port,
+            'node_id': self.node_id
         }
+        # 只有启用了TLS的节点才通告证书指纹
+        if self.tls_fingerprint:
+            data['tls_fingerprint'] = self.tls_fingerprint
+        return data
     
     @classmethod
-    def from_dict(cls, data):
-        """从字典创建实例"""
-        return cls(
-            username=data['username'],
-            ip=data['ip'],
-            udp_port=data['udp_port'],
-            tcp_port=data['tcp_port']
-        )
+    def from_dict(cls, data, ip: Optional[str] = None):
+        """
+        从字典创建实例，字段相同时返回已有实例
+
+        Args:
+            data: 字典
+            ip: 覆盖字典中的IP（以实际收到数据的源地址为准）
+        """
+        return _member_registry.intern(data['username'], ip or data['ip'], data['udp_port'],
+                                       data['tcp_port'], data.get('node_id', ''),
+                                       data.get('tls_fingerprint', ''))
+
+
+_MEMBER_FIELDS = ('username', 'ip', 'udp_port', 'tcp_port', 'node_id', 'tls_fingerprint')
+
+
+class MemberRegistry:
+    """
+    成员复用表：(ip, udp_port) -> 最近一次见到的Member
+    只保存弱引用，不再被任何消息或成员列表引用的成员自动移除；
+    同一地址的字段有变化（如对方重启后端口或ID不同）时换成新实例
+    """
+
+    def __init__(self):
+        self._members: 'weakref.WeakValueDictionary[tuple, Member]' = weakref.WeakValueDictionary()
+
+    def intern(self, username: str, ip: str, udp_port: int, tcp_port: int, node_id: str = '',
+               tls_fingerprint: str = '') -> Member:
+        """
+        取得字段完全相同的共享实例，没有时创建并登记
+
+        Returns:
+            Member: 成员
+        """
+        key = (ip, udp_port)
+        member = self._members.get(key)
+        if (member is not None and member.username == username
+                and member.tcp_port == tcp_port and member.node_id == node_id
+                and member.tls_fingerprint == tls_fingerprint):
+            return member
+        member = Member(username, ip, udp_port, tcp_port, node_id, tls_fingerprint)
+        self._members[key] = member
+        return member
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+
+_member_registry = MemberRegistry()
 
 
-@dataclass
 class ChatMessage:
-    """聊天消息数据类"""
+    """
+    聊天消息
+    界面和守护进程会长期保存大量消息，使用__slots__省去每个实例的__dict__
+    """
+    __slots__ = ('msg_type', 'sender', 'content', 'receiver')
+
     msg_type: MessageType  # 消息类型
     sender: Member  # 发送者
     content: str  # 消息内容
-    receiver: Optional[Member] = None  # 接收者（一对一消息使用）
+    receiver: Optional[Member]  # 接收者（一对一消息使用）
+
+    def __init__(self, msg_type: MessageType, sender: Member, content: str,
+                 receiver: Optional[Member] = None):
+        self.msg_type = msg_type
+        self.sender = sender
+        self.content = content
+        self.receiver = receiver
+
+    def __repr__(self):
+        return (f"ChatMessage(msg_type={self.msg_type!r}, sender={self.sender!r}, "
+                f"content={self.content!r}, receiver={self.receiver!r})")
+
+    def __eq__(self, other):
+        if not isinstance(other, ChatMessage):
+            return NotImplemented
+        return (self.msg_type, self.sender, self.content, self.receiver) == \
+            (other.msg_type, other.sender, other.content, other.receiver)
+
+    __hash__ = None
     
     def to_dict(self):
         """转换为字典"""
@@ -78,15 +201,32 @@ class ChatMessage:
         if self.receiver:
             data['receiver'] = self.receiver.to_dict()
         return data
+
+    def to_compact_dict(self):
+        """
+        转换为紧凑字典：发送者和接收者只用节点ID表示。
+        完整的成员信息已经通过发现和加入消息通告过，接收方从成员列表中查出
+        （见MemberManager.resolve_message），只有双方都有节点ID时才能使用
+        """
+        data = {
+            'msg_type': self.msg_type.value,
+            'sender_id': self.sender.node_id,
+            'content': self.content
+        }
+        if self.receiver:
+            data['receiver_id'] = self.receiver.node_id
+        return data
     
     @classmethod
     def from_dict(cls, data):
-        """从字典创建实例"""
+        """从字典创建实例（完整格式）"""
+        value = data['msg_type']
+        receiver = data.get('receiver')
         return cls(
-            msg_type=MessageType(data['msg_type']),
-            sender=Member.from_dict(data['sender']),
-            content=data['content'],
-            receiver=Member.from_dict(data['receiver']) if 'receiver' in data else None
+            _MESSAGE_TYPES.get(value) or MessageType(value),
+            Member.from_dict(data['sender']),
+            data['content'],
+            Member.from_dict(receiver) if receiver is not None else None
         )
 
 
@@ -97,6 +237,8 @@ class FileTransferInfo:
     filesize: int  # 文件大小
     sender: Member  # 发送者
     receiver: Member  # 接收者
+    transfer_id: str = ''  # 传输ID，由发送方生成，贯穿请求、确认和数据连接
+    content_hash: str = ''  # 文件内容哈希（分块清单的根哈希），接收方据此查找本地已有的相同文件
     
     def to_dict(self):
         """转换为字典"""
@@ -104,7 +246,9 @@ class FileTransferInfo:
             'filename': self.filename,
             'filesize': self.filesize,
             'sender': self.sender.to_dict(),
-            'receiver': self.receiver.to_dict()
+            'receiver': self.receiver.to_dict(),
+            'transfer_id': self.transfer_id,
+            'content_hash': self.content_hash
         }
     
     @classmethod
@@ -114,6 +258,39 @@ class FileTransferInfo:
             filename=data['filename'],
             filesize=data['filesize'],
             sender=Member.from_dict(data['sender']),
-            receiver=Member.from_dict(data['receiver'])
+            receiver=Member.from_dict(data['receiver']),
+            transfer_id=data.get('transfer_id', ''),
+            content_hash=data.get('content_hash', '')
         )
 
+
+@dataclass
+class TransferProgress:
+    """文件传输进度数据类（仅在本地模块与界面之间传递）"""
+    filename: str  # 文件名
+    bytes_done: int  # 已传输字节数
+    total_bytes: int  # 文件总字节数
+    bytes_per_sec: float  # 当前传输速率
+    eta_seconds: Optional[float] = None  # 预计剩余时间，速率未知时为None
+    transfer_id: str = ''  # 传输ID
+    tuning: Optional[dict] = None  # 数据连接采用的传输参数（块大小、缓冲区、往返时间等）
+
+    @property
+    def percent(self) -> int:
+        """进度百分比"""
+        if not self.total_bytes:
+            return 100
+        return int(self.bytes_done * 100 / self.total_bytes)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'filename': self.filename,
+            'bytes_done': self.bytes_done,
+            'total_bytes': self.total_bytes,
+            'percent': self.percent,
+            'bytes_per_sec': self.bytes_per_sec,
+            'eta_seconds': self.eta_seconds,
+            'transfer_id': self.transfer_id,
+            'tuning': self.tuning
+        }
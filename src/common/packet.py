@@ -0,0 +1,141 @@
+"""
+数据报帧格式模块
+功能：每条UDP消息前加一个固定长度的二进制头，接收方只看头部就能丢弃格式错误、
+类型未知、自己发出的以及发给别人的消息，不必解码JSON正文。
+
+帧格式（网络字节序，共14字节头部）：
+    魔数 2字节 b'CM' | 版本 1字节 | 类型码 1字节 | 正文长度 2字节 |
+    发送者节点ID 4字节 | 接收者节点ID 4字节（全零表示不限接收者） | JSON正文
+一个数据报可以依次包含多个帧（UdpBatcher合并发送时）
+
+类型码最高位为SEALED时正文已加密（见core.secure_channel），头部本身仍是明文，
+作为AEAD的附加数据参与认证
+"""
+
+import struct
+from typing import Dict, List, NamedTuple, Optional
+
+from .message_types import MessageType
+from .utils import serialize_message
+
+MAGIC = b'CM'
+VERSION = 1
+HEADER = struct.Struct('!2sBBH4s4s')
+ANY_NODE = b'\x00' * 4  # 接收者节点ID全零：广播或不知道对方节点ID
+SEALED = 0x80  # 类型码中的加密标志位
+
+# 类型码一经分配不再修改，新类型只追加
+TYPE_CODES: Dict[MessageType, int] = {
+    MessageType.DISCOVERY: 1,
+    MessageType.DISCOVERY_RESPONSE: 2,
+    MessageType.JOIN: 3,
+    MessageType.LEAVE: 4,
+    MessageType.REFRESH: 5,
+    MessageType.P2P_MESSAGE: 6,
+    MessageType.BROADCAST_MESSAGE: 7,
+    MessageType.FILE_REQUEST: 8,
+    MessageType.FILE_ACCEPT: 9,
+    MessageType.FILE_REJECT: 10,
+    MessageType.FILE_CANCEL: 11,
+    MessageType.FILE_HAVE: 12,
+    MessageType.KEY_EXCHANGE: 13,
+}
+_CODE_TYPES: Dict[int, MessageType] = {code: msg_type for msg_type, code in TYPE_CODES.items()}
+_VALUE_CODES: Dict[str, int] = {msg_type.value: code for msg_type, code in TYPE_CODES.items()}
+
+
+class Frame(NamedTuple):
+    """数据报中的一个帧，正文为data[start:end]"""
+    msg_type: Optional[MessageType]  # 未知类型码为None
+    sender: bytes  # 发送者节点ID
+    receiver: bytes  # 接收者节点ID，ANY_NODE表示不限
+    start: int
+    end: int
+    sealed: bool = False  # 正文是否已加密
+
+
+def node_id_bytes(node_id: Optional[str]) -> bytes:
+    """
+    把节点ID（8位十六进制）转为头部中的4字节，无效时返回ANY_NODE
+
+    Args:
+        node_id: 节点ID
+
+    Returns:
+        bytes: 4字节节点ID
+    """
+    try:
+        value = bytes.fromhex(node_id)
+    except (TypeError, ValueError):
+        return ANY_NODE
+    return value if len(value) == 4 else ANY_NODE
+
+
+def _party_id(message_dict: dict, role: str) -> Optional[str]:
+    # 完整格式中是成员字典，精简格式中只有节点ID
+    member = message_dict.get(role)
+    if isinstance(member, dict):
+        return member.get('node_id')
+    return message_dict.get(f'{role}_id')
+
+
+def message_sender(message_dict: dict) -> bytes:
+    """
+    消息正文中发送者的4字节节点ID（完整格式和精简格式都适用），没有时返回ANY_NODE
+
+    Args:
+        message_dict: 消息字典
+
+    Returns:
+        bytes: 4字节节点ID
+    """
+    return node_id_bytes(_party_id(message_dict, 'sender'))
+
+
+def encode_packet(message_dict: dict) -> bytes:
+    """
+    把消息编码为一个帧：头部字段取自消息的msg_type、发送者和接收者
+
+    Args:
+        message_dict: 消息字典
+
+    Returns:
+        bytes: 帧
+
+    Raises:
+        ValueError: 消息类型未知或正文超过65535字节
+    """
+    code = _VALUE_CODES.get(message_dict.get('msg_type'))
+    if code is None:
+        raise ValueError(f"未知消息类型: {message_dict.get('msg_type')}")
+    body = serialize_message(message_dict)
+    if len(body) > 0xFFFF:
+        raise ValueError(f"消息过长: {len(body)} 字节")
+    return HEADER.pack(MAGIC, VERSION, code, len(body),
+                       message_sender(message_dict),
+                       node_id_bytes(_party_id(message_dict, 'receiver'))) + body
+
+
+def split_frames(data: bytes) -> Optional[List[Frame]]:
+    """
+    解析数据报中所有帧的头部（不解码正文）
+
+    Args:
+        data: 数据报内容
+
+    Returns:
+        Optional[List[Frame]]: 帧列表；魔数、版本或长度不对时返回None
+    """
+    frames = []
+    offset, size = 0, len(data)
+    while offset < size:
+        if size - offset < HEADER.size:
+            return None
+        magic, version, code, length, sender, receiver = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        offset = start + length
+        if magic != MAGIC or version != VERSION or offset > size:
+            return None
+        frames.append(Frame(_CODE_TYPES.get(code & ~SEALED), sender, receiver, start, offset,
+                            bool(code & SEALED)))
+    return frames or None
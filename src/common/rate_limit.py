@@ -0,0 +1,90 @@
+"""
+令牌桶限速模块
+功能：按字节数或消息数限速，供文件传输带宽限制等功能使用
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    令牌桶（线程安全）
+    令牌以rate个/秒的速度补充，最多积累burst个；rate不大于0表示不限速
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数，不大于0表示不限速
+            burst: 桶容量，默认等于rate（即最多突发1秒的量）
+            clock: 时钟函数，便于测试替换
+        """
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        """
+        修改速率，桶被重新装满
+
+        Args:
+            rate: 每秒补充的令牌数，不大于0表示不限速
+            burst: 桶容量，默认等于rate
+        """
+        with self._lock:
+            self.rate = rate
+            self.burst = burst if burst is not None else rate
+            self._tokens = self.burst
+            self._updated = self.clock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_consume(self, amount: float = 1) -> bool:
+        """
+        尝试取出令牌，令牌不足时不取出
+
+        Args:
+            amount: 令牌数
+
+        Returns:
+            bool: 是否取出成功
+        """
+        if self.unlimited:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return True
+            return False
+
+    def reserve(self, amount: float) -> float:
+        """
+        取出令牌，令牌不足时允许透支，返回调用方需要等待的时间
+
+        Args:
+            amount: 令牌数
+
+        Returns:
+            float: 需要等待的秒数，0表示无需等待
+        """
+        if self.unlimited:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
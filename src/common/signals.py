@@ -0,0 +1,88 @@
+"""
+信号模块
+提供不依赖PyQt6的纯Python信号/回调机制，接口与pyqtSignal保持一致
+（connect / disconnect / emit），核心模块因此可以在无界面环境下运行
+
+注意：槽函数在发射信号的线程中同步执行，
+图形界面需要通过 ui.qt_bridge.QtSignalBridge 把调用转发到Qt主线程
+"""
+
+import threading
+from typing import Callable, List, Optional
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BoundSignal:
+    """
+    绑定到具体对象的信号实例
+    槽函数列表采用写时复制，emit时无需加锁
+    """
+
+    __slots__ = ("name", "_slots", "_lock")
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._slots: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def connect(self, slot: Callable):
+        """
+        连接槽函数
+
+        Args:
+            slot: 任意可调用对象，参数与emit时传入的参数一致
+        """
+        with self._lock:
+            self._slots = self._slots + [slot]
+
+    def disconnect(self, slot: Optional[Callable] = None):
+        """
+        断开槽函数
+
+        Args:
+            slot: 要断开的槽函数，为None时断开全部
+        """
+        with self._lock:
+            if slot is None:
+                self._slots = []
+            else:
+                self._slots = [s for s in self._slots if s != slot]
+
+    def emit(self, *args):
+        """
+        发射信号，依次调用所有槽函数
+        单个槽函数出错只记录日志，不影响其他槽函数和发射线程
+        """
+        for slot in self._slots:
+            try:
+                slot(*args)
+            except Exception:
+                logger.exception("信号 %s 的槽函数执行出错", self.name)
+
+
+class Signal:
+    """
+    信号描述符
+    用法与pyqtSignal相同：在类中声明 `xxx = Signal(类型...)`，
+    通过实例访问时得到该实例独有的BoundSignal
+    """
+
+    def __init__(self, *types):
+        self.types = types  # 参数类型，仅作说明用途
+        self.name = ""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        bound = instance.__dict__.get(self.name)
+        if bound is None:
+            bound = instance.__dict__.setdefault(
+                self.name, BoundSignal(f"{owner.__name__}.{self.name}")
+            )
+        return bound
@@ -3,15 +3,160 @@
 提供通用的工具函数
 """
 
-import json
+import functools
+import ipaddress
+import os
+import secrets
 import socket
 import struct
-from typing import Optional
+import sys
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
 
+from .codec import select_codec
+from .config import NETWORK_INTERFACES, INTERFACE_EXCLUDE_PREFIXES, MESSAGE_CODEC
+from .logger import get_logger
 
+logger = get_logger(__name__)
+
+# 消息编解码器，由MESSAGE_CODEC选择（默认使用已安装的最快实现）
+codec = select_codec(MESSAGE_CODEC)
+
+# Linux网卡ioctl常量
+_SIOCGIFFLAGS = 0x8913
+_SIOCGIFADDR = 0x8915
+_SIOCGIFNETMASK = 0x891b
+_IFF_UP = 0x1
+
+UNKNOWN_NETMASK = '0.0.0.0'  # 无法获取子网掩码时使用，对应受限广播地址
+
+
+@dataclass(frozen=True)
+class NetworkInterface:
+    """本机网卡（IPv4）信息"""
+    name: str  # 网卡名称
+    ip: str  # 网卡IP地址
+    netmask: str  # 子网掩码
+    
+    @property
+    def broadcast(self) -> str:
+        """由子网掩码推导出的广播地址（掩码未知时为255.255.255.255）"""
+        network = ipaddress.IPv4Network(f"{self.ip}/{self.netmask}", strict=False)
+        return str(network.broadcast_address)
+    
+    @property
+    def is_loopback(self) -> bool:
+        """是否为回环网卡"""
+        return ipaddress.IPv4Address(self.ip).is_loopback
+
+
+def _psutil_interfaces() -> Optional[List[NetworkInterface]]:
+    """通过psutil枚举网卡（可选依赖，未安装时返回None）"""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    stats = psutil.net_if_stats()
+    result = []
+    for name, addrs in psutil.net_if_addrs().items():
+        if name in stats and not stats[name].isup:
+            continue
+        for addr in addrs:
+            if addr.family == socket.AF_INET and addr.address:
+                result.append(NetworkInterface(name, addr.address, addr.netmask or UNKNOWN_NETMASK))
+    return result
+
+
+def _linux_interfaces() -> Optional[List[NetworkInterface]]:
+    """通过ioctl枚举Linux网卡（每个网卡取主IPv4地址）"""
+    if not sys.platform.startswith('linux'):
+        return None
+    import fcntl
+    result = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for _, name in socket.if_nameindex():
+            request = struct.pack('256s', name[:15].encode())
+            try:
+                flags = struct.unpack('H', fcntl.ioctl(s.fileno(), _SIOCGIFFLAGS, request)[16:18])[0]
+                if not flags & _IFF_UP:
+                    continue
+                ip = socket.inet_ntoa(fcntl.ioctl(s.fileno(), _SIOCGIFADDR, request)[20:24])
+                netmask = socket.inet_ntoa(fcntl.ioctl(s.fileno(), _SIOCGIFNETMASK, request)[20:24])
+            except OSError:
+                # 网卡没有IPv4地址
+                continue
+            result.append(NetworkInterface(name, ip, netmask))
+    return result
+
+
+def _hostname_interfaces() -> List[NetworkInterface]:
+    """通过主机名解析得到本机IP（无法获知子网掩码，使用受限广播）"""
+    try:
+        infos = socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)
+    except socket.gaierror:
+        infos = []
+    ips = sorted({info[4][0] for info in infos})
+    return [NetworkInterface(ip, ip, UNKNOWN_NETMASK) for ip in ips]
+
+
+def list_interfaces() -> List[NetworkInterface]:
+    """
+    枚举本机所有已启用的IPv4网卡
+    依次尝试psutil、Linux ioctl、主机名解析
+    
+    Returns:
+        List[NetworkInterface]: 网卡列表（包含回环网卡）
+    """
+    for source in (_psutil_interfaces, _linux_interfaces):
+        try:
+            interfaces = source()
+        except Exception as e:
+            logger.debug("枚举网卡失败(%s): %s", source.__name__, e)
+            continue
+        if interfaces is not None:
+            return interfaces
+    return _hostname_interfaces()
+
+
+def select_interfaces(interfaces: Optional[Iterable[NetworkInterface]] = None,
+                      names: Optional[Iterable[str]] = None) -> List[NetworkInterface]:
+    """
+    选择用于发现广播的网卡，同一网段只保留一个，避免重复发送
+    
+    Args:
+        interfaces: 候选网卡，默认枚举本机网卡
+        names: 指定使用的网卡名称，默认使用配置中的NETWORK_INTERFACES；
+               为空时使用所有非回环、非虚拟网卡
+        
+    Returns:
+        List[NetworkInterface]: 选中的网卡列表
+    """
+    candidates = list(interfaces) if interfaces is not None else list_interfaces()
+    wanted = list(names) if names is not None else list(NETWORK_INTERFACES)
+    if wanted:
+        candidates = [i for i in candidates if i.name in wanted]
+    else:
+        candidates = [
+            i for i in candidates
+            if not i.is_loopback and not i.name.startswith(tuple(INTERFACE_EXCLUDE_PREFIXES))
+        ]
+    selected = []
+    segments = set()
+    for iface in candidates:
+        # 掩码未知时所有网卡的广播地址相同，只能按IP区分
+        segment = iface.ip if iface.netmask == UNKNOWN_NETMASK else iface.broadcast
+        if segment in segments:
+            continue
+        segments.add(segment)
+        selected.append(iface)
+    return selected
+
+
+@functools.lru_cache(maxsize=None)
 def get_local_ip() -> str:
     """
-    获取本机IP地址
+    获取本机IP地址（结果会被缓存，避免重复探测路由）
+    优先使用默认路由所在网卡，离线时使用第一个可用网卡
     
     Returns:
         str: 本机IP地址
@@ -25,7 +170,28 @@ def get_local_ip() -> str:
         s.close()
         return ip
     except Exception:
-        return '127.0.0.1'
+        interfaces = select_interfaces()
+        return interfaces[0].ip if interfaces else '127.0.0.1'
+
+
+def generate_node_id() -> str:
+    """
+    生成节点实例ID
+    
+    Returns:
+        str: 8位十六进制随机字符串
+    """
+    return secrets.token_hex(4)
+
+
+def generate_transfer_id() -> str:
+    """
+    生成文件传输ID
+    
+    Returns:
+        str: 16位十六进制随机字符串
+    """
+    return secrets.token_hex(8)
 
 
 def serialize_message(message_dict: dict) -> bytes:
@@ -38,8 +204,7 @@ def serialize_message(message_dict: dict) -> bytes:
     Returns:
         bytes: 序列化后的字节流
     """
-    json_str = json.dumps(message_dict, ensure_ascii=False)
-    return json_str.encode('utf-8')
+    return codec.encode(message_dict)
 
 
 def deserialize_message(data: bytes) -> Optional[dict]:
@@ -53,10 +218,9 @@ def deserialize_message(data: bytes) -> Optional[dict]:
         dict: 消息字典，失败返回None
     """
     try:
-        json_str = data.decode('utf-8')
-        return json.loads(json_str)
+        return codec.decode(data)
     except Exception as e:
-        print(f"反序列化消息失败: {e}")
+        logger.warning("反序列化消息失败: %s", e)
         return None
 
 
@@ -77,6 +241,46 @@ def format_file_size(size: int) -> str:
     return f"{size:.2f} TB"
 
 
+def format_duration(seconds: Optional[float]) -> str:
+    """
+    格式化剩余时间显示
+    
+    Args:
+        seconds: 秒数，None表示未知
+        
+    Returns:
+        str: 如 "45秒"、"3分05秒"、"1时02分"，未知时返回 "--"
+    """
+    if seconds is None:
+        return "--"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}秒"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}分{seconds:02d}秒"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}时{minutes:02d}分"
+
+
+def safe_filename(filename: str) -> Optional[str]:
+    """
+    把对方提供的文件名化简为不含目录的文件名，防止写到下载目录之外
+
+    Args:
+        filename: 对方提供的文件名，可能含有路径（如 "../../.bashrc"、"/etc/passwd"、"..\\x"）
+
+    Returns:
+        Optional[str]: 化简后的文件名；为空、"."、".."或仍是绝对路径时返回None
+    """
+    if not isinstance(filename, str) or '\0' in filename:
+        return None
+    name = os.path.basename(filename.replace('\\', '/')).strip()
+    if name in ('', '.', '..') or os.path.isabs(name):
+        return None
+    return name
+
+
 def validate_ip(ip: str) -> bool:
     """
     验证IP地址格式
@@ -1,12 +1,39 @@
 """
 核心功能模块包
+各模块在首次访问对应类时才导入，导入本包本身不会加载任何子模块
 """
 
-from .message_dispatcher import MessageDispatcher
-from .network_discovery import NetworkDiscovery
-from .message_p2p import MessageP2P
-from .message_broadcast import MessageBroadcast
-from .file_transfer import FileTransfer
-from .member_manager import MemberManager
-from .member_refresh import MemberRefresh
+import importlib
 
+# 导出名称 -> 所在子模块
+_EXPORTS = {
+    'MessageDispatcher': 'message_dispatcher',
+    'NetworkDiscovery': 'network_discovery',
+    'MessageP2P': 'message_p2p',
+    'MessageBroadcast': 'message_broadcast',
+    'FileTransfer': 'file_transfer',
+    'MemberManager': 'member_manager',
+    'MemberRefresh': 'member_refresh',
+    'ProgressReporter': 'progress',
+    'TransferTuner': 'tuning',
+    'SessionPool': 'session_pool',
+    'UdpBatcher': 'udp_batcher',
+    'FloodGuard': 'flood_guard',
+    'Outbox': 'outbox',
+    'SecureChannel': 'secure_channel',
+    'TlsChannel': 'tls_channel',
+    'TransferScheduler': 'transfer_manager',
+    'TransferTask': 'transfer_manager',
+    'ChatNode': 'node',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,212 @@
+"""
+内容寻址缓存模块
+功能：按内容哈希（分块清单的根哈希）索引已接收的文件，再次收到相同内容时
+在本地硬链接或复制，不再经网络传输；索引按最近使用顺序淘汰，条目数和总字节数都有上限。
+加入索引前和命中后各重新计算一次文件的根哈希，路径上的文件已不是该内容时不会被复用
+"""
+
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from ..common.config import *
+from ..common.logger import get_logger
+from .manifest import MANIFEST_VERSION, build_manifest
+
+logger = get_logger(__name__)
+
+
+def _file_key(path: str) -> Tuple[int, int]:
+    """文件的(大小, 修改时间)，用于判断文件内容是否可能已变化"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _verified_key(path: str, content_hash: str, block_size: int) -> Optional[Tuple[int, int]]:
+    """
+    重新计算文件的根哈希并与content_hash比对
+
+    Returns:
+        Optional[Tuple[int, int]]: 内容一致且计算期间文件没有变化时返回(大小, 修改时间)，否则为None
+    """
+    try:
+        before = _file_key(path)
+        root = build_manifest(path, block_size).root
+        after = _file_key(path)
+    except (OSError, ValueError):
+        return None
+    return before if root == content_hash and before == after else None
+
+
+class ContentStore:
+    """
+    内容寻址索引（线程安全）
+    content_hash -> 本地文件路径；索引只记录文件位置，淘汰条目不会删除文件
+    """
+
+    def __init__(self, index_path: Optional[str] = None,
+                 max_entries: int = CONTENT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = CONTENT_CACHE_MAX_BYTES):
+        """
+        初始化内容索引
+
+        Args:
+            index_path: 索引文件路径，为None时只保存在内存中
+            max_entries: 最多记录的文件数
+            max_bytes: 记录的文件总大小上限（字节）
+        """
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # content_hash -> {'path', 'size', 'mtime_ns', 'block_size'}，越靠后越是最近使用
+        self._entries: 'OrderedDict[str, dict]' = OrderedDict()
+        self._total_bytes = 0
+        self._load()
+
+    # ========== 索引 ==========
+
+    def lookup(self, content_hash: str, size: int) -> Optional[str]:
+        """
+        查找内容相同的本地文件，重新计算哈希确认内容未变；文件已被删除、修改或替换时移除该条目
+
+        Args:
+            content_hash: 内容哈希
+            size: 文件大小
+
+        Returns:
+            Optional[str]: 文件路径，没有时为None
+        """
+        with self._lock:
+            entry = self._entries.get(content_hash)
+        if entry is None:
+            return None
+        # 计算哈希较慢，不持有锁
+        valid = entry['size'] == size and _verified_key(
+            entry['path'], content_hash, entry['block_size']) == (size, entry['mtime_ns'])
+        with self._lock:
+            if not valid:
+                if self._entries.get(content_hash) is entry:
+                    self._remove(content_hash)
+                    self._save()
+                return None
+            if content_hash in self._entries:
+                self._entries.move_to_end(content_hash)
+        return entry['path']
+
+    def add(self, content_hash: str, path: str, block_size: int = MANIFEST_BLOCK_SIZE):
+        """
+        记录接收完成的文件，先重新计算哈希确认路径上的文件确实是该内容，
+        超出上限时淘汰最久未使用的条目
+
+        Args:
+            content_hash: 内容哈希
+            path: 文件路径
+            block_size: 计算content_hash时的块大小
+        """
+        if self.max_entries <= 0:
+            return
+        key = _verified_key(path, content_hash, block_size)
+        if key is None:
+            logger.warning("文件内容与哈希不符，不加入内容索引: %s", path)
+            return
+        size, mtime_ns = key
+        with self._lock:
+            self._remove(content_hash)
+            self._entries[content_hash] = {'path': os.path.abspath(path), 'size': size,
+                                           'mtime_ns': mtime_ns, 'block_size': block_size}
+            self._total_bytes += size
+            self._evict()
+            self._save()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def _remove(self, content_hash: str):
+        entry = self._entries.pop(content_hash, None)
+        if entry:
+            self._total_bytes -= entry['size']
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._total_bytes > self.max_bytes):
+            content_hash = next(iter(self._entries))
+            self._remove(content_hash)
+
+    # ========== 持久化 ==========
+
+    def _load(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('algorithm') != MANIFEST_VERSION:
+                # 内容哈希的算法已变化，旧索引无法再匹配
+                return
+            for content_hash, entry in data.get('entries', []):
+                self._entries[content_hash] = {
+                    'path': entry['path'], 'size': int(entry['size']), 'mtime_ns': int(entry['mtime_ns']),
+                    'block_size': int(entry.get('block_size', MANIFEST_BLOCK_SIZE))
+                }
+                self._total_bytes += int(entry['size'])
+            self._evict()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("读取内容索引失败，将重新建立: %s", e)
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _save(self):
+        """写入索引文件（调用方持有_lock），先写临时文件再替换，避免写到一半时损坏"""
+        if not self.index_path:
+            return
+        try:
+            folder = os.path.dirname(self.index_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            temp_path = self.index_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'algorithm': MANIFEST_VERSION, 'entries': list(self._entries.items())}, f)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logger.warning("保存内容索引失败: %s", e)
+
+
+def link_or_copy(source: str, target: str) -> str:
+    """
+    把已有文件放到目标路径：优先硬链接（瞬间完成、不占额外空间），
+    跨文件系统或不支持硬链接时复制
+
+    Args:
+        source: 已有文件路径
+        target: 目标路径
+
+    Returns:
+        str: 'same'、'link' 或 'copy'
+    """
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return 'same'
+    folder = os.path.dirname(target)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # 先放到临时名再替换，目标已存在（用户选择覆盖）时也不会失败
+    temp_path = target + '.part'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source, temp_path)
+        method = 'link'
+    except OSError:
+        shutil.copyfile(source, temp_path)
+        method = 'copy'
+    os.replace(temp_path, target)
+    return method
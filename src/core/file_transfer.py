@@ -4,47 +4,141 @@
 """
 
 import os
+import selectors
 import socket
+import ssl
 import threading
-from typing import Optional, Callable, Dict, Tuple
-from PyQt6.QtCore import QObject, pyqtSignal
+import time
+from typing import Optional, Dict, List
 
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
+from ..common.logger import get_logger
+from ..common.signals import Signal
+from .content_store import ContentStore, link_or_copy
+from .manifest import BlockVerifier, Manifest, ManifestCache
+from . import tls_channel
+from .progress import ProgressReporter
+from .secure_channel import SecureChannel, StreamCipher
+from .tls_channel import TlsChannel, is_tls_hello
+from .session_pool import SessionPool
+from .tuning import TransferTuner
+from .swarm import (
+    RECIPIENT_DONE, RECIPIENT_FAILED, SwarmDownloader, SwarmSeed, SwarmSession
+)
+from .transfer_manager import (
+    PRIORITY_NORMAL, TransferCancelled, TransferDirection, TransferScheduler, TransferTask
+)
 
+logger = get_logger(__name__)
 
-class FileTransfer(QObject):
+# 接收方记录的请求状态
+_OFFERED = 'offered'  # 等待用户处理
+_ACCEPTED = 'accepted'  # 已接受，等待发送方连接
+_CONNECTED = 'connected'  # 数据连接已建立
+_REJECTED = 'rejected'  # 已拒绝（保留到超时，以便回复重发的请求）
+_LOCAL = 'local'  # 已接受，本地已有相同内容，正在链接或复制
+_SWARMING = 'swarming'  # 已接受多人分发，正在从多个成员下载分块
+_SATISFIED = 'satisfied'  # 已得到完整文件（保留到超时，以便回复重发的请求和继续提供分块）
+
+_SWARM_POLL = 0.5  # 多人分发进行中，发送方检查接收者状态的间隔（秒）
+
+
+class FileTransfer:
     """
     文件传输类
     负责通过TCP协议可靠地传输文件
+
+    传输流程：
+    1. 发送方通过UDP发送FILE_REQUEST（含传输ID），未获回应时定期重发
+    2. 接收方用户随时接受或拒绝，回复FILE_ACCEPT/FILE_REJECT，期间不占用连接和线程
+    3. 发送方收到接受后任务进入发送队列，工作线程连接接收方TCP端口，
+       发送含传输ID的头部和文件数据；传输成功结束后双方都保留连接，
+       下一次向同一成员发送时直接在这个连接上发送头部（见session_pool模块）
+    4. 接收方按头部中的分块清单逐块校验，有块校验失败时请求发送方只重传这些块，
+       全部通过后回复1字节确认
+
+    与对方已协商会话密钥（见secure_channel模块）时，数据连接的明文头部只有传输ID和密钥标识，
+    真正的头部和文件数据都按块加密为AEAD记录，接收方的确认和重传请求也是反方向的加密记录；双方都启用TLS（见tls_channel模块）时，
+    数据连接改为TLS连接，头部和文件数据在TLS中按明文格式传输
+
+    请求中带有文件内容哈希，接收方接受时若本地已有相同内容的文件，
+    直接硬链接或复制过来并回复FILE_HAVE，不再建立数据连接
+
+    多人分发（distribute_file）的请求还带有分块信息和全部接收者，
+    接收方接受后从发送方和其他接收方下载分块（见swarm模块），完成后回复FILE_HAVE
     """
-    
+
     # 定义信号
-    file_request_received = pyqtSignal(FileTransferInfo)  # 收到文件传输请求
-    transfer_progress = pyqtSignal(str, int)  # 传输进度 (filename, percentage)
-    transfer_completed = pyqtSignal(str, bool)  # 传输完成 (filename, success)
-    
-    def __init__(self, local_member: Member):
+    file_request_received = Signal(FileTransferInfo)  # 收到文件传输请求
+    file_request_cancelled = Signal(str)  # 尚未处理的请求被对方撤回或已过期 (transfer_id)
+    transfer_progress = Signal(str, int)  # 传输进度 (filename, percentage)
+    transfer_stats = Signal(TransferProgress)  # 传输进度详情（已传字节、速率、预计剩余时间）
+    transfer_completed = Signal(str, bool)  # 传输完成 (filename, success)
+    transfer_updated = Signal(object)  # 传输任务状态变化 (TransferTask)
+    local_member_changed = Signal(Member)  # TCP端口确定后的本地成员信息
+
+    def __init__(self, local_member: Member, message_dispatcher,
+                 download_dir: str = DOWNLOAD_DIR, max_file_size: int = MAX_FILE_SIZE,
+                 secure: Optional[SecureChannel] = None, tls: bool = FILE_TLS_ENABLED):
         """
         初始化文件传输模块
-        
+
         Args:
             local_member: 本地用户信息
+            message_dispatcher: 消息分发器实例，用于收发传输请求
+            download_dir: 默认下载目录
+            max_file_size: 允许发送的最大文件大小（字节）
+            secure: 消息分发器的加密层，提供时加密文件数据
+            tls: 是否以TLS连接传输文件数据（需要安装cryptography，对方也启用时才生效）
         """
-        super().__init__()
         self.local_member = local_member
+        self.dispatcher = message_dispatcher
+        self.secure = secure
+        self.tls: Optional[TlsChannel] = None
+        if tls:
+            if tls_channel.available():
+                self.tls = TlsChannel(local_member.username)
+            else:
+                logger.warning("未安装cryptography，文件数据连接不使用TLS")
         self.tcp_socket: Optional[socket.socket] = None
         self.is_running = False
         self.listen_thread: Optional[threading.Thread] = None
 
-        # 记录等待用户确认的传输：key 为 (ip, filename)
-        self._pending: Dict[Tuple[str, str], dict] = {}
-        
-        # 确保下载目录存在
-        if not os.path.exists(DOWNLOAD_DIR):
-            os.makedirs(DOWNLOAD_DIR)
-    
+        self._lock = threading.Lock()
+        # 发送方：已发出、等待对方回应的请求，transfer_id -> 请求信息
+        self._outgoing: Dict[str, dict] = {}
+        # 接收方：收到的请求，transfer_id -> 请求信息
+        self._incoming: Dict[str, dict] = {}
+        # 本节点参与的多人分发（发送或接收），transfer_id -> 分块状态
+        self._swarms: Dict[str, SwarmSession] = {}
+        # 发送方：进行中的多人分发，transfer_id -> 各接收者状态
+        self._seeds: Dict[str, SwarmSeed] = {}
+        self._housekeeping_stop = threading.Event()
+        self._housekeeping_thread: Optional[threading.Thread] = None
+
+        # 下载目录在首次接收文件时才创建
+        self.download_dir = download_dir
+        self.max_file_size = max_file_size
+        # 发送过的文件的分块清单，文件未修改时重复发送不必重新计算
+        self.manifests = ManifestCache()
+        # 按对方的往返时间和历史速率调整块大小与socket缓冲区
+        self.tuner = TransferTuner()
+        # 发送方：传输结束后保留的数据连接，下次向同一成员发送时复用
+        self.pool = SessionPool()
+        # 接收方：传输结束后保留、等待下一个头部的数据连接，socket -> (地址, 保留时间)
+        self._parked: Dict[socket.socket, tuple] = {}
+        self._parked_new: List[tuple] = []
+        self._wakeup_r: Optional[socket.socket] = None
+        self._wakeup_w: Optional[socket.socket] = None
+        # 已接收文件的内容索引
+        self.content_store = ContentStore(os.path.join(download_dir, CONTENT_INDEX_FILE))
+
+        # 发送和接收都由调度器的有界工作线程池执行
+        self.scheduler = TransferScheduler()
+        self.scheduler.task_updated.connect(self.transfer_updated.emit)
+
     def start(self):
         """
         启动文件传输服务
@@ -55,129 +149,819 @@ class FileTransfer(QObject):
             self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.tcp_socket.bind(('', self.local_member.tcp_port))
+            # 端口为0时由系统分配，与TLS证书指纹一起写入本地成员信息中通告给其他成员
+            self.local_member = self.local_member.replace(
+                tcp_port=self.tcp_socket.getsockname()[1],
+                tls_fingerprint=self.tls.fingerprint if self.tls else '')
+            self.local_member_changed.emit(self.local_member)
             self.tcp_socket.listen(5)
+            # 接收方保留连接时唤醒监听线程，把连接加入监听
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
             self.is_running = True
             self.listen_thread = threading.Thread(target=self._listen_loop, daemon=True)
             self.listen_thread.start()
+            self._housekeeping_thread = threading.Thread(target=self._housekeeping_loop, daemon=True)
+            self._housekeeping_thread.start()
         except Exception as e:
-            print(f"启动文件传输服务失败: {e}")
-    
+            logger.error("启动文件传输服务失败: %s", e)
+
     def stop(self):
         """
         停止文件传输服务
         """
         self.is_running = False
+        self._housekeeping_stop.set()
+        self.scheduler.stop()
         if self.tcp_socket:
+            try:
+                # shutdown可以唤醒阻塞在accept中的监听线程，close不一定能
+                self.tcp_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             try:
                 self.tcp_socket.close()
             except Exception:
                 pass
+        if self._wakeup_w:
+            self._wake_listener()
         if self.listen_thread:
             self.listen_thread.join(timeout=2)
-    
-    def send_file(self, file_path: str, receiver: Member):
+        if self._housekeeping_thread:
+            self._housekeeping_thread.join(timeout=2)
+        self.pool.close()
+        with self._lock:
+            parked = list(self._parked) + [sock for sock, _ in self._parked_new]
+            self._parked.clear()
+            self._parked_new.clear()
+        for sock in parked:
+            sock.close()
+        for sock in (self._wakeup_r, self._wakeup_w):
+            if sock:
+                sock.close()
+
+    # ========== 发送方 ==========
+
+    def send_file(self, file_path: str, receiver: Member,
+                  priority: int = PRIORITY_NORMAL) -> TransferTask:
         """
-        发送文件给指定成员
-        
+        向指定成员发出文件传输请求，对方接受后加入发送队列
+
         Args:
             file_path: 要发送的文件路径
             receiver: 接收者信息
+            priority: 优先级
+
+        Returns:
+            TransferTask: 传输任务，可用其transfer_id取消
         """
-        # 在新线程中执行，避免阻塞UI
-        thread = threading.Thread(
-            target=self._send_file_thread,
-            args=(file_path, receiver)
+        filename = os.path.basename(file_path)
+        filesize = os.path.getsize(file_path) if os.path.isfile(file_path) else -1
+        task = TransferTask(
+            TransferDirection.SEND, filename, receiver, max(filesize, 0),
+            runner=lambda t: self._send_file(file_path, receiver, t),
+            priority=priority,
+            discard=self._discard_send
         )
-        thread.daemon = True
-        thread.start()
-    
-    def _send_file_thread(self, file_path: str, receiver: Member):
+        self.scheduler.submit(task, wait=True)
+        if task.finished:
+            return task
+
+        if filesize < 0:
+            logger.warning("文件不存在: %s", file_path)
+            self._fail(task)
+        elif filesize > self.max_file_size:
+            logger.warning("文件过大: %s", file_path)
+            self._fail(task)
+        else:
+            # 大文件计算哈希需要一段时间，不阻塞调用方（通常是界面线程）
+            threading.Thread(
+                target=self._offer_file,
+                args=(file_path, receiver, task),
+                daemon=True
+            ).start()
+        return task
+
+    def _offer_file(self, file_path: str, receiver: Member, task: TransferTask):
         """
-        发送文件的线程函数
-        
+        计算分块清单后发出请求，清单的根哈希作为内容哈希
+
         Args:
             file_path: 文件路径
             receiver: 接收者
+            task: 等待中的发送任务
         """
         try:
-            filename = os.path.basename(file_path)
-            if not os.path.exists(file_path):
-                print(f"文件不存在: {file_path}")
-                self.transfer_completed.emit(filename, False)
-                return
+            content_hash = self.manifests.get(file_path).root
+        except OSError as e:
+            logger.warning("读取文件失败: %s", e)
+            self._fail(task)
+            return
+        info = FileTransferInfo(
+            filename=task.filename,
+            filesize=task.total_bytes,
+            sender=self.local_member,
+            receiver=receiver,
+            transfer_id=task.transfer_id,
+            content_hash=content_hash
+        )
+        now = time.monotonic()
+        with self._lock:
+            self._outgoing[task.transfer_id] = {
+                'info': info,
+                'deadline': now + FILE_OFFER_TIMEOUT,
+                'next_retry': now + FILE_OFFER_RETRY_INTERVAL,
+            }
+        if task.finished:
+            # 计算哈希期间已被取消
+            with self._lock:
+                self._outgoing.pop(task.transfer_id, None)
+            return
+        self._send_offer(info)
+
+    def distribute_file(self, file_path: str, receivers: List[Member],
+                        priority: int = PRIORITY_NORMAL) -> TransferTask:
+        """
+        把文件同时分发给多个成员：文件切成带哈希的分块，接收方之间互相提供已有分块，
+        发送方只需上传大约几份文件的数据量；只有一个接收者时等同于send_file
+
+        Args:
+            file_path: 要发送的文件路径
+            receivers: 接收者列表
+            priority: 优先级
+
+        Returns:
+            TransferTask: 代表整个分发的发送任务
+        """
+        if len(receivers) == 1:
+            return self.send_file(file_path, receivers[0], priority)
+        filename = os.path.basename(file_path)
+        filesize = os.path.getsize(file_path) if os.path.isfile(file_path) else -1
+        swarm_id = generate_transfer_id()
+        # 发送方主要是等待各接收方完成（分块由监听线程提供），在独立线程中执行，
+        # 不占用普通发送的并发名额
+        task = TransferTask(
+            TransferDirection.SEND, filename, None, max(filesize, 0) * len(receivers),
+            runner=lambda t: self._seed_file(file_path, max(filesize, 0), list(receivers), t),
+            priority=priority,
+            transfer_id=swarm_id,
+            label=f"{len(receivers)}名成员",
+            dedicated=True
+        )
+        if self.secure and self.secure.required:
+            # 接收方之间互传分块的连接不加密
+            logger.warning("要求加密时不能多人分发文件: %s", file_path)
+            self.scheduler.submit(task, wait=True)
+            self._fail(task)
+            return task
+        if filesize < 0 or filesize > self.max_file_size or not receivers:
+            logger.warning("无法分发文件: %s", file_path)
+            self.scheduler.submit(task, wait=True)
+            self._fail(task)
+            return task
+        self.scheduler.submit(task)
+        return task
+
+    def _seed_file(self, file_path: str, filesize: int, receivers: List[Member],
+                   task: TransferTask) -> bool:
+        """
+        多人分发的发送方（在发送工作线程中执行）：计算分块哈希、发出请求，
+        然后向接收方提供分块，直到所有接收者完成、拒绝或超时
+
+        Args:
+            file_path: 文件路径
+            filesize: 文件大小
+            receivers: 接收者列表
+            task: 发送任务
+
+        Returns:
+            bool: 是否没有接收者失败且至少一人收到
+        """
+        filename = task.filename
+        try:
+            manifest = self.manifests.get(file_path)
+        except OSError as e:
+            logger.error("读取文件失败: %s", e)
+            self.transfer_completed.emit(filename, False)
+            return False
+        if manifest.filesize != filesize:
+            logger.warning("文件在发送前已被修改: %s", file_path)
+            self.transfer_completed.emit(filename, False)
+            return False
+
+        transfer_id = task.transfer_id
+        content_hash = manifest.root
+        session = SwarmSession(transfer_id, file_path, filesize, manifest.block_size, manifest)
+        seed = SwarmSeed(receivers)
+        swarm = {
+            'piece_size': manifest.block_size,
+            'peers': [member.to_dict() for member in receivers],
+        }
+        with self._lock:
+            self._swarms[transfer_id] = session
+            self._seeds[transfer_id] = seed
+
+        def _offer(member: Member):
+            info = FileTransferInfo(filename, filesize, self.local_member, member,
+                                    transfer_id, content_hash)
+            self._send_control(MessageType.FILE_REQUEST, member, transfer_id,
+                               file=info.to_dict(), swarm=swarm)
+
+        progress = self._progress_reporter(filename, task.total_bytes, task)
+        try:
+            for member in receivers:
+                _offer(member)
+            while not seed.done.wait(_SWARM_POLL):
+                task.checkpoint(0)
+                for member in seed.due():
+                    _offer(member)
+                progress.update(seed.count(RECIPIENT_DONE) * filesize - progress.bytes_done)
+            progress.update(seed.count(RECIPIENT_DONE) * filesize - progress.bytes_done)
+            progress.finish()
+            task.bytes_done = progress.bytes_done
+            done, failed = seed.count(RECIPIENT_DONE), seed.count(RECIPIENT_FAILED)
+            logger.info("分发完成: %s，%d/%d 个成员收到，本机上传 %s",
+                        filename, done, len(receivers), format_file_size(session.bytes_served))
+            success = done > 0 and failed == 0
+            self.transfer_completed.emit(filename, success)
+            return success
+        except TransferCancelled:
+            logger.info("已取消分发: %s", filename)
+        finally:
+            with self._lock:
+                self._seeds.pop(transfer_id, None)
+                self._swarms.pop(transfer_id, None)
+            # 通知接收方分发结束：已完成的停止提供分块，未完成的取消
+            for member in receivers:
+                self._send_control(MessageType.FILE_CANCEL, member, transfer_id)
+        self.transfer_completed.emit(filename, False)
+        return False
+
+    def _send_offer(self, info: FileTransferInfo):
+        self._send_control(MessageType.FILE_REQUEST, info.receiver, info.transfer_id,
+                           file=info.to_dict())
+
+    def _fail(self, task: TransferTask):
+        self.scheduler.fail(task.transfer_id)
+        self.transfer_completed.emit(task.filename, False)
 
+    def _discard_send(self, task: TransferTask):
+        """等待或排队中的发送被取消：撤回请求"""
+        with self._lock:
+            offer = self._outgoing.pop(task.transfer_id, None)
+        if offer:
+            self._send_control(MessageType.FILE_CANCEL, task.peer, task.transfer_id)
+        self.transfer_completed.emit(task.filename, False)
+
+    def _send_file(self, file_path: str, receiver: Member, task: TransferTask) -> bool:
+        """
+        发送文件（对方接受后在发送工作线程中执行）
+
+        Args:
+            file_path: 文件路径
+            receiver: 接收者
+            task: 传输任务
+
+        Returns:
+            bool: 是否发送成功
+        """
+        filename = os.path.basename(file_path)
+        try:
             filesize = os.path.getsize(file_path)
-            if filesize > MAX_FILE_SIZE:
-                print("文件过大")
+            if filesize != task.total_bytes:
+                logger.warning("文件在发送前已被修改: %s", file_path)
                 self.transfer_completed.emit(filename, False)
-                return
+                return False
+            # 发出请求时已计算过，这里直接取缓存
+            manifest = self.manifests.get(file_path)
 
-            # 连接对方
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(5)
-                s.connect((receiver.ip, receiver.tcp_port))
+            # 连接对方，优先复用上一次传输留下的连接；对方通告了证书指纹时使用TLS
+            pinned = receiver.tls_fingerprint if self.tls else ''
+            cipher = None
+            if not pinned:
+                cipher = self.secure.stream_to((receiver.ip, receiver.udp_port)) if self.secure else None
+                if cipher is None and self.secure and self.secure.required:
+                    raise ConnectionError("与对方没有会话密钥，不以明文发送文件")
 
+            addr = (receiver.ip, receiver.tcp_port)
+            s, connect_rtt = self.pool.acquire(addr)
+            reusable = False
+            try:
+                if pinned and not isinstance(s, ssl.SSLSocket):
+                    # 复用的连接已完成过握手；新连接有缓存的会话时恢复会话
+                    s = self.tls.wrap_client(s, addr, pinned)
                 info = FileTransferInfo(
                     filename=filename,
                     filesize=filesize,
                     sender=self.local_member,
-                    receiver=receiver
+                    receiver=receiver,
+                    transfer_id=task.transfer_id,
+                    content_hash=manifest.root
                 )
-                header = serialize_message(info.to_dict())
-                header_len = len(header).to_bytes(4, 'big')
-                s.sendall(header_len + header)
-
-                # 等待对方接受/拒绝
-                resp = s.recv(1)
-                if not resp or resp != b'1':
-                    print("对方拒绝接收文件")
-                    self.transfer_completed.emit(filename, False)
-                    return
+                header = serialize_message({**info.to_dict(), 'manifest': manifest.to_dict()})
+                if cipher:
+                    # 文件名和分块清单也加密，明文部分只有传输ID和密钥标识
+                    outer = serialize_message({'transfer_id': task.transfer_id, 'encryption': cipher.header()})
+                    s.sendall(len(outer).to_bytes(4, 'big') + outer + cipher.seal(header))
+                else:
+                    s.sendall(len(header).to_bytes(4, 'big') + header)
 
-                sent = 0
+                self._prepare_data_socket(s)
+                tuning = self.tuner.configure(s, receiver.ip, sending=True, rtt=connect_rtt)
+                task.tuning = tuning
+                progress = self._progress_reporter(filename, filesize, task)
+                progress.tuning = tuning
+                # 缓冲区不必大于文件本身，小文件不用分配和清零整个块大小上限
+                buffer_size = min(self.tuner.chunk_max, filesize)
+                if cipher:
+                    cipher.allocate(buffer_size)
+                else:
+                    view = memoryview(bytearray(buffer_size))
                 with open(file_path, 'rb') as f:
                     while True:
-                        chunk = f.read(FILE_CHUNK_SIZE)
-                        if not chunk:
+                        if cipher:
+                            # 直接读进加密缓冲区原地加密
+                            n = f.readinto(cipher.reserve(min(tuning.chunk_size, buffer_size)))
+                            if not n:
+                                break
+                            s.sendall(cipher.seal_reserved(n))
+                        else:
+                            n = f.readinto(view[:tuning.chunk_size])
+                            if not n:
+                                break
+                            s.sendall(view[:n])
+                        progress.update(n)
+                        task.checkpoint(n)
+                        if progress.bytes_per_sec:
+                            tuning.chunk_size = self.tuner.chunk_for(progress.bytes_per_sec)
+                    progress.finish()
+                    self.tuner.record(receiver.ip, progress.bytes_per_sec)
+
+                    # 等待接收方确认完整接收，期间按要求重传校验失败的块；
+                    # 加密时确认和重传请求也是反方向的加密记录，不能被篡改或伪造
+                    replies = cipher.reverse() if cipher else None
+                    while True:
+                        if replies:
+                            record = replies.recv(s)
+                            reply, request = (bytes(record[:1]), bytes(record[1:])) if record else (b'', b'')
+                        else:
+                            reply, request = s.recv(1), None
+                        if reply == b'1':
                             break
-                        s.sendall(chunk)
-                        sent += len(chunk)
-                        percent = int(sent * 100 / filesize) if filesize else 100
-                        self.transfer_progress.emit(filename, percent)
+                        if reply != b'R':
+                            logger.warning("对方未确认接收: %s", filename)
+                            self.transfer_completed.emit(filename, False)
+                            return False
+                        self._resend_blocks(s, f, manifest, task, cipher, request)
 
+                reusable = True
+                if pinned:
+                    self.tls.save_session(addr, pinned, s)
                 self.transfer_completed.emit(filename, True)
+                return True
+            finally:
+                # 只有完整结束的连接才能继续使用，其余情况下连接中可能还有未读完的数据
+                if reusable:
+                    self.pool.release(addr, s)
+                else:
+                    s.close()
+        except TransferCancelled:
+            logger.info("已取消发送: %s", filename)
+        except Exception as e:
+            logger.error("发送文件失败: %s", e)
+        self.transfer_completed.emit(filename, False)
+        return False
+
+    def _resend_blocks(self, sock: socket.socket, f, manifest: Manifest, task: TransferTask,
+                       cipher: Optional[StreamCipher] = None, request: Optional[bytes] = None):
+        """
+        重传接收方校验失败的块：请求为4字节块数加各4字节块号，依次回复各块数据
+
+        Args:
+            sock: 数据连接
+            f: 已打开的文件
+            manifest: 分块清单
+            task: 传输任务
+            cipher: 数据加密器，每块重传数据为一条记录
+            request: 已解密的请求（'R'之后的部分）；为None时从连接中读取明文请求
+        """
+        if request is None:
+            head = self._recv_exact(sock, 4)
+            count = int.from_bytes(head, 'big') if head else 0
+            indices = self._recv_exact(sock, 4 * count) if 0 < count <= manifest.block_count else None
+        else:
+            count = int.from_bytes(request[:4], 'big')
+            indices = request[4:] if 0 < count <= manifest.block_count and len(request) == 4 + 4 * count else None
+        if indices is None:
+            raise ConnectionError("重传请求不完整")
+        for pos in range(0, len(indices), 4):
+            index = int.from_bytes(indices[pos:pos + 4], 'big')
+            if index >= manifest.block_count:
+                raise ValueError(f"无效的块号: {index}")
+            offset, length = manifest.block_range(index)
+            logger.info("重传第 %d 块: %s", index, task.filename)
+            f.seek(offset)
+            data = f.read(length)
+            sock.sendall(cipher.seal(data) if cipher else data)
+            task.checkpoint(len(data))
+
+    # ========== 控制消息 ==========
+
+    def _send_control(self, msg_type: MessageType, peer: Member, transfer_id: str, **fields) -> bool:
+        """
+        通过UDP发送传输控制消息
+
+        Args:
+            msg_type: 消息类型
+            peer: 对方成员
+            transfer_id: 传输ID
+            **fields: 其他字段
+        """
+        message = {
+            'msg_type': msg_type.value,
+            'sender': self.local_member.to_dict(),
+            'transfer_id': transfer_id,
+            **fields
+        }
+        return self.dispatcher.send_message(message, peer.ip, peer.udp_port)
+
+    def handle_message(self, message: dict, addr: tuple):
+        """
+        处理文件传输控制消息（由MessageDispatcher分发过来）
+
+        Args:
+            message: 消息字典
+            addr: 发送者地址
+        """
+        try:
+            transfer_id = message.get('transfer_id')
+            if not transfer_id:
+                return
+            msg_type = message.get('msg_type')
+            if transfer_id in self._seeds and msg_type in (
+                    MessageType.FILE_ACCEPT.value, MessageType.FILE_REJECT.value,
+                    MessageType.FILE_HAVE.value):
+                self._on_swarm_reply(transfer_id, MessageType(msg_type), message)
+            elif msg_type == MessageType.FILE_REQUEST.value:
+                self._on_offer(message, transfer_id, addr)
+            elif msg_type == MessageType.FILE_ACCEPT.value:
+                self._on_accept(transfer_id)
+            elif msg_type == MessageType.FILE_REJECT.value:
+                self._on_reject(transfer_id)
+            elif msg_type == MessageType.FILE_CANCEL.value:
+                self._on_cancel(transfer_id)
+            elif msg_type == MessageType.FILE_HAVE.value:
+                self._on_have(transfer_id)
         except Exception as e:
-            print(f"发送文件失败: {e}")
-            self.transfer_completed.emit(os.path.basename(file_path), False)
-    
+            logger.warning("处理文件传输消息失败: %s", e)
+
+    def _on_offer(self, message: dict, transfer_id: str, addr: tuple):
+        file_info = FileTransferInfo.from_dict(message['file'])
+        file_info.transfer_id = transfer_id
+        # 以实际来源地址为准
+        file_info.sender = file_info.sender.replace(ip=addr[0])
+        # 文件名由对方提供，只保留最后一段，不能含有路径
+        filename = safe_filename(file_info.filename)
+        if filename is None:
+            logger.warning("拒绝文件名无效的传输请求: %r (%s)", file_info.filename, addr[0])
+            self._send_control(MessageType.FILE_REJECT, file_info.sender, transfer_id)
+            return
+        file_info.filename = filename
+        if message.get('swarm') and self.secure and self.secure.required:
+            logger.warning("要求加密，拒绝多人分发的传输请求: %s (%s)", filename, addr[0])
+            self._send_control(MessageType.FILE_REJECT, file_info.sender, transfer_id)
+            return
+        with self._lock:
+            entry = self._incoming.get(transfer_id)
+            if entry is None:
+                self._incoming[transfer_id] = {
+                    'info': file_info,
+                    'state': _OFFERED,
+                    'deadline': time.monotonic() + FILE_OFFER_TIMEOUT,
+                    'save_path': None,
+                    'socket': None,
+                    'swarm': message.get('swarm'),
+                }
+            state = entry['state'] if entry else None
+        if state is None:
+            # 询问用户，不阻塞等待
+            self.file_request_received.emit(file_info)
+        elif state in (_ACCEPTED, _CONNECTED, _SWARMING):
+            # 重复的请求说明对方没有收到回复
+            self._send_control(MessageType.FILE_ACCEPT, file_info.sender, transfer_id)
+        elif state == _REJECTED:
+            self._send_control(MessageType.FILE_REJECT, file_info.sender, transfer_id)
+        elif state == _SATISFIED:
+            self._send_control(MessageType.FILE_HAVE, file_info.sender, transfer_id)
+
+    def _on_accept(self, transfer_id: str):
+        with self._lock:
+            offer = self._outgoing.pop(transfer_id, None)
+        if offer:
+            self.scheduler.release(transfer_id)
+
+    def _on_reject(self, transfer_id: str):
+        with self._lock:
+            offer = self._outgoing.pop(transfer_id, None)
+        if offer:
+            logger.info("对方拒绝接收文件: %s", offer['info'].filename)
+            task = self.scheduler.get(transfer_id)
+            if task:
+                self._fail(task)
+
+    def _on_swarm_reply(self, transfer_id: str, msg_type: MessageType, message: dict):
+        with self._lock:
+            seed = self._seeds.get(transfer_id)
+        if seed:
+            member = Member.from_dict(message['sender'])
+            state = seed.on_reply(member, msg_type)
+            if state:
+                logger.debug("分发 %s: %s -> %s", transfer_id, member.username, state)
+
+    def _on_have(self, transfer_id: str):
+        with self._lock:
+            offer = self._outgoing.pop(transfer_id, None)
+        if offer and self.scheduler.complete(transfer_id):
+            logger.info("对方已有相同内容，无需传输: %s", offer['info'].filename)
+            self.transfer_completed.emit(offer['info'].filename, True)
+
+    def _on_cancel(self, transfer_id: str):
+        with self._lock:
+            entry = self._incoming.get(transfer_id)
+            state = entry['state'] if entry else None
+            if state in (_OFFERED, _REJECTED, _SATISFIED):
+                del self._incoming[transfer_id]
+                self._swarms.pop(transfer_id, None)
+        if state == _OFFERED:
+            self.file_request_cancelled.emit(transfer_id)
+        elif state in (_ACCEPTED, _CONNECTED, _LOCAL, _SWARMING):
+            self.scheduler.cancel(transfer_id)
+
+    # ========== 接收方 ==========
+
+    def accept_file(self, file_info: FileTransferInfo, save_path: Optional[str] = None) -> bool:
+        """
+        接受文件传输
+
+        Args:
+            file_info: 文件传输信息
+            save_path: 保存路径（含文件名），可选
+
+        Returns:
+            bool: 请求是否仍然有效
+        """
+        transfer_id = file_info.transfer_id
+        local_copy = None
+        if file_info.content_hash:
+            local_copy = self.content_store.lookup(file_info.content_hash, file_info.filesize)
+        with self._lock:
+            entry = self._incoming.get(transfer_id)
+            if entry is None or entry['state'] != _OFFERED:
+                return False
+            info = entry['info']
+            swarm = entry['swarm']
+            entry['state'] = _LOCAL if local_copy else (_SWARMING if swarm else _ACCEPTED)
+            entry['deadline'] = time.monotonic() + FILE_OFFER_TIMEOUT
+            entry['save_path'] = save_path or self._prepare_save_path(info.filename)
+
+        if local_copy:
+            self.scheduler.submit(TransferTask(
+                TransferDirection.RECEIVE, info.filename, info.sender, info.filesize,
+                runner=lambda t: self._receive_local(transfer_id, local_copy, t),
+                discard=self._discard_receive,
+                transfer_id=transfer_id
+            ))
+            return True
+        if swarm:
+            self.scheduler.submit(TransferTask(
+                TransferDirection.RECEIVE, info.filename, info.sender, info.filesize,
+                runner=lambda t: self._receive_swarm(transfer_id, t),
+                discard=self._discard_receive,
+                transfer_id=transfer_id
+            ))
+            self._send_control(MessageType.FILE_ACCEPT, info.sender, transfer_id)
+            return True
+
+        # 先登记接收任务再回复，保证对方连接时任务已存在
+        self.scheduler.submit(TransferTask(
+            TransferDirection.RECEIVE, info.filename, info.sender, info.filesize,
+            runner=lambda t: self._receive_file(transfer_id, t),
+            discard=self._discard_receive,
+            transfer_id=transfer_id
+        ), wait=True)
+        self._send_control(MessageType.FILE_ACCEPT, info.sender, transfer_id)
+        return True
+
+    def reject_file(self, file_info: FileTransferInfo):
+        """
+        拒绝文件传输
+
+        Args:
+            file_info: 文件传输信息
+        """
+        with self._lock:
+            entry = self._incoming.get(file_info.transfer_id)
+            if entry is None or entry['state'] != _OFFERED:
+                return
+            entry['state'] = _REJECTED
+            info = entry['info']
+        self._send_control(MessageType.FILE_REJECT, info.sender, info.transfer_id)
+
+    def _discard_receive(self, task: TransferTask):
+        """等待或排队中的接收被取消：关闭已建立的连接并通知发送方"""
+        with self._lock:
+            entry = self._incoming.pop(task.transfer_id, None)
+        if entry:
+            if entry['socket']:
+                entry['socket'].close()
+            self._send_control(MessageType.FILE_REJECT, entry['info'].sender, task.transfer_id)
+        self.transfer_completed.emit(task.filename, False)
+
+    def _receive_local(self, transfer_id: str, source: str, task: TransferTask) -> bool:
+        """
+        从本地已有的相同文件得到接收文件，并通知发送方无需传输
+
+        Args:
+            transfer_id: 传输ID
+            source: 本地已有文件路径
+            task: 传输任务
+
+        Returns:
+            bool: 是否成功
+        """
+        with self._lock:
+            entry = self._incoming.get(transfer_id)
+        if entry is None:
+            self.transfer_completed.emit(task.filename, False)
+            return False
+        file_info = entry['info']
+        try:
+            method = link_or_copy(source, entry['save_path'])
+        except OSError as e:
+            logger.error("从本地复制文件失败: %s", e)
+            with self._lock:
+                entry['state'] = _REJECTED
+            self._send_control(MessageType.FILE_REJECT, file_info.sender, transfer_id)
+            self.transfer_completed.emit(file_info.filename, False)
+            return False
+
+        logger.info("本地已有相同内容(%s)，无需传输: %s", method, file_info.filename)
+        task.bytes_done = file_info.filesize
+        progress = self._progress_reporter(file_info.filename, file_info.filesize, task)
+        progress.update(file_info.filesize)
+        progress.finish()
+        with self._lock:
+            entry['state'] = _SATISFIED
+            entry['deadline'] = time.monotonic() + FILE_OFFER_TIMEOUT
+        self._send_control(MessageType.FILE_HAVE, file_info.sender, transfer_id)
+        self.transfer_completed.emit(file_info.filename, True)
+        return True
+
+    def _receive_swarm(self, transfer_id: str, task: TransferTask) -> bool:
+        """
+        多人分发的接收方（在接收工作线程中执行）：从发送方和其他接收方下载分块，
+        同时向其他接收方提供已有分块
+
+        Args:
+            transfer_id: 传输ID
+            task: 传输任务
+
+        Returns:
+            bool: 是否接收完整
+        """
+        with self._lock:
+            entry = self._incoming.get(transfer_id)
+        if entry is None:
+            self.transfer_completed.emit(task.filename, False)
+            return False
+        file_info = entry['info']
+        swarm = entry['swarm']
+        save_path = entry['save_path']
+        success = False
+        try:
+            folder = os.path.dirname(save_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+            session = SwarmSession(transfer_id, save_path, file_info.filesize, int(swarm['piece_size']))
+            peers = [Member.from_dict(peer) for peer in swarm.get('peers', [])]
+            peers = [peer for peer in peers if not self._is_local(peer)]
+            with self._lock:
+                self._swarms[transfer_id] = session
+            progress = self._progress_reporter(file_info.filename, file_info.filesize, task)
+            downloader = SwarmDownloader(
+                session, file_info.sender, peers, task, file_info.content_hash,
+                on_piece=progress.update,
+                heartbeat=lambda: self._send_control(MessageType.FILE_ACCEPT, file_info.sender, transfer_id)
+            )
+            success = downloader.run()
+            progress.finish()
+        except TransferCancelled:
+            logger.info("已取消接收: %s", file_info.filename)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("接收文件失败: %s", e)
+
+        if success:
+            if file_info.content_hash:
+                self.content_store.add(file_info.content_hash, save_path)
+            with self._lock:
+                # 保留分块状态，继续向其他接收方提供，直到分发结束或超时
+                entry['state'] = _SATISFIED
+                entry['deadline'] = time.monotonic() + FILE_OFFER_TIMEOUT
+            self._send_control(MessageType.FILE_HAVE, file_info.sender, transfer_id)
+        else:
+            with self._lock:
+                self._incoming.pop(transfer_id, None)
+                self._swarms.pop(transfer_id, None)
+            self._send_control(MessageType.FILE_REJECT, file_info.sender, transfer_id)
+        self.transfer_completed.emit(file_info.filename, success)
+        return success
+
     def _listen_loop(self):
         """
-        监听TCP连接的循环
+        监听循环（在独立线程中运行）
+        接受新连接，同时监听保留下来的空闲连接，任一连接上到达头部时交给处理线程
         """
-        while self.is_running:
-            try:
-                client_socket, addr = self.tcp_socket.accept()
-                handler = threading.Thread(
-                    target=self._handle_client,
-                    args=(client_socket, addr),
-                    daemon=True
-                )
-                handler.start()
-            except Exception as e:
-                if self.is_running:
-                    print(f"接受连接出错: {e}")
-    
+        selector = selectors.DefaultSelector()
+        selector.register(self.tcp_socket, selectors.EVENT_READ)
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        try:
+            while self.is_running:
+                try:
+                    self._watch_parked(selector)
+                    for key, _ in selector.select(timeout=1.0):
+                        if key.fileobj is self._wakeup_r:
+                            self._wakeup_r.recv(BUFFER_SIZE)
+                            continue
+                        if key.fileobj is self.tcp_socket:
+                            client_socket, addr = self.tcp_socket.accept()
+                        else:
+                            # 保留的连接上到达了下一个传输的头部，或对方已关闭连接
+                            client_socket = key.fileobj
+                            selector.unregister(client_socket)
+                            with self._lock:
+                                addr = self._parked.pop(client_socket)[0]
+                        handler = threading.Thread(
+                            target=self._handle_client,
+                            args=(client_socket, addr),
+                            daemon=True
+                        )
+                        handler.start()
+                except Exception as e:
+                    if self.is_running:
+                        logger.error("接受连接出错: %s", e)
+        finally:
+            selector.close()
+
+    def _watch_parked(self, selector: selectors.BaseSelector):
+        """把新保留的连接加入监听，关闭空闲超时的连接（在监听线程中调用）"""
+        now = time.monotonic()
+        with self._lock:
+            for sock, addr in self._parked_new:
+                self._parked[sock] = (addr, now)
+                selector.register(sock, selectors.EVENT_READ)
+            self._parked_new.clear()
+            deadline = now - 2 * self.pool.idle_timeout
+            expired = [sock for sock, (_, parked_at) in self._parked.items() if parked_at <= deadline]
+            for sock in expired:
+                del self._parked[sock]
+                selector.unregister(sock)
+        for sock in expired:
+            sock.close()
+
+    def _park(self, sock: socket.socket, addr):
+        """
+        保留传输成功结束的连接，等待发送方在其上开始下一个传输
+
+        Args:
+            sock: 数据连接
+            addr: 对方地址
+        """
+        if not self.is_running or self.pool.max_idle <= 0:
+            sock.close()
+            return
+        with self._lock:
+            self._parked_new.append((sock, addr))
+        self._wake_listener()
+
+    def _wake_listener(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass
+
     def _handle_client(self, client_socket: socket.socket, addr):
         """
-        处理客户端连接（接收文件）
-        
+        处理数据连接：读取头部，与已接受的请求对应后交给接收队列
+
         Args:
             client_socket: 客户端socket
             addr: 客户端地址
         """
+        handed_off = False
         try:
-            key = None
-            client_socket.settimeout(5)
+            client_socket.settimeout(SOCKET_TIMEOUT)
+            if self.tls and is_tls_hello(client_socket):
+                # 发送方在新连接上发起了TLS握手（保留下来的TLS连接不必再握手）
+                client_socket = self.tls.wrap_server(client_socket)
             # 读取头长度
             head_len_bytes = self._recv_exact(client_socket, 4)
             if not head_len_bytes:
@@ -189,106 +973,337 @@ class FileTransfer(QObject):
             header_dict = deserialize_message(header_bytes)
             if not header_dict:
                 return
+            if 'swarm_id' in header_dict:
+                # 多人分发的分块请求，分块以明文传输
+                if self.secure and self.secure.required:
+                    logger.warning("要求加密，拒绝多人分发的分块连接 (%s)", addr[0])
+                    return
+                with self._lock:
+                    session = self._swarms.get(header_dict['swarm_id'])
+                if session:
+                    session.serve(client_socket)
+                return
+            cipher = None
+            encrypted = isinstance(client_socket, ssl.SSLSocket)
+            if 'encryption' in header_dict:
+                transfer_id = header_dict.get('transfer_id')
+                cipher = self._incoming_cipher(header_dict)
+                inner = cipher.recv(client_socket) if cipher else None
+                header_dict = deserialize_message(bytes(inner)) if inner is not None else None
+                if not isinstance(header_dict, dict) or header_dict.get('transfer_id') != transfer_id:
+                    logger.warning("无法解密传输连接的头部 (%s)", addr[0])
+                    return
+            elif self.secure and self.secure.required and not encrypted:
+                logger.warning("拒绝未加密的传输连接 (%s)", addr[0])
+                return
             file_info = FileTransferInfo.from_dict(header_dict)
+            transfer_id = file_info.transfer_id
+            manifest = Manifest.from_dict(header_dict['manifest']) if 'manifest' in header_dict else None
 
-            key = (addr[0], file_info.filename)
-            decision_event = threading.Event()
-            self._pending[key] = {
-                'event': decision_event,
-                'accepted': None,
-                'socket': client_socket,
-                'info': file_info,
-                'save_path': None,
-            }
+            with self._lock:
+                entry = self._incoming.get(transfer_id)
+                valid = (entry is not None and entry['state'] == _ACCEPTED
+                         and entry['info'].filesize == file_info.filesize)
+                if valid and entry['info'].content_hash:
+                    # 清单必须与请求中的内容哈希一致
+                    valid = manifest is not None and manifest.root == entry['info'].content_hash
+                if valid:
+                    entry['state'] = _CONNECTED
+                    entry['socket'] = client_socket
+                    entry['addr'] = addr
+                    entry['manifest'] = manifest
+                    entry['cipher'] = cipher
+            if not valid:
+                logger.warning("拒绝未经接受的传输连接: %s (%s)", transfer_id, addr[0])
+                return
+            handed_off = self.scheduler.release(transfer_id)
+        except Exception as e:
+            logger.error("接收文件失败: %s", e)
+        finally:
+            if not handed_off:
+                client_socket.close()
 
-            # 询问用户
-            self.file_request_received.emit(file_info)
+    def _incoming_cipher(self, header: dict) -> Optional[StreamCipher]:
+        """
+        按加密连接明文头部中的传输ID和密钥标识创建解密器，密钥必须属于该传输的发送方
 
-            # 等待用户选择，超时拒绝
-            decision_event.wait(timeout=30)
-            accepted = self._pending.get(key, {}).get('accepted')
-            if not accepted:
-                client_socket.sendall(b'0')
-                return
+        Args:
+            header: 明文头部
 
-            client_socket.sendall(b'1')
+        Returns:
+            Optional[StreamCipher]: 不是已接受的传输或找不到对应的会话密钥时返回None
+        """
+        if not self.secure:
+            return None
+        with self._lock:
+            entry = self._incoming.get(header.get('transfer_id'))
+            sender = entry['info'].sender if entry else None
+        if sender is None:
+            return None
+        return self.secure.stream_from(sender.node_id, header['encryption'])
+
+    def _receive_file(self, transfer_id: str, task: TransferTask) -> bool:
+        """
+        接收文件数据（在接收工作线程中执行）
 
-            chosen = self._pending.get(key, {}).get('save_path')
-            save_path = chosen if chosen else self._prepare_save_path(file_info.filename)
-            if save_path:
-                folder = os.path.dirname(save_path)
-                if folder and not os.path.exists(folder):
-                    os.makedirs(folder, exist_ok=True)
-            received = 0
+        Args:
+            transfer_id: 传输ID
+            task: 传输任务
+
+        Returns:
+            bool: 是否接收完整
+        """
+        with self._lock:
+            entry = self._incoming.get(transfer_id)
+        if entry is None or entry['socket'] is None:
+            self.transfer_completed.emit(task.filename, False)
+            return False
+        client_socket = entry['socket']
+        file_info = entry['info']
+        save_path = entry['save_path']
+        reusable = False
+        try:
+            folder = os.path.dirname(save_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder, exist_ok=True)
+            self._prepare_data_socket(client_socket)
+            peer_ip = file_info.sender.ip
+            tuning = self.tuner.configure(client_socket, peer_ip, sending=False)
+            task.tuning = tuning
+            progress = self._progress_reporter(file_info.filename, file_info.filesize, task)
+            progress.tuning = tuning
+            manifest = entry.get('manifest')
+            verifier = BlockVerifier(manifest) if manifest else None
+            cipher = entry.get('cipher')
+            replies = cipher.reverse() if cipher else None
+            buffer_size = min(self.tuner.chunk_max, file_info.filesize)
+            if cipher:
+                cipher.allocate(buffer_size)
+            else:
+                view = memoryview(bytearray(buffer_size))
             with open(save_path, 'wb') as f:
-                while received < file_info.filesize:
-                    chunk = client_socket.recv(FILE_CHUNK_SIZE)
-                    if not chunk:
-                        break
+                while progress.bytes_done < file_info.filesize:
+                    if cipher:
+                        # 每条记录是发送方的一块，大小由发送方决定
+                        chunk = cipher.recv(client_socket)
+                        if chunk is None:
+                            break
+                        n = len(chunk)
+                        if n > file_info.filesize - progress.bytes_done:
+                            raise ValueError("收到的数据超出文件大小")
+                    else:
+                        wanted = min(tuning.chunk_size, file_info.filesize - progress.bytes_done)
+                        n = client_socket.recv_into(view[:wanted])
+                        if not n:
+                            break
+                        chunk = view[:n]
                     f.write(chunk)
-                    received += len(chunk)
-                    percent = int(received * 100 / file_info.filesize) if file_info.filesize else 100
-                    self.transfer_progress.emit(file_info.filename, percent)
+                    if verifier:
+                        verifier.update(chunk)
+                    progress.update(n)
+                    task.checkpoint(n)
+                    if progress.bytes_per_sec:
+                        tuning.chunk_size = self.tuner.chunk_for(progress.bytes_per_sec)
+                progress.finish()
+                self.tuner.record(peer_ip, progress.bytes_per_sec)
 
-            success = received == file_info.filesize
+                success = progress.bytes_done == file_info.filesize
+                if success and verifier:
+                    success = self._repair_blocks(client_socket, f, manifest, verifier.finish() or [],
+                                                  file_info, cipher, replies)
+            if success:
+                if manifest:
+                    self.content_store.add(manifest.root, save_path, manifest.block_size)
+                client_socket.sendall(replies.seal(b'1') if replies else b'1')
+                reusable = True
             self.transfer_completed.emit(file_info.filename, success)
+            return success
+        except TransferCancelled:
+            logger.info("已取消接收: %s", file_info.filename)
         except Exception as e:
-            print(f"接收文件失败: {e}")
+            logger.error("接收文件失败: %s", e)
         finally:
-            if key and key in self._pending:
-                self._pending.pop(key, None)
-            client_socket.close()
-    
-    def accept_file(self, file_info: FileTransferInfo, save_path: Optional[str] = None):
+            if reusable:
+                self._park(client_socket, entry.get('addr'))
+            else:
+                client_socket.close()
+            with self._lock:
+                self._incoming.pop(transfer_id, None)
+        self.transfer_completed.emit(file_info.filename, False)
+        return False
+
+    def _repair_blocks(self, sock: socket.socket, f, manifest: Manifest,
+                       bad_blocks: list, file_info: FileTransferInfo,
+                       cipher: Optional[StreamCipher] = None,
+                       replies: Optional[StreamCipher] = None) -> bool:
         """
-        接受文件传输
-        
+        请求发送方重传校验失败的块并写回原位置，最多重试MANIFEST_MAX_REPAIRS轮
+
         Args:
+            sock: 数据连接
+            f: 正在写入的文件
+            manifest: 分块清单
+            bad_blocks: 校验失败的块号
             file_info: 文件传输信息
-            save_path: 保存路径（含文件名），可选
+            cipher: 数据解密器，每块重传数据为一条记录
+            replies: 反方向的加密器，重传请求作为一条记录发出
+
+        Returns:
+            bool: 是否所有块都已通过校验
         """
-        key = (file_info.sender.ip, file_info.filename)
-        pending = self._pending.get(key)
-        if pending:
-            pending['accepted'] = True
-            if save_path:
-                pending['save_path'] = save_path
-            pending['event'].set()
-    
-    def reject_file(self, file_info: FileTransferInfo):
+        for _ in range(MANIFEST_MAX_REPAIRS):
+            if not bad_blocks:
+                return True
+            logger.warning("%d 个块校验失败，请求重传: %s", len(bad_blocks), file_info.filename)
+            request = b''.join(index.to_bytes(4, 'big') for index in bad_blocks)
+            request = b'R' + len(bad_blocks).to_bytes(4, 'big') + request
+            sock.sendall(replies.seal(request) if replies else request)
+            still_bad = []
+            for index in bad_blocks:
+                offset, length = manifest.block_range(index)
+                data = cipher.recv(sock) if cipher else self._recv_exact(sock, length)
+                if data is None:
+                    return False
+                if manifest.verify(index, data):
+                    f.seek(offset)
+                    f.write(data)
+                else:
+                    still_bad.append(index)
+            bad_blocks = still_bad
+        if bad_blocks:
+            logger.warning("文件内容校验失败: %s", file_info.filename)
+        return not bad_blocks
+
+    # ========== 超时与重发 ==========
+
+    def _housekeeping_loop(self):
+        while not self._housekeeping_stop.wait(FILE_OFFER_RETRY_INTERVAL):
+            self._housekeeping()
+
+    def _housekeeping(self):
         """
-        拒绝文件传输
-        
+        重发未获回应的请求，清理超时的请求，关闭空闲过久的连接
+        """
+        self.pool.evict_idle()
+        now = time.monotonic()
+        resend, expired_offers, expired_entries = [], [], []
+        with self._lock:
+            for transfer_id, offer in list(self._outgoing.items()):
+                if now >= offer['deadline']:
+                    expired_offers.append(self._outgoing.pop(transfer_id))
+                elif now >= offer['next_retry']:
+                    offer['next_retry'] = now + FILE_OFFER_RETRY_INTERVAL
+                    resend.append(offer)
+            for transfer_id, entry in list(self._incoming.items()):
+                if entry['state'] not in (_CONNECTED, _LOCAL, _SWARMING) and now >= entry['deadline']:
+                    expired_entries.append(self._incoming.pop(transfer_id))
+                    self._swarms.pop(transfer_id, None)
+
+        for offer in resend:
+            self._send_offer(offer['info'])
+        for offer in expired_offers:
+            logger.info("文件传输请求超时: %s", offer['info'].filename)
+            task = self.scheduler.get(offer['info'].transfer_id)
+            if task:
+                self._fail(task)
+        for entry in expired_entries:
+            transfer_id = entry['info'].transfer_id
+            if entry['state'] == _OFFERED:
+                self.file_request_cancelled.emit(transfer_id)
+            elif entry['state'] == _ACCEPTED:
+                logger.info("等待对方连接超时: %s", entry['info'].filename)
+                task = self.scheduler.get(transfer_id)
+                if task:
+                    self._fail(task)
+
+    # ========== 传输控制 ==========
+
+    def pause_transfer(self, transfer_id: str) -> bool:
+        """暂停传输"""
+        return self.scheduler.pause(transfer_id)
+
+    def resume_transfer(self, transfer_id: str) -> bool:
+        """继续传输"""
+        return self.scheduler.resume(transfer_id)
+
+    def cancel_transfer(self, transfer_id: str) -> bool:
+        """取消传输"""
+        return self.scheduler.cancel(transfer_id)
+
+    # ========== 工具方法 ==========
+
+    def _is_local(self, member: Member) -> bool:
+        """是否本节点"""
+        if member.node_id and self.local_member.node_id:
+            return member.node_id == self.local_member.node_id
+        return member == self.local_member
+
+    @staticmethod
+    def _prepare_data_socket(sock: socket.socket):
+        """
+        数据阶段的连接设置：暂停可能使连接长时间空闲，超时放宽到FILE_STALL_TIMEOUT，
+        卡住的传输（如对方迟迟不读取或不确认）在该时间后失败而不是一直占用工作线程；
+        同时开启TCP keepalive发现对方失联
+        """
+        sock.settimeout(FILE_STALL_TIMEOUT or None)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    def _progress_reporter(self, filename: str, total_bytes: int,
+                           task: TransferTask) -> ProgressReporter:
+        """
+        创建限流的进度上报器，同时发射简单进度和详细进度两个信号
+
         Args:
-            file_info: 文件传输信息
+            filename: 文件名
+            total_bytes: 文件总字节数
+            task: 传输任务
+
+        Returns:
+            ProgressReporter: 进度上报器
         """
-        key = (file_info.sender.ip, file_info.filename)
-        pending = self._pending.get(key)
-        if pending:
-            pending['accepted'] = False
-            pending['event'].set()
+        def _emit(stats: TransferProgress):
+            task.bytes_per_sec = stats.bytes_per_sec
+            self.transfer_progress.emit(stats.filename, stats.percent)
+            self.transfer_stats.emit(stats)
+        return ProgressReporter(filename, total_bytes, _emit, transfer_id=task.transfer_id)
 
     def _recv_exact(self, sock: socket.socket, size: int) -> Optional[bytes]:
-        data = b''
+        data = bytearray()
         try:
             while len(data) < size:
                 chunk = sock.recv(size - len(data))
                 if not chunk:
                     return None
                 data += chunk
-            return data
+            return bytes(data)
         except Exception:
             return None
 
     def _prepare_save_path(self, filename: str) -> str:
-        base = os.path.join(DOWNLOAD_DIR, filename)
-        if not os.path.exists(base):
+        """
+        下载目录中不与已有文件重名的保存路径（调用方持有_lock）
+        已接受、尚未写完的传输占用的路径也视为已存在，同时接受多个同名文件时不会互相覆盖
+
+        Args:
+            filename: 文件名，其中的路径部分被去掉
+
+        Returns:
+            str: 保存路径，总在下载目录之内
+
+        Raises:
+            ValueError: 文件名无效
+        """
+        filename = safe_filename(filename)
+        if filename is None:
+            raise ValueError("文件名无效")
+        reserved = {entry['save_path'] for entry in self._incoming.values() if entry['save_path']}
+        base = os.path.join(self.download_dir, filename)
+        if not os.path.exists(base) and base not in reserved:
             return base
         name, ext = os.path.splitext(filename)
         idx = 1
         while True:
-            candidate = os.path.join(DOWNLOAD_DIR, f"{name}_{idx}{ext}")
-            if not os.path.exists(candidate):
+            candidate = os.path.join(self.download_dir, f"{name}_{idx}{ext}")
+            if not os.path.exists(candidate) and candidate not in reserved:
                 return candidate
             idx += 1
-
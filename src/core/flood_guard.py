@@ -0,0 +1,116 @@
+"""
+防洪泛模块
+功能：在JSON解析之前按来源地址和消息类型限速，丢弃帧头（魔数、版本、长度）不对的数据报，
+某个节点（或伪造的来源）向发现端口狂发广播、刷新请求时，
+多余的数据报不再被解析、分发和显示，也不会触发成倍的单播回复
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..common.config import *
+from ..common.logger import get_logger
+from ..common.packet import Frame, split_frames
+from ..common.rate_limit import TokenBucket
+
+logger = get_logger(__name__)
+
+# 丢弃原因
+DROP_MALFORMED = 'malformed'  # 帧头不对
+DROP_SOURCE = 'source'  # 超出来源地址的总速率
+DROP_TYPE = 'type'  # 超出来源地址该类消息的速率
+
+
+class FloodGuard:
+    """
+    按来源地址限速的预过滤器（只在监听线程中调用，非线程安全）
+    每个来源地址(IP, 端口)一个总令牌桶，RATE_LIMIT_TYPES中的消息类型另有各自的令牌桶；
+    记录的来源地址数有上限，超出时淘汰最久未出现的
+    """
+
+    def __init__(self, source_rate: float = RATE_LIMIT_SOURCE_RATE,
+                 source_burst: float = RATE_LIMIT_SOURCE_BURST,
+                 type_limits: Dict[str, Tuple[float, float]] = RATE_LIMIT_TYPES,
+                 max_sources: int = RATE_LIMIT_MAX_SOURCES,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化预过滤器
+
+        Args:
+            source_rate: 每个来源地址每秒允许的数据报数，不大于0表示不限速
+            source_burst: 每个来源地址的突发上限
+            type_limits: 消息类型 -> (每秒条数, 突发上限)
+            max_sources: 最多记录的来源地址数
+            clock: 时钟函数，便于测试替换
+        """
+        self.source_rate = source_rate
+        self.source_burst = source_burst
+        self.type_limits = dict(type_limits)
+        self.max_sources = max_sources
+        self.clock = clock
+        # (IP, 端口) -> (总令牌桶, {消息类型: 令牌桶})
+        self._sources: 'OrderedDict[tuple, Tuple[TokenBucket, Dict[str, TokenBucket]]]' = OrderedDict()
+        self.accepted = 0
+        self.dropped = {DROP_MALFORMED: 0, DROP_SOURCE: 0, DROP_TYPE: 0}
+        self._last_warning = float('-inf')
+
+    def admit(self, data: bytes, addr: tuple) -> Optional[List[Frame]]:
+        """
+        判断是否处理一个数据报
+
+        Args:
+            data: 数据报内容
+            addr: 来源地址
+
+        Returns:
+            Optional[List[Frame]]: 数据报中的帧，None表示丢弃
+        """
+        frames = split_frames(data)
+        if frames is None:
+            return self._drop(DROP_MALFORMED, addr)
+
+        buckets = self._sources.get(addr)
+        if buckets is None:
+            buckets = self._sources[addr] = (TokenBucket(self.source_rate, self.source_burst, self.clock), {})
+            if len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        else:
+            self._sources.move_to_end(addr)
+        source, per_type = buckets
+        if not source.try_consume():
+            return self._drop(DROP_SOURCE, addr)
+
+        if self.type_limits:
+            for frame in frames:
+                if frame.msg_type is None:
+                    continue
+                msg_type = frame.msg_type.value
+                limit = self.type_limits.get(msg_type)
+                if limit is None:
+                    continue
+                bucket = per_type.get(msg_type)
+                if bucket is None:
+                    bucket = per_type[msg_type] = TokenBucket(limit[0], limit[1], self.clock)
+                if not bucket.try_consume():
+                    return self._drop(DROP_TYPE, addr)
+
+        self.accepted += 1
+        return frames
+
+    def _drop(self, reason: str, addr: tuple) -> None:
+        self.dropped[reason] += 1
+        now = self.clock()
+        if now - self._last_warning >= RATE_LIMIT_WARNING_INTERVAL:
+            self._last_warning = now
+            logger.warning("来自 %s:%d 的数据报过多或格式错误，正在丢弃（%s）", addr[0], addr[1], reason)
+        return None
+
+    def stats(self) -> dict:
+        """
+        统计
+
+        Returns:
+            dict: accepted、dropped（按原因）、sources（当前记录的来源地址数）
+        """
+        return {'accepted': self.accepted, 'dropped': dict(self.dropped), 'sources': len(self._sources)}
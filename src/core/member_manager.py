@@ -3,37 +3,56 @@
 功能：管理聊天组成员列表，处理成员的加入、离开和更新
 """
 
-from typing import List, Optional
-from PyQt6.QtCore import QObject, pyqtSignal
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
+from ..common.logger import get_logger
+from ..common.signals import Signal
+from .outbox import peer_key
 
+logger = get_logger(__name__)
 
-class MemberManager(QObject):
+
+class MemberManager:
     """
     组员管理类
     负责维护和管理聊天组的成员列表
     """
     
     # 定义信号
-    member_added = pyqtSignal(Member)  # 成员加入信号
-    member_removed = pyqtSignal(Member)  # 成员离开信号
-    member_list_updated = pyqtSignal(list)  # 成员列表更新信号
+    member_added = Signal(Member)  # 成员加入信号
+    member_removed = Signal(Member)  # 成员离开信号
+    member_list_updated = Signal(list)  # 成员列表更新信号
     
-    def __init__(self, local_member: Member, message_dispatcher):
+    def __init__(self, local_member: Member, message_dispatcher,
+                 clock: Callable[[], float] = time.monotonic):
         """
         初始化组员管理模块
         
         Args:
             local_member: 本地用户信息
             message_dispatcher: 消息分发器实例
+            clock: 时钟函数，便于测试替换
         """
-        super().__init__()
         self.local_member = local_member
         self.dispatcher = message_dispatcher
+        self.clock = clock
         self.members: List[Member] = []
+        # 成员 -> 最近一次收到其加入消息或发现响应的时间，用于识别没有发送离开消息就掉线的成员
+        self._last_seen: Dict[Member, float] = {}
+        # 节点ID -> 成员，用于解析紧凑格式消息中的发送者
+        self._by_id: Dict[str, Member] = {}
+        # 尚未解析的节点ID -> {'addr', 'callbacks', 'next_request', 'deadline'}
+        self._pending: Dict[str, dict] = {}
+        # 已离开的成员：(用户名, IP) -> 成员，可以给他们留离线消息
+        self._departed: 'OrderedDict[Tuple[str, str], Member]' = OrderedDict()
+        # 成员列表可能同时被网络线程和界面线程修改
+        self._lock = threading.Lock()
     
     def add_member(self, member: Member):
         """
@@ -44,11 +63,34 @@ class MemberManager(QObject):
         """
         if member == self.local_member:
             return
-        if member in self.members:
+        if member.node_id and member.node_id == self.local_member.node_id:
             return
-        self.members.append(member)
+        with self._lock:
+            now = self.clock()
+            if member in self.members:
+                existing = self.members[self.members.index(member)]
+                if not member.node_id or existing.node_id == member.node_id:
+                    self._last_seen[existing] = now
+                    return
+                # 对方在同一地址上重启，节点ID已变化
+                self.members.remove(existing)
+                self._by_id.pop(existing.node_id, None)
+            # 同一节点可能经由多个网段被发现，按节点ID去重
+            elif member.node_id and member.node_id in self._by_id:
+                self._last_seen[self._by_id[member.node_id]] = now
+                return
+            self.members.append(member)
+            self._last_seen[member] = now
+            if member.node_id:
+                self._by_id[member.node_id] = member
+            self._departed.pop(peer_key(member), None)
+            members = self.members.copy()
+            waiting = self._pending.pop(member.node_id, None)
         self.member_added.emit(member)
-        self.member_list_updated.emit(self.members.copy())
+        self.member_list_updated.emit(members)
+        if waiting:
+            for callback in waiting['callbacks']:
+                callback(member)
     
     def remove_member(self, member: Member):
         """
@@ -57,11 +99,41 @@ class MemberManager(QObject):
         Args:
             member: 要移除的成员
         """
-        if member in self.members:
+        with self._lock:
+            if member not in self.members:
+                return
             self.members.remove(member)
-            self.member_removed.emit(member)
-            self.member_list_updated.emit(self.members.copy())
+            self._last_seen.pop(member, None)
+            if self._by_id.get(member.node_id) == member:
+                del self._by_id[member.node_id]
+            key = peer_key(member)
+            self._departed.pop(key, None)
+            self._departed[key] = member
+            while len(self._departed) > OUTBOX_MAX_PEERS:
+                self._departed.popitem(last=False)
+            members = self.members.copy()
+        self.member_removed.emit(member)
+        self.member_list_updated.emit(members)
     
+    def expire_silent(self, timeout: float) -> List[Member]:
+        """
+        移除超过timeout没有任何回应（加入消息或发现响应）的成员，视为已离线。
+        对方睡眠或断网时不会发送离开消息，需要定期刷新并调用本方法
+
+        Args:
+            timeout: 最长沉默时间（秒）
+
+        Returns:
+            List[Member]: 被移除的成员
+        """
+        deadline = self.clock() - timeout
+        with self._lock:
+            silent = [member for member in self.members if self._last_seen.get(member, deadline) < deadline]
+        for member in silent:
+            logger.info("%s 长时间没有回应，视为已离线", member.username)
+            self.remove_member(member)
+        return silent
+
     def get_member_list(self) -> List[Member]:
         """
         获取当前成员列表
@@ -69,7 +141,33 @@ class MemberManager(QObject):
         Returns:
             List[Member]: 成员列表
         """
-        return self.members.copy()
+        with self._lock:
+            return self.members.copy()
+    
+    def get_departed_members(self) -> List[Member]:
+        """
+        获取已离开、尚未重新出现的成员（最近离开的在后）
+        
+        Returns:
+            List[Member]: 成员列表
+        """
+        with self._lock:
+            return list(self._departed.values())
+    
+    def is_online(self, member: Member) -> bool:
+        """
+        成员是否在成员列表中（按节点ID或地址判断）
+        
+        Args:
+            member: 成员
+            
+        Returns:
+            bool: 是否在线
+        """
+        with self._lock:
+            if member.node_id and member.node_id in self._by_id:
+                return True
+            return member in self.members
     
     def get_member_by_ip(self, ip: str, port: int) -> Optional[Member]:
         """
@@ -82,11 +180,92 @@ class MemberManager(QObject):
         Returns:
             Optional[Member]: 找到的成员，未找到返回None
         """
-        for member in self.members:
+        for member in self.get_member_list():
             if member.ip == ip and member.udp_port == port:
                 return member
         return None
     
+    def get_member_by_id(self, node_id: str) -> Optional[Member]:
+        """
+        根据节点ID查找成员
+
+        Args:
+            node_id: 节点ID
+
+        Returns:
+            Optional[Member]: 找到的成员，未找到返回None
+        """
+        with self._lock:
+            return self._by_id.get(node_id)
+
+    def resolve(self, node_id: str, addr: tuple, callback: Callable[[Member], None]):
+        """
+        把节点ID解析为成员后调用callback：成员列表中有时立即调用，
+        没有时向来源地址发送发现请求，对方回复后再调用；
+        超过MEMBER_LOOKUP_TIMEOUT仍未得到回复的等待被丢弃
+
+        Args:
+            node_id: 节点ID
+            addr: 消息的来源地址
+            callback: 参数为解析出的成员
+        """
+        now = self.clock()
+        with self._lock:
+            member = self._by_id.get(node_id)
+            if member is None:
+                for expired_id in [k for k, v in self._pending.items() if now >= v['deadline']]:
+                    dropped = self._pending.pop(expired_id)
+                    logger.warning("无法识别发送者 %s，丢弃 %d 条消息", expired_id, len(dropped['callbacks']))
+                waiting = self._pending.setdefault(node_id, {
+                    'addr': addr, 'callbacks': [], 'next_request': now,
+                    'deadline': now + MEMBER_LOOKUP_TIMEOUT
+                })
+                if len(waiting['callbacks']) < MEMBER_LOOKUP_MAX_PENDING:
+                    waiting['callbacks'].append(callback)
+                request = now >= waiting['next_request']
+                if request:
+                    waiting['next_request'] = now + MEMBER_LOOKUP_RETRY
+        if member is not None:
+            callback(member)
+        elif request:
+            self._request_member(addr)
+
+    def resolve_message(self, message: dict, addr: tuple, callback: Callable[[ChatMessage], None]):
+        """
+        还原收到的聊天消息后调用callback，同时支持完整格式和紧凑格式（to_compact_dict）
+
+        Args:
+            message: 消息字典
+            addr: 消息的来源地址
+            callback: 参数为还原出的ChatMessage
+        """
+        if 'sender_id' not in message:
+            callback(ChatMessage.from_dict(message))
+            return
+        msg_type = MessageType(message['msg_type'])
+        content = message['content']
+        receiver_id = message.get('receiver_id')
+        if receiver_id is None:
+            receiver = None
+        elif receiver_id == self.local_member.node_id:
+            receiver = self.local_member
+        else:
+            receiver = self.get_member_by_id(receiver_id)
+        self.resolve(message['sender_id'], addr,
+                     lambda sender: callback(ChatMessage(msg_type, sender, content, receiver)))
+
+    def _request_member(self, addr: tuple):
+        """向指定地址单播发现请求，对方回复的发现响应带有完整成员信息"""
+        try:
+            message = ChatMessage(
+                msg_type=MessageType.DISCOVERY,
+                sender=self.local_member,
+                content=DISCOVERY_KEYWORD
+            )
+            self.dispatcher.send_message(message.to_dict(), addr[0], addr[1])
+        except Exception as e:
+            logger.warning("查询成员信息失败: %s", e)
+
     def broadcast_join(self):
         """
         广播加入消息
@@ -100,7 +279,7 @@ class MemberManager(QObject):
             )
             self.dispatcher.broadcast_udp(message.to_dict())
         except Exception as e:
-            print(f"广播加入消息失败: {e}")
+            logger.error("广播加入消息失败: %s", e)
     
     def broadcast_leave(self):
         """
@@ -115,7 +294,7 @@ class MemberManager(QObject):
             )
             self.dispatcher.broadcast_udp(message.to_dict())
         except Exception as e:
-            print(f"广播离开消息失败: {e}")
+            logger.error("广播离开消息失败: %s", e)
     
     def handle_join_message(self, message: dict, addr: tuple):
         """
@@ -129,10 +308,11 @@ class MemberManager(QObject):
             sender_data = message.get('sender')
             if not sender_data:
                 return
-            member = Member.from_dict(sender_data)
+            # 多网卡主机自报的IP不一定在本网段内，以实际收到数据的源地址为准
+            member = Member.from_dict(sender_data, ip=addr[0])
             self.add_member(member)
         except Exception as e:
-            print(f"处理加入消息失败: {e}")
+            logger.warning("处理加入消息失败: %s", e)
     
     def handle_leave_message(self, message: dict, addr: tuple):
         """
@@ -146,15 +326,18 @@ class MemberManager(QObject):
             sender_data = message.get('sender')
             if not sender_data:
                 return
-            member = Member.from_dict(sender_data)
+            member = Member.from_dict(sender_data, ip=addr[0])
             self.remove_member(member)
         except Exception as e:
-            print(f"处理离开消息失败: {e}")
+            logger.warning("处理离开消息失败: %s", e)
     
     def clear_members(self):
         """
         清空成员列表
         """
-        self.members.clear()
+        with self._lock:
+            self.members.clear()
+            self._by_id.clear()
+            self._last_seen.clear()
         self.member_list_updated.emit([])
 
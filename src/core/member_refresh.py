@@ -5,22 +5,25 @@
 
 import socket
 from typing import Optional
-from PyQt6.QtCore import QObject, pyqtSignal
 
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
+from ..common.logger import get_logger
+from ..common.signals import Signal
 
+logger = get_logger(__name__)
 
-class MemberRefresh(QObject):
+
+class MemberRefresh:
     """
     成员刷新类
     负责手动刷新组员列表
     """
     
     # 定义信号
-    refresh_started = pyqtSignal()  # 刷新开始信号
-    refresh_completed = pyqtSignal(int)  # 刷新完成信号 (发现的成员数量)
+    refresh_started = Signal()  # 刷新开始信号
+    refresh_completed = Signal(int)  # 刷新完成信号 (发现的成员数量)
     
     def __init__(self, local_member: Member, message_dispatcher):
         """
@@ -30,7 +33,6 @@ class MemberRefresh(QObject):
             local_member: 本地用户信息
             message_dispatcher: 消息分发器实例
         """
-        super().__init__()
         self.local_member = local_member
         self.dispatcher = message_dispatcher
         self.is_refreshing = False
@@ -41,7 +43,7 @@ class MemberRefresh(QObject):
         发送刷新广播请求
         """
         if self.is_refreshing:
-            print("正在刷新中，请稍候...")
+            logger.info("正在刷新中，请稍候...")
             return
         
         try:
@@ -56,7 +58,7 @@ class MemberRefresh(QObject):
             # 简化处理：立即允许再次刷新
             self.is_refreshing = False
         except Exception as e:
-            print(f"刷新成员列表失败: {e}")
+            logger.error("刷新成员列表失败: %s", e)
             self.is_refreshing = False
     
     def handle_refresh_message(self, message: dict, addr: tuple):
@@ -79,5 +81,5 @@ class MemberRefresh(QObject):
             )
             self.dispatcher.send_message(response.to_dict(), addr[0], addr[1])
         except Exception as e:
-            print(f"处理刷新消息失败: {e}")
+            logger.warning("处理刷新消息失败: %s", e)
 
@@ -3,34 +3,40 @@
 功能：实现客户端间的广播消息功能
 """
 
-from typing import List
-from PyQt6.QtCore import QObject, pyqtSignal
+from typing import List, Optional
 
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
+from ..common.logger import get_logger
+from ..common.signals import Signal
+from .member_manager import MemberManager
 
+logger = get_logger(__name__)
 
-class MessageBroadcast(QObject):
+
+class MessageBroadcast:
     """
     广播消息类
     负责向所有在线成员广播消息
     """
     
     # 定义信号
-    broadcast_received = pyqtSignal(ChatMessage)  # 接收到广播消息信号
+    broadcast_received = Signal(ChatMessage)  # 接收到广播消息信号
     
-    def __init__(self, local_member: Member, message_dispatcher):
+    def __init__(self, local_member: Member, message_dispatcher,
+                 member_manager: Optional[MemberManager] = None):
         """
         初始化广播消息模块
         
         Args:
             local_member: 本地用户信息
             message_dispatcher: 消息分发器实例
+            member_manager: 组员管理模块，用于发送和解析只带节点ID的紧凑格式消息
         """
-        super().__init__()
         self.local_member = local_member
         self.dispatcher = message_dispatcher
+        self.member_manager = member_manager
         self.member_list: List[Member] = []
     
     def update_member_list(self, members: List[Member]):
@@ -58,7 +64,8 @@ class MessageBroadcast(QObject):
                 sender=self.local_member,
                 content=content
             )
-            message_dict = message.to_dict()
+            compact = self.member_manager and self.local_member.node_id
+            message_dict = message.to_compact_dict() if compact else message.to_dict()
             success = True
             for member in self.member_list:
                 if not self.dispatcher.send_message(
@@ -69,7 +76,7 @@ class MessageBroadcast(QObject):
                     success = False
             return success
         except Exception as e:
-            print(f"发送广播消息失败: {e}")
+            logger.error("发送广播消息失败: %s", e)
             return False
     
     def handle_message(self, message: dict, addr: tuple):
@@ -81,8 +88,10 @@ class MessageBroadcast(QObject):
             addr: 发送者地址
         """
         try:
-            chat_message = ChatMessage.from_dict(message)
-            self.broadcast_received.emit(chat_message)
+            if self.member_manager:
+                self.member_manager.resolve_message(message, addr, self.broadcast_received.emit)
+            else:
+                self.broadcast_received.emit(ChatMessage.from_dict(message))
         except Exception as e:
-            print(f"处理广播消息失败: {e}")
+            logger.warning("处理广播消息失败: %s", e)
 
@@ -4,42 +4,113 @@
 这个模块由成员一和成员七共同完成
 """
 
+import selectors
 import socket
 import threading
-from typing import Optional, Dict, Callable
-from PyQt6.QtCore import QObject, pyqtSignal
+from typing import Optional, Dict, Callable, List
 
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
+from ..common.logger import get_logger
+from ..common.packet import ANY_NODE, Frame, encode_packet, message_sender, node_id_bytes
+from ..common.signals import Signal
+from . import secure_channel
+from .flood_guard import FloodGuard
+from .secure_channel import PROTECTED_VALUES, SecureChannel
+from .udp_batcher import UdpBatcher
 
+logger = get_logger(__name__)
 
-class MessageDispatcher(QObject):
+# 只看帧头就跳过、不解码正文的消息
+SKIP_UNKNOWN_TYPE = 'unknown_type'  # 类型码未知（对方版本更新）
+SKIP_OWN = 'own'  # 自己发出的广播
+SKIP_NOT_FOR_ME = 'not_for_me'  # 发给其他节点的消息
+SKIP_UNDECRYPTABLE = 'undecryptable'  # 加密帧没有对应的会话密钥或认证失败
+SKIP_PLAINTEXT = 'plaintext'  # 要求加密（SECURE_REQUIRED）或协商成功过的成员发来的明文聊天和文件消息
+SKIP_SPOOFED = 'spoofed'  # 加密帧正文中的发送者与帧头（会话的对方）不一致
+
+
+class MessageDispatcher:
     """
     消息分发器类
     负责创建UDP socket，接收所有消息并分发到相应的处理模块
+    
+    socket分工：
+    - 消息socket：绑定本实例的消息端口（默认由系统分配），接收一对一消息等单播数据
+    - 发现socket：同机所有实例共享的发现端口，只用于接收广播
+    - 网卡socket：每个选中的网卡一个，发现广播从这些socket分别发往各网段的广播地址
+    
+    每条消息编码为带二进制头的帧（common.packet），batch_window大于0时经由UdpBatcher合并发送；
+    收到的数据报先经FloodGuard检查帧头、按来源地址和消息类型限速，
+    再按帧头跳过自己发出的、发给别人的和类型未知的消息，只有剩下的才解码JSON正文
+    
+    安装了cryptography时，聊天和文件传输控制消息经由SecureChannel加密后单播，
+    收到的加密帧解密后再解码；发现、加入、离开、刷新等广播仍是明文
     """
     
     # 定义信号 - 根据消息类型分发
-    discovery_message = pyqtSignal(dict, tuple)      # 发现消息 (message, addr)
-    p2p_message = pyqtSignal(dict, tuple)            # 一对一消息
-    broadcast_message = pyqtSignal(dict, tuple)      # 广播消息
-    join_message = pyqtSignal(dict, tuple)           # 加入消息
-    leave_message = pyqtSignal(dict, tuple)          # 离开消息
-    refresh_message = pyqtSignal(dict, tuple)        # 刷新消息
+    discovery_message = Signal(dict, tuple)      # 发现消息 (message, addr)
+    p2p_message = Signal(dict, tuple)            # 一对一消息
+    broadcast_message = Signal(dict, tuple)      # 广播消息
+    join_message = Signal(dict, tuple)           # 加入消息
+    leave_message = Signal(dict, tuple)          # 离开消息
+    refresh_message = Signal(dict, tuple)        # 刷新消息
+    file_message = Signal(dict, tuple)           # 文件传输请求/接受/拒绝/撤回
+    key_exchange_message = Signal(dict, tuple)   # 会话密钥协商
+    local_member_changed = Signal(Member)        # 消息端口确定后的本地成员信息（在监听开始前发射）
     
-    def __init__(self, local_member: Member):
+    def __init__(self, local_member: Member, interfaces: Optional[List[NetworkInterface]] = None,
+                 discovery_port: int = DEFAULT_UDP_PORT, batch_window: float = UDP_BATCH_WINDOW,
+                 secure: bool = SECURE_ENABLED):
         """
         初始化消息分发器
         
         Args:
-            local_member: 本地用户信息
+            local_member: 本地用户信息，udp_port为0时启动后换成带实际端口的新实例（local_member_changed）
+            interfaces: 用于发送广播的网卡，默认由select_interfaces自动选择
+            discovery_port: 共享的发现端口
+            batch_window: UDP发送合并窗口（秒），0表示每条消息立即单独发送
+            secure: 是否加密聊天和文件消息（需要安装cryptography）
         """
-        super().__init__()
         self.local_member = local_member
+        self.interfaces = interfaces
+        self.discovery_port = discovery_port
         self.udp_socket: Optional[socket.socket] = None
+        self.discovery_socket: Optional[socket.socket] = None
+        # 网卡 -> 绑定到该网卡IP的广播socket
+        self.interface_sockets: Dict[NetworkInterface, socket.socket] = {}
+        self._selector: Optional[selectors.BaseSelector] = None
         self.is_running = False
         self.listen_thread: Optional[threading.Thread] = None
+        self.batcher: Optional[UdpBatcher] = UdpBatcher(batch_window) if batch_window > 0 else None
+        self.flood_guard = FloodGuard()
+        self.skipped = {SKIP_UNKNOWN_TYPE: 0, SKIP_OWN: 0, SKIP_NOT_FOR_ME: 0,
+                        SKIP_UNDECRYPTABLE: 0, SKIP_PLAINTEXT: 0, SKIP_SPOOFED: 0}
+        self._local_id = node_id_bytes(local_member.node_id)
+        # 加密需要本节点ID（接收方按帧头中的发送者选择密钥）
+        self.secure: Optional[SecureChannel] = None
+        if secure and self._local_id != ANY_NODE:
+            if secure_channel.available():
+                self.secure = SecureChannel(self._local_id, self._send_unicast)
+                self.key_exchange_message.connect(self.secure.handle_message)
+            else:
+                logger.info("未安装cryptography，聊天和文件以明文传输")
+        self._routes = {
+            MessageType.DISCOVERY: self.discovery_message,
+            MessageType.DISCOVERY_RESPONSE: self.discovery_message,
+            MessageType.P2P_MESSAGE: self.p2p_message,
+            MessageType.BROADCAST_MESSAGE: self.broadcast_message,
+            MessageType.JOIN: self.join_message,
+            MessageType.LEAVE: self.leave_message,
+            MessageType.REFRESH: self.refresh_message,
+            MessageType.FILE_REQUEST: self.file_message,
+            MessageType.FILE_ACCEPT: self.file_message,
+            MessageType.FILE_REJECT: self.file_message,
+            MessageType.FILE_CANCEL: self.file_message,
+            MessageType.FILE_HAVE: self.file_message,
+            MessageType.KEY_EXCHANGE: self.key_exchange_message,
+        }
     
     def start(self):
         """
@@ -47,39 +118,80 @@ class MessageDispatcher(QObject):
         创建UDP socket并开始监听
         """
         try:
-            # 创建UDP socket
+            # 创建消息socket，端口为0时由系统分配并回填到本地成员信息中
             self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            
-            # 设置socket选项
             self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.udp_socket.bind(('', self.local_member.udp_port))
+            self.local_member = self.local_member.replace(udp_port=self.udp_socket.getsockname()[1])
+            self.local_member_changed.emit(self.local_member)
+            
+            # 创建发现socket，同机多个实例共享端口，广播会投递给每一个实例
+            self.discovery_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                self.discovery_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.discovery_socket.bind(('', self.discovery_port))
             
-            # 绑定到指定端口
-            self.udp_socket.bind(('', DEFAULT_UDP_PORT))
+            # 为每个网卡创建广播socket，对方的回复也会发到这些socket
+            if self.interfaces is None:
+                self.interfaces = select_interfaces()
+            for iface in self.interfaces:
+                try:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                    sock.bind((iface.ip, 0))
+                    self.interface_sockets[iface] = sock
+                except OSError as e:
+                    logger.warning("网卡 %s(%s) 绑定失败: %s", iface.name, iface.ip, e)
             
-            # 设置为非阻塞模式，避免close时卡住
-            self.udp_socket.settimeout(1.0)
+            # 用selector同时监听所有socket，超时后检查运行标志，避免close时卡住
+            self._selector = selectors.DefaultSelector()
+            for sock in [self.udp_socket, self.discovery_socket] + list(self.interface_sockets.values()):
+                self._selector.register(sock, selectors.EVENT_READ)
             
-            # 启动监听线程
+            # 启动发送线程和监听线程
+            if self.batcher:
+                self.batcher.start()
             self.is_running = True
             self.listen_thread = threading.Thread(target=self._listen_loop, daemon=True)
             self.listen_thread.start()
             
-            print(f"消息分发器启动成功，监听端口 {DEFAULT_UDP_PORT}")
+            logger.info(
+                "消息分发器启动成功，消息端口 %d，发现端口 %d，广播网卡: %s",
+                self.local_member.udp_port, self.discovery_port,
+                ", ".join(f"{i.name}({i.ip}->{i.broadcast})" for i in self.interface_sockets) or "默认"
+            )
             
         except Exception as e:
-            print(f"启动消息分发器失败: {e}")
+            logger.error("启动消息分发器失败: %s", e)
     
     def stop(self):
         """
         停止消息分发服务
         """
         self.is_running = False
+        if self.secure:
+            self.secure.stop()
+        if self.batcher:
+            # 先发出队列中剩余的消息（如离开通知），再关闭socket
+            self.batcher.stop()
         if self.udp_socket:
-            self.udp_socket.close()
+            # 给自己发一个空数据报，立即唤醒等待中的监听线程
+            try:
+                self.udp_socket.sendto(b'', ('127.0.0.1', self.local_member.udp_port))
+            except OSError:
+                pass
         if self.listen_thread:
             self.listen_thread.join(timeout=2)
-        print("消息分发器已停止")
+        if self._selector:
+            self._selector.close()
+        for sock in self.interface_sockets.values():
+            sock.close()
+        self.interface_sockets.clear()
+        for sock in (self.discovery_socket, self.udp_socket):
+            if sock:
+                sock.close()
+        logger.info("消息分发器已停止")
     
     def get_socket(self) -> Optional[socket.socket]:
         """
@@ -93,6 +205,7 @@ class MessageDispatcher(QObject):
     def send_message(self, message_dict: dict, target_ip: str, target_port: int) -> bool:
         """
         发送UDP消息（供所有模块使用的统一发送接口）
+        聊天和文件传输控制消息在启用加密时加密发送，与对方还没有会话密钥时先协商
         
         Args:
             message_dict: 消息字典
@@ -104,21 +217,52 @@ class MessageDispatcher(QObject):
         """
         try:
             if not self.udp_socket:
-                print("UDP socket未初始化")
+                logger.error("UDP socket未初始化")
                 return False
             
-            data = serialize_message(message_dict)
-            self.udp_socket.sendto(data, (target_ip, target_port))
+            packet = encode_packet(message_dict)
+            if self.secure and message_dict.get('msg_type') in PROTECTED_VALUES:
+                return self.secure.send(packet, (target_ip, target_port))
+            self._send(self.udp_socket, packet, (target_ip, target_port))
             return True
         except Exception as e:
-            print(f"发送消息失败: {e}")
+            logger.error("发送消息失败: %s", e)
             return False
     
     def broadcast_udp(self, message_dict: dict) -> bool:
         """
         广播UDP消息（发送接口）
+        从每个网卡的socket分别发往该网段的广播地址，没有可用网卡时使用受限广播
+        
+        Args:
+            message_dict: 消息字典
+            
+        Returns:
+            bool: 是否至少在一个网卡上发送成功
         """
-        return self.send_message(message_dict, BROADCAST_ADDRESS, DEFAULT_UDP_PORT)
+        if not self.interface_sockets:
+            return self.send_message(message_dict, BROADCAST_ADDRESS, self.discovery_port)
+        data = encode_packet(message_dict)
+        success = False
+        for iface, sock in list(self.interface_sockets.items()):
+            try:
+                self._send(sock, data, (iface.broadcast, self.discovery_port))
+                success = True
+            except Exception as e:
+                logger.error("网卡 %s 广播失败: %s", iface.name, e)
+        return success
+    
+    def _send(self, sock: socket.socket, data: bytes, addr: tuple):
+        """启用合并时加入发送队列，否则立即发送"""
+        if self.batcher:
+            self.batcher.send(sock, addr, data)
+        else:
+            sock.sendto(data, addr)
+    
+    def _send_unicast(self, data: bytes, addr: tuple):
+        """从消息socket发送（加密层发出协商消息和暂存的消息）"""
+        if self.udp_socket:
+            self._send(self.udp_socket, data, addr)
     
     def _listen_loop(self):
         """
@@ -127,44 +271,51 @@ class MessageDispatcher(QObject):
         """
         while self.is_running:
             try:
-                # 接收数据
-                data, addr = self.udp_socket.recvfrom(BUFFER_SIZE)
-                
-                # 忽略来自本机的消息（避免自己收到自己的广播）
-                if addr[0] == self.local_member.ip:
-                    continue
-                
-                # 反序列化消息
-                message = deserialize_message(data)
-                if not message:
-                    continue
-                
-                # 根据消息类型分发到相应的信号
-                msg_type = message.get('msg_type')
-                
-                if msg_type == MessageType.DISCOVERY.value:
-                    self.discovery_message.emit(message, addr)
-                elif msg_type == MessageType.DISCOVERY_RESPONSE.value:
-                    self.discovery_message.emit(message, addr)
-                elif msg_type == MessageType.P2P_MESSAGE.value:
-                    self.p2p_message.emit(message, addr)
-                elif msg_type == MessageType.BROADCAST_MESSAGE.value:
-                    self.broadcast_message.emit(message, addr)
-                elif msg_type == MessageType.JOIN.value:
-                    self.join_message.emit(message, addr)
-                elif msg_type == MessageType.LEAVE.value:
-                    self.leave_message.emit(message, addr)
-                elif msg_type == MessageType.REFRESH.value:
-                    self.refresh_message.emit(message, addr)
-                else:
-                    print(f"未知消息类型: {msg_type}")
-                    
-            except socket.timeout:
-                # 超时是正常的，继续循环
-                continue
+                for key, _ in self._selector.select(timeout=1.0):
+                    data, addr = key.fileobj.recvfrom(BUFFER_SIZE)
+                    frames = self.flood_guard.admit(data, addr) if data else None
+                    if frames:
+                        self._dispatch(data, addr, frames)
             except Exception as e:
                 if self.is_running:
-                    print(f"接收消息出错: {e}")
+                    logger.error("接收消息出错: %s", e)
         
-        print("监听循环已退出")
-
+        logger.debug("监听循环已退出")
+    
+    def _dispatch(self, data: bytes, addr: tuple, frames: List[Frame]):
+        """
+        按帧头筛选数据报中的各条消息，只解码与本节点有关的正文并按类型分发
+        
+        Args:
+            data: 数据报内容
+            addr: 发送者地址
+            frames: 数据报中的帧
+        """
+        for frame in frames:
+            if frame.msg_type is None:
+                self.skipped[SKIP_UNKNOWN_TYPE] += 1
+                continue
+            # 忽略自己发出的消息（按节点ID识别，多网卡和同机多实例时IP不可靠）
+            if frame.sender == self._local_id:
+                self.skipped[SKIP_OWN] += 1
+                continue
+            if frame.receiver != ANY_NODE and frame.receiver != self._local_id:
+                self.skipped[SKIP_NOT_FOR_ME] += 1
+                continue
+            if frame.sealed:
+                body = self.secure.open(data, frame, addr) if self.secure else None
+                if body is None:
+                    self.skipped[SKIP_UNDECRYPTABLE] += 1
+                    continue
+            elif self.secure and not self.secure.accepts_plaintext(frame.msg_type, frame.sender, addr):
+                self.skipped[SKIP_PLAINTEXT] += 1
+                continue
+            else:
+                body = data[frame.start:frame.end]
+            message = deserialize_message(body)
+            if frame.sealed and isinstance(message, dict) and message_sender(message) != frame.sender:
+                # 帧头中的发送者已随会话密钥认证，正文不能冒充其他成员
+                self.skipped[SKIP_SPOOFED] += 1
+                continue
+            if isinstance(message, dict):
+                self._routes[frame.msg_type].emit(message, addr)
@@ -3,35 +3,51 @@
 功能：实现客户端之间一对一即时消息的发送和接收
 """
 
-from PyQt6.QtCore import QObject, pyqtSignal
+from typing import Optional
 
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
+from ..common.logger import get_logger
+from ..common.signals import Signal
+from .member_manager import MemberManager
+from .outbox import Outbox
 
+logger = get_logger(__name__)
 
-class MessageP2P(QObject):
+
+class MessageP2P:
     """
     一对一消息类
     负责点对点消息的发送和接收
     
     注意：消息接收由MessageDispatcher分发，此模块只负责处理
+    同时提供了member_manager和outbox时，发给不在线成员的消息暂存在发件箱中，
+    对方重新出现（member_added）时一并发出
     """
     
     # 定义信号
-    message_received = pyqtSignal(ChatMessage)  # 接收到消息信号
+    message_received = Signal(ChatMessage)  # 接收到消息信号
+    message_queued = Signal(ChatMessage)  # 对方不在线，消息已暂存到发件箱
     
-    def __init__(self, local_member: Member, message_dispatcher):
+    def __init__(self, local_member: Member, message_dispatcher,
+                 member_manager: Optional[MemberManager] = None,
+                 outbox: Optional[Outbox] = None):
         """
         初始化一对一消息模块
         
         Args:
             local_member: 本地用户信息
             message_dispatcher: 消息分发器实例
+            member_manager: 组员管理模块，用于发送和解析只带节点ID的紧凑格式消息
+            outbox: 离线消息发件箱
         """
-        super().__init__()
         self.local_member = local_member
         self.dispatcher = message_dispatcher
+        self.member_manager = member_manager
+        self.outbox = outbox
+        if member_manager and outbox:
+            member_manager.member_added.connect(self.flush_outbox)
     
     def send_p2p_message(self, receiver: Member, content: str) -> bool:
         """
@@ -51,15 +67,51 @@ class MessageP2P(QObject):
                 receiver=receiver,
                 content=content
             )
-            return self.dispatcher.send_message(
-                message.to_dict(),
-                receiver.ip,
-                receiver.udp_port
-            )
+            if self.outbox and self.member_manager and not self.member_manager.is_online(receiver):
+                self.outbox.put(receiver, content)
+                self.message_queued.emit(message)
+                return True
+            return self._send(message)
         except Exception as e:
-            print(f"发送一对一消息失败: {e}")
+            logger.error("发送一对一消息失败: %s", e)
             return False
     
+    def _send(self, message: ChatMessage) -> bool:
+        """立即发出消息，不经过发件箱"""
+        receiver = message.receiver
+        compact = self.member_manager and self.local_member.node_id and receiver.node_id
+        return self.dispatcher.send_message(
+            message.to_compact_dict() if compact else message.to_dict(),
+            receiver.ip,
+            receiver.udp_port
+        )
+    
+    def flush_outbox(self, member: Member) -> int:
+        """
+        发出发件箱中暂存的发给member的消息（成员重新出现时调用），
+        发送失败的消息留在发件箱中
+        
+        Args:
+            member: 刚出现的成员
+            
+        Returns:
+            int: 发出的消息数
+        """
+        if not self.outbox:
+            return 0
+
+        def send(content: str) -> bool:
+            try:
+                return self._send(ChatMessage(MessageType.P2P_MESSAGE, self.local_member, content, member))
+            except Exception as e:
+                logger.error("发送离线消息失败: %s", e)
+                return False
+
+        sent = self.outbox.deliver(member, send)
+        if sent:
+            logger.info("%s 已上线，发出 %d 条离线消息", member.username, sent)
+        return sent
+    
     def handle_message(self, message: dict, addr: tuple):
         """
         处理接收到的P2P消息（由MessageDispatcher分发过来）
@@ -69,8 +121,13 @@ class MessageP2P(QObject):
             addr: 发送者地址
         """
         try:
-            chat_message = ChatMessage.from_dict(message)
-            self.message_received.emit(chat_message)
+            if 'sender_id' not in message:
+                self.message_received.emit(ChatMessage.from_dict(message))
+            elif message.get('receiver_id') != self.local_member.node_id:
+                # 发给本端口上一个实例（已重启）的消息
+                logger.debug("忽略发给其他节点的消息: %s", message.get('receiver_id'))
+            elif self.member_manager:
+                self.member_manager.resolve_message(message, addr, self.message_received.emit)
         except Exception as e:
-            print(f"处理P2P消息失败: {e}")
+            logger.warning("处理P2P消息失败: %s", e)
 
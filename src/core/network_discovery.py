@@ -4,14 +4,17 @@
 """
 
 from typing import Optional
-from PyQt6.QtCore import QObject, pyqtSignal
 
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
+from ..common.logger import get_logger
+from ..common.signals import Signal
 
+logger = get_logger(__name__)
 
-class NetworkDiscovery(QObject):
+
+class NetworkDiscovery:
     """
     网络发现类
     负责通过UDP广播发现局域网内的聊天组成员
@@ -20,7 +23,7 @@ class NetworkDiscovery(QObject):
     """
     
     # 定义信号
-    member_discovered = pyqtSignal(Member)  # 发现新成员信号
+    member_discovered = Signal(Member)  # 发现新成员信号
     
     def __init__(self, local_member: Member, message_dispatcher):
         """
@@ -30,7 +33,6 @@ class NetworkDiscovery(QObject):
             local_member: 本地用户信息
             message_dispatcher: 消息分发器实例
         """
-        super().__init__()
         self.local_member = local_member
         self.dispatcher = message_dispatcher
         self.is_running = True
@@ -49,7 +51,7 @@ class NetworkDiscovery(QObject):
             )
             self.dispatcher.broadcast_udp(message.to_dict())
         except Exception as e:
-            print(f"发送发现广播失败: {e}")
+            logger.error("发送发现广播失败: %s", e)
     
     def handle_message(self, message: dict, addr: tuple):
         """
@@ -68,7 +70,7 @@ class NetworkDiscovery(QObject):
                 self._handle_discovery_response(message, addr)
                 
         except Exception as e:
-            print(f"处理发现消息出错: {e}")
+            logger.warning("处理发现消息出错: %s", e)
     
     def _handle_discovery_request(self, message: dict, addr: tuple):
         """
@@ -86,7 +88,7 @@ class NetworkDiscovery(QObject):
             )
             self.dispatcher.send_message(response.to_dict(), addr[0], addr[1])
         except Exception as e:
-            print(f"处理发现请求失败: {e}")
+            logger.warning("处理发现请求失败: %s", e)
     
     def _handle_discovery_response(self, message: dict, addr: tuple):
         """
@@ -100,10 +102,11 @@ class NetworkDiscovery(QObject):
             sender_data = message.get('sender')
             if not sender_data:
                 return
-            member = Member.from_dict(sender_data)
+            # 多网卡主机自报的IP不一定在本网段内，以实际收到数据的源地址为准
+            member = Member.from_dict(sender_data, ip=addr[0])
             self.member_discovered.emit(member)
         except Exception as e:
-            print(f"处理发现响应失败: {e}")
+            logger.warning("处理发现响应失败: %s", e)
 
     def stop(self):
         """停止发现模块（主要用于关闭时标记状态）。"""
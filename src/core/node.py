@@ -0,0 +1,168 @@
+"""
+聊天节点模块
+功能：创建并连接所有核心模块，图形界面和无界面守护进程共用同一套组装逻辑
+"""
+
+import os
+import threading
+from typing import List, Optional
+
+from ..common.config import *
+from ..common.message_types import *
+from ..common.utils import *
+from ..common.logger import get_logger
+from .message_dispatcher import MessageDispatcher
+from .network_discovery import NetworkDiscovery
+from .message_p2p import MessageP2P
+from .message_broadcast import MessageBroadcast
+from .file_transfer import FileTransfer
+from .member_manager import MemberManager
+from .member_refresh import MemberRefresh
+from .outbox import Outbox
+
+logger = get_logger(__name__)
+
+
+class ChatNode:
+    """
+    聊天节点类
+    持有一个本地用户的全部核心模块，负责模块间的信号连接以及启动/停止顺序
+
+    注意：模块之间的信号在网络线程中直接调用，
+    界面需要自行把关心的信号转发到主线程
+    """
+
+    def __init__(self, username: str, local_ip: Optional[str] = None,
+                 download_dir: str = DOWNLOAD_DIR,
+                 interfaces: Optional[List[NetworkInterface]] = None,
+                 udp_port: int = DEFAULT_MESSAGE_PORT,
+                 tcp_port: int = DEFAULT_TCP_PORT,
+                 discovery_port: int = DEFAULT_UDP_PORT,
+                 secure: bool = SECURE_ENABLED,
+                 tls: bool = FILE_TLS_ENABLED,
+                 state_dir: Optional[str] = None):
+        """
+        初始化聊天节点
+
+        Args:
+            username: 用户名
+            local_ip: 本机IP，默认自动检测
+            download_dir: 文件下载目录
+            interfaces: 用于发现广播的网卡，默认自动选择
+            udp_port: UDP消息端口，0表示启动时由系统分配
+            tcp_port: TCP文件传输端口，0表示启动时由系统分配
+            discovery_port: 共享的发现端口
+            secure: 是否加密聊天和文件（需要安装cryptography）
+            tls: 文件数据连接是否改用TLS（需要安装cryptography）
+            state_dir: 保存离线消息等程序状态的目录（与下载目录分开），为None时只保存在内存中
+        """
+        self.local_member = Member(
+            username=username,
+            ip=local_ip or get_local_ip(),
+            udp_port=udp_port,
+            tcp_port=tcp_port,
+            node_id=generate_node_id()
+        )
+
+        self.message_dispatcher = MessageDispatcher(self.local_member, interfaces, discovery_port,
+                                                    secure=secure)
+        self.network_discovery = NetworkDiscovery(self.local_member, self.message_dispatcher)
+        self.member_manager = MemberManager(self.local_member, self.message_dispatcher)
+        self.outbox = Outbox(os.path.join(state_dir, OUTBOX_FILE) if state_dir else None)
+        self.message_p2p = MessageP2P(self.local_member, self.message_dispatcher, self.member_manager,
+                                      self.outbox)
+        self.message_broadcast = MessageBroadcast(self.local_member, self.message_dispatcher,
+                                                  self.member_manager)
+        self.member_refresh = MemberRefresh(self.local_member, self.message_dispatcher)
+        self.file_transfer = FileTransfer(self.local_member, self.message_dispatcher, download_dir,
+                                          secure=self.message_dispatcher.secure, tls=tls)
+        self.is_running = False
+        # 定期刷新成员列表，连续多次没有回应的成员视为已离线
+        self.refresh_interval = MEMBER_REFRESH_INTERVAL
+        self._refresh_stop = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+        self._connect_modules()
+
+    def _connect_modules(self):
+        """
+        连接模块之间的信号
+        """
+        # dispatcher -> modules
+        self.message_dispatcher.discovery_message.connect(
+            self.network_discovery.handle_message)
+        self.message_dispatcher.p2p_message.connect(
+            self.message_p2p.handle_message)
+        self.message_dispatcher.broadcast_message.connect(
+            self.message_broadcast.handle_message)
+        self.message_dispatcher.join_message.connect(
+            self.member_manager.handle_join_message)
+        self.message_dispatcher.leave_message.connect(
+            self.member_manager.handle_leave_message)
+        self.message_dispatcher.refresh_message.connect(
+            self.member_refresh.handle_refresh_message)
+        self.message_dispatcher.file_message.connect(
+            self.file_transfer.handle_message)
+
+        # 动态端口确定后，所有模块改用新的本地成员信息
+        self.message_dispatcher.local_member_changed.connect(self._set_local_member)
+        self.file_transfer.local_member_changed.connect(self._set_local_member)
+
+        # 发现的成员加入成员列表，成员列表同步到广播模块
+        self.network_discovery.member_discovered.connect(self.member_manager.add_member)
+        self.member_manager.member_list_updated.connect(
+            self.message_broadcast.update_member_list)
+
+    def _set_local_member(self, member: Member):
+        """
+        替换各模块持有的本地成员信息（成员信息不可变，端口变化时生成新实例）
+
+        Args:
+            member: 新的本地成员信息
+        """
+        self.local_member = member
+        for module in (self.message_dispatcher, self.network_discovery, self.message_p2p,
+                       self.message_broadcast, self.member_manager, self.member_refresh,
+                       self.file_transfer):
+            module.local_member = member
+
+    def start(self):
+        """
+        启动网络服务并广播加入、发现消息
+        动态端口在服务启动后才确定，因此加入消息必须在启动之后发送
+        """
+        self.message_dispatcher.start()
+        self.file_transfer.start()
+        self.is_running = True
+
+        # 加入后先广播一次加入
+        self.member_manager.broadcast_join()
+        # 发送发现广播
+        self.network_discovery.send_discovery_broadcast()
+        if self.refresh_interval > 0:
+            self._refresh_stop.clear()
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._refresh_thread.start()
+        logger.info("节点 %s 已启动 (%s)", self.local_member.username, self.local_member.ip)
+
+    def stop(self):
+        """
+        广播离开消息并停止所有服务
+        """
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._refresh_stop.set()
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+        self.member_manager.broadcast_leave()
+        self.network_discovery.stop()
+        self.file_transfer.stop()
+        self.message_dispatcher.stop()
+
+    def _refresh_loop(self):
+        """定期移除长时间没有回应的成员并广播刷新请求，仍在线的成员回复发现响应"""
+        while not self._refresh_stop.wait(self.refresh_interval):
+            self.member_manager.expire_silent(self.refresh_interval * MEMBER_MISSED_REFRESHES)
+            self.member_refresh.refresh_members()
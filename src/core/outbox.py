@@ -0,0 +1,190 @@
+"""
+离线消息模块
+功能：发给不在线成员的一对一消息暂存在按成员划分的发件箱中并写入磁盘（程序状态目录，不在下载目录中），
+对方再次出现（加入消息或发现响应）时一次性发出，只有发送成功的消息才从发件箱中删除；
+每个成员暂存的消息数、暂存的成员数和消息的保留时间都有上限
+
+对方每次启动节点ID和端口都会变化，发件箱按(用户名, IP)识别成员
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Set, Tuple
+
+from ..common.config import *
+from ..common.logger import get_logger
+from ..common.message_types import Member
+
+logger = get_logger(__name__)
+
+OUTBOX_VERSION = 1
+
+
+def peer_key(member: Member) -> Tuple[str, str]:
+    """发件箱中识别成员的键，对方重启后仍相同"""
+    return member.username, member.ip
+
+
+class Outbox:
+    """
+    离线消息发件箱（线程安全）
+    成员 -> [(暂存时间, 消息内容)]，越靠后越新；成员按最近暂存的顺序排列，超出上限时淘汰最久未暂存的
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 max_messages: int = OUTBOX_MAX_MESSAGES,
+                 max_peers: int = OUTBOX_MAX_PEERS,
+                 max_age: float = OUTBOX_MAX_AGE,
+                 clock: Callable[[], float] = time.time):
+        """
+        初始化发件箱
+
+        Args:
+            path: 保存文件路径，为None时只保存在内存中
+            max_messages: 每个成员最多暂存的消息数，超出时丢弃最早的
+            max_peers: 最多为多少个成员暂存消息
+            max_age: 消息最长保留时间（秒），超时的消息不再发送
+            clock: 时钟函数（墙上时间，重启后仍有效），便于测试替换
+        """
+        self.path = path
+        self.max_messages = max_messages
+        self.max_peers = max_peers
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._peers: 'OrderedDict[Tuple[str, str], List[Tuple[float, str]]]' = OrderedDict()
+        # 正在发出消息的成员，同一成员同时多次出现时不重复发送
+        self._delivering: Set[Tuple[str, str]] = set()
+        self._load()
+
+    def put(self, member: Member, content: str):
+        """
+        暂存一条发给member的消息
+
+        Args:
+            member: 接收者
+            content: 消息内容
+        """
+        key = peer_key(member)
+        with self._lock:
+            messages = self._peers.pop(key, [])
+            messages.append((self.clock(), content))
+            del messages[:-self.max_messages]
+            self._peers[key] = messages
+            while len(self._peers) > self.max_peers:
+                dropped_key, dropped = self._peers.popitem(last=False)
+                logger.warning("离线成员过多，丢弃发给 %s 的 %d 条消息", dropped_key[0], len(dropped))
+            self._save()
+
+    def take(self, member: Member) -> List[str]:
+        """
+        取出并删除发给member的全部未过期消息
+
+        Args:
+            member: 接收者
+
+        Returns:
+            List[str]: 消息内容，按暂存顺序
+        """
+        with self._lock:
+            messages = self._peers.pop(peer_key(member), None)
+            if messages is None:
+                return []
+            self._save()
+        deadline = self.clock() - self.max_age
+        return [content for stored_at, content in messages if stored_at >= deadline]
+
+    def deliver(self, member: Member, send: Callable[[str], bool]) -> int:
+        """
+        按暂存顺序发出发给member的未过期消息，只删除发送成功的（过期的消息直接删除）；
+        某条发送失败时停止，它和之后的消息留在发件箱中，对方下次出现时再发
+
+        Args:
+            member: 接收者
+            send: 发送函数，参数为消息内容，返回是否发送成功
+
+        Returns:
+            int: 发出的消息数
+        """
+        key = peer_key(member)
+        with self._lock:
+            if key in self._delivering or key not in self._peers:
+                return 0
+            self._delivering.add(key)
+            messages = list(self._peers[key])
+        done, sent = [], 0
+        try:
+            deadline = self.clock() - self.max_age
+            for stored_at, content in messages:
+                if stored_at >= deadline:
+                    if not send(content):
+                        break
+                    sent += 1
+                done.append((stored_at, content))
+        finally:
+            with self._lock:
+                self._delivering.discard(key)
+                # 发送期间可能又暂存了新消息，只删除已处理的
+                remaining = self._peers.get(key)
+                if remaining is not None and done:
+                    for message in done:
+                        if message in remaining:
+                            remaining.remove(message)
+                    if not remaining:
+                        del self._peers[key]
+                    self._save()
+        return sent
+
+    def pending(self, member: Optional[Member] = None) -> int:
+        """
+        暂存的消息数
+
+        Args:
+            member: 只统计发给该成员的，为None时统计全部
+        """
+        with self._lock:
+            if member is not None:
+                return len(self._peers.get(peer_key(member), ()))
+            return sum(len(messages) for messages in self._peers.values())
+
+    # ========== 持久化 ==========
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != OUTBOX_VERSION:
+                return
+            deadline = self.clock() - self.max_age
+            for username, ip, messages in data.get('peers', []):
+                kept = [(float(stored_at), str(content)) for stored_at, content in messages
+                        if float(stored_at) >= deadline][-self.max_messages:]
+                if kept:
+                    self._peers[(username, ip)] = kept
+            while len(self._peers) > self.max_peers:
+                self._peers.popitem(last=False)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("读取离线消息失败: %s", e)
+            self._peers.clear()
+
+    def _save(self):
+        """写入保存文件（调用方持有_lock），先写临时文件再替换，避免写到一半时损坏"""
+        if not self.path:
+            return
+        try:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': OUTBOX_VERSION,
+                           'peers': [[username, ip, messages] for (username, ip), messages in self._peers.items()]},
+                          f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("保存离线消息失败: %s", e)
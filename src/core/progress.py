@@ -0,0 +1,111 @@
+"""
+传输进度上报模块
+功能：对文件传输循环中的进度更新限流，并计算传输速率和预计剩余时间，
+传输循环每个数据块只做一次计数和比较，真正的信号发射按时间或进度步长触发
+"""
+
+import time
+from typing import Callable, Optional
+
+from ..common.config import PROGRESS_MIN_INTERVAL, PROGRESS_MIN_STEP
+from ..common.message_types import TransferProgress
+
+RATE_SMOOTHING = 0.3  # 速率指数平滑系数，越大越偏向最近一次的速率
+
+
+class ProgressReporter:
+    """
+    进度上报器
+    距上次上报超过min_interval秒，或进度增加min_step个百分点时才调用回调，
+    传输结束时调用finish()保证最终进度一定被上报
+    """
+
+    def __init__(self, filename: str, total_bytes: int,
+                 callback: Callable[[TransferProgress], None],
+                 min_interval: float = PROGRESS_MIN_INTERVAL,
+                 min_step: float = PROGRESS_MIN_STEP,
+                 clock: Callable[[], float] = time.monotonic,
+                 transfer_id: str = ''):
+        """
+        初始化进度上报器
+
+        Args:
+            filename: 文件名
+            total_bytes: 文件总字节数
+            callback: 上报回调，参数为TransferProgress
+            min_interval: 最小上报间隔（秒）
+            min_step: 触发上报的最小进度增量（百分点）
+            clock: 时钟函数，便于测试替换
+            transfer_id: 传输ID，随进度一起上报
+        """
+        self.filename = filename
+        self.transfer_id = transfer_id
+        self.total_bytes = total_bytes
+        self.callback = callback
+        self.min_interval = min_interval
+        self.clock = clock
+        self.bytes_done = 0
+        self.bytes_per_sec = 0.0
+        self.tuning = None  # 数据连接的传输参数（SocketTuning），设置后随进度一起上报
+
+        self._step_bytes = max(1, int(total_bytes * min_step / 100))
+        self._started_at = clock()
+        self._last_time = self._started_at
+        self._last_bytes = 0
+        self._next_bytes = self._step_bytes
+        self._finished = False
+
+    def update(self, nbytes: int):
+        """
+        记录新传输的字节数，必要时上报
+
+        Args:
+            nbytes: 本次传输的字节数
+        """
+        self.bytes_done += nbytes
+        if self.bytes_done >= self._next_bytes:
+            self._report(self.clock())
+            return
+        now = self.clock()
+        if now - self._last_time >= self.min_interval:
+            self._report(now)
+
+    def finish(self):
+        """
+        传输结束，上报最终进度（只上报一次）
+        """
+        if self._finished:
+            return
+        self._finished = True
+        now = self.clock()
+        elapsed = now - self._started_at
+        if elapsed > 0:
+            # 最终速率取整个传输过程的平均值
+            self.bytes_per_sec = self.bytes_done / elapsed
+        self._emit(0.0 if self.bytes_done >= self.total_bytes else None)
+
+    def _report(self, now: float):
+        elapsed = now - self._last_time
+        if elapsed > 0:
+            rate = (self.bytes_done - self._last_bytes) / elapsed
+            if self.bytes_per_sec:
+                rate = RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.bytes_per_sec
+            self.bytes_per_sec = rate
+        self._last_time = now
+        self._last_bytes = self.bytes_done
+        self._next_bytes = self.bytes_done + self._step_bytes
+
+        remaining = max(0, self.total_bytes - self.bytes_done)
+        eta: Optional[float] = remaining / self.bytes_per_sec if self.bytes_per_sec > 0 else None
+        self._emit(eta)
+
+    def _emit(self, eta: Optional[float]):
+        self.callback(TransferProgress(
+            filename=self.filename,
+            bytes_done=self.bytes_done,
+            total_bytes=self.total_bytes,
+            bytes_per_sec=self.bytes_per_sec,
+            eta_seconds=eta,
+            transfer_id=self.transfer_id,
+            tuning=self.tuning.to_dict() if self.tuning else None
+        ))
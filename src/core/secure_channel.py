@@ -0,0 +1,632 @@
+"""
+端到端加密模块
+功能：每个节点启动时生成X25519密钥对，第一次向某个成员发送聊天或文件消息时
+通过KEY_EXCHANGE消息协商会话密钥（ECDH + HKDF-SHA256），此后发给该成员的消息
+逐个数据报以AEAD（AES-GCM或ChaCha20-Poly1305）加密，文件数据按块加密（StreamCipher）
+
+- 会话密钥按对方的消息地址缓存，SECURE_SESSION_TTL后过期，发送下一条消息时重新协商；
+  重新协商后上一个密钥仍可用于解密，双方同时发起协商也不会丢消息
+- 协商期间待发的消息暂存，对方回复后加密发出；对方在SECURE_HANDSHAKE_TIMEOUT内没有回复
+  （未安装cryptography或旧版本）时以明文发出，SECURE_REQUIRED时丢弃；
+  与某个地址或节点协商成功过之后不再与它以明文收发，防止降级
+- 同一地址、节点ID的公钥在本进程内固定（首次使用即信任），中途更换公钥的协商被拒绝；
+  公钥本身没有经过身份认证，不能防御协商阶段的中间人
+- 加密帧的帧头（类型、发送者、接收者）仍是明文，作为附加数据参与认证，
+  正文为12字节随机nonce + 密文 + 16字节认证标签；按来源地址上的会话解密，
+  帧头中的发送者必须是该会话的对方
+- 文件数据流两个方向各用一个StreamCipher，接收方的确认和重传请求同样经过认证
+
+依赖cryptography，未安装时available()返回False，所有消息都以明文收发
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional, Set
+
+from ..common.config import *
+from ..common.logger import get_logger
+from ..common.message_types import MessageType
+from ..common.packet import (
+    ANY_NODE, HEADER, MAGIC, SEALED, VERSION, Frame, encode_packet, node_id_bytes
+)
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    # 算法名 -> (AEAD实现, 密钥长度)
+    CIPHERS = {
+        'aes-128-gcm': (AESGCM, 16),
+        'aes-256-gcm': (AESGCM, 32),
+        'chacha20-poly1305': (ChaCha20Poly1305, 32),
+    }
+except ImportError:
+    CIPHERS = {}
+
+logger = get_logger(__name__)
+
+# 加密发送的消息类型，发现、加入、离开、刷新等广播仍是明文
+PROTECTED_TYPES = frozenset((
+    MessageType.P2P_MESSAGE,
+    MessageType.BROADCAST_MESSAGE,
+    MessageType.FILE_REQUEST,
+    MessageType.FILE_ACCEPT,
+    MessageType.FILE_REJECT,
+    MessageType.FILE_CANCEL,
+    MessageType.FILE_HAVE,
+))
+PROTECTED_VALUES = frozenset(msg_type.value for msg_type in PROTECTED_TYPES)
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+KEY_SIZE = 32  # 派生出的会话密钥长度，AEAD密钥取其前若干字节
+KEY_ID_SIZE = 4  # 密钥标识：文件数据连接的头部据此选择会话密钥
+SALT_SIZE = 16
+HANDSHAKE_NONCE_SIZE = 16
+MAX_RECORD = 64 * 1024 * 1024  # 文件数据流中单条记录的密文长度上限
+
+_SESSION_INFO = b'chat-session-v1'
+_STREAM_INFO = b'chat-stream-v1'
+_REPLY_INFO = b'chat-stream-reply-v1'
+_RECEIVER_ID = slice(HEADER.size - 4, HEADER.size)  # 帧头中接收者节点ID的位置
+
+
+def available() -> bool:
+    """是否安装了cryptography"""
+    return bool(CIPHERS)
+
+
+def _derive(secret: bytes, salt: bytes, info: bytes, length: int) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=length, salt=salt, info=info).derive(secret)
+
+
+def _aead(cipher: str, key: bytes):
+    aead_class, key_size = CIPHERS[cipher]
+    return aead_class(key[:key_size])
+
+
+class SessionKey:
+    """
+    会话密钥：预先创建AEAD实例，加解密时直接复用
+    """
+
+    __slots__ = ('cipher', 'key', 'key_id', 'aead')
+
+    def __init__(self, cipher: str, material: bytes):
+        """
+        Args:
+            cipher: 算法名（CIPHERS中的键）
+            material: 派生出的KEY_SIZE + KEY_ID_SIZE字节
+        """
+        self.cipher = cipher
+        self.key = material[:KEY_SIZE]
+        self.key_id = material[KEY_SIZE:KEY_SIZE + KEY_ID_SIZE]
+        self.aead = _aead(cipher, self.key)
+
+    def stream(self, salt: bytes) -> 'StreamCipher':
+        """
+        为一次文件传输派生数据流密钥
+
+        Args:
+            salt: 发送方为本次传输随机生成的盐，保证每次传输的密钥都不同
+
+        Returns:
+            StreamCipher: 数据流加解密器
+        """
+        return StreamCipher(self.cipher, _derive(self.key, salt, _STREAM_INFO, KEY_SIZE), self.key_id, salt)
+
+
+class StreamCipher:
+    """
+    文件数据流的AEAD记录层（一个实例只用于一个方向）
+    每条记录为4字节密文长度 + 密文（含16字节认证标签），nonce是记录序号，
+    收发双方各自按顺序计数，记录被篡改、重排、丢弃或重放都无法通过认证；
+    记录在复用的缓冲区中原地加解密（encrypt_into/decrypt_into），发送方可以用reserve
+    直接把文件读进缓冲区，收发都不比明文传输多复制数据
+    """
+
+    def __init__(self, cipher: str, key: bytes, key_id: bytes, salt: bytes):
+        self.cipher = cipher
+        self.key = key
+        self.aead = _aead(cipher, key)
+        self.key_id = key_id
+        self.salt = salt
+        self._counter = 0
+        self._buffer = bytearray()
+
+    def header(self) -> dict:
+        """数据连接头部中说明所用密钥的字段"""
+        return {'key_id': self.key_id.hex(), 'salt': self.salt.hex()}
+
+    def reverse(self) -> 'StreamCipher':
+        """
+        派生反方向（接收方发给发送方的确认和重传请求）的记录层，双方各自调用得到同一个密钥
+
+        Returns:
+            StreamCipher: 反方向的加解密器
+        """
+        return StreamCipher(self.cipher, _derive(self.key, self.salt, _REPLY_INFO, KEY_SIZE),
+                            self.key_id, self.salt)
+
+    def _nonce(self) -> bytes:
+        nonce = self._counter.to_bytes(NONCE_SIZE, 'big')
+        self._counter += 1
+        return nonce
+
+    def _grow(self, size: int) -> memoryview:
+        if len(self._buffer) < size:
+            self._buffer = bytearray(size)
+        return memoryview(self._buffer)
+
+    def allocate(self, size: int):
+        """
+        预先分配能容纳size字节明文的记录缓冲区，避免传输中随块大小增长反复分配
+
+        Args:
+            size: 明文最大长度
+        """
+        self._grow(4 + size + TAG_SIZE)
+
+    def reserve(self, size: int) -> memoryview:
+        """
+        取得缓冲区中存放下一条记录明文的位置，写入n字节后调用seal_reserved(n)
+
+        Args:
+            size: 明文最大长度
+
+        Returns:
+            memoryview: 可写入的缓冲区
+        """
+        return self._grow(4 + size + TAG_SIZE)[4:4 + size]
+
+    def seal_reserved(self, n: int) -> memoryview:
+        """
+        原地加密reserve位置上的n字节明文
+
+        Returns:
+            memoryview: 带长度前缀的记录，下一次调用reserve或seal前有效
+        """
+        view = memoryview(self._buffer)
+        view[:4] = (n + TAG_SIZE).to_bytes(4, 'big')
+        self.aead.encrypt_into(self._nonce(), view[4:4 + n], None, view[4:4 + n + TAG_SIZE])
+        return view[:4 + n + TAG_SIZE]
+
+    def seal(self, data) -> memoryview:
+        """
+        加密一条记录
+
+        Args:
+            data: 明文（bytes或memoryview）
+
+        Returns:
+            memoryview: 带长度前缀的记录，下一次调用reserve或seal前有效
+        """
+        self.reserve(len(data))[:] = data
+        return self.seal_reserved(len(data))
+
+    def recv(self, sock: socket.socket) -> Optional[memoryview]:
+        """
+        从连接中读取并解密一条记录
+
+        Args:
+            sock: 数据连接
+
+        Returns:
+            Optional[memoryview]: 明文，下一次调用recv前有效；连接已关闭时返回None
+
+        Raises:
+            ValueError: 记录长度无效或认证失败
+        """
+        head = bytearray(4)
+        if not _recv_into(sock, memoryview(head)):
+            return None
+        size = int.from_bytes(head, 'big')
+        if not TAG_SIZE <= size <= MAX_RECORD:
+            raise ValueError(f"无效的加密记录长度: {size}")
+        record = self._grow(size)[:size]
+        if not _recv_into(sock, record):
+            return None
+        plain = record[:size - TAG_SIZE]
+        try:
+            self.aead.decrypt_into(self._nonce(), record, None, plain)
+        except InvalidTag:
+            raise ValueError("加密记录认证失败") from None
+        return plain
+
+
+def _recv_into(sock: socket.socket, view: memoryview) -> bool:
+    """填满view，连接关闭时返回False"""
+    while view:
+        n = sock.recv_into(view)
+        if not n:
+            return False
+        view = view[n:]
+    return True
+
+
+class _Session:
+    """与一个成员的会话：对方节点ID、当前密钥、上一个密钥（仍用于解密）和过期时间"""
+
+    __slots__ = ('node_id', 'current', 'previous', 'expires')
+
+    def __init__(self, node_id: bytes):
+        self.node_id = node_id
+        self.current: Optional[SessionKey] = None
+        self.previous: Optional[SessionKey] = None
+        self.expires = 0.0
+
+
+class SecureChannel:
+    """
+    数据报加密层（线程安全），由MessageDispatcher持有
+    send把编码好的帧加密后交给发送函数，没有可用的会话密钥时先协商；
+    open解密收到的加密帧；handle_message处理对方发来的KEY_EXCHANGE
+    """
+
+    def __init__(self, local_id: bytes, send: Callable[[bytes, tuple], None],
+                 cipher: str = SECURE_CIPHER,
+                 ttl: float = SECURE_SESSION_TTL,
+                 handshake_timeout: float = SECURE_HANDSHAKE_TIMEOUT,
+                 plaintext_retry: float = SECURE_PLAINTEXT_RETRY,
+                 required: bool = SECURE_REQUIRED,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化加密层
+
+        Args:
+            local_id: 本节点的4字节节点ID
+            send: 发送函数，参数为(数据报, 地址)
+            cipher: 发起协商时选用的算法
+            ttl: 会话密钥有效期（秒）
+            handshake_timeout: 等待协商回复的时间（秒）
+            plaintext_retry: 对方未回复协商时，该时间（秒）内直接以明文发送
+            required: 为True时不以明文发送受保护的消息，也不接受明文的受保护消息
+            clock: 时钟函数，便于测试替换
+        """
+        if cipher not in CIPHERS:
+            raise ValueError(f"不支持的加密算法: {cipher}")
+        self.local_id = local_id
+        self.cipher = cipher
+        self.ttl = ttl
+        self.handshake_timeout = handshake_timeout
+        self.plaintext_retry = plaintext_retry
+        self.required = required
+        self.clock = clock
+        self._send = send
+        self._private = X25519PrivateKey.generate()
+        self.public_key = self._private.public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        self._lock = threading.Lock()
+        # 对方消息地址 -> 会话
+        self._sessions: Dict[tuple, _Session] = {}
+        # 对方节点ID -> 会话，解密时按帧头中的发送者查找
+        self._by_node: Dict[bytes, _Session] = {}
+        # (对方IP, 消息端口, 节点ID) -> 首次协商时的公钥
+        self._pinned: Dict[tuple, bytes] = {}
+        # 协商成功过的对方地址和节点ID，此后不再与它们以明文收发受保护的消息
+        self._negotiated_addrs: Set[tuple] = set()
+        self._negotiated_nodes: Set[bytes] = set()
+        # 对方消息地址 -> {'nonce', 'packets', 'timer'}，本节点发起、尚未得到回复的协商
+        self._pending: Dict[tuple, dict] = {}
+        # 对方消息地址 -> 在该时间之前直接以明文发送（对方没有回复协商）
+        self._plaintext_until: Dict[tuple, float] = {}
+
+    # ========== 发送 ==========
+
+    def send(self, packet: bytes, addr: tuple) -> bool:
+        """
+        加密发送一个帧，与对方还没有会话密钥时暂存并发起协商
+
+        Args:
+            packet: encode_packet编码的帧
+            addr: 对方消息地址
+
+        Returns:
+            bool: 是否已发送或暂存（SECURE_REQUIRED且对方不支持加密时为False）
+
+        Raises:
+            ValueError: 加密后正文超过帧长度上限
+        """
+        if len(packet) - HEADER.size + NONCE_SIZE + TAG_SIZE > 0xFFFF:
+            raise ValueError(f"消息过长: {len(packet)} 字节")
+        receiver = packet[_RECEIVER_ID]
+        now = self.clock()
+        key = handshake = None
+        plaintext = False
+        with self._lock:
+            session = self._sessions.get(addr)
+            if session is not None and receiver != ANY_NODE and receiver != session.node_id:
+                # 对方在同一地址上重启，节点ID已变化
+                self._forget(addr)
+                session = None
+            if session is not None and now < session.expires:
+                key = session.current
+            elif self._plaintext_until.get(addr, 0.0) > now:
+                plaintext = True
+            else:
+                pending = self._pending.get(addr)
+                if pending is None:
+                    pending = handshake = self._start_handshake(addr)
+                if len(pending['packets']) < SECURE_MAX_PENDING:
+                    pending['packets'].append(packet)
+                else:
+                    logger.warning("等待与 %s 协商密钥的消息过多，丢弃新消息", addr[0])
+        if key is not None:
+            self._send(self._seal(packet, key), addr)
+        elif plaintext:
+            if self.required:
+                return False
+            self._send(packet, addr)
+        elif handshake is not None:
+            self._send_key_exchange(addr, receiver, handshake['nonce'], self.cipher)
+        return True
+
+    @staticmethod
+    def _seal(packet: bytes, key: SessionKey) -> bytes:
+        """加密帧的正文，帧头（置SEALED标志、改为密文长度）作为附加数据"""
+        _, _, code, length, sender, receiver = HEADER.unpack_from(packet)
+        header = HEADER.pack(MAGIC, VERSION, code | SEALED, length + NONCE_SIZE + TAG_SIZE, sender, receiver)
+        nonce = os.urandom(NONCE_SIZE)
+        return header + nonce + key.aead.encrypt(nonce, packet[HEADER.size:], header)
+
+    # ========== 接收 ==========
+
+    def open(self, data: bytes, frame: Frame, addr: tuple) -> Optional[bytes]:
+        """
+        解密收到的加密帧
+
+        Args:
+            data: 数据报内容
+            frame: 其中的加密帧
+            addr: 数据报的来源地址
+
+        Returns:
+            Optional[bytes]: 明文正文；来源地址上没有帧头中发送者的会话密钥或认证失败时返回None
+        """
+        with self._lock:
+            session = self._sessions.get(addr)
+            if session is None or session.node_id != frame.sender:
+                # 对方从与消息地址不同的地址发出（多网卡），按节点ID查找
+                session = self._by_node.get(frame.sender)
+        if session is None or frame.end - frame.start < NONCE_SIZE + TAG_SIZE:
+            return None
+        header = data[frame.start - HEADER.size:frame.start]
+        nonce = data[frame.start:frame.start + NONCE_SIZE]
+        ciphertext = data[frame.start + NONCE_SIZE:frame.end]
+        for key in (session.current, session.previous):
+            if key is None:
+                continue
+            try:
+                return key.aead.decrypt(nonce, ciphertext, header)
+            except InvalidTag:
+                continue
+        return None
+
+    def accepts_plaintext(self, msg_type: MessageType, sender: bytes, addr: tuple) -> bool:
+        """
+        是否处理明文消息：SECURE_REQUIRED时，或者与来源地址、帧头中的发送者协商成功过时，
+        拒绝明文的受保护消息
+
+        Args:
+            msg_type: 消息类型
+            sender: 帧头中的发送者节点ID
+            addr: 数据报的来源地址
+        """
+        if msg_type not in PROTECTED_TYPES:
+            return True
+        if self.required:
+            return False
+        with self._lock:
+            return addr not in self._negotiated_addrs and sender not in self._negotiated_nodes
+
+    # ========== 文件数据流 ==========
+
+    def stream_to(self, addr: tuple) -> Optional[StreamCipher]:
+        """
+        为发往对方的文件数据创建加密器（发送方调用）
+
+        Args:
+            addr: 对方消息地址
+
+        Returns:
+            Optional[StreamCipher]: 与对方还没有会话密钥时返回None
+        """
+        with self._lock:
+            session = self._sessions.get(addr)
+            key = session.current if session else None
+        return key.stream(os.urandom(SALT_SIZE)) if key else None
+
+    def stream_from(self, node_id: str, encryption: dict) -> Optional[StreamCipher]:
+        """
+        按数据连接头部中的密钥标识为收到的文件数据创建解密器（接收方调用）
+
+        Args:
+            node_id: 发送方节点ID
+            encryption: 头部中的encryption字段（StreamCipher.header）
+
+        Returns:
+            Optional[StreamCipher]: 找不到对应的会话密钥时返回None
+        """
+        try:
+            key_id = bytes.fromhex(encryption['key_id'])
+            salt = bytes.fromhex(encryption['salt'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        with self._lock:
+            session = self._by_node.get(node_id_bytes(node_id))
+            keys = (session.current, session.previous) if session else ()
+        for key in keys:
+            if key is not None and key.key_id == key_id:
+                return key.stream(salt)
+        return None
+
+    # ========== 密钥协商 ==========
+
+    def _start_handshake(self, addr: tuple) -> dict:
+        """登记一次发起的协商（调用方持有_lock）"""
+        nonce = os.urandom(HANDSHAKE_NONCE_SIZE)
+        timer = threading.Timer(self.handshake_timeout, self._handshake_expired, (addr, nonce))
+        timer.daemon = True
+        pending = {'nonce': nonce, 'packets': [], 'timer': timer}
+        self._pending[addr] = pending
+        timer.start()
+        return pending
+
+    def _send_key_exchange(self, addr: tuple, receiver: bytes, nonce: bytes, cipher: str,
+                           echo: Optional[bytes] = None):
+        """发送协商请求（echo为None）或回复（echo为请求中的nonce）"""
+        message = {
+            'msg_type': MessageType.KEY_EXCHANGE.value,
+            'sender_id': self.local_id.hex(),
+            'public_key': self.public_key.hex(),
+            'nonce': nonce.hex(),
+            'cipher': cipher,
+        }
+        if receiver != ANY_NODE:
+            message['receiver_id'] = receiver.hex()
+        if echo is not None:
+            message['echo'] = echo.hex()
+        try:
+            self._send(encode_packet(message), addr)
+        except Exception as e:
+            logger.warning("发送密钥协商消息失败: %s", e)
+
+    def handle_message(self, message: dict, addr: tuple):
+        """
+        处理KEY_EXCHANGE消息（由MessageDispatcher分发过来）
+        收到请求时派生会话密钥并回复；收到回复时核对nonce后派生同一个密钥，
+        然后加密发出协商期间暂存的消息
+
+        Args:
+            message: 消息字典
+            addr: 对方消息地址
+        """
+        try:
+            peer_id = bytes.fromhex(message['sender_id'])
+            public_key = bytes.fromhex(message['public_key'])
+            nonce = bytes.fromhex(message['nonce'])
+            cipher = message['cipher']
+            echo = bytes.fromhex(message['echo']) if 'echo' in message else None
+        except (KeyError, TypeError, ValueError, AttributeError):
+            logger.warning("无效的密钥协商消息: %s", addr[0])
+            return
+        if (len(peer_id) != 4 or peer_id == ANY_NODE or len(public_key) != 32
+                or len(nonce) != HANDSHAKE_NONCE_SIZE or cipher not in CIPHERS):
+            logger.warning("无效的密钥协商消息: %s", addr[0])
+            return
+        with self._lock:
+            pinned = self._pinned.setdefault((addr[0], addr[1], peer_id), public_key)
+        if pinned != public_key:
+            logger.warning("节点 %s (%s) 的公钥与之前不同，拒绝协商", peer_id.hex(), addr[0])
+            return
+        try:
+            secret = self._private.exchange(X25519PublicKey.from_public_bytes(public_key))
+        except ValueError as e:
+            logger.warning("密钥协商失败 (%s): %s", addr[0], e)
+            return
+
+        if echo is None:
+            # 对方发起：nonce和公钥都按(发起方, 响应方)的顺序参与派生
+            own_nonce = os.urandom(HANDSHAKE_NONCE_SIZE)
+            key = SessionKey(cipher, _derive(secret, nonce + own_nonce,
+                                             _SESSION_INFO + cipher.encode() + public_key + self.public_key,
+                                             KEY_SIZE + KEY_ID_SIZE))
+            with self._lock:
+                self._install(addr, peer_id, key)
+                self._send_key_exchange(addr, peer_id, own_nonce, cipher, echo=nonce)
+                # 本节点同时发起的协商仍在等待回复，暂存的消息先用这个密钥发出
+                pending = self._pending.get(addr)
+                if pending:
+                    packets, pending['packets'] = pending['packets'], []
+                    self._flush(packets, addr, key)
+        else:
+            with self._lock:
+                pending = self._pending.get(addr)
+                if pending is None or pending['nonce'] != echo:
+                    return
+                del self._pending[addr]
+                pending['timer'].cancel()
+                key = SessionKey(cipher, _derive(secret, echo + nonce,
+                                                 _SESSION_INFO + cipher.encode() + self.public_key + public_key,
+                                                 KEY_SIZE + KEY_ID_SIZE))
+                self._install(addr, peer_id, key)
+                self._flush(pending['packets'], addr, key)
+
+    def _flush(self, packets: list, addr: tuple, key: Optional[SessionKey]):
+        """
+        发出暂存的消息（调用方持有_lock）：在锁内发出，保证它们排在启用密钥之后
+        其他线程直接加密发送的消息之前，不改变消息顺序
+        """
+        for packet in packets:
+            try:
+                self._send(self._seal(packet, key) if key else packet, addr)
+            except Exception as e:
+                logger.warning("发送消息失败: %s", e)
+
+    def _install(self, addr: tuple, peer_id: bytes, key: SessionKey):
+        """启用新的会话密钥，上一个密钥保留用于解密（调用方持有_lock）"""
+        session = self._sessions.get(addr)
+        if session is None or session.node_id != peer_id:
+            self._forget(addr)
+            # 会话只属于这一个地址，其他地址上冒用同一节点ID的协商不影响它
+            session = self._sessions[addr] = _Session(peer_id)
+        session.previous = session.current
+        session.current = key
+        session.expires = self.clock() + self.ttl
+        self._by_node[peer_id] = session
+        self._plaintext_until.pop(addr, None)
+        self._negotiated_addrs.add(addr)
+        self._negotiated_nodes.add(peer_id)
+
+    def _forget(self, addr: tuple):
+        """删除地址上的会话（调用方持有_lock）"""
+        session = self._sessions.pop(addr, None)
+        if session is not None and self._by_node.get(session.node_id) is session:
+            del self._by_node[session.node_id]
+
+    def _handshake_expired(self, addr: tuple, nonce: bytes):
+        """
+        协商超时：已有会话密钥时加密发出暂存的消息，否则以明文发出；
+        SECURE_REQUIRED时或与该地址协商成功过时丢弃，不降级为明文
+        """
+        with self._lock:
+            pending = self._pending.get(addr)
+            if pending is None or pending['nonce'] != nonce:
+                return
+            del self._pending[addr]
+            session = self._sessions.get(addr)
+            key = session.current if session else None
+            packets = pending['packets']
+            if key is None:
+                # 协商成功过的地址下次发送时重新协商，其余地址在一段时间内不再尝试
+                if addr not in self._negotiated_addrs:
+                    self._plaintext_until[addr] = self.clock() + self.plaintext_retry
+                if self.required or addr in self._negotiated_addrs:
+                    logger.warning("%s 未回复密钥协商，丢弃 %d 条消息", addr[0], len(packets))
+                    return
+                if packets:
+                    logger.info("%s 未回复密钥协商，以明文发送 %d 条消息", addr[0], len(packets))
+            self._flush(packets, addr, key)
+
+    # ========== 状态 ==========
+
+    def stats(self) -> dict:
+        """会话数、进行中的协商数和以明文通信的成员数"""
+        now = self.clock()
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'pending': len(self._pending),
+                'plaintext': sum(1 for until in self._plaintext_until.values() if until > now),
+            }
+
+    def stop(self):
+        """取消进行中的协商，丢弃暂存的消息"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for entry in pending.values():
+            entry['timer'].cancel()
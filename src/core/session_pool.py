@@ -0,0 +1,144 @@
+"""
+数据连接池模块
+功能：发送方按对方地址保存传输完成后的空闲TCP连接，下一次向同一成员发送文件时直接复用，
+省去建立连接和TCP慢启动；空闲过久的连接被关闭。
+接收方在传输完成后保留连接等待下一个头部，空闲超时是发送方的两倍，
+保证总是发送方先放弃连接，不会复用到对方刚关闭的连接
+"""
+
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from ..common.config import *
+from ..common.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _is_stale(sock: socket.socket) -> bool:
+    """
+    空闲连接上不应有任何数据可读：可读说明对方已关闭连接（或协议已错乱）
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class SessionPool:
+    """
+    发送方的空闲连接池（线程安全）
+    同一成员的并发传输各自占用一个连接，传输成功结束后归还，最多保留max_idle个空闲连接
+    """
+
+    def __init__(self, idle_timeout: float = TCP_POOL_IDLE_TIMEOUT,
+                 max_idle: int = TCP_POOL_MAX_IDLE):
+        """
+        初始化连接池
+
+        Args:
+            idle_timeout: 空闲连接保留时间（秒）
+            max_idle: 每个对方最多保留的空闲连接数，0表示不复用连接
+        """
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.connections_created = 0
+        self.connections_reused = 0
+        self._lock = threading.Lock()
+        # (ip, port) -> [(socket, 归还时间)]，越靠右越是最近归还
+        self._idle: Dict[Tuple[str, int], Deque[Tuple[socket.socket, float]]] = {}
+
+    def acquire(self, addr: Tuple[str, int]) -> Tuple[socket.socket, Optional[float]]:
+        """
+        取得到对方的连接：优先复用最近归还的空闲连接，没有时新建
+
+        Args:
+            addr: 对方的(IP, TCP端口)
+
+        Returns:
+            Tuple[socket.socket, Optional[float]]: 连接，以及新建连接时测得的往返时间（秒）
+
+        Raises:
+            OSError: 无法连接
+        """
+        while True:
+            with self._lock:
+                idle = self._idle.get(addr)
+                if not idle:
+                    break
+                sock, _ = idle.pop()
+                if not idle:
+                    del self._idle[addr]
+            if _is_stale(sock):
+                sock.close()
+                continue
+            with self._lock:
+                self.connections_reused += 1
+            sock.settimeout(SOCKET_TIMEOUT)
+            return sock, None
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(SOCKET_TIMEOUT)
+        started = time.monotonic()
+        try:
+            sock.connect(addr)
+        except OSError:
+            sock.close()
+            raise
+        with self._lock:
+            self.connections_created += 1
+        return sock, time.monotonic() - started
+
+    def release(self, addr: Tuple[str, int], sock: socket.socket):
+        """
+        归还传输成功结束的连接；传输失败的连接状态未知，调用方应直接关闭
+
+        Args:
+            addr: 对方的(IP, TCP端口)
+            sock: 连接
+        """
+        with self._lock:
+            idle = self._idle.setdefault(addr, deque())
+            if len(idle) < self.max_idle:
+                idle.append((sock, time.monotonic()))
+                return
+            if not idle:
+                del self._idle[addr]
+        sock.close()
+
+    def evict_idle(self) -> int:
+        """
+        关闭空闲超时的连接
+
+        Returns:
+            int: 关闭的连接数
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        expired = []
+        with self._lock:
+            for addr, idle in list(self._idle.items()):
+                while idle and idle[0][1] <= deadline:
+                    expired.append(idle.popleft()[0])
+                if not idle:
+                    del self._idle[addr]
+        for sock in expired:
+            sock.close()
+        return len(expired)
+
+    def idle_count(self) -> int:
+        """空闲连接数"""
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for sock, _ in connections:
+                sock.close()
@@ -0,0 +1,476 @@
+"""
+多人分发模块
+功能：把一个文件同时分发给多个成员。文件按分块清单（见manifest模块）切成带哈希的分块，
+接收方一边下载一边把已校验的分块提供给其他接收方，发送方的上行带宽不再是瓶颈；
+分块请求走文件传输的TCP端口，连接头部带swarm_id与普通传输区分
+
+连接协议（头部之后由下载方逐个发送4字节请求号）：
+    0..N-1       请求分块：回复 b'1' + 分块数据，没有该分块时回复 b'0'
+    0xFFFFFFFF   请求位图：回复4字节长度 + 已有分块的位图
+    0xFFFFFFFE   请求分块清单：回复4字节长度 + JSON
+"""
+
+import json
+import random
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..common.config import *
+from ..common.message_types import *
+from ..common.utils import *
+from ..common.logger import get_logger
+from .manifest import Manifest
+from .transfer_manager import TransferCancelled, TransferTask
+
+logger = get_logger(__name__)
+
+_REQUEST_BITFIELD = 0xFFFFFFFF
+_REQUEST_MANIFEST = 0xFFFFFFFE
+_BITFIELD_REFRESH = 0.2  # 对方的位图超过该时间（秒）未更新时重新询问
+_IDLE_WAIT = 0.02  # 暂时没有可下载的分块时的等待时间（秒）
+_PEER_RETRY = 1.0  # 连接某成员失败后，隔多久再尝试（秒）
+
+# 发送方记录的接收者状态
+RECIPIENT_OFFERED = 'offered'
+RECIPIENT_ACCEPTED = 'accepted'
+RECIPIENT_DONE = 'done'
+RECIPIENT_REJECTED = 'rejected'
+RECIPIENT_FAILED = 'failed'
+
+
+def peer_key(member: Member) -> str:
+    """成员标识，与TransferTask.peer_key一致"""
+    return member.node_id or f"{member.ip}:{member.udp_port}"
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        data += chunk
+    return bytes(data)
+
+
+class PieceSet:
+    """分块位图"""
+
+    def __init__(self, count: int, full: bool = False):
+        self.count = count
+        self._bits = bytearray(b'\xff' * ((count + 7) // 8) if full else (count + 7) // 8)
+        self._have = count if full else 0
+
+    @classmethod
+    def from_bytes(cls, count: int, data: bytes) -> 'PieceSet':
+        pieces = cls(count)
+        pieces._bits[:len(data)] = data[:len(pieces._bits)]
+        pieces._have = sum(1 for i in range(count) if i in pieces)
+        return pieces
+
+    def __contains__(self, index: int) -> bool:
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def __len__(self) -> int:
+        return self._have
+
+    def add(self, index: int):
+        if index not in self:
+            self._bits[index >> 3] |= 1 << (index & 7)
+            self._have += 1
+
+    @property
+    def complete(self) -> bool:
+        return self._have >= self.count
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+
+class SwarmSession:
+    """
+    一次分发在本节点上的状态：文件位置、分块清单和已有分块
+    发送方创建时已有全部分块；接收方边下载边向其他成员提供已有分块
+    """
+
+    def __init__(self, swarm_id: str, path: str, filesize: int, piece_size: int,
+                 manifest: Optional[Manifest] = None):
+        """
+        初始化分发状态
+
+        Args:
+            swarm_id: 分发ID（即传输ID）
+            path: 本地文件路径
+            filesize: 文件大小
+            piece_size: 分块大小
+            manifest: 分块清单，给出时表示本地已有完整文件
+        """
+        self.swarm_id = swarm_id
+        self.path = path
+        self.filesize = filesize
+        self.piece_size = piece_size
+        self.piece_count = (filesize + piece_size - 1) // piece_size
+        self.manifest = manifest
+        self.have = PieceSet(self.piece_count, full=manifest is not None)
+        self.bytes_served = 0
+        # 多个连接处理线程同时向其他成员提供分块
+        self._lock = threading.Lock()
+
+    def piece_range(self, index: int) -> Tuple[int, int]:
+        """分块的(偏移, 长度)"""
+        offset = index * self.piece_size
+        return offset, min(self.piece_size, self.filesize - offset)
+
+    def verify(self, index: int, data: bytes) -> bool:
+        """校验分块内容"""
+        return self.manifest.verify(index, data)
+
+    def serve(self, sock: socket.socket):
+        """
+        响应其他成员的分块请求，直到对方关闭连接（在连接处理线程中执行）
+
+        接收方登记分发状态时文件可能还没有创建，因此只在对方请求本地已有的分块时才打开文件
+        （已有分块说明文件已创建并写入了该分块），打开失败时按没有该分块回复
+
+        Args:
+            sock: 已读取过头部的连接
+        """
+        sock.settimeout(SOCKET_TIMEOUT)
+        f = None
+        try:
+            while True:
+                try:
+                    request = _recv_exact(sock, 4)
+                except (ConnectionError, OSError):
+                    return
+                index = int.from_bytes(request, 'big')
+                if index == _REQUEST_BITFIELD:
+                    data = self.have.to_bytes()
+                    sock.sendall(len(data).to_bytes(4, 'big') + data)
+                elif index == _REQUEST_MANIFEST:
+                    data = json.dumps(self.manifest.to_dict() if self.manifest else None).encode('ascii')
+                    sock.sendall(len(data).to_bytes(4, 'big') + data)
+                elif index >= self.piece_count or index not in self.have:
+                    sock.sendall(b'0')
+                else:
+                    if f is None:
+                        try:
+                            f = open(self.path, 'rb')
+                        except FileNotFoundError:
+                            logger.warning("分发的文件不存在: %s", self.path)
+                            sock.sendall(b'0')
+                            continue
+                    offset, length = self.piece_range(index)
+                    f.seek(offset)
+                    sock.sendall(b'1' + f.read(length))
+                    with self._lock:
+                        self.bytes_served += length
+        finally:
+            if f is not None:
+                f.close()
+
+
+class SwarmSeed:
+    """
+    发送方记录的一次分发：各接收者的回应状态，以及未回应请求的重发和超时
+    """
+
+    def __init__(self, recipients: List[Member]):
+        now = time.monotonic()
+        self._lock = threading.Lock()
+        self.recipients: Dict[str, dict] = {
+            peer_key(member): {
+                'member': member,
+                'state': RECIPIENT_OFFERED,
+                'deadline': now + FILE_OFFER_TIMEOUT,
+                'next_retry': now + FILE_OFFER_RETRY_INTERVAL,
+            }
+            for member in recipients
+        }
+        self.done = threading.Event()
+        self._check_done()
+
+    def on_reply(self, member: Member, msg_type: MessageType) -> Optional[str]:
+        """
+        记录接收者的回应
+
+        Args:
+            member: 回应的成员
+            msg_type: FILE_ACCEPT（接受或仍在下载）、FILE_HAVE（已完成）或FILE_REJECT
+
+        Returns:
+            Optional[str]: 变化后的状态，没有变化时为None
+        """
+        with self._lock:
+            entry = self.recipients.get(peer_key(member))
+            if entry is None or entry['state'] not in (RECIPIENT_OFFERED, RECIPIENT_ACCEPTED):
+                return None
+            entry['deadline'] = time.monotonic() + FILE_OFFER_TIMEOUT
+            if msg_type == MessageType.FILE_HAVE:
+                state = RECIPIENT_DONE
+            elif msg_type == MessageType.FILE_REJECT:
+                # 接受之后再拒绝说明对方下载失败
+                state = RECIPIENT_FAILED if entry['state'] == RECIPIENT_ACCEPTED else RECIPIENT_REJECTED
+            else:
+                state = RECIPIENT_ACCEPTED
+            changed = state != entry['state']
+            entry['state'] = state
+            self._check_done()
+        return state if changed else None
+
+    def due(self) -> List[Member]:
+        """
+        处理超时：未回应的请求到期重发，长时间没有消息的接收者记为失败
+
+        Returns:
+            List[Member]: 需要重发请求的成员
+        """
+        now = time.monotonic()
+        resend = []
+        with self._lock:
+            for entry in self.recipients.values():
+                if entry['state'] not in (RECIPIENT_OFFERED, RECIPIENT_ACCEPTED):
+                    continue
+                if now >= entry['deadline']:
+                    entry['state'] = RECIPIENT_FAILED
+                elif entry['state'] == RECIPIENT_OFFERED and now >= entry['next_retry']:
+                    entry['next_retry'] = now + FILE_OFFER_RETRY_INTERVAL
+                    resend.append(entry['member'])
+            self._check_done()
+        return resend
+
+    def count(self, state: str) -> int:
+        with self._lock:
+            return sum(1 for entry in self.recipients.values() if entry['state'] == state)
+
+    def pending(self) -> List[Member]:
+        """尚未结束的接收者"""
+        with self._lock:
+            return [entry['member'] for entry in self.recipients.values()
+                    if entry['state'] in (RECIPIENT_OFFERED, RECIPIENT_ACCEPTED)]
+
+    def _check_done(self):
+        if all(entry['state'] not in (RECIPIENT_OFFERED, RECIPIENT_ACCEPTED)
+               for entry in self.recipients.values()):
+            self.done.set()
+
+
+class SwarmDownloader:
+    """
+    接收方的分块下载：若干个工作线程各自选择一个成员建立连接，
+    随机挑选本地缺少、对方已有的分块下载，校验后写入文件；
+    优先从其他接收方下载，同一时刻只有一个线程向发送方请求
+    """
+
+    def __init__(self, session: SwarmSession, seeder: Member, peers: List[Member],
+                 task: TransferTask, content_hash: str,
+                 on_piece: Callable[[int], None],
+                 heartbeat: Callable[[], None],
+                 parallel: int = SWARM_PARALLEL_PIECES):
+        """
+        初始化下载
+
+        Args:
+            session: 本地分发状态（尚无分块清单）
+            seeder: 发送方
+            peers: 其他接收方
+            task: 接收任务，用于响应暂停、取消和限速
+            content_hash: 请求中的内容哈希，即分块清单的根哈希
+            on_piece: 每拿到一个分块调用一次，参数为字节数
+            heartbeat: 定期调用，向发送方表明仍在下载
+            parallel: 同时下载的连接数
+        """
+        self.session = session
+        self.seeder = seeder
+        self.task = task
+        self.content_hash = content_hash
+        self.on_piece = on_piece
+        self.heartbeat = heartbeat
+        self.parallel = parallel
+
+        self._seeder_key = peer_key(seeder)
+        self._peers: Dict[str, Member] = {peer_key(m): m for m in peers}
+        self._peers.pop(self._seeder_key, None)
+        self._lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._busy = set()
+        self._in_flight = set()
+        self._bitfields: Dict[str, Tuple[PieceSet, float]] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._order = list(range(session.piece_count))
+        random.shuffle(self._order)
+        self._file = None
+        self._cancelled = False
+        self._last_progress = time.monotonic()
+
+    def run(self) -> bool:
+        """
+        下载整个文件（在接收工作线程中执行）
+
+        Returns:
+            bool: 是否下载完整
+
+        Raises:
+            TransferCancelled: 任务被取消
+        """
+        self._fetch_manifest()
+        with open(self.session.path, 'wb') as f:
+            f.truncate(self.session.filesize)
+        with open(self.session.path, 'r+b', buffering=0) as self._file:
+            workers = [threading.Thread(target=self._worker, daemon=True)
+                       for _ in range(min(self.parallel, max(1, self.session.piece_count)))]
+            for worker in workers:
+                worker.start()
+            next_heartbeat = time.monotonic() + FILE_OFFER_RETRY_INTERVAL
+            while True:
+                alive = [worker for worker in workers if worker.is_alive()]
+                if not alive:
+                    break
+                alive[0].join(_BITFIELD_REFRESH)
+                now = time.monotonic()
+                if now >= next_heartbeat:
+                    next_heartbeat = now + FILE_OFFER_RETRY_INTERVAL
+                    self.heartbeat()
+                if now - self._last_progress > SWARM_STALL_TIMEOUT:
+                    logger.warning("长时间没有拿到新分块，放弃下载: %s", self.session.swarm_id)
+                    self._stop.set()
+                if self.task.cancelled:
+                    self._stop.set()
+        if self._cancelled or self.task.cancelled:
+            raise TransferCancelled(self.task.transfer_id)
+        return self.session.have.complete
+
+    def _fetch_manifest(self):
+        """从发送方取得分块清单，并用请求中的根哈希校验"""
+        with self._connect(self.seeder) as sock:
+            sock.sendall(_REQUEST_MANIFEST.to_bytes(4, 'big'))
+            length = int.from_bytes(_recv_exact(sock, 4), 'big')
+            manifest = Manifest.from_dict(json.loads(_recv_exact(sock, length).decode('ascii')) or {})
+        if (manifest.root != self.content_hash or manifest.filesize != self.session.filesize
+                or manifest.block_size != self.session.piece_size):
+            raise ValueError("分块清单校验失败")
+        self.session.manifest = manifest
+
+    def _connect(self, member: Member) -> socket.socket:
+        sock = socket.create_connection((member.ip, member.tcp_port), timeout=SOCKET_TIMEOUT)
+        header = serialize_message({'swarm_id': self.session.swarm_id})
+        sock.sendall(len(header).to_bytes(4, 'big') + header)
+        return sock
+
+    # ========== 工作线程 ==========
+
+    def _worker(self):
+        try:
+            while not self._stop.is_set():
+                key = self._acquire_peer()
+                if key is None:
+                    self._stop.wait(_IDLE_WAIT)
+                    continue
+                member = self.seeder if key == self._seeder_key else self._peers[key]
+                try:
+                    self._fetch_from(key, member)
+                except (OSError, ValueError) as e:
+                    logger.debug("从 %s 下载分块失败: %s", member.username, e)
+                    with self._lock:
+                        self._retry_at[key] = time.monotonic() + _PEER_RETRY
+                finally:
+                    with self._lock:
+                        self._busy.discard(key)
+        except TransferCancelled:
+            self._cancelled = True
+            self._stop.set()
+
+    def _acquire_peer(self) -> Optional[str]:
+        """
+        选择下一个连接的成员：已知有所需分块的接收方优先，其次是发送方，
+        最后是位图已过期、需要重新询问的接收方
+        """
+        with self._lock:
+            if self.session.have.complete:
+                self._stop.set()
+                return None
+            now = time.monotonic()
+            useful, stale = [], []
+            for key in self._peers:
+                if key in self._busy or self._retry_at.get(key, 0) > now:
+                    continue
+                known = self._bitfields.get(key)
+                if known and self._next_piece(known[0]) is not None:
+                    useful.append(key)
+                elif known is None or now - known[1] >= _BITFIELD_REFRESH:
+                    stale.append(key)
+            if useful:
+                choice = random.choice(useful)
+            elif self._seeder_key not in self._busy and self._retry_at.get(self._seeder_key, 0) <= now:
+                choice = self._seeder_key
+            elif stale:
+                choice = random.choice(stale)
+            else:
+                return None
+            self._busy.add(choice)
+            return choice
+
+    def _next_piece(self, available: PieceSet) -> Optional[int]:
+        """在持有锁时调用：从随机位置开始找一个本地缺少、未在下载、对方已有的分块"""
+        have = self.session.have
+        count = len(self._order)
+        start = random.randrange(count) if count else 0
+        for offset in range(count):
+            index = self._order[(start + offset) % count]
+            if index not in have and index not in self._in_flight and index in available:
+                return index
+        return None
+
+    def _fetch_from(self, key: str, member: Member):
+        """连接一个成员，下载它拥有的分块，直到没有可下载的为止"""
+        with self._connect(member) as sock:
+            available = self._request_bitfield(sock, key)
+            while not self._stop.is_set():
+                with self._lock:
+                    index = self._next_piece(available)
+                    if index is not None:
+                        self._in_flight.add(index)
+                if index is None:
+                    return
+                try:
+                    sock.sendall(index.to_bytes(4, 'big'))
+                    data = None
+                    if _recv_exact(sock, 1) == b'1':
+                        data = _recv_exact(sock, self.session.piece_range(index)[1])
+                    if data is None:
+                        # 对方的位图已过期
+                        available = self._request_bitfield(sock, key)
+                        continue
+                    if not self.session.verify(index, data):
+                        logger.warning("分块 %d 校验失败，来自 %s", index, member.username)
+                        raise ValueError("分块校验失败")
+                    self._store(index, data)
+                finally:
+                    with self._lock:
+                        self._in_flight.discard(index)
+
+    def _request_bitfield(self, sock: socket.socket, key: str) -> PieceSet:
+        sock.sendall(_REQUEST_BITFIELD.to_bytes(4, 'big'))
+        length = int.from_bytes(_recv_exact(sock, 4), 'big')
+        available = PieceSet.from_bytes(self.session.piece_count, _recv_exact(sock, length))
+        with self._lock:
+            self._bitfields[key] = (available, time.monotonic())
+        return available
+
+    def _store(self, index: int, data: bytes):
+        offset, length = self.session.piece_range(index)
+        with self._file_lock:
+            self._file.seek(offset)
+            self._file.write(data)
+        with self._lock:
+            self.session.have.add(index)
+            self._last_progress = time.monotonic()
+            if self.session.have.complete:
+                self._stop.set()
+        with self._progress_lock:
+            self.on_piece(length)
+            self.task.checkpoint(length)
@@ -0,0 +1,209 @@
+"""
+TLS文件通道模块
+功能：文件数据连接可选地用标准库ssl包装为TLS 1.3连接，代替会话密钥加密（StreamCipher）
+
+- 每个节点启动时生成自签名证书（ECDSA P-256），证书的SHA-256指纹写入本地成员信息，
+  随发现和加入消息通告；发送方连接后核对对方证书与通告的指纹是否一致（证书固定），
+  不依赖CA和主机名
+- 接收方签发TLS会话票据，发送方按对方地址缓存会话，下次新建连接时恢复会话，
+  省去完整握手；复用连接池中的空闲连接时则不需要任何握手
+- Python 3.12及以上版本启用OP_ENABLE_KTLS，平台支持时由内核完成TLS记录加密
+- 只有服务端（接收方）出示证书，接收方仍按传输ID核对连接属于哪次已接受的传输
+
+依赖cryptography生成证书，未安装时available()返回False，文件数据连接不使用TLS
+"""
+
+import datetime
+import hashlib
+import os
+import shutil
+import socket
+import ssl
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from ..common.config import *
+from ..common.logger import get_logger
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    x509 = None
+
+logger = get_logger(__name__)
+
+TLS_RECORD_TYPE = 0x16  # TLS握手记录的类型字节，明文头部的长度字段不会以它开头
+CERT_VALID_DAYS = 365
+
+
+def available() -> bool:
+    """是否安装了cryptography"""
+    return x509 is not None
+
+
+def fingerprint(der: bytes) -> str:
+    """证书指纹：DER编码的SHA-256（十六进制）"""
+    return hashlib.sha256(der).hexdigest()
+
+
+def is_tls_hello(sock: socket.socket) -> bool:
+    """
+    不读走数据，判断新连接的第一个字节是否是TLS握手记录
+
+    Args:
+        sock: 刚接受的连接
+
+    Returns:
+        bool: 对方发起了TLS握手
+    """
+    if isinstance(sock, ssl.SSLSocket):
+        return False
+    try:
+        first = sock.recv(1, socket.MSG_PEEK)
+    except OSError:
+        return False
+    return first == bytes([TLS_RECORD_TYPE])
+
+
+def _self_signed(common_name: str) -> Tuple[bytes, bytes]:
+    """
+    生成自签名证书
+
+    Returns:
+        Tuple[bytes, bytes]: (证书PEM, 私钥PEM)
+    """
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=CERT_VALID_DAYS))
+            .sign(key, hashes.SHA256()))
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    return cert.public_bytes(serialization.Encoding.PEM), key_pem
+
+
+class TlsChannel:
+    """
+    文件数据连接的TLS包装（线程安全）
+    本节点作为接收方时用自己的证书完成握手，作为发送方时核对对方证书指纹并缓存会话用于恢复
+    """
+
+    def __init__(self, common_name: str = 'chat-node', session_cache: int = FILE_TLS_SESSION_CACHE):
+        """
+        生成本节点的证书并创建TLS上下文
+
+        Args:
+            common_name: 证书主题名称（只用于显示，身份以指纹为准）
+            session_cache: 最多缓存多少个对方地址的TLS会话
+        """
+        cert_pem, key_pem = _self_signed(common_name)
+        self.fingerprint = fingerprint(ssl.PEM_cert_to_DER_cert(cert_pem.decode('ascii')))
+        self.session_cache = session_cache
+        self.handshakes = 0
+        self.resumed = 0
+        self._lock = threading.Lock()
+        # (对方地址, 指纹) -> 最近一次连接的TLS会话，越靠后越新
+        self._sessions: 'OrderedDict[tuple, ssl.SSLSession]' = OrderedDict()
+
+        self.server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        # load_cert_chain只接受文件路径，私钥只在加载期间写到仅本用户可读的临时目录中
+        folder = tempfile.mkdtemp(prefix='chat-tls-')
+        try:
+            cert_path, key_path = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+            for path, data in ((cert_path, cert_pem), (key_path, key_pem)):
+                with open(path, 'wb') as f:
+                    f.write(data)
+            self.server_context.load_cert_chain(cert_path, key_path)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+        # 身份由证书指纹确认，不校验证书链和主机名
+        self.client_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        self.client_context.check_hostname = False
+        self.client_context.verify_mode = ssl.CERT_NONE
+        for context in (self.server_context, self.client_context):
+            context.minimum_version = ssl.TLSVersion.TLSv1_3
+            if hasattr(ssl, 'OP_ENABLE_KTLS'):
+                context.options |= ssl.OP_ENABLE_KTLS
+
+    def wrap_client(self, sock: socket.socket, addr: tuple, pinned: str) -> ssl.SSLSocket:
+        """
+        以发送方身份完成TLS握手，有缓存的会话时恢复会话
+
+        Args:
+            sock: 已连接的socket
+            addr: 对方的(IP, TCP端口)
+            pinned: 对方在发现消息中通告的证书指纹
+
+        Returns:
+            ssl.SSLSocket: TLS连接
+
+        Raises:
+            ssl.SSLError: 握手失败
+            ConnectionError: 对方证书与通告的指纹不符
+        """
+        with self._lock:
+            session = self._sessions.get((addr, pinned))
+        tls_sock = self.client_context.wrap_socket(sock, session=session)
+        if fingerprint(tls_sock.getpeercert(binary_form=True) or b'') != pinned:
+            with self._lock:
+                self._sessions.pop((addr, pinned), None)
+            tls_sock.close()
+            raise ConnectionError("对方证书与发现消息中通告的指纹不符")
+        with self._lock:
+            self.handshakes += 1
+            if tls_sock.session_reused:
+                self.resumed += 1
+        return tls_sock
+
+    def wrap_server(self, sock: socket.socket) -> ssl.SSLSocket:
+        """
+        以接收方身份完成TLS握手
+
+        Args:
+            sock: 刚接受的连接（第一个字节是TLS握手记录）
+
+        Returns:
+            ssl.SSLSocket: TLS连接
+
+        Raises:
+            ssl.SSLError: 握手失败
+        """
+        return self.server_context.wrap_socket(sock, server_side=True)
+
+    def save_session(self, addr: tuple, pinned: str, sock: ssl.SSLSocket):
+        """
+        缓存连接的TLS会话，下次连接同一地址时恢复。
+        TLS 1.3的会话票据在握手之后才发出，需在读到对方的数据（如接收确认）之后调用
+
+        Args:
+            addr: 对方的(IP, TCP端口)
+            pinned: 对方的证书指纹
+            sock: 传输成功结束的TLS连接
+        """
+        session = sock.session
+        if session is None or not session.has_ticket:
+            return
+        key = (addr, pinned)
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._sessions[key] = session
+            while len(self._sessions) > self.session_cache:
+                self._sessions.popitem(last=False)
+
+    def stats(self) -> dict:
+        """握手次数（含恢复的会话）、恢复的会话数和缓存的会话数"""
+        with self._lock:
+            return {'handshakes': self.handshakes, 'resumed': self.resumed,
+                    'sessions': len(self._sessions)}
@@ -0,0 +1,494 @@
+"""
+文件传输调度模块
+功能：用有界的工作线程池执行文件传输，支持全局/单成员并发上限、优先级、
+令牌桶带宽限制、暂停/继续/取消，每个传输有唯一的传输ID
+
+发送和接收使用两组独立的工作线程：发送要等对方接收才能完成，
+如果共用一组线程，两端都被发送占满时会互相等待
+"""
+
+import itertools
+import threading
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from ..common.config import (
+    MAX_CONCURRENT_SENDS, MAX_CONCURRENT_RECEIVES, MAX_TRANSFERS_PER_PEER,
+    TRANSFER_BANDWIDTH_LIMIT, MAX_FINISHED_TRANSFERS
+)
+from ..common.message_types import Member
+from ..common.rate_limit import TokenBucket
+from ..common.utils import generate_transfer_id
+from ..common.logger import get_logger
+from ..common.signals import Signal
+
+logger = get_logger(__name__)
+
+# 传输优先级，数值越大越先执行
+PRIORITY_LOW = -1
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+
+
+class TransferDirection(Enum):
+    """传输方向"""
+    SEND = "send"
+    RECEIVE = "receive"
+
+
+class TransferState(Enum):
+    """传输状态"""
+    WAITING = "waiting"  # 等待对方接受（发送）或等待对方连接（接收）
+    QUEUED = "queued"  # 排队中
+    RUNNING = "running"  # 传输中
+    PAUSED = "paused"  # 已暂停
+    COMPLETED = "completed"  # 已完成
+    FAILED = "failed"  # 失败
+    CANCELLED = "cancelled"  # 已取消
+
+
+FINISHED_STATES = (TransferState.COMPLETED, TransferState.FAILED, TransferState.CANCELLED)
+
+
+class TransferCancelled(Exception):
+    """传输被取消，由TransferTask.checkpoint在传输循环中抛出"""
+
+
+class TransferTask:
+    """
+    传输任务
+    runner在工作线程中执行实际传输，返回是否成功；
+    传输循环每处理一个数据块调用一次checkpoint，以响应暂停、取消和限速
+    """
+
+    def __init__(self, direction: TransferDirection, filename: str, peer: Optional[Member],
+                 total_bytes: int, runner: Callable[["TransferTask"], bool],
+                 priority: int = PRIORITY_NORMAL, rate_limit: float = 0,
+                 discard: Optional[Callable[["TransferTask"], None]] = None,
+                 transfer_id: Optional[str] = None, label: str = '',
+                 dedicated: bool = False):
+        """
+        初始化传输任务
+
+        Args:
+            direction: 传输方向
+            filename: 文件名
+            peer: 对方成员，对方不止一个成员时为None
+            total_bytes: 文件总字节数
+            runner: 执行传输的函数，返回是否成功
+            priority: 优先级
+            rate_limit: 本传输的带宽上限（字节/秒），0表示不限速
+            discard: 任务未执行就被取消时的清理函数（如关闭已建立的连接）
+            transfer_id: 传输ID，默认生成新的ID（接收方沿用发送方的ID）
+            label: 显示的对方名称，默认为对方的用户名（如多人分发时为"3名成员"）
+            dedicated: 为True时在独立线程中执行，不占用并发名额
+                （用于多人分发的发送方：长时间等待各接收方，数据由其他线程提供）
+        """
+        self.transfer_id = transfer_id or generate_transfer_id()
+        self.direction = direction
+        self.filename = filename
+        self.peer = peer
+        self.label = label
+        self.dedicated = dedicated
+        self.total_bytes = total_bytes
+        self.priority = priority
+        self.runner = runner
+        self.discard = discard
+        self.state = TransferState.QUEUED
+        self.bytes_done = 0
+        self.bytes_per_sec = 0.0
+        self.tuning = None  # 数据连接采用的传输参数（SocketTuning），建立连接后设置
+
+        self.seq = 0
+        self.bucket = TokenBucket(rate_limit)
+        self.global_bucket: Optional[TokenBucket] = None
+        self._resume = threading.Event()
+        self._resume.set()
+        self._cancel = threading.Event()
+
+    @property
+    def peer_key(self) -> str:
+        """对方成员的标识，用于单成员并发上限"""
+        if self.peer is None:
+            return f"group:{self.transfer_id}"
+        return self.peer.node_id or f"{self.peer.ip}:{self.peer.udp_port}"
+
+    @property
+    def peer_name(self) -> str:
+        """显示的对方名称"""
+        return self.label or (self.peer.username if self.peer else '')
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._resume.is_set()
+
+    def checkpoint(self, nbytes: int):
+        """
+        传输循环每处理一个数据块调用一次：暂停时阻塞，取消时抛出TransferCancelled，
+        超出带宽上限时等待
+
+        Args:
+            nbytes: 本次处理的字节数
+        """
+        self.bytes_done += nbytes
+        if not self._resume.is_set():
+            self._resume.wait()
+        if self._cancel.is_set():
+            raise TransferCancelled(self.transfer_id)
+        delay = self.bucket.reserve(nbytes)
+        if self.global_bucket is not None:
+            delay = max(delay, self.global_bucket.reserve(nbytes))
+        if delay > 0 and self._cancel.wait(delay):
+            raise TransferCancelled(self.transfer_id)
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            'transfer_id': self.transfer_id,
+            'direction': self.direction.value,
+            'filename': self.filename,
+            'peer': self.peer_name,
+            'total_bytes': self.total_bytes,
+            'bytes_done': self.bytes_done,
+            'bytes_per_sec': self.bytes_per_sec,
+            'priority': self.priority,
+            'state': self.state.value,
+            'tuning': self.tuning.to_dict() if self.tuning else None,
+        }
+
+
+class TransferScheduler:
+    """
+    传输调度器
+    任务按优先级（同优先级先到先执行）分配给对应方向的工作线程，
+    工作线程按需创建，数量不超过该方向的并发上限，之后常驻复用
+    标记为dedicated的任务（多人分发的发送方）各自在独立线程中执行，不占用工作线程
+    """
+
+    # 任务状态变化时发射（参数为TransferTask，可能在工作线程中发射）
+    task_updated = Signal(object)
+
+    def __init__(self, max_sends: int = MAX_CONCURRENT_SENDS,
+                 max_receives: int = MAX_CONCURRENT_RECEIVES,
+                 max_per_peer: int = MAX_TRANSFERS_PER_PEER,
+                 bandwidth_limit: float = TRANSFER_BANDWIDTH_LIMIT):
+        """
+        初始化传输调度器
+
+        Args:
+            max_sends: 同时进行的发送数上限
+            max_receives: 同时进行的接收数上限
+            max_per_peer: 与同一成员同时进行的传输数上限（发送和接收分别计算）
+            bandwidth_limit: 所有传输合计的带宽上限（字节/秒），0表示不限速
+        """
+        self.limits = {
+            TransferDirection.SEND: max(1, max_sends),
+            TransferDirection.RECEIVE: max(1, max_receives),
+        }
+        self.max_per_peer = max(1, max_per_peer)
+        self.bandwidth = TokenBucket(bandwidth_limit)
+
+        self._cond = threading.Condition()
+        self._tasks: Dict[str, TransferTask] = {}
+        self._queue: List[TransferTask] = []
+        # (方向, 成员标识) -> 进行中的传输数；发送和接收分别计数，双方同时互相发送时
+        # 不会因为各自的名额都被等待对方接收的发送占满而互相等待
+        self._running_per_peer: Dict[tuple, int] = {}
+        self._workers: Dict[TransferDirection, List[threading.Thread]] = {
+            direction: [] for direction in TransferDirection
+        }
+        self._seq = itertools.count()
+        self._stopped = False
+
+    # ========== 提交与查询 ==========
+
+    def submit(self, task: TransferTask, wait: bool = False) -> TransferTask:
+        """
+        提交传输任务
+
+        Args:
+            task: 传输任务
+            wait: 为True时任务先处于等待状态，调用release后才开始排队
+
+        Returns:
+            TransferTask: 提交的任务
+        """
+        with self._cond:
+            if self._stopped:
+                task.state = TransferState.CANCELLED
+            else:
+                task.seq = next(self._seq)
+                task.global_bucket = self.bandwidth
+                self._tasks[task.transfer_id] = task
+                if wait:
+                    task.state = TransferState.WAITING
+                else:
+                    self._enqueue(task)
+        if task.state == TransferState.CANCELLED:
+            self._discard(task)
+        self.task_updated.emit(task)
+        return task
+
+    def release(self, transfer_id: str) -> bool:
+        """
+        等待中的任务开始排队
+
+        Returns:
+            bool: 是否成功
+        """
+        with self._cond:
+            task = self._tasks.get(transfer_id)
+            if task is None or task.state != TransferState.WAITING:
+                return False
+            task.state = TransferState.QUEUED
+            self._enqueue(task)
+        self.task_updated.emit(task)
+        return True
+
+    def fail(self, transfer_id: str) -> bool:
+        """
+        结束一个尚未执行的任务并标记为失败（如对方拒绝或超时）
+
+        Returns:
+            bool: 是否成功
+        """
+        return self._close(transfer_id, TransferState.FAILED)
+
+    def complete(self, transfer_id: str) -> bool:
+        """
+        结束一个尚未执行的任务并标记为完成（如对方已有相同内容，无需传输）
+
+        Returns:
+            bool: 是否成功
+        """
+        return self._close(transfer_id, TransferState.COMPLETED)
+
+    def _close(self, transfer_id: str, state: TransferState) -> bool:
+        with self._cond:
+            task = self._tasks.get(transfer_id)
+            if task is None or task.state not in (TransferState.WAITING, TransferState.QUEUED):
+                return False
+            if task in self._queue:
+                self._queue.remove(task)
+            if state == TransferState.COMPLETED:
+                task.bytes_done = task.total_bytes
+            self._finish(task, state)
+        self.task_updated.emit(task)
+        return True
+
+    def get(self, transfer_id: str) -> Optional[TransferTask]:
+        """按传输ID查找任务"""
+        with self._cond:
+            return self._tasks.get(transfer_id)
+
+    def tasks(self) -> List[TransferTask]:
+        """所有任务（含最近结束的），按提交顺序"""
+        with self._cond:
+            return list(self._tasks.values())
+
+    def set_bandwidth_limit(self, rate: float):
+        """
+        修改全局带宽上限
+
+        Args:
+            rate: 字节/秒，0表示不限速
+        """
+        self.bandwidth.set_rate(rate)
+
+    # ========== 暂停/继续/取消 ==========
+
+    def pause(self, transfer_id: str) -> bool:
+        """
+        暂停传输：排队中的任务不再被调度，传输中的任务在下一个数据块处阻塞
+        （暂停中的传输仍占用工作线程和并发名额）
+
+        Returns:
+            bool: 是否暂停成功
+        """
+        with self._cond:
+            task = self._tasks.get(transfer_id)
+            if task is None or task.finished or task.paused or task.state == TransferState.WAITING:
+                return False
+            task._resume.clear()
+            task.state = TransferState.PAUSED
+        self.task_updated.emit(task)
+        return True
+
+    def resume(self, transfer_id: str) -> bool:
+        """
+        继续已暂停的传输
+
+        Returns:
+            bool: 是否继续成功
+        """
+        with self._cond:
+            task = self._tasks.get(transfer_id)
+            if task is None or task.finished or not task.paused:
+                return False
+            task.state = TransferState.QUEUED if task in self._queue else TransferState.RUNNING
+            task._resume.set()
+            self._cond.notify_all()
+        self.task_updated.emit(task)
+        return True
+
+    def cancel(self, transfer_id: str) -> bool:
+        """
+        取消传输：等待或排队中的任务直接移除，传输中的任务在下一个数据块处停止
+
+        Returns:
+            bool: 是否取消成功
+        """
+        with self._cond:
+            task = self._tasks.get(transfer_id)
+            if task is None or task.finished:
+                return False
+            task._cancel.set()
+            task._resume.set()
+            queued = task in self._queue or task.state == TransferState.WAITING
+            if queued:
+                if task in self._queue:
+                    self._queue.remove(task)
+                self._finish(task, TransferState.CANCELLED)
+        if queued:
+            self._discard(task)
+            self.task_updated.emit(task)
+        return True
+
+    def stop(self):
+        """
+        停止调度器：取消所有排队和进行中的任务，工作线程随后退出
+        """
+        with self._cond:
+            self._stopped = True
+            queued, self._queue = self._queue, []
+            queued += [t for t in self._tasks.values() if t.state == TransferState.WAITING]
+            for task in self._tasks.values():
+                if not task.finished:
+                    task._cancel.set()
+                    task._resume.set()
+            for task in queued:
+                self._finish(task, TransferState.CANCELLED)
+            self._cond.notify_all()
+        for task in queued:
+            self._discard(task)
+            self.task_updated.emit(task)
+
+    # ========== 工作线程 ==========
+
+    def _enqueue(self, task: TransferTask):
+        """在持有锁时调用：任务加入队列并唤醒工作线程，独立执行的任务直接开始"""
+        if task.dedicated:
+            self._start_dedicated(task)
+            return
+        self._queue.append(task)
+        self._ensure_worker(task.direction)
+        self._cond.notify_all()
+
+    def _ensure_worker(self, direction: TransferDirection):
+        """在持有锁时调用：排队任务多于空闲线程时按需创建工作线程"""
+        workers = self._workers[direction]
+        if len(workers) >= self.limits[direction]:
+            return
+        pending = sum(1 for task in self._queue if task.direction == direction)
+        busy = sum(1 for task in self._tasks.values()
+                   if task.direction == direction and task.state in
+                   (TransferState.RUNNING, TransferState.PAUSED) and task not in self._queue)
+        if len(workers) < min(self.limits[direction], pending + busy):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                args=(direction,),
+                name=f"transfer-{direction.value}-{len(workers)}",
+                daemon=True
+            )
+            workers.append(worker)
+            worker.start()
+
+    def _start_dedicated(self, task: TransferTask):
+        """在持有锁时调用：为独立执行的任务创建线程，执行完即退出"""
+        key = (task.direction, task.peer_key)
+        self._running_per_peer[key] = self._running_per_peer.get(key, 0) + 1
+        task.state = TransferState.RUNNING
+        threading.Thread(
+            target=self._run,
+            args=(task,),
+            name=f"transfer-{task.direction.value}-{task.transfer_id}",
+            daemon=True
+        ).start()
+
+    def _take(self, direction: TransferDirection) -> Optional[TransferTask]:
+        """在持有锁时调用：取出该方向上可执行的最高优先级任务"""
+        best = None
+        for task in self._queue:
+            if task.direction != direction or task.paused:
+                continue
+            if self._running_per_peer.get((task.direction, task.peer_key), 0) >= self.max_per_peer:
+                continue
+            if best is None or (task.priority, -task.seq) > (best.priority, -best.seq):
+                best = task
+        if best is not None:
+            self._queue.remove(best)
+            key = (best.direction, best.peer_key)
+            self._running_per_peer[key] = self._running_per_peer.get(key, 0) + 1
+            best.state = TransferState.RUNNING
+        return best
+
+    def _worker_loop(self, direction: TransferDirection):
+        while True:
+            with self._cond:
+                task = self._take(direction)
+                while task is None:
+                    if self._stopped:
+                        return
+                    self._cond.wait()
+                    task = self._take(direction)
+            self._run(task)
+
+    def _run(self, task: TransferTask):
+        """执行已标记为传输中的任务并记录结束状态"""
+        self.task_updated.emit(task)
+
+        try:
+            success = bool(task.runner(task))
+        except TransferCancelled:
+            success = False
+        except Exception as e:
+            logger.error("传输 %s 出错: %s", task.transfer_id, e)
+            success = False
+
+        with self._cond:
+            key = (task.direction, task.peer_key)
+            count = self._running_per_peer.get(key, 1) - 1
+            if count > 0:
+                self._running_per_peer[key] = count
+            else:
+                self._running_per_peer.pop(key, None)
+            if task.cancelled:
+                state = TransferState.CANCELLED
+            else:
+                state = TransferState.COMPLETED if success else TransferState.FAILED
+            self._finish(task, state)
+            self._cond.notify_all()
+        self.task_updated.emit(task)
+
+    def _finish(self, task: TransferTask, state: TransferState):
+        """在持有锁时调用：记录结束状态，只保留最近的若干条已结束记录"""
+        task.state = state
+        finished = [t for t in self._tasks.values() if t.finished]
+        for old in finished[:max(0, len(finished) - MAX_FINISHED_TRANSFERS)]:
+            del self._tasks[old.transfer_id]
+
+    def _discard(self, task: TransferTask):
+        if task.discard is None:
+            return
+        try:
+            task.discard(task)
+        except Exception as e:
+            logger.warning("清理传输 %s 失败: %s", task.transfer_id, e)
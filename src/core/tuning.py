@@ -0,0 +1,182 @@
+"""
+传输参数调优模块
+功能：按带宽时延积（往返时间 × 带宽估计）设置数据连接的socket缓冲区，
+按测得的传输速率调整每次读写的块大小，并记录每个对方最近测得的速率供下次估计带宽
+"""
+
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from ..common.config import *
+from ..common.logger import get_logger
+
+logger = get_logger(__name__)
+
+_TCP_INFO_RTT_OFFSET = 68  # Linux struct tcp_info 中 tcpi_rtt（微秒）的偏移
+_MAX_PEER_RATES = 256  # 最多记录的对方速率数
+
+
+def socket_rtt(sock: socket.socket) -> Optional[float]:
+    """
+    读取内核测得的连接往返时间，平台不支持时返回None
+
+    Args:
+        sock: 已建立的TCP连接
+
+    Returns:
+        Optional[float]: 往返时间（秒）
+    """
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+        rtt_us = struct.unpack_from('I', info, _TCP_INFO_RTT_OFFSET)[0]
+    except (OSError, struct.error):
+        return None
+    return rtt_us / 1e6 if rtt_us else None
+
+
+@dataclass
+class SocketTuning:
+    """一个数据连接实际采用的传输参数（随传输统计上报）"""
+    rtt: Optional[float]  # 往返时间（秒），未知时为None
+    bdp: int  # 带宽时延积估计（字节）
+    sndbuf: int  # 发送缓冲区大小（字节，系统实际值）
+    rcvbuf: int  # 接收缓冲区大小（字节，系统实际值）
+    chunk_size: int  # 当前块大小（字节），传输中随速率调整
+    nodelay: bool  # 是否关闭了Nagle算法
+    notsent_lowat: int  # 未发出数据的水位（字节），0表示未设置
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'rtt': self.rtt,
+            'bdp': self.bdp,
+            'sndbuf': self.sndbuf,
+            'rcvbuf': self.rcvbuf,
+            'chunk_size': self.chunk_size,
+            'nodelay': self.nodelay,
+            'notsent_lowat': self.notsent_lowat,
+        }
+
+
+class TransferTuner:
+    """
+    传输参数调优器（线程安全）
+    每个FileTransfer一个，记录各对方最近测得的速率
+    """
+
+    def __init__(self, link_rate: float = FILE_LINK_RATE_GUESS,
+                 chunk_min: int = FILE_CHUNK_MIN, chunk_max: int = FILE_CHUNK_MAX,
+                 target_time: float = FILE_CHUNK_TARGET_TIME):
+        """
+        初始化调优器
+
+        Args:
+            link_rate: 还没有测得速率时假设的带宽（字节/秒）
+            chunk_min: 块大小下限
+            chunk_max: 块大小上限
+            target_time: 按当前速率每块大约耗时（秒）
+        """
+        self.link_rate = link_rate
+        self.chunk_min = chunk_min
+        self.chunk_max = chunk_max
+        self.target_time = target_time
+        self._lock = threading.Lock()
+        self._rates: 'OrderedDict[str, float]' = OrderedDict()
+
+    def configure(self, sock: socket.socket, peer: str, sending: bool,
+                  rtt: Optional[float] = None) -> SocketTuning:
+        """
+        为已建立的数据连接设置socket选项并给出初始块大小
+
+        缓冲区只在带宽时延积需要时调大：Linux上显式设置缓冲区会关闭内核的自动调整，
+        低时延链路上保持系统默认更好
+
+        Args:
+            sock: 数据连接
+            peer: 对方IP
+            sending: 本端是否为发送方
+            rtt: 调用方测得的往返时间（秒），内核能提供时以内核值为准
+
+        Returns:
+            SocketTuning: 采用的参数
+        """
+        rtt = socket_rtt(sock) or rtt
+        rate = self.peer_rate(peer)
+        bdp = int(rate * rtt) if rtt else 0
+        option = socket.SO_SNDBUF if sending else socket.SO_RCVBUF
+        wanted = min(2 * bdp, TCP_BUFFER_MAX)
+        try:
+            if wanted > sock.getsockopt(socket.SOL_SOCKET, option):
+                sock.setsockopt(socket.SOL_SOCKET, option, wanted)
+        except OSError as e:
+            logger.debug("设置socket缓冲区失败: %s", e)
+
+        nodelay = False
+        if TCP_NODELAY_ENABLED:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                nodelay = True
+            except OSError:
+                pass
+        lowat = 0
+        if sending and TCP_NOTSENT_LOWAT and hasattr(socket, 'TCP_NOTSENT_LOWAT'):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, TCP_NOTSENT_LOWAT)
+                lowat = TCP_NOTSENT_LOWAT
+            except OSError:
+                pass
+
+        return SocketTuning(
+            rtt=rtt,
+            bdp=bdp,
+            sndbuf=sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+            rcvbuf=sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+            chunk_size=self.chunk_for(rate),
+            nodelay=nodelay,
+            notsent_lowat=lowat
+        )
+
+    def chunk_for(self, rate: float) -> int:
+        """
+        按速率计算块大小：每块大约耗时target_time秒，取不超过该值的2的幂，
+        速率小幅波动时块大小保持不变
+
+        Args:
+            rate: 速率（字节/秒）
+
+        Returns:
+            int: 块大小（字节）
+        """
+        target = rate * self.target_time
+        if target <= self.chunk_min:
+            return self.chunk_min
+        if target >= self.chunk_max:
+            return self.chunk_max
+        return max(self.chunk_min, 1 << (int(target).bit_length() - 1))
+
+    def peer_rate(self, peer: str) -> float:
+        """对方最近测得的速率，没有记录时为假设的带宽"""
+        with self._lock:
+            return self._rates.get(peer, self.link_rate)
+
+    def record(self, peer: str, rate: float):
+        """
+        记录一次传输测得的平均速率
+
+        Args:
+            peer: 对方IP
+            rate: 速率（字节/秒）
+        """
+        if rate <= 0:
+            return
+        with self._lock:
+            self._rates[peer] = rate
+            self._rates.move_to_end(peer)
+            while len(self._rates) > _MAX_PEER_RATES:
+                self._rates.popitem(last=False)
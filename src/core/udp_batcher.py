@@ -0,0 +1,126 @@
+"""
+UDP发送合并模块
+功能：发送线程把短时间窗口内发往同一目的地址的多条小消息合并成一个数据报，
+突发的在线状态、确认和连续输入的聊天消息不再是一条消息一次系统调用、一个包。
+每条消息都是自带长度的帧（common.packet），合并时直接首尾相连，不超过mtu字节
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from ..common.config import *
+from ..common.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def pack_batches(messages: List[bytes], mtu: int) -> List[bytes]:
+    """
+    把发往同一地址的消息按顺序打包成不超过mtu字节的数据报
+
+    Args:
+        messages: 已编码的帧
+        mtu: 数据报大小上限
+
+    Returns:
+        List[bytes]: 数据报，超过mtu的单条消息单独成包
+    """
+    datagrams = []
+    group: List[bytes] = []
+    size = 0
+    for data in messages:
+        if group and size + len(data) > mtu:
+            datagrams.append(b''.join(group))
+            group, size = [], 0
+        group.append(data)
+        size += len(data)
+    if group:
+        datagrams.append(b''.join(group))
+    return datagrams
+
+
+class UdpBatcher:
+    """
+    UDP发送合并器（线程安全）
+    队列中第一条消息最多等待window秒，期间到达的消息一起按目的地址打包发送
+    """
+
+    def __init__(self, window: float = UDP_BATCH_WINDOW, mtu: int = UDP_BATCH_MTU):
+        """
+        初始化发送合并器
+
+        Args:
+            window: 合并窗口（秒）
+            mtu: 合并后的数据报大小上限（字节）
+        """
+        self.window = window
+        self.mtu = mtu
+        self.messages_sent = 0
+        self.datagrams_sent = 0
+        self._queue: Deque[Tuple[socket.socket, tuple, bytes]] = deque()
+        self._first_at = 0.0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """启动发送线程"""
+        self._running = True
+        self._thread = threading.Thread(target=self._send_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止发送线程，队列中剩余的消息立即发出"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def send(self, sock: socket.socket, addr: tuple, data: bytes):
+        """
+        把一条消息加入发送队列
+
+        Args:
+            sock: 发送用的socket
+            addr: 目的地址
+            data: 已编码的帧
+        """
+        with self._cond:
+            if not self._queue:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            self._queue.append((sock, addr, data))
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                while self._running:
+                    remaining = self._first_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[socket.socket, tuple, bytes]]):
+        # 按(socket, 地址)分组，保持各目的地址内的消息顺序
+        groups: Dict[Tuple[socket.socket, tuple], List[bytes]] = {}
+        for sock, addr, data in batch:
+            groups.setdefault((sock, addr), []).append(data)
+        for (sock, addr), messages in groups.items():
+            self.messages_sent += len(messages)
+            for datagram in pack_batches(messages, self.mtu):
+                try:
+                    sock.sendto(datagram, addr)
+                    self.datagrams_sent += 1
+                except OSError as e:
+                    logger.error("发送消息到 %s 失败: %s", addr, e)
@@ -0,0 +1,403 @@
+"""
+无界面守护进程入口
+功能：不依赖PyQt6，以服务方式运行发现、消息收发和文件接收，
+适合部署在没有显示器的实验室服务器上
+
+用法：
+    python -m src.daemon --name Server1 [--control-port 9000] [--auto-accept]
+
+控制接口：从标准输入（以及可选的本地TCP控制端口）逐行读取命令，
+每行可以是JSON对象，也可以是简写的文本命令：
+    {"cmd": "members"}                                  members
+    {"cmd": "send", "to": "Bob", "content": "hi"}       send Bob hi
+    {"cmd": "broadcast", "content": "hello"}            broadcast hello
+    {"cmd": "send_file", "to": "Bob", "path": "a.zip"}  send_file Bob a.zip
+    {"cmd": "distribute", "to": ["Bob", "Eve"], "path": "a.zip"}
+                                                        distribute Bob,Eve a.zip
+    {"cmd": "offers"}                                   offers
+    {"cmd": "accept", "id": "<传输ID>", "path": "..."}  accept <传输ID> [路径]
+    {"cmd": "reject", "id": "<传输ID>"}                 reject <传输ID>
+    {"cmd": "transfers"}                                transfers
+    {"cmd": "pause", "id": "<传输ID>"}                  pause <传输ID>
+    {"cmd": "resume", "id": "<传输ID>"}                 resume <传输ID>
+    {"cmd": "cancel", "id": "<传输ID>"}                 cancel <传输ID>
+    {"cmd": "refresh"}                                  refresh
+    {"cmd": "status"}                                   status
+    {"cmd": "quit"}                                     quit
+命令结果与事件（收到消息、成员变化、文件传输）以JSON行的形式输出到标准输出，
+日志输出到标准错误
+"""
+
+import argparse
+import json
+import signal
+import socket
+import sys
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .common.config import *
+from .common.message_types import *
+from .common.utils import *
+from .common.logger import get_logger, setup_logging
+from .core.node import ChatNode
+
+logger = get_logger(__name__)
+
+
+class ChatDaemon:
+    """
+    守护进程类
+    把ChatNode的信号转换为JSON事件，并执行控制接口收到的命令
+    """
+
+    def __init__(self, node: ChatNode, auto_accept: bool = False):
+        """
+        初始化守护进程
+
+        Args:
+            node: 聊天节点
+            auto_accept: 是否自动接收所有文件，否则请求等待accept/reject命令
+        """
+        self.node = node
+        self.auto_accept = auto_accept
+        # 未自动接受时等待命令处理的文件请求：transfer_id -> FileTransferInfo
+        self.pending_offers: Dict[str, FileTransferInfo] = {}
+        self.stop_event = threading.Event()
+        self._output_lock = threading.Lock()
+        self._writers: List[Callable[[str], None]] = [self._write_stdout]
+        self._control_socket: Optional[socket.socket] = None
+        self._connect_events()
+
+    def _connect_events(self):
+        """
+        把节点信号转换为JSON事件输出
+        """
+        node = self.node
+        node.message_p2p.message_received.connect(
+            lambda msg: self.emit_event('p2p_message', **self._message_fields(msg)))
+        node.message_p2p.message_queued.connect(
+            lambda msg: self.emit_event('p2p_queued', receiver=msg.receiver.to_dict(), content=msg.content))
+        node.message_broadcast.broadcast_received.connect(
+            lambda msg: self.emit_event('broadcast_message', **self._message_fields(msg)))
+        node.member_manager.member_added.connect(
+            lambda member: self.emit_event('member_added', member=member.to_dict()))
+        node.member_manager.member_removed.connect(
+            lambda member: self.emit_event('member_removed', member=member.to_dict()))
+        node.file_transfer.file_request_received.connect(self._on_file_request)
+        node.file_transfer.file_request_cancelled.connect(self._on_file_request_cancelled)
+        node.file_transfer.transfer_updated.connect(
+            lambda task: self.emit_event('transfer_state', **task.to_dict()))
+        node.file_transfer.transfer_stats.connect(
+            lambda progress: self.emit_event('transfer_progress', **progress.to_dict()))
+        node.file_transfer.transfer_completed.connect(
+            lambda filename, ok: self.emit_event('transfer_completed', filename=filename, success=ok))
+
+    @staticmethod
+    def _message_fields(message: ChatMessage) -> dict:
+        return {
+            'sender': message.sender.to_dict(),
+            'content': message.content,
+        }
+
+    def _on_file_request(self, file_info: FileTransferInfo):
+        self.emit_event('file_request', **file_info.to_dict())
+        if self.auto_accept:
+            self.node.file_transfer.accept_file(file_info)
+        else:
+            self.pending_offers[file_info.transfer_id] = file_info
+
+    def _on_file_request_cancelled(self, transfer_id: str):
+        if self.pending_offers.pop(transfer_id, None):
+            self.emit_event('file_request_cancelled', transfer_id=transfer_id)
+
+    # ========== 输出 ==========
+
+    def _write_stdout(self, line: str):
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+    def _output(self, payload: dict):
+        line = json.dumps(payload, ensure_ascii=False)
+        with self._output_lock:
+            for writer in list(self._writers):
+                try:
+                    writer(line)
+                except Exception:
+                    # 控制连接已断开
+                    self._writers.remove(writer)
+
+    def emit_event(self, event: str, **fields):
+        """
+        输出一条JSON事件
+
+        Args:
+            event: 事件名
+            **fields: 事件字段
+        """
+        self._output({'event': event, **fields})
+
+    # ========== 命令处理 ==========
+
+    @staticmethod
+    def parse_command(line: str) -> Optional[dict]:
+        """
+        解析一行命令，支持JSON和简写文本两种格式
+
+        Args:
+            line: 命令行文本
+
+        Returns:
+            dict: 命令字典，空行返回None
+        """
+        line = line.strip()
+        if not line:
+            return None
+        if line.startswith('{'):
+            return json.loads(line)
+        name, _, rest = line.partition(' ')
+        if name in ('send', 'send_file'):
+            target, _, value = rest.partition(' ')
+            key = 'content' if name == 'send' else 'path'
+            return {'cmd': name, 'to': target, key: value}
+        if name == 'broadcast':
+            return {'cmd': name, 'content': rest}
+        if name == 'distribute':
+            targets, _, path = rest.partition(' ')
+            return {'cmd': name, 'to': targets.split(','), 'path': path}
+        if name == 'accept':
+            transfer_id, _, path = rest.strip().partition(' ')
+            return {'cmd': name, 'id': transfer_id, 'path': path.strip() or None}
+        if name in ('reject', 'pause', 'resume', 'cancel'):
+            return {'cmd': name, 'id': rest.strip()}
+        return {'cmd': name}
+
+    def find_member(self, target: str) -> Optional[Member]:
+        """
+        按用户名、IP或 IP:端口 查找成员，在线成员优先，其次是已离开的成员（可以给他们留离线消息）
+
+        Args:
+            target: 成员标识
+
+        Returns:
+            Optional[Member]: 找到的成员
+        """
+        manager = self.node.member_manager
+        for member in manager.get_member_list() + manager.get_departed_members()[::-1]:
+            if target in (member.username, member.ip, f"{member.ip}:{member.udp_port}"):
+                return member
+        return None
+
+    def handle_command(self, command: dict) -> dict:
+        """
+        执行一条命令
+
+        Args:
+            command: 命令字典
+
+        Returns:
+            dict: 命令结果
+        """
+        cmd = command.get('cmd')
+        node = self.node
+        if cmd == 'members':
+            members = [m.to_dict() for m in node.member_manager.get_member_list()]
+            offline = [m.to_dict() for m in node.member_manager.get_departed_members()]
+            return {'ok': True, 'members': members, 'offline': offline}
+        if cmd == 'status':
+            return {
+                'ok': True,
+                'member': node.local_member.to_dict(),
+                'members': len(node.member_manager.get_member_list()),
+                'auto_accept': self.auto_accept,
+            }
+        if cmd == 'refresh':
+            node.member_refresh.refresh_members()
+            return {'ok': True}
+        if cmd == 'broadcast':
+            return {'ok': node.message_broadcast.send_broadcast_message(command.get('content', ''))}
+        if cmd in ('send', 'send_file'):
+            member = self.find_member(str(command.get('to', '')))
+            if member is None:
+                return {'ok': False, 'error': f"未找到成员: {command.get('to')}"}
+            if cmd == 'send':
+                return {'ok': node.message_p2p.send_p2p_message(member, command.get('content', ''))}
+            task = node.file_transfer.send_file(
+                command.get('path', ''), member, int(command.get('priority', 0)))
+            return {'ok': True, 'transfer_id': task.transfer_id}
+        if cmd == 'distribute':
+            targets = command.get('to') or []
+            if targets == ['*']:
+                members = node.member_manager.get_member_list()
+            else:
+                members = [self.find_member(str(target)) for target in targets]
+            if not members or None in members:
+                return {'ok': False, 'error': f"未找到成员: {targets}"}
+            task = node.file_transfer.distribute_file(
+                command.get('path', ''), members, int(command.get('priority', 0)))
+            return {'ok': True, 'transfer_id': task.transfer_id}
+        if cmd == 'offers':
+            return {'ok': True, 'offers': [info.to_dict() for info in self.pending_offers.values()]}
+        if cmd in ('accept', 'reject'):
+            file_info = self.pending_offers.pop(str(command.get('id', '')), None)
+            if file_info is None:
+                return {'ok': False, 'error': f"未找到文件请求: {command.get('id')}"}
+            if cmd == 'accept':
+                return {'ok': node.file_transfer.accept_file(file_info, command.get('path'))}
+            node.file_transfer.reject_file(file_info)
+            return {'ok': True}
+        if cmd == 'transfers':
+            return {'ok': True, 'transfers': [t.to_dict() for t in node.file_transfer.scheduler.tasks()]}
+        if cmd in ('pause', 'resume', 'cancel'):
+            action = getattr(node.file_transfer, f"{cmd}_transfer")
+            return {'ok': action(str(command.get('id', '')))}
+        if cmd == 'quit':
+            self.stop_event.set()
+            return {'ok': True}
+        return {'ok': False, 'error': f"未知命令: {cmd}"}
+
+    def handle_line(self, line: str) -> Optional[dict]:
+        """
+        解析并执行一行命令
+
+        Args:
+            line: 命令行文本
+
+        Returns:
+            dict: 命令结果，空行返回None
+        """
+        try:
+            command = self.parse_command(line)
+            if command is None:
+                return None
+            result = self.handle_command(command)
+        except Exception as e:
+            result = {'ok': False, 'error': str(e)}
+        return {'event': 'result', **result}
+
+    # ========== 控制接口 ==========
+
+    def _stdin_loop(self):
+        for line in sys.stdin:
+            result = self.handle_line(line)
+            if result is not None:
+                with self._output_lock:
+                    self._write_stdout(json.dumps(result, ensure_ascii=False))
+            if self.stop_event.is_set():
+                break
+        # 标准输入关闭（例如作为系统服务运行）时继续提供服务
+
+    def start_control_server(self, port: int):
+        """
+        在本机回环地址上启动TCP控制端口，每个连接使用与标准输入相同的行协议
+
+        Args:
+            port: 控制端口
+        """
+        self._control_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._control_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._control_socket.bind(('127.0.0.1', port))
+        self._control_socket.listen(5)
+        threading.Thread(target=self._control_accept_loop, daemon=True).start()
+        logger.info("控制端口已启动: 127.0.0.1:%d", port)
+
+    def _control_accept_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                conn, _ = self._control_socket.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._control_client, args=(conn,), daemon=True).start()
+
+    def _control_client(self, conn: socket.socket):
+        conn_lock = threading.Lock()
+
+        def write(line: str):
+            with conn_lock:
+                conn.sendall((line + '\n').encode('utf-8'))
+
+        with self._output_lock:
+            self._writers.append(write)
+        try:
+            with conn, conn.makefile('r', encoding='utf-8') as reader:
+                for line in reader:
+                    result = self.handle_line(line)
+                    if result is not None:
+                        write(json.dumps(result, ensure_ascii=False))
+        except OSError:
+            pass
+        finally:
+            with self._output_lock:
+                if write in self._writers:
+                    self._writers.remove(write)
+
+    def run(self, control_port: Optional[int] = None):
+        """
+        启动节点并阻塞运行，直到收到quit命令或终止信号
+
+        Args:
+            control_port: TCP控制端口，None表示只使用标准输入
+        """
+        self.node.start()
+        if control_port:
+            self.start_control_server(control_port)
+        threading.Thread(target=self._stdin_loop, daemon=True).start()
+        self.emit_event('started', member=self.node.local_member.to_dict())
+        try:
+            while not self.stop_event.wait(timeout=1.0):
+                pass
+        finally:
+            if self._control_socket:
+                self._control_socket.close()
+            self.node.stop()
+            self.emit_event('stopped')
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    守护进程主函数
+
+    Args:
+        argv: 命令行参数，默认使用sys.argv
+    """
+    parser = argparse.ArgumentParser(description=f"{WINDOW_TITLE}（无界面模式）")
+    parser.add_argument('--name', help="用户名，默认 Node_<IP末段>")
+    parser.add_argument('--download-dir', default=DOWNLOAD_DIR, help="文件下载目录")
+    parser.add_argument('--state-dir', default=STATE_DIR, help="离线消息等程序状态的保存目录")
+    parser.add_argument('--control-port', type=int, help="本机TCP控制端口")
+    parser.add_argument('--udp-port', type=int, default=DEFAULT_MESSAGE_PORT,
+                        help="UDP消息端口，默认由系统分配")
+    parser.add_argument('--tcp-port', type=int, default=DEFAULT_TCP_PORT,
+                        help="TCP文件传输端口，默认由系统分配")
+    parser.add_argument('--discovery-port', type=int, default=DEFAULT_UDP_PORT,
+                        help="共享的发现端口")
+    parser.add_argument('--interface', action='append', dest='interfaces',
+                        help="用于发现广播的网卡名称，可重复指定，默认自动选择")
+    parser.add_argument('--auto-accept', action='store_true',
+                        help="自动接收所有成员发来的文件，默认收到的请求等待accept/reject命令处理")
+    parser.add_argument('--log-level', default=LOG_LEVEL, help="日志级别")
+    args = parser.parse_args(argv)
+
+    setup_logging(level=args.log_level)
+    interfaces = select_interfaces(names=args.interfaces) if args.interfaces else None
+    node = ChatNode(
+        args.name or f"Node_{get_local_ip().split('.')[-1]}",
+        download_dir=args.download_dir,
+        state_dir=args.state_dir,
+        interfaces=interfaces,
+        udp_port=args.udp_port,
+        tcp_port=args.tcp_port,
+        discovery_port=args.discovery_port
+    )
+    daemon = ChatDaemon(node, auto_accept=args.auto_accept)
+
+    def _on_signal(signum, frame):
+        daemon.stop_event.set()
+
+    signal.signal(signal.SIGINT, _on_signal)
+    signal.signal(signal.SIGTERM, _on_signal)
+    daemon.run(control_port=args.control_port)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 """
 
 import sys
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication, QInputDialog, QMessageBox
 
 from .common.config import *
@@ -51,6 +52,9 @@ def main():
     window = MainWindow()
     window.show()
     
+    # 窗口显示后再询问用户名并在后台启动网络服务
+    QTimer.singleShot(0, window.start_services)
+    
     # 运行应用程序
     sys.exit(app.exec())
 
@@ -3,13 +3,15 @@
 功能：整合各个功能模块，设计用户界面
 """
 
+import os
 import sys
-from typing import Optional
+import threading
+from typing import Dict, Optional, TYPE_CHECKING
 from PyQt6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QTextEdit, QLineEdit, QPushButton, QListWidget,
     QLabel, QFileDialog, QMessageBox, QSplitter,
-    QGroupBox, QProgressBar, QListWidgetItem
+    QGroupBox, QListWidgetItem, QAbstractItemView
 )
 from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QAction
@@ -17,7 +19,18 @@ from PyQt6.QtGui import QAction
 from ..common.config import *
 from ..common.message_types import *
 from ..common.utils import *
-from ..core import *
+from ..common.logger import get_logger
+from .qt_bridge import LANE_BROADCAST, LANE_P2P, QtSignalBridge
+from .transfer_panel import TransferPanel
+
+if TYPE_CHECKING:
+    # 核心模块在窗口显示后才按需导入，这里仅用于类型标注
+    from ..core import (
+        ChatNode, MessageDispatcher, NetworkDiscovery, MessageP2P,
+        MessageBroadcast, FileTransfer, MemberManager, MemberRefresh
+    )
+
+logger = get_logger(__name__)
 
 
 class MainWindow(QMainWindow):
@@ -35,7 +48,9 @@ class MainWindow(QMainWindow):
         # 本地用户信息
         self.local_member: Optional[Member] = None
         
-        # 核心功能模块实例
+        # 核心功能模块实例（由ChatNode统一创建和连接）
+        self.node: Optional[ChatNode] = None
+        self.message_dispatcher: Optional[MessageDispatcher] = None
         self.network_discovery: Optional[NetworkDiscovery] = None
         self.message_p2p: Optional[MessageP2P] = None
         self.message_broadcast: Optional[MessageBroadcast] = None
@@ -43,14 +58,17 @@ class MainWindow(QMainWindow):
         self.member_manager: Optional[MemberManager] = None
         self.member_refresh: Optional[MemberRefresh] = None
         
-        # 初始化UI
-        self.init_ui()
+        # 尚未处理的文件请求：transfer_id -> FileTransferInfo
+        self.pending_offers: Dict[str, FileTransferInfo] = {}
         
-        # 初始化核心模块
-        self.init_modules()
+        # 核心模块的信号可能在网络线程中发射，经信号桥转发到主线程
+        self.bridge = QtSignalBridge(self)
+        self.bridge.events_dropped.connect(self.on_events_dropped)
         
-        # 连接信号和槽
-        self.connect_signals()
+        # 初始化UI
+        # 注意：核心模块由start_services在窗口首次绘制后再初始化，避免拖慢启动
+        self.init_ui()
+        self.set_services_enabled(False)
     
     def init_ui(self):
         """
@@ -86,7 +104,7 @@ class MainWindow(QMainWindow):
         self.create_menu_bar()
         
         # 创建状态栏
-        self.statusBar().showMessage('准备就绪')
+        self.statusBar().showMessage('正在启动...')
     
     def create_member_panel(self) -> QWidget:
         """
@@ -103,7 +121,7 @@ class MainWindow(QMainWindow):
         user_group = QGroupBox("用户信息")
         user_layout = QVBoxLayout()
         self.label_username = QLabel("用户名：未设置")
-        self.label_ip = QLabel(f"IP：{get_local_ip()}")
+        self.label_ip = QLabel("IP：检测中...")
         user_layout.addWidget(self.label_username)
         user_layout.addWidget(self.label_ip)
         user_group.setLayout(user_layout)
@@ -120,6 +138,8 @@ class MainWindow(QMainWindow):
         
         # 成员列表
         self.list_members = QListWidget()
+        # 按住Ctrl/Shift可以选择多个成员，一次分发文件
+        self.list_members.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.list_members.itemDoubleClicked.connect(self.on_member_double_clicked)
         member_layout.addWidget(self.list_members)
         
@@ -142,6 +162,7 @@ class MainWindow(QMainWindow):
         # 聊天显示区域
         self.text_chat = QTextEdit()
         self.text_chat.setReadOnly(True)
+        self.text_chat.document().setMaximumBlockCount(UI_CHAT_MAX_LINES)
         layout.addWidget(self.text_chat)
         
         # 输入区域
@@ -166,10 +187,14 @@ class MainWindow(QMainWindow):
         
         layout.addLayout(input_layout)
         
-        # 文件传输进度条
-        self.progress_file = QProgressBar()
-        self.progress_file.setVisible(False)
-        layout.addWidget(self.progress_file)
+        # 文件传输面板
+        self.panel_transfers = TransferPanel()
+        self.panel_transfers.accept_requested.connect(self.on_accept_offer)
+        self.panel_transfers.reject_requested.connect(self.on_reject_offer)
+        self.panel_transfers.pause_requested.connect(self.on_pause_transfer)
+        self.panel_transfers.resume_requested.connect(self.on_resume_transfer)
+        self.panel_transfers.cancel_requested.connect(self.on_cancel_transfer)
+        layout.addWidget(self.panel_transfers)
         
         return panel
 
@@ -195,71 +220,110 @@ class MainWindow(QMainWindow):
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
     
-    def init_modules(self):
+    def set_services_enabled(self, enabled: bool):
         """
-        初始化核心功能模块
+        启用/禁用依赖网络服务的控件
+        
+        Args:
+            enabled: 是否启用
+        """
+        for widget in (self.btn_refresh, self.btn_send, self.btn_broadcast, self.btn_send_file):
+            widget.setEnabled(enabled)
+    
+    def start_services(self):
+        """
+        询问用户名并在后台线程中初始化、启动核心模块
+        由main在窗口首次绘制后调用
         """
         from ..main import get_username
 
         username = get_username()
-        local_ip = get_local_ip()
-        self.local_member = Member(
-            username=username,
-            ip=local_ip,
-            udp_port=DEFAULT_UDP_PORT,
-            tcp_port=DEFAULT_TCP_PORT
-        )
-
-        # 更新UI显示
         self.label_username.setText(f"用户名：{username}")
-        self.label_ip.setText(f"IP：{local_ip}")
-
-        # 按顺序创建并启动模块
-        self.message_dispatcher = MessageDispatcher(self.local_member)
-        self.message_dispatcher.start()
-
-        self.network_discovery = NetworkDiscovery(self.local_member, self.message_dispatcher)
-        self.message_p2p = MessageP2P(self.local_member, self.message_dispatcher)
-        self.message_broadcast = MessageBroadcast(self.local_member, self.message_dispatcher)
-        self.member_manager = MemberManager(self.local_member, self.message_dispatcher)
-        self.member_refresh = MemberRefresh(self.local_member, self.message_dispatcher)
-        self.file_transfer = FileTransfer(self.local_member)
-        self.file_transfer.start()
+        self.statusBar().showMessage('正在启动网络服务...')
+        threading.Thread(target=self.init_modules, args=(username,), daemon=True).start()
+    
+    def init_modules(self, username: str):
+        """
+        初始化核心功能模块（在后台线程中运行）
         
-        # 加入后先广播一次加入
-        self.member_manager.broadcast_join()
-        # 发送发现广播
-        self.network_discovery.send_discovery_broadcast()
+        Args:
+            username: 用户名
+        """
+        from ..core.node import ChatNode
+
+        node = None
+        try:
+            node = ChatNode(username, state_dir=STATE_DIR)
+            # 信号连接完成后再启动网络服务，避免遗漏早到的消息
+            self.connect_signals(node)
+            node.start()
+            # 各服务启动失败时只记录日志，这里检查是否都已运行
+            if not (node.message_dispatcher.is_running and node.file_transfer.is_running):
+                raise RuntimeError("消息或文件传输服务未能启动，端口可能已被占用，详见日志")
+        except Exception as e:
+            logger.error("启动网络服务失败: %s", e)
+            if node is not None:
+                try:
+                    node.stop()
+                except Exception:
+                    pass
+            self.bridge.call(self.on_services_failed, str(e))
+            return
+        self.bridge.call(self.on_services_started, node)
     
-    def connect_signals(self):
+    def connect_signals(self, node: "ChatNode"):
         """
         连接信号和槽
+        
+        Args:
+            node: 聊天节点
         """
-        # dispatcher -> modules
-        self.message_dispatcher.discovery_message.connect(
-            self.network_discovery.handle_message)
-        self.message_dispatcher.p2p_message.connect(
-            self.message_p2p.handle_message)
-        self.message_dispatcher.broadcast_message.connect(
-            self.message_broadcast.handle_message)
-        self.message_dispatcher.join_message.connect(
-            self.member_manager.handle_join_message)
-        self.message_dispatcher.leave_message.connect(
-            self.member_manager.handle_leave_message)
-        self.message_dispatcher.refresh_message.connect(
-            self.member_refresh.handle_refresh_message)
-
         # modules -> UI
-        self.network_discovery.member_discovered.connect(self.on_member_discovered)
-        self.message_p2p.message_received.connect(self.on_message_received)
-        self.message_broadcast.broadcast_received.connect(self.on_broadcast_received)
-        self.file_transfer.file_request_received.connect(self.on_file_request)
-        self.file_transfer.transfer_progress.connect(self.on_transfer_progress)
-        self.member_manager.member_list_updated.connect(self.on_member_list_updated)
+        # 聊天消息每轮批量显示；进度、任务状态和成员列表只关心最新值，排队时按键合并
+        self.bridge.connect(node.message_p2p.message_received, self.on_messages_received,
+                            lane=LANE_P2P, batch=True)
+        self.bridge.connect(node.message_p2p.message_queued, self.on_message_queued, lane=LANE_P2P)
+        self.bridge.connect(node.message_broadcast.broadcast_received, self.on_broadcasts_received,
+                            lane=LANE_BROADCAST, batch=True)
+        self.bridge.connect(node.file_transfer.file_request_received, self.on_file_request)
+        self.bridge.connect(node.file_transfer.file_request_cancelled, self.on_file_request_cancelled)
+        self.bridge.connect(node.file_transfer.transfer_stats, self.on_transfer_progress,
+                            key=lambda progress: progress.transfer_id)
+        self.bridge.connect(node.file_transfer.transfer_updated, self.panel_transfers.update_task,
+                            key=lambda task: task.transfer_id)
+        self.bridge.connect(node.member_manager.member_list_updated, self.on_member_list_updated,
+                            key=lambda members: None)
+    
+    def on_services_started(self, node: "ChatNode"):
+        """
+        网络服务启动完成的槽函数（在主线程中执行）
+        
+        Args:
+            node: 已启动的聊天节点
+        """
+        self.node = node
+        self.local_member = node.local_member
+        self.message_dispatcher = node.message_dispatcher
+        self.network_discovery = node.network_discovery
+        self.message_p2p = node.message_p2p
+        self.message_broadcast = node.message_broadcast
+        self.member_manager = node.member_manager
+        self.member_refresh = node.member_refresh
+        self.file_transfer = node.file_transfer
 
-        # member list sync to broadcast module
-        self.member_manager.member_list_updated.connect(
-            self.message_broadcast.update_member_list)
+        self.label_ip.setText(f"IP：{self.local_member.ip}")
+        self.set_services_enabled(True)
+        self.statusBar().showMessage('准备就绪')
+    
+    def on_services_failed(self, error: str):
+        """
+        网络服务启动失败的槽函数（在主线程中执行）
+        
+        Args:
+            error: 错误信息
+        """
+        self.statusBar().showMessage(f'网络服务启动失败：{error}')
+        QMessageBox.critical(self, "启动失败", f"无法启动网络服务：\n{error}")
     
     # ========== 槽函数 ==========
     
@@ -308,17 +372,16 @@ class MainWindow(QMainWindow):
     def on_send_file(self):
         """
         发送文件按钮点击事件
+        选中多个成员时以多人分发方式发送
         """
-        current_item = self.list_members.currentItem()
-        if not current_item:
-            QMessageBox.information(self, "提示", "请选择一个成员")
-            return
-        member = current_item.data(Qt.ItemDataRole.UserRole)
-        if not isinstance(member, Member):
+        members = [item.data(Qt.ItemDataRole.UserRole) for item in self.list_members.selectedItems()]
+        members = [member for member in members if isinstance(member, Member)]
+        if not members:
+            QMessageBox.information(self, "提示", "请选择至少一个成员")
             return
         file_path, _ = QFileDialog.getOpenFileName(self, "选择要发送的文件")
         if file_path:
-            self.file_transfer.send_file(file_path, member)
+            self.file_transfer.distribute_file(file_path, members)
     
     def on_member_double_clicked(self, item: QListWidgetItem):
         """
@@ -329,78 +392,153 @@ class MainWindow(QMainWindow):
         """
         self.list_members.setCurrentItem(item)
     
-    def on_member_discovered(self, member: Member):
+    def on_messages_received(self, batch: list):
+        """
+        接收到消息信号的槽函数（本轮事件循环中收到的所有消息）
+        
+        Args:
+            batch: 信号参数元组(message,)的列表
+        """
+        # 仅显示与本地相关的私聊（按节点ID判断，对方看到的本机IP可能与本地记录不同）
+        local_id = self.local_member.node_id
+        lines = []
+        for message, in batch:
+            is_to_me = bool(message.receiver) and message.receiver.node_id == local_id
+            if message.receiver and not is_to_me and message.sender.node_id != local_id:
+                continue
+            target = "我" if is_to_me else message.receiver.username if message.receiver else None
+            lines.append(self.format_chat_message(message.sender.username, message.content, target=target))
+        self.append_chat_lines(lines)
+    
+    def on_broadcasts_received(self, batch: list):
         """
-        发现新成员信号的槽函数
+        接收到广播消息信号的槽函数（本轮事件循环中收到的所有广播）
         
         Args:
-            member: 发现的成员
+            batch: 信号参数元组(message,)的列表
         """
-        if self.member_manager:
-            self.member_manager.add_member(member)
+        self.append_chat_lines([
+            self.format_chat_message(message.sender.username, message.content, is_broadcast=True)
+            for message, in batch
+        ])
     
-    def on_message_received(self, message: ChatMessage):
+    def on_message_queued(self, message: ChatMessage):
         """
-        接收到消息信号的槽函数
+        对方不在线、消息已暂存的槽函数
         
         Args:
-            message: 接收到的消息
+            message: 暂存的消息
         """
-        # 仅显示与本地相关的私聊
-        if message.receiver and message.receiver != self.local_member and message.sender != self.local_member:
-            return
-        target = "我" if message.receiver and message.receiver == self.local_member else message.receiver.username if message.receiver else None
-        self.append_chat_message(message.sender.username, message.content, is_broadcast=False, target=target)
+        self.statusBar().showMessage(f"{message.receiver.username} 不在线，消息将在其上线后自动发送", 5000)
     
-    def on_broadcast_received(self, message: ChatMessage):
+    def on_events_dropped(self, total: int):
         """
-        接收到广播消息信号的槽函数
+        网络事件过多、部分被丢弃时在状态栏提示
         
         Args:
-            message: 广播消息
+            total: 累计丢弃的事件数
         """
-        self.append_chat_message(message.sender.username, message.content, is_broadcast=True)
+        self.statusBar().showMessage(f"消息过多，已丢弃 {total} 条", 5000)
     
     def on_file_request(self, file_info: FileTransferInfo):
         """
         收到文件传输请求信号的槽函数
+        请求加入传输面板等待处理，不弹出模态对话框
         
         Args:
             file_info: 文件传输信息
         """
-        reply = QMessageBox.question(
+        self.pending_offers[file_info.transfer_id] = file_info
+        self.panel_transfers.add_offer(file_info)
+        self.statusBar().showMessage(
+            f"来自 {file_info.sender.username} 的文件: {file_info.filename} "
+            f"({format_file_size(file_info.filesize)})，请在文件传输面板中接受或拒绝"
+        )
+        QApplication.alert(self)
+    
+    def on_file_request_cancelled(self, transfer_id: str):
+        """
+        文件请求被对方撤回或已过期
+        
+        Args:
+            transfer_id: 传输ID
+        """
+        self.pending_offers.pop(transfer_id, None)
+        self.panel_transfers.close_offer(transfer_id, 'withdrawn')
+    
+    def on_accept_offer(self, transfer_id: str):
+        """
+        传输面板接受按钮：选择保存位置后接受请求，取消选择则请求保持待处理
+        
+        Args:
+            transfer_id: 传输ID
+        """
+        file_info = self.pending_offers.get(transfer_id)
+        if not file_info or not self.file_transfer:
+            return
+        default_path = os.path.join(self.file_transfer.download_dir, file_info.filename)
+        save_path, _ = QFileDialog.getSaveFileName(
             self,
-            "文件传输请求",
-            f"来自 {file_info.sender.username} 的文件: {file_info.filename} ({format_file_size(file_info.filesize)})\n是否接受?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-            QMessageBox.StandardButton.Yes
+            "选择保存位置",
+            default_path,
+            "所有文件 (*.*)"
         )
-        if reply == QMessageBox.StandardButton.Yes:
-            default_path = os.path.join(DOWNLOAD_DIR, file_info.filename)
-            save_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "选择保存位置",
-                default_path,
-                "所有文件 (*.*)"
-            )
-            if save_path:
-                self.file_transfer.accept_file(file_info, save_path)
-            else:
-                self.file_transfer.reject_file(file_info)
-        else:
+        if not save_path or transfer_id not in self.pending_offers:
+            return
+        self.pending_offers.pop(transfer_id)
+        if not self.file_transfer.accept_file(file_info, save_path):
+            self.panel_transfers.close_offer(transfer_id, 'withdrawn')
+    
+    def on_reject_offer(self, transfer_id: str):
+        """
+        传输面板拒绝按钮
+        
+        Args:
+            transfer_id: 传输ID
+        """
+        file_info = self.pending_offers.pop(transfer_id, None)
+        if file_info and self.file_transfer:
             self.file_transfer.reject_file(file_info)
+        self.panel_transfers.close_offer(transfer_id, 'rejected')
+    
+    def on_transfer_progress(self, progress: TransferProgress):
+        """
+        文件传输进度信号的槽函数（已限流，约每100毫秒或每1%一次）
+        
+        Args:
+            progress: 传输进度详情
+        """
+        self.panel_transfers.update_progress(progress)
+    
+    def on_pause_transfer(self, transfer_id: str):
+        """
+        传输面板暂停按钮
+        
+        Args:
+            transfer_id: 传输ID
+        """
+        if self.file_transfer:
+            self.file_transfer.pause_transfer(transfer_id)
     
-    def on_transfer_progress(self, filename: str, percentage: int):
+    def on_resume_transfer(self, transfer_id: str):
         """
-        文件传输进度信号的槽函数
+        传输面板继续按钮
         
         Args:
-            filename: 文件名
-            percentage: 进度百分比
+            transfer_id: 传输ID
         """
-        self.progress_file.setVisible(True)
-        self.progress_file.setValue(percentage)
-        self.progress_file.setFormat(f"{filename} {percentage}%")
+        if self.file_transfer:
+            self.file_transfer.resume_transfer(transfer_id)
+    
+    def on_cancel_transfer(self, transfer_id: str):
+        """
+        传输面板取消按钮
+        
+        Args:
+            transfer_id: 传输ID
+        """
+        if self.file_transfer:
+            self.file_transfer.cancel_transfer(transfer_id)
     
     def on_member_list_updated(self, members: list):
         """
@@ -414,6 +552,13 @@ class MainWindow(QMainWindow):
             item = QListWidgetItem(f"{member.username} ({member.ip})")
             item.setData(Qt.ItemDataRole.UserRole, member)
             self.list_members.addItem(item)
+        # 已离开的成员灰色显示，发给他们的消息在其上线后自动发送
+        departed = self.member_manager.get_departed_members() if self.member_manager else []
+        for member in reversed(departed):
+            item = QListWidgetItem(f"{member.username} ({member.ip}) [离线]")
+            item.setData(Qt.ItemDataRole.UserRole, member)
+            item.setForeground(Qt.GlobalColor.gray)
+            self.list_members.addItem(item)
     
     def append_chat_message(self, sender: str, content: str, is_broadcast: bool = False, target: Optional[str] = None):
         """
@@ -425,6 +570,32 @@ class MainWindow(QMainWindow):
             is_broadcast: 是否是广播消息
             target: 私聊目标（可选）
         """
+        self.append_chat_lines([self.format_chat_message(sender, content, is_broadcast, target)])
+    
+    def append_chat_lines(self, lines: list):
+        """
+        在聊天窗口一次性添加多条已格式化的消息
+        
+        Args:
+            lines: format_chat_message返回的HTML行
+        """
+        if lines:
+            self.text_chat.append("<br>".join(lines))
+    
+    def format_chat_message(self, sender: str, content: str, is_broadcast: bool = False,
+                            target: Optional[str] = None) -> str:
+        """
+        把一条消息格式化为聊天窗口中的HTML行
+        
+        Args:
+            sender: 发送者
+            content: 消息内容
+            is_broadcast: 是否是广播消息
+            target: 私聊目标（可选）
+            
+        Returns:
+            str: HTML行
+        """
         if is_broadcast:
             prefix = "<span style='color:#9cdcfe;'>[广播]</span>"
             route = f"{sender} → 所有人"
@@ -435,7 +606,7 @@ class MainWindow(QMainWindow):
             else:
                 route = sender
         safe_content = content.replace("<", "&lt;").replace(">", "&gt;")
-        self.text_chat.append(f"{prefix} {route}: {safe_content}")
+        return f"{prefix} {route}: {safe_content}"
     
     def show_about(self):
         """
@@ -471,15 +642,9 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            # 清理资源
-            if self.member_manager:
-                self.member_manager.broadcast_leave()
-            if self.network_discovery:
-                self.network_discovery.stop()
-            if self.file_transfer:
-                self.file_transfer.stop()
-            if self.message_dispatcher:
-                self.message_dispatcher.stop()
+            # 清理资源：广播离开消息并停止所有服务
+            if self.node:
+                self.node.stop()
             event.accept()
         else:
             event.ignore()
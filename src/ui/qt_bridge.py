@@ -0,0 +1,111 @@
+"""
+Qt信号桥模块
+功能：把核心模块在网络线程中发射的纯Python信号转发到Qt主线程执行，
+核心模块因此无需依赖PyQt6，图形界面只是其上的一个适配层。
+网络线程与主线程之间是有界的多优先级队列（common.event_queue.LaneQueue）：
+控制事件优先于一对一消息，一对一消息优先于广播；主线程每轮事件循环最多处理
+UI_DRAIN_BATCH个事件，消息洪泛时界面仍能及时响应，丢弃的事件计入统计
+"""
+
+from typing import Callable, Hashable, Optional
+
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+from ..common.config import *
+from ..common.event_queue import DROP_NEWEST, DROP_OLDEST, LaneQueue
+from ..common.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 通道，按优先级从高到低
+LANE_CONTROL = 'control'
+LANE_P2P = 'p2p'
+LANE_BROADCAST = 'broadcast'
+
+
+class QtSignalBridge(QObject):
+    """
+    信号桥类
+    网络线程把(槽函数, 参数)放入队列，队列由空变为非空时经跨线程的pyqtSignal唤醒主线程分批处理
+    """
+
+    _wakeup = pyqtSignal()
+    events_dropped = pyqtSignal(int)  # 累计丢弃的事件数增加时发射（在主线程中）
+
+    def __init__(self, parent=None, batch_size: int = UI_DRAIN_BATCH):
+        """
+        初始化信号桥（必须在主线程中创建）
+
+        Args:
+            parent: 父对象
+            batch_size: 每轮事件循环最多处理的事件数
+        """
+        super().__init__(parent)
+        self.batch_size = batch_size
+        self.queue = LaneQueue([
+            (LANE_CONTROL, UI_QUEUE_CONTROL_CAPACITY, DROP_NEWEST),
+            (LANE_P2P, UI_QUEUE_P2P_CAPACITY, DROP_OLDEST),
+            (LANE_BROADCAST, UI_QUEUE_BROADCAST_CAPACITY, DROP_OLDEST),
+        ], on_ready=self._wakeup.emit)
+        self._reported_drops = 0
+        # 总是排队执行，主线程中调用call时也不会在调用处同步处理队列
+        self._wakeup.connect(self._drain, Qt.ConnectionType.QueuedConnection)
+
+    def connect(self, signal, slot: Callable, lane: str = LANE_CONTROL,
+                key: Optional[Callable[..., Hashable]] = None, batch: bool = False):
+        """
+        把核心模块的信号连接到界面槽函数，槽函数总是在主线程中执行
+
+        Args:
+            signal: 核心模块的Signal实例
+            slot: 界面槽函数
+            lane: 事件通道
+            key: 从信号参数计算合并键的函数，队列中同键的事件只保留最新的一个
+            batch: 为True时同一轮中的事件合并为一次调用，槽函数收到参数元组的列表
+        """
+        def forward(*args):
+            self.queue.put(lane, (slot, args, batch), None if key is None else (slot, key(*args)))
+        signal.connect(forward)
+
+    def call(self, slot: Callable, *args):
+        """
+        在主线程中调用一个函数（可在任意线程中调用，经控制通道排队）
+
+        Args:
+            slot: 要调用的函数
+            *args: 参数
+        """
+        self.queue.put(LANE_CONTROL, (slot, args, False))
+
+    def stats(self) -> dict:
+        """队列统计，见LaneQueue.stats"""
+        return self.queue.stats()
+
+    def _drain(self):
+        items, more = self.queue.get_batch(self.batch_size)
+        try:
+            batches = {}
+            for slot, args, batch in items:
+                if batch:
+                    batches.setdefault(slot, []).append(args)
+                else:
+                    self._invoke(slot, args)
+            for slot, arg_list in batches.items():
+                self._invoke(slot, (arg_list,))
+        finally:
+            if more:
+                # 剩余事件留到下一轮，先让界面处理绘制和输入
+                QTimer.singleShot(0, self._drain)
+        dropped = self.queue.dropped()
+        if dropped > self._reported_drops:
+            logger.warning("界面处理不过来，已丢弃 %d 个网络事件", dropped - self._reported_drops)
+            self._reported_drops = dropped
+            self.events_dropped.emit(dropped)
+
+    @staticmethod
+    def _invoke(slot: Callable, args: tuple):
+        """调用一个槽函数，出错时记录日志后继续处理其余事件，一个槽函数的异常不会丢掉整批事件"""
+        try:
+            slot(*args)
+        except Exception:
+            logger.exception("界面处理网络事件出错: %s", getattr(slot, '__qualname__', slot))
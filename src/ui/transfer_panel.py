@@ -0,0 +1,232 @@
+"""
+文件传输面板模块
+功能：以表格列出收到的文件请求和所有传输任务（等待、排队、进行中、已结束），
+显示进度、速率和剩余时间，并提供接受/拒绝、暂停/继续/取消操作；
+收到的请求只是表格中的一行，不弹出模态对话框，多个请求可以随时分别处理
+"""
+
+from typing import Dict, Optional
+
+from PyQt6.QtWidgets import (
+    QGroupBox, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QPushButton, QProgressBar, QHeaderView, QAbstractItemView
+)
+from PyQt6.QtCore import Qt, pyqtSignal
+
+from ..common.message_types import FileTransferInfo, TransferProgress
+from ..common.utils import format_file_size, format_duration
+
+# 状态显示文本
+STATE_TEXT = {
+    'offer': "待接受",
+    'rejected': "已拒绝",
+    'withdrawn': "已撤回",
+    'waiting': "等待对方",
+    'queued': "排队中",
+    'running': "传输中",
+    'paused': "已暂停",
+    'completed': "已完成",
+    'failed': "失败",
+    'cancelled': "已取消",
+}
+FINISHED_STATES = ('completed', 'failed', 'cancelled', 'rejected', 'withdrawn')
+
+
+class TransferPanel(QGroupBox):
+    """
+    文件传输面板
+    以传输ID为键维护表格行，所有方法都必须在主线程中调用
+    """
+
+    accept_requested = pyqtSignal(str)  # 接受文件请求 (transfer_id)
+    reject_requested = pyqtSignal(str)  # 拒绝文件请求 (transfer_id)
+    pause_requested = pyqtSignal(str)  # 请求暂停 (transfer_id)
+    resume_requested = pyqtSignal(str)  # 请求继续 (transfer_id)
+    cancel_requested = pyqtSignal(str)  # 请求取消 (transfer_id)
+
+    COLUMNS = ("文件", "成员", "方向", "状态", "进度", "速率 / 剩余")
+
+    def __init__(self, parent=None):
+        """
+        初始化传输面板
+
+        Args:
+            parent: 父控件
+        """
+        super().__init__("文件传输", parent)
+        self._states: Dict[str, str] = {}
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.itemSelectionChanged.connect(self._update_buttons)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.btn_accept = QPushButton("接受")
+        self.btn_accept.clicked.connect(lambda: self._request(self.accept_requested))
+        self.btn_reject = QPushButton("拒绝")
+        self.btn_reject.clicked.connect(lambda: self._request(self.reject_requested))
+        self.btn_pause = QPushButton("暂停")
+        self.btn_pause.clicked.connect(lambda: self._request(self.pause_requested))
+        self.btn_resume = QPushButton("继续")
+        self.btn_resume.clicked.connect(lambda: self._request(self.resume_requested))
+        self.btn_cancel = QPushButton("取消")
+        self.btn_cancel.clicked.connect(lambda: self._request(self.cancel_requested))
+        self.btn_clear = QPushButton("清除已结束")
+        self.btn_clear.clicked.connect(self.clear_finished)
+        for button in (self.btn_accept, self.btn_reject, self.btn_pause,
+                       self.btn_resume, self.btn_cancel, self.btn_clear):
+            button_layout.addWidget(button)
+        button_layout.addStretch()
+        layout.addLayout(button_layout)
+
+        self._update_buttons()
+
+    # ========== 更新 ==========
+
+    def add_offer(self, file_info: FileTransferInfo):
+        """
+        收到文件请求，新增一行等待用户接受或拒绝，并选中该行
+
+        Args:
+            file_info: 文件传输信息
+        """
+        row = self._row_for(file_info.transfer_id)
+        self._set_state(file_info.transfer_id, row, 'offer')
+        self._set_text(row, 0, file_info.filename)
+        self._set_text(row, 1, file_info.sender.username)
+        self._set_text(row, 2, "接收")
+        self._set_text(row, 5, format_file_size(file_info.filesize))
+        self.table.selectRow(row)
+        self._update_buttons()
+
+    def close_offer(self, transfer_id: str, state: str):
+        """
+        文件请求已处理或失效
+
+        Args:
+            transfer_id: 传输ID
+            state: 'rejected' 或 'withdrawn'
+        """
+        row = self._find_row(transfer_id)
+        if row >= 0 and self._states.get(transfer_id) == 'offer':
+            self._set_state(transfer_id, row, state)
+            self._update_buttons()
+
+    def update_task(self, task):
+        """
+        传输任务状态变化
+
+        Args:
+            task: TransferTask
+        """
+        row = self._row_for(task.transfer_id)
+        state = task.state.value
+        self._set_state(task.transfer_id, row, state)
+        direction = "发送" if task.direction.value == 'send' else "接收"
+        self._set_text(row, 0, task.filename)
+        self._set_text(row, 1, task.peer_name)
+        self._set_text(row, 2, direction)
+        bar = self._progress_bar(row)
+        if task.total_bytes:
+            bar.setValue(min(100, int(task.bytes_done * 100 / task.total_bytes)))
+        if state == 'completed':
+            bar.setValue(100)
+        if state in FINISHED_STATES:
+            self._set_text(row, 5, format_file_size(task.total_bytes))
+        self._update_buttons()
+
+    def update_progress(self, progress: TransferProgress):
+        """
+        传输进度更新（已限流）
+
+        Args:
+            progress: 传输进度详情
+        """
+        row = self._find_row(progress.transfer_id)
+        if row < 0:
+            return
+        bar = self._progress_bar(row)
+        bar.setValue(progress.percent)
+        bar.setFormat(
+            f"{progress.percent}%  {format_file_size(int(progress.bytes_done))}"
+            f" / {format_file_size(progress.total_bytes)}"
+        )
+        if self._states.get(progress.transfer_id) not in FINISHED_STATES:
+            self._set_text(row, 5, f"{format_file_size(int(progress.bytes_per_sec))}/s  "
+                                   f"{format_duration(progress.eta_seconds)}")
+
+    def clear_finished(self):
+        """
+        移除已结束的传输
+        """
+        for row in reversed(range(self.table.rowCount())):
+            transfer_id = self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
+            if self._states.get(transfer_id) in FINISHED_STATES:
+                self.table.removeRow(row)
+                del self._states[transfer_id]
+        self._update_buttons()
+
+    # ========== 内部 ==========
+
+    def selected_id(self) -> Optional[str]:
+        """当前选中行的传输ID"""
+        rows = self.table.selectionModel().selectedRows() if self.table.selectionModel() else []
+        if not rows:
+            return None
+        item = self.table.item(rows[0].row(), 0)
+        return item.data(Qt.ItemDataRole.UserRole) if item else None
+
+    def _request(self, signal):
+        transfer_id = self.selected_id()
+        if transfer_id:
+            signal.emit(transfer_id)
+
+    def _set_state(self, transfer_id: str, row: int, state: str):
+        self._states[transfer_id] = state
+        self._set_text(row, 3, STATE_TEXT.get(state, state))
+
+    def _update_buttons(self):
+        state = self._states.get(self.selected_id() or '')
+        self.btn_accept.setEnabled(state == 'offer')
+        self.btn_reject.setEnabled(state == 'offer')
+        self.btn_pause.setEnabled(state in ('queued', 'running'))
+        self.btn_resume.setEnabled(state == 'paused')
+        self.btn_cancel.setEnabled(state is not None and state not in FINISHED_STATES + ('offer',))
+
+    def _row_for(self, transfer_id: str) -> int:
+        row = self._find_row(transfer_id)
+        if row >= 0:
+            return row
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        item = QTableWidgetItem()
+        item.setData(Qt.ItemDataRole.UserRole, transfer_id)
+        self.table.setItem(row, 0, item)
+        bar = QProgressBar()
+        bar.setRange(0, 100)
+        self.table.setCellWidget(row, 4, bar)
+        return row
+
+    def _find_row(self, transfer_id: str) -> int:
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item and item.data(Qt.ItemDataRole.UserRole) == transfer_id:
+                return row
+        return -1
+
+    def _progress_bar(self, row: int) -> QProgressBar:
+        return self.table.cellWidget(row, 4)
+
+    def _set_text(self, row: int, column: int, text: str):
+        item = self.table.item(row, column)
+        if item is None:
+            item = QTableWidgetItem()
+            self.table.setItem(row, column, item)
+        item.setText(text)
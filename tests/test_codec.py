@@ -0,0 +1,66 @@
+"""
+消息编解码器测试
+所有可用的编解码器共用同一份语料：任意两种实现之间编码、解码结果一致，
+并且都能解码旧版本（标准库json，带空格）编码的消息
+"""
+
+import itertools
+import json
+import os
+import sys
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.common.codec import JsonCodec, available_codecs, select_codec
+from src.common.message_types import ChatMessage, FileTransferInfo, Member, MessageType
+
+ALICE = Member('Alice', '192.168.1.10', 40000, 40001, '0a1b2c3d')
+BOB = Member('张三', '192.168.1.20', 40002, 40003, '4e5f6a7b')
+
+CORPUS = [
+    {'msg_type': MessageType.DISCOVERY.value, 'sender': ALICE.to_dict(), 'content': 'CHAT_DISCOVER'},
+    {'msg_type': MessageType.LEAVE.value, 'sender': BOB.to_dict()},
+    ChatMessage(MessageType.P2P_MESSAGE, ALICE, '你好，世界 🌏', BOB).to_dict(),
+    ChatMessage(MessageType.P2P_MESSAGE, BOB, 'compact', ALICE).to_compact_dict(),
+    ChatMessage(MessageType.BROADCAST_MESSAGE, ALICE, 'quote " backslash \\ newline \n tab \t nul \x00').to_dict(),
+    ChatMessage(MessageType.BROADCAST_MESSAGE, BOB, '').to_compact_dict(),
+    {'msg_type': MessageType.FILE_REQUEST.value, 'sender': ALICE.to_dict(), 'transfer_id': '0123456789abcdef',
+     'file': FileTransferInfo('资料 v2.zip', 2 ** 40 + 7, ALICE, BOB, '0123456789abcdef', 'ab' * 32).to_dict(),
+     'swarm': None},
+    {'manifest': {'version': 'sha256-1', 'block_size': 1048576, 'blocks': ['00' * 32, 'ff' * 32]},
+     'rate': 1.25e8, 'ratio': 0.5, 'paused': False, 'done': True, 'members': [[1, 2], []]},
+]
+
+CODECS = available_codecs()
+
+
+def test_json_codec_is_always_available():
+    assert isinstance(CODECS['json'], JsonCodec)
+    assert select_codec('no-such-codec').name == 'json'
+    assert select_codec('auto').name == next(iter(CODECS))
+
+
+@pytest.mark.parametrize('encoder,decoder', list(itertools.product(CODECS, repeat=2)))
+def test_corpus_round_trips_between_codecs(encoder, decoder):
+    for message in CORPUS:
+        data = CODECS[encoder].encode(message)
+        assert isinstance(data, bytes)
+        data.decode('utf-8')
+        assert CODECS[decoder].decode(data) == message
+
+
+@pytest.mark.parametrize('name', list(CODECS))
+def test_decodes_legacy_encoding(name):
+    for message in CORPUS:
+        for legacy in (json.dumps(message, ensure_ascii=False), json.dumps(message)):
+            assert CODECS[name].decode(legacy.encode('utf-8')) == message
+
+
+@pytest.mark.parametrize('name', list(CODECS))
+def test_malformed_input_raises(name):
+    for data in (b'', b'{"a": ', b'\xff\xfe', b'{"a": 1}}'):
+        with pytest.raises(Exception):
+            CODECS[name].decode(data)
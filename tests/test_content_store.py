@@ -0,0 +1,146 @@
+"""
+内容寻址缓存测试
+覆盖索引的淘汰、失效、加入和命中时的内容校验、持久化，以及重复分发同一文件时的本地复用
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.core.content_store import ContentStore, link_or_copy
+from src.core.manifest import build_manifest
+from src.core.node import ChatNode
+from src.core.transfer_manager import TransferState
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def _content_hash(path):
+    return build_manifest(path).root
+
+
+def _make_file(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_lookup_and_lru_eviction(tmp_path):
+    store = ContentStore(max_entries=2)
+    paths = [_make_file(tmp_path / f'{i}.bin', bytes([i]) * 10) for i in range(3)]
+    hashes = [_content_hash(path) for path in paths]
+    store.add(hashes[0], paths[0])
+    store.add(hashes[1], paths[1])
+    # 访问第一个后它成为最近使用的，加入第三个时淘汰第二个
+    assert store.lookup(hashes[0], 10) == paths[0]
+    store.add(hashes[2], paths[2])
+    assert store.lookup(hashes[1], 10) is None
+    assert store.lookup(hashes[0], 10) == paths[0]
+    assert store.lookup(hashes[2], 10) == paths[2]
+    # 淘汰只影响索引，不删除文件
+    assert os.path.exists(paths[1])
+
+
+def test_size_bound(tmp_path):
+    store = ContentStore(max_bytes=150)
+    big = _make_file(tmp_path / 'big.bin', b'b' * 100)
+    small = _make_file(tmp_path / 'small.bin', b's' * 60)
+    store.add(_content_hash(big), big)
+    store.add(_content_hash(small), small)
+    assert len(store) == 1
+    assert store.total_bytes == 60
+
+
+def test_modified_file_is_dropped(tmp_path):
+    store = ContentStore()
+    path = tmp_path / 'data.bin'
+    _make_file(path, b'original')
+    content_hash = _content_hash(str(path))
+    store.add(content_hash, str(path))
+    path.write_bytes(b'changed!')
+    os.utime(path, ns=(0, 0))
+    assert store.lookup(content_hash, 8) is None
+    assert len(store) == 0
+
+
+def test_file_is_rehashed_on_add_and_lookup(tmp_path):
+    store = ContentStore()
+    original = _make_file(tmp_path / 'original.bin', b'original')
+    other = _make_file(tmp_path / 'other.bin', b'imposter')
+    content_hash = _content_hash(original)
+    # 路径上的文件不是该内容时不加入索引
+    store.add(content_hash, other)
+    assert len(store) == 0
+
+    store.add(content_hash, original)
+    stat = os.stat(original)
+    # 内容被替换，但大小和修改时间都与索引中一致
+    (tmp_path / 'original.bin').write_bytes(b'replaced')
+    os.utime(original, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert store.lookup(content_hash, 8) is None
+    assert len(store) == 0
+
+
+def test_index_persists(tmp_path):
+    index_path = str(tmp_path / 'index.json')
+    path = _make_file(tmp_path / 'data.bin', b'payload')
+    store = ContentStore(index_path)
+    content_hash = _content_hash(path)
+    store.add(content_hash, path)
+    assert ContentStore(index_path).lookup(content_hash, 7) == os.path.abspath(path)
+
+
+def test_link_or_copy_replaces_existing_target(tmp_path):
+    source = _make_file(tmp_path / 'source.bin', b'content')
+    target = tmp_path / 'out' / 'target.bin'
+    target.parent.mkdir()
+    target.write_bytes(b'old')
+    assert link_or_copy(source, str(target)) in ('link', 'copy')
+    assert target.read_bytes() == b'content'
+    assert link_or_copy(source, source) == 'same'
+
+
+@pytest.fixture
+def nodes(tmp_path):
+    port = free_udp_port()
+    pair = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                     interfaces=[LOOPBACK], discovery_port=port) for name in ("A", "B")]
+    for node in pair:
+        node.start()
+    yield pair
+    for node in pair:
+        node.stop()
+
+
+def test_repeated_distribution_is_served_locally(nodes, tmp_path):
+    """第二次收到相同内容时在本地复用，发送方不建立数据连接。"""
+    sender, receiver = nodes
+    source = tmp_path / 'installer.bin'
+    source.write_bytes(os.urandom(200000))
+    receiver.file_transfer.file_request_received.connect(receiver.file_transfer.accept_file)
+    connections = []
+    original_send = sender.file_transfer._send_file
+    sender.file_transfer._send_file = lambda *args: connections.append(args) or original_send(*args)
+
+    first = sender.file_transfer.send_file(str(source), receiver.local_member)
+    assert _wait_for(lambda: first.state == TransferState.COMPLETED)
+    second = sender.file_transfer.send_file(str(source), receiver.local_member)
+    assert _wait_for(lambda: second.state == TransferState.COMPLETED)
+
+    assert len(connections) == 1
+    saved = [tmp_path / 'B' / 'installer.bin', tmp_path / 'B' / 'installer_1.bin']
+    for path in saved:
+        assert path.read_bytes() == source.read_bytes()
+    assert receiver.file_transfer.scheduler.get(second.transfer_id).state == TransferState.COMPLETED
@@ -0,0 +1,67 @@
+"""
+无界面守护进程与纯Python信号单元测试
+"""
+
+import os
+import sys
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.message_types import Member
+from src.common.signals import Signal
+from src.core.node import ChatNode
+from src.daemon import ChatDaemon
+
+
+def test_signal_connect_emit_disconnect():
+    """信号按实例隔离，单个槽函数出错不影响其他槽函数。"""
+
+    class Sender:
+        fired = Signal(str)
+
+    a, b = Sender(), Sender()
+    received = []
+
+    def bad_slot(value):
+        raise RuntimeError("boom")
+
+    a.fired.connect(bad_slot)
+    a.fired.connect(received.append)
+    a.fired.emit("x")
+    b.fired.emit("y")
+    assert received == ["x"]
+
+    a.fired.disconnect(received.append)
+    a.fired.emit("z")
+    assert received == ["x"]
+
+
+def test_parse_command_text_and_json():
+    """文本简写与JSON命令解析为同样的结构。"""
+    assert ChatDaemon.parse_command("send Bob hello world") == {
+        'cmd': 'send', 'to': 'Bob', 'content': 'hello world'}
+    assert ChatDaemon.parse_command("distribute Bob,Eve a b.zip") == {
+        'cmd': 'distribute', 'to': ['Bob', 'Eve'], 'path': 'a b.zip'}
+    assert ChatDaemon.parse_command('{"cmd": "members"}') == {'cmd': 'members'}
+    assert ChatDaemon.parse_command("   ") is None
+
+
+def test_handle_command_without_network(tmp_path):
+    """不启动网络也能查询状态和成员，未知成员与未知命令返回错误。"""
+    node = ChatNode("Server", local_ip="192.168.1.10", download_dir=str(tmp_path))
+    daemon = ChatDaemon(node)
+    # 默认不自动接收文件，请求等待accept/reject命令
+    assert daemon.auto_accept is False
+    node.member_manager.add_member(Member("Bob", "192.168.1.20", 8888, 8889))
+
+    result = daemon.handle_command({'cmd': 'members'})
+    assert result['ok'] is True
+    assert [m['username'] for m in result['members']] == ['Bob']
+    assert daemon.find_member("192.168.1.20").username == "Bob"
+
+    assert daemon.handle_command({'cmd': 'send', 'to': 'Carol', 'content': 'hi'})['ok'] is False
+    assert daemon.handle_line("bogus")['ok'] is False
+
+    daemon.handle_command({'cmd': 'quit'})
+    assert daemon.stop_event.is_set()
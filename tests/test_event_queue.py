@@ -0,0 +1,129 @@
+"""
+有界事件队列测试
+覆盖优先级、丢弃策略、按键合并，以及Qt信号桥的分批处理
+"""
+
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.common.event_queue import DROP_NEWEST, DROP_OLDEST, LaneQueue
+from src.common.signals import Signal
+
+
+def _queue(on_ready=None):
+    return LaneQueue([('control', 3, DROP_NEWEST), ('chat', 3, DROP_OLDEST)], on_ready)
+
+
+def test_higher_lane_first_and_batch_limit():
+    queue = _queue()
+    for i in range(3):
+        queue.put('chat', f'chat{i}')
+    queue.put('control', 'offer')
+    items, more = queue.get_batch(2)
+    assert items == ['offer', 'chat0'] and more
+    assert queue.get_batch(10) == (['chat1', 'chat2'], False)
+
+
+def test_drop_policies():
+    queue = _queue()
+    for i in range(5):
+        queue.put('chat', i)
+    assert [queue.put('control', i) for i in range(5)] == [True, True, True, False, False]
+    assert queue.get_batch(10)[0] == [0, 1, 2, 2, 3, 4]
+    stats = queue.stats()
+    assert stats['chat']['dropped'] == 2 and stats['control']['dropped'] == 2
+    assert stats['chat']['high_water'] == 3 and stats['chat']['depth'] == 0
+    assert queue.dropped() == 4
+
+
+def test_keyed_events_are_coalesced():
+    queue = _queue()
+    queue.put('control', ('progress', 1), key='t1')
+    queue.put('control', 'offer')
+    queue.put('control', ('progress', 50), key='t1')
+    queue.put('control', ('progress', 99), key='t1')
+    assert queue.get_batch(10)[0] == [('progress', 99), 'offer']
+    assert queue.stats()['control']['coalesced'] == 2
+    # 取出后同一键重新排队
+    queue.put('control', ('progress', 100), key='t1')
+    assert queue.get_batch(10)[0] == [('progress', 100)]
+
+
+def test_ready_callback_only_when_queue_becomes_non_empty():
+    wakeups = []
+    queue = _queue(lambda: wakeups.append(1))
+    queue.put('chat', 1)
+    queue.put('control', 2)
+    assert len(wakeups) == 1
+    queue.get_batch(10)
+    queue.put('chat', 3)
+    assert len(wakeups) == 2
+
+
+class _Source:
+    broadcast = Signal(object)
+    progress = Signal(object)
+
+
+def test_bridge_delivers_flood_in_bounded_batches():
+    QtCore = pytest.importorskip('PyQt6.QtCore')
+    from src.ui.qt_bridge import LANE_BROADCAST, QtSignalBridge
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    bridge = QtSignalBridge(batch_size=50)
+    source = _Source()
+    batches, progress = [], []
+    bridge.connect(source.broadcast, batches.append, lane=LANE_BROADCAST, batch=True)
+    bridge.connect(source.progress, progress.append, key=lambda value: 'task')
+
+    def flood():
+        for i in range(1000):
+            source.broadcast.emit(i)
+            source.progress.emit(i)
+
+    thread = threading.Thread(target=flood)
+    thread.start()
+    thread.join()
+    deadline = time.time() + 5
+    while len(bridge.queue) and time.time() < deadline:
+        app.processEvents()
+    app.processEvents()
+
+    delivered = [args[0] for batch in batches for args in batch]
+    stats = bridge.stats()
+    # 广播队列有界，最早的广播被丢弃，留下的是最新的；进度合并成一次
+    assert delivered == list(range(1000 - len(delivered), 1000))
+    assert stats['broadcast']['dropped'] == 1000 - len(delivered) > 0
+    assert progress == [999]
+    assert all(len(batch) <= 50 for batch in batches)
+
+
+def test_bridge_keeps_draining_after_slot_error():
+    QtCore = pytest.importorskip('PyQt6.QtCore')
+    from src.ui.qt_bridge import QtSignalBridge
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    bridge = QtSignalBridge()
+    source = _Source()
+    delivered = []
+
+    def failing(value):
+        raise RuntimeError("slot error")
+
+    bridge.connect(source.broadcast, failing)
+    bridge.connect(source.progress, delivered.append)
+    for i in range(3):
+        source.broadcast.emit(i)
+        source.progress.emit(i)
+    deadline = time.time() + 5
+    while len(delivered) < 3 and time.time() < deadline:
+        app.processEvents()
+    # 出错的槽函数之后的事件仍然送达
+    assert delivered == [0, 1, 2]
@@ -45,6 +45,30 @@ def test_member_serialization():
     print("✓ 成员序列化测试通过")
 
 
+def test_member_interning():
+    """测试成员不可变，相同地址和字段的成员解析为同一个对象"""
+    member = Member("TestUser", "192.168.1.100", 8888, 8889)
+    data = member.to_dict()
+    first = Member.from_dict(data)
+    assert Member.from_dict(dict(data)) is first
+    # 以实际来源地址覆盖自报IP
+    assert Member.from_dict(data, ip="10.0.0.7").ip == "10.0.0.7"
+    # 字段变化（如对方重启换了TCP端口）时得到新对象
+    restarted = Member.from_dict({**data, 'tcp_port': 9999})
+    assert restarted is not first and restarted.tcp_port == 9999
+    assert Member.from_dict({**data, 'tcp_port': 9999}) is restarted
+
+    try:
+        member.ip = "10.0.0.1"
+        assert False, "Member应不可修改"
+    except AttributeError:
+        pass
+    assert member.replace(tcp_port=1).tcp_port == 1 and member.tcp_port == 8889
+    assert not hasattr(member, '__dict__')
+    assert not hasattr(ChatMessage(MessageType.P2P_MESSAGE, member, "x"), '__dict__')
+    print("✓ 成员复用测试通过")
+
+
 def test_message_serialization():
     """测试消息序列化"""
     sender = Member("User1", "192.168.1.100", 8888, 8889)
@@ -78,6 +102,7 @@ if __name__ == '__main__':
     print("开始运行测试...\n")
     test_member_creation()
     test_member_serialization()
+    test_member_interning()
     test_message_serialization()
     test_get_local_ip()
     print("\n所有测试通过！")
@@ -0,0 +1,194 @@
+"""
+文件传输请求/接受协议测试
+请求和回复走UDP，数据连接只在接受之后建立
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import FileTransferInfo
+from src.common.utils import serialize_message
+from src.core.node import ChatNode
+from src.core.transfer_manager import TransferState
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def nodes(tmp_path):
+    port = free_udp_port()
+    pair = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                     interfaces=[LOOPBACK], discovery_port=port) for name in ("A", "B")]
+    for node in pair:
+        node.start()
+    yield pair
+    for node in pair:
+        node.stop()
+
+
+def test_slow_accept_opens_connection_only_after_acceptance(nodes, tmp_path):
+    """用户迟迟不处理时不建立连接也不占用线程，接受后传输成功。"""
+    sender, receiver = nodes
+    source = tmp_path / 'report.txt'
+    source.write_bytes(b'x' * 100000)
+    offers = []
+    receiver.file_transfer.file_request_received.connect(offers.append)
+    completed = []
+    receiver.file_transfer.transfer_completed.connect(lambda name, ok: completed.append(ok))
+
+    threads_before = threading.active_count()
+    task = sender.file_transfer.send_file(str(source), receiver.local_member)
+    assert _wait_for(lambda: len(offers) == 1)
+    assert offers[0].transfer_id == task.transfer_id
+    time.sleep(0.3)
+    assert task.state == TransferState.WAITING
+    assert receiver.file_transfer.scheduler.tasks() == []
+    assert threading.active_count() <= threads_before
+
+    assert receiver.file_transfer.accept_file(offers[0])
+    assert _wait_for(lambda: completed == [True])
+    assert _wait_for(lambda: task.state == TransferState.COMPLETED)
+    saved = tmp_path / 'B' / 'report.txt'
+    assert saved.read_bytes() == source.read_bytes()
+
+
+def test_same_filename_offers_are_independent(nodes, tmp_path):
+    """同名文件的多个请求以传输ID区分，可以分别接受或拒绝。"""
+    sender, receiver = nodes
+    first, second = tmp_path / 'one', tmp_path / 'two'
+    first.mkdir()
+    second.mkdir()
+    (first / 'same.bin').write_bytes(b'1' * 1000)
+    (second / 'same.bin').write_bytes(b'2' * 2000)
+    offers = []
+    receiver.file_transfer.file_request_received.connect(offers.append)
+
+    task_one = sender.file_transfer.send_file(str(first / 'same.bin'), receiver.local_member)
+    task_two = sender.file_transfer.send_file(str(second / 'same.bin'), receiver.local_member)
+    assert _wait_for(lambda: len(offers) == 2)
+    by_id = {offer.transfer_id: offer for offer in offers}
+    receiver.file_transfer.reject_file(by_id[task_one.transfer_id])
+    assert receiver.file_transfer.accept_file(by_id[task_two.transfer_id])
+
+    assert _wait_for(lambda: task_one.state == TransferState.FAILED)
+    assert _wait_for(lambda: task_two.state == TransferState.COMPLETED)
+    assert (tmp_path / 'B' / 'same.bin').read_bytes() == b'2' * 2000
+    # 已处理的请求不能再次接受
+    assert not receiver.file_transfer.accept_file(by_id[task_one.transfer_id])
+
+
+def test_concurrent_same_filename_offers_get_distinct_paths(nodes, tmp_path):
+    """两个发送方的同名文件同时被接受，在写入之前就分到不同的保存路径，互不覆盖。"""
+    sender, receiver = nodes
+    other = ChatNode("C", local_ip="127.0.0.1", download_dir=str(tmp_path / "C"),
+                     interfaces=[LOOPBACK], discovery_port=sender.message_dispatcher.discovery_port)
+    other.start()
+    try:
+        payloads = {}
+        offers, completed = [], []
+        receiver.file_transfer.file_request_received.connect(offers.append)
+        receiver.file_transfer.transfer_completed.connect(lambda name, ok: completed.append(ok))
+        for node, fill in ((sender, b'a'), (other, b'c')):
+            folder = tmp_path / f"from_{node.local_member.username}"
+            folder.mkdir()
+            (folder / 'same.bin').write_bytes(fill * 50000)
+            task = node.file_transfer.send_file(str(folder / 'same.bin'), receiver.local_member)
+            payloads[task.transfer_id] = fill * 50000
+        assert _wait_for(lambda: len(offers) == 2)
+        # 两个请求都接受之后才开始传输
+        for offer in offers:
+            assert receiver.file_transfer.accept_file(offer)
+        assert _wait_for(lambda: completed == [True, True])
+        saved = {(tmp_path / 'B' / name).read_bytes() for name in ('same.bin', 'same_1.bin')}
+        assert saved == set(payloads.values())
+    finally:
+        other.stop()
+
+
+def test_sender_cancel_withdraws_offer(nodes, tmp_path):
+    sender, receiver = nodes
+    source = tmp_path / 'draft.txt'
+    source.write_bytes(b'draft')
+    offers, withdrawn = [], []
+    receiver.file_transfer.file_request_received.connect(offers.append)
+    receiver.file_transfer.file_request_cancelled.connect(withdrawn.append)
+
+    task = sender.file_transfer.send_file(str(source), receiver.local_member)
+    assert _wait_for(lambda: len(offers) == 1)
+    assert sender.file_transfer.cancel_transfer(task.transfer_id)
+    assert task.state == TransferState.CANCELLED
+    assert _wait_for(lambda: withdrawn == [task.transfer_id])
+    assert not receiver.file_transfer.accept_file(offers[0])
+
+
+def test_unaccepted_connection_is_refused(nodes, tmp_path):
+    """未经接受的数据连接直接被关闭。"""
+    sender, receiver = nodes
+    info = FileTransferInfo('evil.bin', 10, sender.local_member, receiver.local_member, 'deadbeef')
+    header = serialize_message(info.to_dict())
+    with socket.create_connection(('127.0.0.1', receiver.local_member.tcp_port), timeout=5) as s:
+        s.sendall(len(header).to_bytes(4, 'big') + header + b'0' * 10)
+        try:
+            reply = s.recv(1)
+        except ConnectionResetError:
+            reply = b''
+        assert reply == b''
+    assert not (tmp_path / 'B' / 'evil.bin').exists()
+
+
+def test_offered_filename_cannot_escape_download_dir(nodes, tmp_path):
+    """请求中的文件名只保留最后一段，带路径的文件名仍保存在下载目录中。"""
+    sender, receiver = nodes
+    source = tmp_path / 'escape.bin'
+    source.write_bytes(b'e' * 5000)
+    offers = []
+    receiver.file_transfer.file_request_received.connect(offers.append)
+    completed = []
+    receiver.file_transfer.transfer_completed.connect(lambda name, ok: completed.append(ok))
+    # 恶意发送方在请求中使用带路径的文件名
+    send_offer = sender.file_transfer._send_offer
+    sender.file_transfer._send_offer = lambda info: send_offer(
+        FileTransferInfo('../x', info.filesize, info.sender, info.receiver, info.transfer_id, info.content_hash))
+
+    task = sender.file_transfer.send_file(str(source), receiver.local_member)
+    assert _wait_for(lambda: len(offers) == 1)
+    assert offers[0].filename == 'x'
+    assert receiver.file_transfer.accept_file(offers[0])
+    assert _wait_for(lambda: completed == [True])
+    assert _wait_for(lambda: task.state == TransferState.COMPLETED)
+    assert (tmp_path / 'B' / 'x').read_bytes() == source.read_bytes()
+    assert not (tmp_path / 'x').exists()
+
+
+def test_offer_with_invalid_filename_is_rejected(nodes, tmp_path):
+    """文件名为空、"."或".."的请求直接拒绝，不询问用户。"""
+    sender, receiver = nodes
+    offers = []
+    receiver.file_transfer.file_request_received.connect(offers.append)
+    offered_name = ['']
+    send_offer = sender.file_transfer._send_offer
+    sender.file_transfer._send_offer = lambda info: send_offer(FileTransferInfo(
+        offered_name[0], info.filesize, info.sender, info.receiver, info.transfer_id))
+    for index, name in enumerate(('..', '.', '', 'dir/..')):
+        offered_name[0] = name
+        source = tmp_path / f'file{index}.bin'
+        source.write_bytes(b'data')
+        task = sender.file_transfer.send_file(str(source), receiver.local_member)
+        assert _wait_for(lambda: task.state == TransferState.FAILED)
+    assert offers == []
@@ -0,0 +1,65 @@
+"""
+文件传输吞吐量基准测试
+"""
+
+import os
+import sys
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.bench.file_transfer import (
+    baseline_rules, create_test_file, parse_size, rounds_for, run_encryption_overhead,
+    run_file_transfer_benchmark
+)
+from src.core import secure_channel
+from src.bench.metrics import compare_with_baseline
+
+
+def test_parse_size():
+    assert parse_size('1K') == 1024
+    assert parse_size('100M') == 100 * 1024 * 1024
+    assert parse_size('2g') == 2 * 1024 ** 3
+    assert parse_size('512') == 512
+
+
+def test_large_test_file_is_sparse(tmp_path):
+    """1GB及以上的测试文件以稀疏文件创建，几乎不占用磁盘。"""
+    path = tmp_path / 'sparse.bin'
+    create_test_file(str(path), parse_size('1G'))
+    assert path.stat().st_size == parse_size('1G')
+    if hasattr(path.stat(), 'st_blocks'):
+        assert path.stat().st_blocks * 512 < parse_size('1M')
+
+
+def test_small_files_are_repeated():
+    assert rounds_for(parse_size('1K')) > rounds_for(parse_size('1M')) > 1
+    assert rounds_for(parse_size('2G')) == 1
+
+
+def test_benchmark_reports_metrics(tmp_path):
+    """两个回环FileTransfer实例之间传输成功，并记录各项指标。"""
+    result = run_file_transfer_benchmark(['1K', '256K'], work_dir=str(tmp_path))
+    assert set(result['cases']) == {'1K', '256K'}
+    for case in result['cases'].values():
+        assert case['success']
+        assert case['mb_per_s'] > 0
+        assert case['cpu_seconds'] >= 0
+        assert case['peak_rss_bytes'] > 0
+        assert case['threads_created'] >= 1
+    # 与自身对比不应报告退化
+    assert compare_with_baseline(result, result, baseline_rules(result)) == []
+    # 临时文件全部清理
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.skipif(not secure_channel.available(), reason="未安装cryptography")
+def test_encryption_overhead_reports_both_modes(tmp_path):
+    """加密开销对比分别记录明文和加密传输的吞吐量。"""
+    result = run_encryption_overhead(['256K'], work_dir=str(tmp_path), repeats=1)
+    case = result['cases']['256K']
+    assert case['plaintext_mb_per_s'] > 0 and case['encrypted_mb_per_s'] > 0
+    assert case['overhead'] == 1 - case['encrypted_mb_per_s'] / case['plaintext_mb_per_s']
+    assert os.listdir(str(tmp_path)) == []
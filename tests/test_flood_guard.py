@@ -0,0 +1,101 @@
+"""
+防洪泛预过滤测试
+覆盖格式预过滤、按来源地址和消息类型限速，以及分发器丢弃洪泛的数据报
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import Member, MessageType
+from src.common.packet import encode_packet
+from src.common.utils import generate_node_id
+from src.core.flood_guard import DROP_MALFORMED, DROP_SOURCE, DROP_TYPE, FloodGuard
+from src.core.message_dispatcher import MessageDispatcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _packet(msg_type):
+    return encode_packet({'msg_type': msg_type, 'sender_id': 'abcd', 'content': 'x'})
+
+
+def test_malformed_datagrams_are_dropped():
+    guard = FloodGuard()
+    packet = _packet('P2P_MESSAGE')
+    assert guard.admit(b'{"msg_type": "P2P_MESSAGE"}', ('10.0.0.1', 1)) is None
+    assert guard.admit(b'XX' + packet[2:], ('10.0.0.1', 1)) is None  # 魔数不对
+    assert guard.admit(packet[:2] + b'\x09' + packet[3:], ('10.0.0.1', 1)) is None  # 版本不对
+    assert guard.admit(packet[:-1], ('10.0.0.1', 1)) is None  # 长度不对
+    assert len(guard.admit(packet + packet, ('10.0.0.1', 1))) == 2
+    assert guard.stats()['dropped'][DROP_MALFORMED] == 4
+
+
+def test_source_and_type_limits():
+    clock = FakeClock()
+    guard = FloodGuard(source_rate=10, source_burst=10, type_limits={'REFRESH': (1, 2)}, clock=clock)
+    flooder, other = ('10.0.0.1', 5000), ('10.0.0.2', 5000)
+    assert [bool(guard.admit(_packet('REFRESH'), flooder)) for _ in range(4)] == [True, True, False, False]
+    # 刷新请求超限不影响同一来源的其他消息，也不影响其他来源
+    assert guard.admit(_packet('P2P_MESSAGE'), flooder)
+    assert guard.admit(_packet('REFRESH'), other)
+    assert sum(bool(guard.admit(_packet('P2P_MESSAGE'), flooder)) for _ in range(20)) == 5
+    assert guard.stats()['dropped'] == {DROP_MALFORMED: 0, DROP_SOURCE: 15, DROP_TYPE: 2}
+
+    clock.now += 1.0
+    assert guard.admit(_packet('REFRESH'), flooder)
+
+
+def test_batched_datagram_counts_each_message_type():
+    guard = FloodGuard(type_limits={'REFRESH': (1, 1)}, clock=FakeClock())
+    batch = _packet('P2P_MESSAGE') + _packet('REFRESH')
+    assert guard.admit(batch, ('10.0.0.1', 1))
+    assert not guard.admit(batch, ('10.0.0.1', 1))
+
+
+def test_source_table_is_bounded():
+    guard = FloodGuard(max_sources=3)
+    for port in range(10):
+        guard.admit(_packet('P2P_MESSAGE'), ('10.0.0.1', port))
+    assert guard.stats()['sources'] == 3
+
+
+def test_dispatcher_drops_flood_before_dispatch():
+    member = Member('user', '127.0.0.1', 0, 0, generate_node_id())
+    dispatcher = MessageDispatcher(member, [LOOPBACK], free_udp_port())
+    received, p2p = [], []
+    dispatcher.broadcast_message.connect(lambda message, addr: received.append(message))
+    dispatcher.p2p_message.connect(lambda message, addr: p2p.append(message))
+    dispatcher.start()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        data = encode_packet({'msg_type': MessageType.BROADCAST_MESSAGE.value,
+                                  'sender_id': 'flooder', 'content': 'spam'})
+        for i in range(300):
+            sock.sendto(data, ('127.0.0.1', dispatcher.local_member.udp_port))
+            if i % 50 == 49:
+                time.sleep(0.005)  # 不让接收缓冲区溢出
+        # 洪泛来源的其他消息不受广播限速影响，收到它说明洪泛的数据报都已处理
+        sock.sendto(_packet(MessageType.P2P_MESSAGE.value), ('127.0.0.1', dispatcher.local_member.udp_port))
+        deadline = time.time() + 5
+        while not p2p and time.time() < deadline:
+            time.sleep(0.01)
+        assert p2p
+        burst = dispatcher.flood_guard.type_limits['BROADCAST_MESSAGE'][1]
+        assert burst <= len(received) < 300
+        assert dispatcher.flood_guard.stats()['dropped'][DROP_TYPE] > 0
+    finally:
+        sock.close()
+        dispatcher.stop()
@@ -0,0 +1,49 @@
+"""
+日志模块单元测试
+"""
+
+import logging
+import os
+import queue
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.logger import DropQueueHandler, RateLimitFilter, get_logger
+
+
+def _make_record(msg, level=logging.ERROR, name="chat.test"):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+def test_rate_limit_suppresses_duplicates():
+    """相同内容的日志在间隔内只放行一次，之后附带被抑制的条数。"""
+    limiter = RateLimitFilter(interval=60)
+    assert limiter.filter(_make_record("接收消息出错: boom")) is True
+    for _ in range(5):
+        assert limiter.filter(_make_record("接收消息出错: boom")) is False
+    # 不同内容不受影响
+    assert limiter.filter(_make_record("接收消息出错: other")) is True
+
+    limiter.interval = 0.0001
+    time.sleep(0.001)
+    record = _make_record("接收消息出错: boom")
+    assert limiter.filter(record) is True
+    assert "已抑制 5 条" in record.getMessage()
+
+
+def test_drop_queue_handler_never_blocks():
+    """队列满时丢弃日志而不是阻塞调用线程。"""
+    handler = DropQueueHandler(queue.Queue(maxsize=2))
+    for i in range(10):
+        handler.handle(_make_record(f"msg {i}"))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 8
+
+
+def test_get_logger_namespace():
+    """模块logger统一挂在chat根logger下，便于按模块配置级别。"""
+    logger = get_logger("src.core.message_dispatcher")
+    assert logger.name == "chat.core.message_dispatcher"
@@ -0,0 +1,143 @@
+"""
+分块清单测试
+覆盖清单计算与缓存、边接收边校验，以及只重传校验失败的块
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import FileTransferInfo, Member
+from src.core.file_transfer import FileTransfer
+from src.core.manifest import BlockVerifier, Manifest, ManifestCache, build_manifest
+from src.core.node import ChatNode
+from src.core.transfer_manager import TransferDirection, TransferState, TransferTask
+
+BLOCK = 4096
+
+
+def _feed(verifier, data, step):
+    for pos in range(0, len(data), step):
+        verifier.update(data[pos:pos + step])
+
+
+def test_manifest_roundtrip_and_validation(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(os.urandom(BLOCK * 3 + 7))
+    manifest = build_manifest(str(path), BLOCK)
+    assert manifest.block_count == 4
+    assert manifest.block_range(3) == (BLOCK * 3, 7)
+    copy = Manifest.from_dict(manifest.to_dict())
+    assert copy.root == manifest.root
+    with pytest.raises(ValueError):
+        Manifest.from_dict({**manifest.to_dict(), 'filesize': BLOCK * 10})
+    # 空文件没有块
+    empty = tmp_path / 'empty.bin'
+    empty.write_bytes(b'')
+    assert build_manifest(str(empty), BLOCK).block_count == 0
+
+
+def test_cache_reuses_until_file_changes(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'a' * BLOCK)
+    cache = ManifestCache(block_size=BLOCK)
+    first = cache.get(str(path))
+    assert cache.get(str(path)) is first
+    path.write_bytes(b'b' * BLOCK)
+    os.utime(path, ns=(0, 0))
+    assert cache.get(str(path)).root != first.root
+
+
+@pytest.mark.parametrize('step', [1000, BLOCK, BLOCK * 3 + 1])
+def test_verifier_reports_corrupted_blocks(tmp_path, step):
+    data = os.urandom(BLOCK * 4 + 10)
+    path = tmp_path / 'data.bin'
+    path.write_bytes(data)
+    manifest = build_manifest(str(path), BLOCK)
+    corrupted = bytearray(data)
+    corrupted[BLOCK + 5] ^= 0xFF
+    corrupted[BLOCK * 4 + 2] ^= 0x01
+    verifier = BlockVerifier(manifest)
+    _feed(verifier, bytes(corrupted), step)
+    assert verifier.finish() == [1, 4]
+
+    truncated = BlockVerifier(manifest)
+    _feed(truncated, data[:-1], step)
+    assert truncated.finish() is None
+
+
+def test_bad_blocks_are_resent(tmp_path):
+    """只重传校验失败的块，写回原位置。"""
+    data = os.urandom(BLOCK * 4 + 10)
+    source = tmp_path / 'source.bin'
+    source.write_bytes(data)
+    manifest = build_manifest(str(source), BLOCK)
+    corrupted = bytearray(data)
+    corrupted[BLOCK] ^= 0xFF
+    corrupted[BLOCK * 3 + 100] ^= 0xFF
+    target = tmp_path / 'target.bin'
+    target.write_bytes(bytes(corrupted))
+
+    member = Member('A', '127.0.0.1', 0, 0)
+    transfer = FileTransfer(member, None, download_dir=str(tmp_path))
+    task = TransferTask(TransferDirection.SEND, 'source.bin', member, len(data), runner=lambda t: True)
+    info = FileTransferInfo('source.bin', len(data), member, member, task.transfer_id, manifest.root)
+    sender_sock, receiver_sock = socket.socketpair()
+    resent = []
+
+    def _sender():
+        with open(source, 'rb') as f:
+            while sender_sock.recv(1) == b'R':
+                transfer._resend_blocks(sender_sock, f, manifest, task)
+                resent.append(task.bytes_done)
+
+    thread = threading.Thread(target=_sender, daemon=True)
+    thread.start()
+    with open(target, 'r+b') as f:
+        assert transfer._repair_blocks(receiver_sock, f, manifest, [1, 3], info)
+    receiver_sock.sendall(b'1')
+    thread.join(timeout=5)
+    sender_sock.close()
+    receiver_sock.close()
+    assert target.read_bytes() == data
+    assert resent == [BLOCK * 2]
+
+
+def test_corruption_that_keeps_size_is_detected(tmp_path):
+    """内容被改动但大小不变时，接收方不会确认接收。"""
+    port = free_udp_port()
+    sender, receiver = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                                 interfaces=[LOOPBACK], discovery_port=port) for name in ("A", "B")]
+    for node in (sender, receiver):
+        node.start()
+    try:
+        source = tmp_path / 'image.bin'
+        source.write_bytes(os.urandom(300000))
+        offers = []
+        receiver.file_transfer.file_request_received.connect(offers.append)
+        task = sender.file_transfer.send_file(str(source), receiver.local_member)
+        deadline = time.time() + 5
+        while not offers and time.time() < deadline:
+            time.sleep(0.01)
+        # 请求发出后文件被改写，大小和修改时间都不变
+        stat = source.stat()
+        source.write_bytes(os.urandom(300000))
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert receiver.file_transfer.accept_file(offers[0])
+        deadline = time.time() + 10
+        while not task.finished and time.time() < deadline:
+            time.sleep(0.01)
+        assert task.state == TransferState.FAILED
+        assert len(receiver.file_transfer.content_store) == 0
+    finally:
+        for node in (sender, receiver):
+            node.stop()
@@ -0,0 +1,19 @@
+"""
+消息内存占用基准测试
+用少量消息运行基准，确认共享发送者对象并且占用低于改造前的表示
+"""
+
+import os
+import sys
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.memory import run_memory_benchmark
+
+
+def test_messages_share_sender_objects():
+    result = run_memory_benchmark(messages=5000, peers=50)
+    assert result['after']['distinct_senders'] == 50
+    assert result['before']['distinct_senders'] == 5000
+    assert result['after']['bytes_per_message'] < result['before']['bytes_per_message'] / 2
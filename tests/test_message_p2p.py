@@ -11,6 +11,8 @@ from PyQt6.QtCore import QCoreApplication
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.common.message_types import Member, ChatMessage, MessageType
+from src.common.utils import serialize_message
+from src.core.member_manager import MemberManager
 from src.core.message_p2p import MessageP2P
 
 
@@ -81,8 +83,73 @@ def test_handle_message_emit_signal():
     assert received[0].receiver.username == "Alice"
 
 
+class RecordingDispatcher:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, message_dict, ip, port):
+        self.sent.append((message_dict, ip, port))
+        return True
+
+
+def test_compact_message_resolves_known_sender():
+    """双方都有节点ID时只发送节点ID，包长度减少一半以上，接收方从成员列表中查出发送者。"""
+    _ensure_qt_app()
+    alice = Member("Alice", "192.168.1.10", 8888, 8889, node_id="a1a1a1a1")
+    bob = Member("Bob", "192.168.1.20", 9999, 10000, node_id="b2b2b2b2")
+
+    sender_dispatcher = RecordingDispatcher()
+    sender = MessageP2P(alice, sender_dispatcher, MemberManager(alice, sender_dispatcher))
+    assert sender.send_p2p_message(bob, "hello")
+    compact = sender_dispatcher.sent[0][0]
+    assert 'sender' not in compact and compact['sender_id'] == alice.node_id
+    full = ChatMessage(MessageType.P2P_MESSAGE, alice, "hello", bob).to_dict()
+    assert len(serialize_message(compact)) * 2 < len(serialize_message(full))
+
+    manager = MemberManager(bob, RecordingDispatcher())
+    manager.add_member(alice)
+    receiver = MessageP2P(bob, manager.dispatcher, manager)
+    received = []
+    receiver.message_received.connect(received.append)
+    receiver.handle_message(compact, (alice.ip, alice.udp_port))
+    assert len(received) == 1
+    assert received[0].sender is alice and received[0].receiver is bob
+    assert received[0].content == "hello"
+
+    # 发给本端口上其他节点ID的消息被忽略
+    receiver.handle_message({**compact, 'receiver_id': 'ffffffff'}, (alice.ip, alice.udp_port))
+    assert len(received) == 1
+
+
+def test_unknown_sender_is_looked_up():
+    """未知节点ID的消息暂存，向来源地址查询，对方回复后再送出。"""
+    _ensure_qt_app()
+    alice = Member("Alice", "192.168.1.10", 8888, 8889, node_id="a1a1a1a1")
+    bob = Member("Bob", "192.168.1.20", 9999, 10000, node_id="b2b2b2b2")
+    dispatcher = RecordingDispatcher()
+    manager = MemberManager(bob, dispatcher)
+    receiver = MessageP2P(bob, dispatcher, manager)
+    received = []
+    receiver.message_received.connect(received.append)
+
+    compact = ChatMessage(MessageType.P2P_MESSAGE, alice, "first", bob).to_compact_dict()
+    receiver.handle_message(compact, (alice.ip, alice.udp_port))
+    receiver.handle_message({**compact, 'content': "second"}, (alice.ip, alice.udp_port))
+    assert received == []
+    # 重发间隔内只查询一次
+    assert len(dispatcher.sent) == 1
+    request, ip, port = dispatcher.sent[0]
+    assert request['msg_type'] == MessageType.DISCOVERY.value and (ip, port) == (alice.ip, alice.udp_port)
+
+    manager.add_member(alice)
+    assert [m.content for m in received] == ["first", "second"]
+    assert received[0].sender is alice
+
+
 if __name__ == "__main__":
     _ensure_qt_app()
     test_send_p2p_message()
     test_handle_message_emit_signal()
+    test_compact_message_resolves_known_sender()
+    test_unknown_sender_is_looked_up()
     print("MessageP2P tests passed.")
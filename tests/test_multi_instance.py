@@ -0,0 +1,65 @@
+"""
+同机多实例集成测试
+多个节点在回环网卡上共享发现端口，各自使用系统分配的消息端口和文件端口
+"""
+
+import os
+import socket
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.utils import NetworkInterface
+from src.core.node import ChatNode
+
+LOOPBACK = NetworkInterface("lo", "127.0.0.1", "255.0.0.0")
+
+
+def _free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(condition, timeout=5.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_nodes_discover_each_other_on_one_host(tmp_path):
+    """三个同机节点相互发现，一对一消息送达正确的实例。"""
+    discovery_port = _free_udp_port()
+    nodes = [
+        ChatNode(f"Node{i}", local_ip="127.0.0.1", download_dir=str(tmp_path / str(i)),
+                 interfaces=[LOOPBACK], discovery_port=discovery_port)
+        for i in range(3)
+    ]
+    received = []
+    nodes[2].message_p2p.message_received.connect(received.append)
+    try:
+        for node in nodes:
+            node.start()
+
+        ports = {node.local_member.udp_port for node in nodes}
+        assert len(ports) == 3 and 0 not in ports
+        assert all(node.local_member.tcp_port for node in nodes)
+
+        assert _wait_for(lambda: all(
+            len(node.member_manager.get_member_list()) == 2 for node in nodes))
+
+        target = nodes[0].member_manager.get_member_by_ip(
+            "127.0.0.1", nodes[2].local_member.udp_port)
+        assert target is not None and target.username == "Node2"
+        assert nodes[0].message_p2p.send_p2p_message(target, "hello")
+        assert _wait_for(lambda: len(received) == 1)
+        assert received[0].content == "hello"
+        assert received[0].sender.username == "Node0"
+    finally:
+        for node in nodes:
+            node.stop()
@@ -0,0 +1,51 @@
+"""
+多网卡检测与节点ID单元测试
+"""
+
+import os
+import sys
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.message_types import Member
+from src.common.utils import NetworkInterface, UNKNOWN_NETMASK, select_interfaces
+from src.core.member_manager import MemberManager
+
+
+def test_broadcast_from_netmask():
+    """广播地址由各网卡的子网掩码推导。"""
+    assert NetworkInterface("eth0", "192.168.1.23", "255.255.255.0").broadcast == "192.168.1.255"
+    assert NetworkInterface("wlan0", "10.20.30.40", "255.255.240.0").broadcast == "10.20.31.255"
+    assert NetworkInterface("lo", "127.0.0.1", "255.0.0.0").is_loopback
+    assert NetworkInterface("x", "10.0.0.1", UNKNOWN_NETMASK).broadcast == "255.255.255.255"
+
+
+def test_select_interfaces_filters_and_dedupes():
+    """默认跳过回环和虚拟网卡，同一网段只保留一个网卡。"""
+    candidates = [
+        NetworkInterface("lo", "127.0.0.1", "255.0.0.0"),
+        NetworkInterface("eth0", "192.168.1.10", "255.255.255.0"),
+        NetworkInterface("eth0:1", "192.168.1.11", "255.255.255.0"),
+        NetworkInterface("wlan0", "10.0.0.5", "255.255.255.0"),
+        NetworkInterface("docker0", "172.17.0.1", "255.255.0.0"),
+    ]
+    names = [i.name for i in select_interfaces(candidates, names=[])]
+    assert names == ["eth0", "wlan0"]
+
+    # 显式指定时即使是回环网卡也会使用
+    names = [i.name for i in select_interfaces(candidates, names=["lo", "docker0"])]
+    assert names == ["lo", "docker0"]
+
+
+def test_member_manager_dedupes_by_node_id():
+    """同一节点经不同网段被发现时只保留一个成员，自己的节点ID被忽略。"""
+    local = Member("Alice", "192.168.1.10", 8888, 8889, node_id="aaaa0001")
+    manager = MemberManager(local, None)
+
+    manager.add_member(Member("Alice", "10.0.0.5", 8888, 8889, node_id="aaaa0001"))
+    manager.add_member(Member("Bob", "192.168.1.20", 8888, 8889, node_id="bbbb0002"))
+    manager.add_member(Member("Bob", "10.0.0.20", 8888, 8889, node_id="bbbb0002"))
+
+    members = manager.get_member_list()
+    assert [m.username for m in members] == ["Bob"]
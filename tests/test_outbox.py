@@ -0,0 +1,176 @@
+"""
+离线消息测试
+覆盖发件箱的数量、成员数和时间上限、持久化、只删除发送成功的消息，
+长时间没有回应的成员被视为离线，以及对方重新上线后自动发出
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import Member
+from src.core.member_manager import MemberManager
+from src.core.node import ChatNode
+from src.core.outbox import Outbox
+
+BOB = Member('Bob', '10.0.0.2', 9001, 9002, '0000000b')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_outbox_bounds():
+    clock = FakeClock()
+    outbox = Outbox(max_messages=3, max_peers=2, max_age=60, clock=clock)
+    for i in range(5):
+        outbox.put(BOB, f'm{i}')
+    assert outbox.pending(BOB) == 3
+    # 对方重启后端口和节点ID不同，仍是同一个发件箱
+    assert outbox.take(BOB.replace(udp_port=9100, node_id='0000000c')) == ['m2', 'm3', 'm4']
+    assert outbox.take(BOB) == []
+
+    outbox.put(BOB, 'old')
+    clock.now += 61
+    outbox.put(BOB, 'new')
+    assert outbox.take(BOB) == ['new']
+
+    for name in ('A', 'B', 'C'):
+        outbox.put(Member(name, '10.0.0.9', 1, 2), name)
+    assert outbox.pending() == 2
+    assert outbox.pending(Member('A', '10.0.0.9', 1, 2)) == 0
+
+
+def test_outbox_is_persisted(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / 'outbox.json')
+    outbox = Outbox(path, max_age=60, clock=clock)
+    outbox.put(BOB, '你好')
+    outbox.put(BOB, 'expires')
+    assert Outbox(path, clock=clock).take(BOB) == ['你好', 'expires']
+
+    # 重新加载时丢弃过期的消息；取出的消息不会再次加载
+    clock.now += 61
+    assert Outbox(path, max_age=60, clock=clock).pending() == 0
+    assert Outbox(path, clock=clock).take(BOB) == []
+
+
+def test_only_sent_messages_leave_the_outbox():
+    outbox = Outbox()
+    for i in range(3):
+        outbox.put(BOB, f'm{i}')
+    attempts = []
+
+    def flaky(content):
+        attempts.append(content)
+        return content != 'm1'
+
+    # 第二条发送失败：第一条已发出，第二、三条留在发件箱中
+    assert outbox.deliver(BOB, flaky) == 1
+    assert attempts == ['m0', 'm1'] and outbox.pending(BOB) == 2
+
+    def send_and_queue(content):
+        if content == 'm1':
+            outbox.put(BOB, 'late')
+        return True
+
+    # 发送期间新暂存的消息不会被删除
+    assert outbox.deliver(BOB, send_and_queue) == 2
+    assert outbox.take(BOB) == ['late']
+
+
+def test_silent_members_are_expired():
+    clock = FakeClock()
+    manager = MemberManager(Member('Alice', '10.0.0.1', 9001, 9002, '0000000a'), None, clock=clock)
+    carol = Member('Carol', '10.0.0.3', 9001, 9002, '0000000c')
+    manager.add_member(BOB)
+    manager.add_member(carol)
+    removed = []
+    manager.member_removed.connect(removed.append)
+    clock.now += 60
+    # Bob回复了刷新（发现响应），Carol没有回复
+    manager.add_member(BOB)
+    clock.now += 40
+    assert manager.expire_silent(90) == [carol]
+    assert removed == [carol] and manager.get_member_list() == [BOB]
+    assert manager.get_departed_members() == [carol]
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_messages_for_departed_member_are_sent_when_it_returns(tmp_path):
+    port = free_udp_port()
+
+    def make(name):
+        return ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                        interfaces=[LOOPBACK], discovery_port=port)
+
+    alice, bob = make('Alice'), make('Bob')
+    alice.start()
+    bob.start()
+    try:
+        assert _wait_for(lambda: alice.member_manager.get_member_list())
+        bob.stop()
+        assert _wait_for(lambda: alice.member_manager.get_departed_members())
+        departed, = alice.member_manager.get_departed_members()
+        queued = []
+        alice.message_p2p.message_queued.connect(queued.append)
+        for i in range(3):
+            assert alice.message_p2p.send_p2p_message(departed, f'msg{i}')
+        assert len(queued) == 3 and alice.outbox.pending() == 3
+
+        # Bob重新启动：端口和节点ID都变了，加入消息触发发送
+        bob = make('Bob')
+        received = []
+        bob.message_p2p.message_received.connect(lambda message: received.append(message.content))
+        bob.start()
+        assert _wait_for(lambda: len(received) == 3)
+        assert received == ['msg0', 'msg1', 'msg2']
+        assert alice.outbox.pending() == 0
+        assert not alice.member_manager.get_departed_members()
+    finally:
+        alice.stop()
+        bob.stop()
+
+
+def test_sleeping_member_goes_offline_and_outbox_is_in_state_dir(tmp_path):
+    port = free_udp_port()
+    alice = ChatNode('Alice', local_ip="127.0.0.1", download_dir=str(tmp_path / 'Alice'),
+                     interfaces=[LOOPBACK], discovery_port=port, state_dir=str(tmp_path / 'state'))
+    bob = ChatNode('Bob', local_ip="127.0.0.1", download_dir=str(tmp_path / 'Bob'),
+                   interfaces=[LOOPBACK], discovery_port=port)
+    alice.refresh_interval = 0.1
+    alice.start()
+    bob.start()
+    try:
+        assert _wait_for(lambda: alice.member_manager.get_member_list())
+        time.sleep(0.5)
+        # Bob仍回复刷新请求，不会被移除
+        assert alice.member_manager.get_member_list()
+        # Bob睡眠：不再回应，也没有发送离开消息
+        bob.message_dispatcher.stop()
+        assert _wait_for(lambda: alice.member_manager.get_departed_members())
+        departed, = alice.member_manager.get_departed_members()
+        assert alice.message_p2p.send_p2p_message(departed, 'later')
+        assert alice.outbox.pending() == 1
+        # 离线消息保存在状态目录中，不出现在下载目录里
+        assert os.path.exists(tmp_path / 'state' / 'outbox.json')
+        assert not os.path.exists(tmp_path / 'Alice' / 'outbox.json')
+    finally:
+        alice.stop()
+        bob.stop()
@@ -0,0 +1,64 @@
+"""
+数据报帧格式测试
+覆盖帧头编码、多帧拆分，以及分发器只看帧头就跳过无关消息
+"""
+
+import json
+import os
+import sys
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.common.message_types import ChatMessage, Member, MessageType
+from src.common.packet import ANY_NODE, HEADER, MAGIC, VERSION, encode_packet, split_frames
+from src.core.message_dispatcher import (
+    SKIP_NOT_FOR_ME, SKIP_OWN, SKIP_PLAINTEXT, SKIP_SPOOFED, SKIP_UNDECRYPTABLE, SKIP_UNKNOWN_TYPE, MessageDispatcher
+)
+
+ALICE = Member('Alice', '10.0.0.1', 9001, 9002, '0000000a')
+BOB = Member('Bob', '10.0.0.2', 9001, 9002, '0000000b')
+EVE = Member('Eve', '10.0.0.3', 9001, 9002, '0000000e')
+
+
+def test_header_carries_type_and_parties():
+    for message in (ChatMessage(MessageType.P2P_MESSAGE, ALICE, 'hi', BOB).to_dict(),
+                    ChatMessage(MessageType.P2P_MESSAGE, ALICE, 'hi', BOB).to_compact_dict()):
+        data = encode_packet(message)
+        frame, = split_frames(data)
+        assert frame.msg_type == MessageType.P2P_MESSAGE
+        assert frame.sender == bytes.fromhex('0000000a') and frame.receiver == bytes.fromhex('0000000b')
+        assert json.loads(data[frame.start:frame.end]) == message
+
+    frame, = split_frames(encode_packet(ChatMessage(MessageType.BROADCAST_MESSAGE, ALICE, 'all').to_dict()))
+    assert frame.receiver == ANY_NODE
+
+
+def test_unknown_type_code_is_kept_as_none():
+    body = b'{}'
+    data = HEADER.pack(MAGIC, VERSION, 200, len(body), ANY_NODE, ANY_NODE) + body
+    frame, = split_frames(data)
+    assert frame.msg_type is None
+
+
+def test_dispatcher_skips_irrelevant_frames_without_decoding(monkeypatch):
+    dispatcher = MessageDispatcher(BOB, [])
+    received = []
+    dispatcher.p2p_message.connect(lambda message, addr: received.append(message['content']))
+    decoded = []
+    import src.core.message_dispatcher as module
+    original = module.deserialize_message
+    monkeypatch.setattr(module, 'deserialize_message', lambda data: decoded.append(data) or original(data))
+
+    unknown = HEADER.pack(MAGIC, VERSION, 200, 2, ANY_NODE, ANY_NODE) + b'{}'
+    data = b''.join([
+        encode_packet(ChatMessage(MessageType.P2P_MESSAGE, ALICE, 'for bob', BOB).to_compact_dict()),
+        encode_packet(ChatMessage(MessageType.P2P_MESSAGE, ALICE, 'for eve', EVE).to_compact_dict()),
+        encode_packet(ChatMessage(MessageType.P2P_MESSAGE, BOB, 'own', ALICE).to_compact_dict()),
+        unknown,
+    ])
+    dispatcher._dispatch(data, ('10.0.0.1', 9001), split_frames(data))
+    assert received == ['for bob']
+    assert len(decoded) == 1
+    assert dispatcher.skipped == {SKIP_UNKNOWN_TYPE: 1, SKIP_OWN: 1, SKIP_NOT_FOR_ME: 1,
+                                  SKIP_UNDECRYPTABLE: 0, SKIP_PLAINTEXT: 0, SKIP_SPOOFED: 0}
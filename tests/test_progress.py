@@ -0,0 +1,92 @@
+"""
+传输进度限流上报测试
+"""
+
+import os
+import sys
+import threading
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.utils import format_duration
+from src.core.node import ChatNode
+from src.core.progress import ProgressReporter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reports_by_step_and_interval():
+    """进度每增加1%或距上次上报超过间隔时才上报。"""
+    clock = FakeClock()
+    reports = []
+    reporter = ProgressReporter('a.bin', 1000 * 1024, reports.append,
+                                min_interval=0.1, min_step=1, clock=clock)
+    # 每次1KB，共10KB，恰好1%
+    for _ in range(9):
+        reporter.update(1024)
+    assert reports == []
+    reporter.update(1024)
+    assert len(reports) == 1 and reports[0].percent == 1
+
+    # 不足1%但时间超过间隔
+    clock.now = 0.5
+    reporter.update(1024)
+    assert len(reports) == 2
+    assert reports[-1].bytes_per_sec > 0
+    assert reports[-1].eta_seconds is not None
+
+
+def test_finish_reports_once_with_average_rate():
+    clock = FakeClock()
+    reports = []
+    reporter = ProgressReporter('a.bin', 2048, reports.append, clock=clock)
+    reporter.update(1024)
+    clock.now = 2.0
+    reporter.update(1024)
+    reporter.finish()
+    reporter.finish()
+    assert reports[-1].percent == 100
+    assert reports[-1].bytes_per_sec == 1024
+    assert reports[-1].eta_seconds == 0.0
+    assert sum(1 for r in reports if r.bytes_done == 2048) == 2
+
+
+def test_format_duration():
+    assert format_duration(None) == "--"
+    assert format_duration(45) == "45秒"
+    assert format_duration(185) == "3分05秒"
+    assert format_duration(3720) == "1时02分"
+
+
+def test_file_transfer_progress_is_throttled(tmp_path):
+    """8MB文件（约1000个数据块）的进度上报次数不超过约每1%一次。"""
+    source = tmp_path / 'big.bin'
+    source.write_bytes(os.urandom(8 * 1024 * 1024))
+    port = free_udp_port()
+    nodes = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                      interfaces=[LOOPBACK], discovery_port=port) for name in "AB"]
+    sender, receiver = (node.file_transfer for node in nodes)
+    receiver.file_request_received.connect(receiver.accept_file)
+    stats = []
+    receiver.transfer_stats.connect(stats.append)
+    done = threading.Event()
+    receiver.transfer_completed.connect(lambda name, ok: done.set())
+    for node in nodes:
+        node.start()
+    try:
+        sender.send_file(str(source), nodes[1].local_member)
+        assert done.wait(10)
+    finally:
+        for node in nodes:
+            node.stop()
+    assert 0 < len(stats) <= 102
+    assert stats[-1].percent == 100
+    assert stats[-1].bytes_done == 8 * 1024 * 1024
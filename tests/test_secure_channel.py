@@ -0,0 +1,374 @@
+"""
+端到端加密测试
+覆盖密钥协商、加解密、篡改和公钥更换的拒绝、协商超时后的明文回退、密钥过期后重新协商，
+协商成功后拒绝降级为明文、按地址固定公钥、加密帧不能冒充其他发送者，
+以及两个节点之间加密的聊天消息和文件传输
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+pytest.importorskip('cryptography')
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import ChatMessage, Member, MessageType
+from src.common.packet import HEADER, encode_packet, node_id_bytes, split_frames
+from src.common.utils import deserialize_message, generate_node_id
+from src.core.message_dispatcher import MessageDispatcher
+from src.core.node import ChatNode
+from src.core.secure_channel import SecureChannel
+from src.core.transfer_manager import TransferState
+
+ALICE = Member('Alice', '10.0.0.1', 9001, 9002, '0000000a')
+BOB = Member('Bob', '10.0.0.2', 9001, 9002, '0000000b')
+ADDR = {ALICE.node_id: (ALICE.ip, ALICE.udp_port), BOB.node_id: (BOB.ip, BOB.udp_port)}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Endpoint:
+    """一个节点的加密层，发出的数据报先记录下来，由测试决定是否投递"""
+
+    def __init__(self, member, **kwargs):
+        self.member = member
+        self.addr = ADDR[member.node_id]
+        self.sent = []
+        self.received = []
+        self.channel = SecureChannel(node_id_bytes(member.node_id),
+                                     lambda data, addr: self.sent.append(data), **kwargs)
+
+    def deliver_to(self, peer: 'Endpoint'):
+        """把已发出的数据报全部交给对方处理（对方回复的也一并处理，直到没有新数据报）"""
+        while self.sent or peer.sent:
+            for source, target in ((self, peer), (peer, self)):
+                datagrams, source.sent = source.sent, []
+                for data in datagrams:
+                    target.receive(data, source.addr)
+
+    def receive(self, data, addr):
+        for frame in split_frames(data):
+            body = self.channel.open(data, frame, addr) if frame.sealed else data[frame.start:frame.end]
+            if body is None:
+                self.received.append(None)
+                continue
+            message = deserialize_message(body)
+            if frame.msg_type == MessageType.KEY_EXCHANGE:
+                self.channel.handle_message(message, addr)
+            else:
+                self.received.append(message['content'])
+
+
+def _chat(sender, receiver, content):
+    return encode_packet(ChatMessage(MessageType.P2P_MESSAGE, sender, content, receiver).to_compact_dict())
+
+
+def test_handshake_then_messages_are_sealed():
+    alice, bob = Endpoint(ALICE), Endpoint(BOB)
+    assert alice.channel.send(_chat(ALICE, BOB, 'first'), bob.addr)
+    # 第一条消息等待协商，先发出的是协商请求
+    key_exchange, = split_frames(alice.sent[0])
+    assert key_exchange.msg_type == MessageType.KEY_EXCHANGE and alice.channel.stats()['pending'] == 1
+    alice.deliver_to(bob)
+    assert bob.received == ['first']
+
+    alice.channel.send(_chat(ALICE, BOB, '第二条'), bob.addr)
+    bob.channel.send(_chat(BOB, ALICE, 'reply'), alice.addr)
+    sealed = alice.sent[0]
+    frame, = split_frames(sealed)
+    assert frame.sealed and frame.msg_type == MessageType.P2P_MESSAGE
+    assert '第二条'.encode('utf-8') not in sealed
+    alice.deliver_to(bob)
+    assert bob.received == ['first', '第二条'] and alice.received == ['reply']
+    assert alice.channel.stats() == {'sessions': 1, 'pending': 0, 'plaintext': 0}
+
+
+def test_tampered_frames_are_rejected():
+    alice, bob = Endpoint(ALICE), Endpoint(BOB)
+    alice.channel.send(_chat(ALICE, BOB, 'hello'), bob.addr)
+    alice.deliver_to(bob)
+    alice.channel.send(_chat(ALICE, BOB, 'secret'), bob.addr)
+    sealed = alice.sent.pop()
+    for position in (3, 10, len(sealed) - 20, len(sealed) - 1):
+        tampered = bytearray(sealed)
+        tampered[position] ^= 0x01
+        bob.receive(bytes(tampered), alice.addr)
+    # 帧头是附加数据，改动类型码或接收者同样无法通过认证
+    assert bob.received == ['hello', None, None, None, None]
+    bob.receive(sealed, alice.addr)
+    assert bob.received[-1] == 'secret'
+
+
+def test_changed_public_key_is_rejected():
+    alice, bob = Endpoint(ALICE), Endpoint(BOB)
+    alice.channel.send(_chat(ALICE, BOB, 'hello'), bob.addr)
+    alice.deliver_to(bob)
+    # 冒充者使用相同的节点ID和新的密钥对
+    mallory = Endpoint(ALICE)
+    mallory.channel.send(_chat(ALICE, BOB, 'forged'), bob.addr)
+    mallory.deliver_to(bob)
+    assert bob.received == ['hello']
+    assert mallory.channel.stats()['sessions'] == 0
+
+
+def test_falls_back_to_plaintext_when_peer_does_not_answer():
+    alice = Endpoint(ALICE, handshake_timeout=0.05)
+    assert alice.channel.send(_chat(ALICE, BOB, 'queued'), ADDR[BOB.node_id])
+    deadline = time.time() + 2
+    while len(alice.sent) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    # 协商请求之后是以明文发出的暂存消息，之后的消息直接以明文发送
+    plain, = split_frames(alice.sent[1])
+    assert not plain.sealed and b'queued' in alice.sent[1]
+    alice.channel.send(_chat(ALICE, BOB, 'direct'), ADDR[BOB.node_id])
+    assert b'direct' in alice.sent[2] and alice.channel.stats()['plaintext'] == 1
+
+    strict = Endpoint(ALICE, handshake_timeout=0.05, required=True)
+    strict.channel.send(_chat(ALICE, BOB, 'queued'), ADDR[BOB.node_id])
+    time.sleep(0.2)
+    assert len(strict.sent) == 1
+    assert not strict.channel.send(_chat(ALICE, BOB, 'refused'), ADDR[BOB.node_id])
+
+
+def test_expired_key_is_renegotiated_and_old_key_still_decrypts():
+    clock = FakeClock()
+    alice, bob = Endpoint(ALICE, ttl=60, clock=clock), Endpoint(BOB, ttl=60, clock=clock)
+    alice.channel.send(_chat(ALICE, BOB, 'one'), bob.addr)
+    alice.deliver_to(bob)
+    bob.channel.send(_chat(BOB, ALICE, 'old key'), alice.addr)
+    in_flight = bob.sent.pop()
+
+    clock.now += 61
+    alice.channel.send(_chat(ALICE, BOB, 'two'), bob.addr)
+    frame, = split_frames(alice.sent[0])
+    assert frame.msg_type == MessageType.KEY_EXCHANGE
+    alice.deliver_to(bob)
+    alice.receive(in_flight, bob.addr)
+    assert bob.received == ['one', 'two'] and alice.received == ['old key']
+
+
+def test_stream_cipher_round_trip_and_tamper():
+    alice, bob = Endpoint(ALICE), Endpoint(BOB)
+    alice.channel.send(_chat(ALICE, BOB, 'hello'), bob.addr)
+    alice.deliver_to(bob)
+    sender = alice.channel.stream_to(bob.addr)
+    receiver = bob.channel.stream_from(ALICE.node_id, sender.header())
+    assert receiver is not None
+    assert bob.channel.stream_from(BOB.node_id, sender.header()) is None
+
+    chunks = [os.urandom(size) for size in (1, 1000, 65536)]
+    left, right = socket.socketpair()
+    try:
+        for chunk in chunks:
+            left.sendall(sender.seal(chunk))
+        assert [bytes(receiver.recv(right)) for _ in chunks] == chunks
+
+        record = bytearray(sender.seal(b'data'))
+        record[-1] ^= 0x01
+        left.sendall(record)
+        with pytest.raises(ValueError):
+            receiver.recv(right)
+        left.close()
+        assert receiver.recv(right) is None
+    finally:
+        right.close()
+
+
+def test_stream_replies_are_authenticated():
+    alice, bob = Endpoint(ALICE), Endpoint(BOB)
+    alice.channel.send(_chat(ALICE, BOB, 'hello'), bob.addr)
+    alice.deliver_to(bob)
+    sender = alice.channel.stream_to(bob.addr)
+    receiver = bob.channel.stream_from(ALICE.node_id, sender.header())
+    # 接收方的确认和重传请求用反方向的密钥加密
+    replies, answers = receiver.reverse(), sender.reverse()
+    left, right = socket.socketpair()
+    try:
+        right.sendall(replies.seal(b'R' + (1).to_bytes(4, 'big') + (3).to_bytes(4, 'big')))
+        right.sendall(replies.seal(b'1'))
+        assert bytes(answers.recv(left))[:1] == b'R'
+        assert bytes(answers.recv(left)) == b'1'
+        # 中间人写入的明文确认无法通过认证
+        right.sendall(b'1' + bytes(64))
+        with pytest.raises(ValueError):
+            answers.recv(left)
+    finally:
+        left.close()
+        right.close()
+
+
+def test_negotiated_peer_is_not_downgraded_to_plaintext():
+    alice, bob = Endpoint(ALICE, handshake_timeout=0.05), Endpoint(BOB)
+    alice.channel.send(_chat(ALICE, BOB, 'hello'), bob.addr)
+    alice.deliver_to(bob)
+    alice_id = node_id_bytes(ALICE.node_id)
+    # 协商过的地址和节点ID发来的明文聊天消息都不再处理，其他成员和非受保护的消息不受影响
+    assert not bob.channel.accepts_plaintext(MessageType.P2P_MESSAGE, alice_id, alice.addr)
+    assert not bob.channel.accepts_plaintext(MessageType.FILE_REQUEST, alice_id, ('10.0.0.9', 9001))
+    assert not bob.channel.accepts_plaintext(MessageType.P2P_MESSAGE, b'\x00\x00\x00\x0c', alice.addr)
+    assert bob.channel.accepts_plaintext(MessageType.JOIN, alice_id, alice.addr)
+    assert bob.channel.accepts_plaintext(MessageType.P2P_MESSAGE, b'\x00\x00\x00\x0c', ('10.0.0.9', 9001))
+
+    # 对方在同一地址上以不支持加密的版本重启：协商超时后丢弃消息，不以明文发出
+    restarted = Member('Bob', BOB.ip, BOB.udp_port, BOB.tcp_port, '0000000c')
+    assert alice.channel.send(_chat(ALICE, restarted, 'secret'), bob.addr)
+    time.sleep(0.2)
+    assert all(b'secret' not in data for data in alice.sent)
+    assert alice.channel.stats()['plaintext'] == 0
+
+
+def test_pin_is_bound_to_address():
+    alice, bob = Endpoint(ALICE), Endpoint(BOB)
+    alice.channel.send(_chat(ALICE, BOB, 'hello'), bob.addr)
+    alice.deliver_to(bob)
+    # 另一个地址上冒用Alice节点ID的协商不影响Alice的会话
+    mallory = Endpoint(ALICE)
+    mallory.addr = ('10.0.0.66', 9001)
+    mallory.channel.send(_chat(ALICE, BOB, 'from mallory'), bob.addr)
+    mallory.deliver_to(bob)
+    mallory.channel.send(_chat(ALICE, BOB, 'again'), bob.addr)
+    mallory.deliver_to(bob)
+    alice.channel.send(_chat(ALICE, BOB, 'still alice'), bob.addr)
+    alice.deliver_to(bob)
+    assert bob.received == ['hello', 'from mallory', 'again', 'still alice']
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_nodes_exchange_encrypted_messages_and_files(tmp_path):
+    port = free_udp_port()
+    alice, bob = (ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                           interfaces=[LOOPBACK], discovery_port=port) for name in ('Alice', 'Bob'))
+    received, completed = [], threading.Event()
+    bob.message_p2p.message_received.connect(lambda message: received.append(message.content))
+    bob.file_transfer.file_request_received.connect(bob.file_transfer.accept_file)
+    bob.file_transfer.transfer_completed.connect(lambda name, success: success and completed.set())
+    streams = []
+    stream_from = bob.file_transfer.secure.stream_from
+    bob.file_transfer.secure.stream_from = lambda *args: streams.append(args) or stream_from(*args)
+    alice.start()
+    bob.start()
+    try:
+        assert _wait_for(lambda: alice.member_manager.get_member_list())
+        peer, = alice.member_manager.get_member_list()
+        assert alice.message_p2p.send_p2p_message(peer, '加密消息')
+        assert _wait_for(lambda: received == ['加密消息'])
+        assert alice.message_dispatcher.secure.stats()['sessions'] == 1
+        assert bob.message_dispatcher.secure.stats()['sessions'] == 1
+
+        source = tmp_path / 'payload.bin'
+        payload = os.urandom(3 * 1024 * 1024 + 17)
+        source.write_bytes(payload)
+        alice.file_transfer.send_file(str(source), peer)
+        assert completed.wait(10)
+        assert (tmp_path / 'Bob' / 'payload.bin').read_bytes() == payload
+        assert len(streams) == 1
+        assert bob.message_dispatcher.skipped['undecryptable'] == 0
+    finally:
+        alice.stop()
+        bob.stop()
+
+
+def test_node_without_encryption_still_receives_messages(tmp_path):
+    port = free_udp_port()
+    alice = ChatNode('Alice', local_ip="127.0.0.1", download_dir=str(tmp_path / 'Alice'),
+                     interfaces=[LOOPBACK], discovery_port=port)
+    bob = ChatNode('Bob', local_ip="127.0.0.1", download_dir=str(tmp_path / 'Bob'),
+                   interfaces=[LOOPBACK], discovery_port=port, secure=False)
+    alice.message_dispatcher.secure.handshake_timeout = 0.2
+    received = []
+    bob.message_p2p.message_received.connect(lambda message: received.append(message.content))
+    alice.start()
+    bob.start()
+    try:
+        assert bob.message_dispatcher.secure is None
+        assert _wait_for(lambda: alice.member_manager.get_member_list())
+        peer, = alice.member_manager.get_member_list()
+        # Bob不回复密钥协商，协商超时后以明文发出
+        assert alice.message_p2p.send_p2p_message(peer, 'first')
+        assert alice.message_p2p.send_p2p_message(peer, 'second')
+        assert _wait_for(lambda: received == ['first', 'second'])
+        assert alice.message_dispatcher.secure.stats()['plaintext'] == 1
+    finally:
+        alice.stop()
+        bob.stop()
+
+
+def test_required_encryption_refuses_plaintext_swarm(tmp_path):
+    """要求加密时不发起多人分发，也拒绝别人发来的多人分发（分块连接不加密）"""
+    port = free_udp_port()
+    nodes = [ChatNode(f"N{i}", local_ip="127.0.0.1", download_dir=str(tmp_path / f"N{i}"),
+                      interfaces=[LOOPBACK], discovery_port=port) for i in range(3)]
+    seeder, strict, relaxed = nodes
+    offers = []
+    for node in (strict, relaxed):
+        node.file_transfer.file_request_received.connect(offers.append)
+        node.file_transfer.file_request_received.connect(node.file_transfer.accept_file)
+    for node in nodes:
+        node.start()
+    try:
+        source = tmp_path / 'dataset.bin'
+        source.write_bytes(os.urandom(300000))
+        receivers = [strict.local_member, relaxed.local_member]
+
+        seeder.message_dispatcher.secure.required = True
+        task = seeder.file_transfer.distribute_file(str(source), receivers)
+        assert _wait_for(lambda: task.finished)
+        assert task.state == TransferState.FAILED and offers == []
+
+        seeder.message_dispatcher.secure.required = False
+        strict.message_dispatcher.secure.required = True
+        task = seeder.file_transfer.distribute_file(str(source), receivers)
+        assert _wait_for(lambda: task.finished, timeout=20)
+        assert [offer.receiver.username for offer in offers] == ['N2']
+        assert (tmp_path / 'N2' / 'dataset.bin').read_bytes() == source.read_bytes()
+        assert not (tmp_path / 'N1' / 'dataset.bin').exists()
+    finally:
+        for node in nodes:
+            node.stop()
+
+
+def test_sealed_frame_cannot_claim_another_sender():
+    port = free_udp_port()
+    a, b = (MessageDispatcher(Member(name, '127.0.0.1', 0, 0, generate_node_id()), [LOOPBACK], port)
+            for name in ('a', 'b'))
+    received = []
+    b.p2p_message.connect(lambda message, addr: received.append(message['content']))
+    a.start()
+    b.start()
+    try:
+        target = ('127.0.0.1', b.local_member.udp_port)
+        a.send_message({'msg_type': 'P2P_MESSAGE', 'sender_id': a.local_member.node_id, 'content': 'hello'},
+                       *target)
+        assert _wait_for(lambda: received == ['hello'])
+        # 帧头是a（会话的对方），加密的正文却声称来自另一个成员
+        packet = encode_packet({'msg_type': 'P2P_MESSAGE', 'sender_id': a.local_member.node_id,
+                                'content': 'forged'})
+        forged = packet[:HEADER.size] + packet[HEADER.size:].replace(
+            a.local_member.node_id.encode(), b.local_member.node_id.encode())
+        assert a.secure.send(forged, target)
+        assert _wait_for(lambda: b.skipped['spoofed'] == 1)
+        assert received == ['hello']
+    finally:
+        a.stop()
+        b.stop()
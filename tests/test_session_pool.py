@@ -0,0 +1,121 @@
+"""
+数据连接池测试
+覆盖空闲连接的复用、失效检测和超时关闭，以及连续传输复用同一连接
+"""
+
+import os
+import socket
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.core.node import ChatNode
+from src.core.session_pool import SessionPool
+from src.core.transfer_manager import TransferState
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def server():
+    sock = socket.create_server(('127.0.0.1', 0))
+    accepted = []
+    yield sock, accepted
+    for conn in accepted:
+        conn.close()
+    sock.close()
+
+
+def test_released_connection_is_reused(server):
+    listener, accepted = server
+    addr = listener.getsockname()
+    pool = SessionPool(max_idle=1)
+    first, rtt = pool.acquire(addr)
+    accepted.append(listener.accept()[0])
+    assert rtt is not None
+    pool.release(addr, first)
+    second, rtt = pool.acquire(addr)
+    assert second is first and rtt is None
+    assert (pool.connections_created, pool.connections_reused) == (1, 1)
+
+    # 超出空闲上限的连接直接关闭
+    extra, _ = pool.acquire(addr)
+    accepted.append(listener.accept()[0])
+    pool.release(addr, second)
+    pool.release(addr, extra)
+    assert pool.idle_count() == 1
+    assert extra.fileno() == -1
+    pool.close()
+
+
+def test_connection_closed_by_peer_is_not_reused(server):
+    listener, accepted = server
+    addr = listener.getsockname()
+    pool = SessionPool()
+    sock, _ = pool.acquire(addr)
+    peer = listener.accept()[0]
+    pool.release(addr, sock)
+    peer.close()
+    time.sleep(0.05)
+    fresh, rtt = pool.acquire(addr)
+    accepted.append(listener.accept()[0])
+    assert fresh is not sock and rtt is not None
+    assert pool.connections_reused == 0
+    pool.close()
+
+
+def test_idle_connections_expire(server):
+    listener, accepted = server
+    addr = listener.getsockname()
+    pool = SessionPool(idle_timeout=0)
+    sock, _ = pool.acquire(addr)
+    accepted.append(listener.accept()[0])
+    pool.release(addr, sock)
+    assert pool.evict_idle() == 1
+    assert pool.idle_count() == 0 and sock.fileno() == -1
+
+
+def test_back_to_back_transfers_share_connection(tmp_path):
+    port = free_udp_port()
+    nodes = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                      interfaces=[LOOPBACK], discovery_port=port) for name in ("A", "B")]
+    for node in nodes:
+        node.start()
+    try:
+        sender, receiver = nodes
+        receiver.file_transfer.file_request_received.connect(receiver.file_transfer.accept_file)
+        for i in range(3):
+            source = tmp_path / f'file{i}.bin'
+            source.write_bytes(os.urandom(50000 + i))
+            task = sender.file_transfer.send_file(str(source), receiver.local_member)
+            assert _wait_for(lambda: task.finished)
+            assert task.state == TransferState.COMPLETED
+            assert (tmp_path / 'B' / f'file{i}.bin').read_bytes() == source.read_bytes()
+        pool = sender.file_transfer.pool
+        assert (pool.connections_created, pool.connections_reused) == (1, 2)
+
+        # 接收方关闭了保留的连接，发送方发现连接失效后重新建立连接
+        receiver.file_transfer.pool.idle_timeout = 0
+        assert _wait_for(lambda: not receiver.file_transfer._parked)
+        time.sleep(0.05)
+        source = tmp_path / 'after_restart.bin'
+        source.write_bytes(b'x' * 1000)
+        task = sender.file_transfer.send_file(str(source), receiver.local_member)
+        assert _wait_for(lambda: task.finished)
+        assert task.state == TransferState.COMPLETED
+        assert pool.connections_created == 2
+    finally:
+        for node in nodes:
+            node.stop()
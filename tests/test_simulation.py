@@ -0,0 +1,52 @@
+"""
+多节点回环仿真与基准工具测试
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.metrics import compare_with_baseline, percentile
+from src.bench.simulation import BASELINE_RULES, run_simulation
+
+
+def test_percentile_nearest_rank():
+    """分位数采用最近秩法。"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0.0
+
+
+def test_compare_with_baseline():
+    """超出允许范围的指标被报告为退化，方向相反的变化不算退化。"""
+    baseline = {'discovery_convergence_s': 1.0, 'packets_per_second': 1000.0,
+                'broadcast_latency_ms': {'p99': 10.0}}
+    better = {'discovery_convergence_s': 0.5, 'packets_per_second': 2000.0,
+              'broadcast_latency_ms': {'p99': 5.0}}
+    worse = {'discovery_convergence_s': 2.0, 'packets_per_second': 500.0,
+             'broadcast_latency_ms': {'p99': 30.0}}
+    assert compare_with_baseline(better, baseline, BASELINE_RULES) == []
+    assert len(compare_with_baseline(worse, baseline, BASELINE_RULES)) == 3
+
+
+def test_single_process_simulation(tmp_path, monkeypatch):
+    """单进程仿真中所有节点收敛，广播全部送达，结束后不留下临时文件。"""
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    result = run_simulation(nodes=6, senders=2, messages=5, interval=0.0, timeout=10)
+    assert list(tmp_path.iterdir()) == []
+    assert result['converged_nodes'] == 6
+    assert result['discovery_convergence_s'] is not None
+    assert result['deliveries'] == result['expected_deliveries'] == 2 * 5 * 5
+    assert result['broadcast_latency_ms']['p99'] >= result['broadcast_latency_ms']['p50'] > 0
+    assert result['packets_per_second'] > 0
+
+
+def test_multi_process_simulation():
+    """节点分布在多个进程中时同样能相互发现并收到广播。"""
+    result = run_simulation(nodes=6, processes=2, senders=1, messages=3, interval=0.0, timeout=15)
+    assert result['converged_nodes'] == 6
+    assert result['deliveries'] == result['expected_deliveries'] == 3 * 5
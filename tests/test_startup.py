@@ -0,0 +1,87 @@
+"""
+启动耗时基准测试
+用 -X importtime 和首帧墙钟时间跟踪启动开销，防止重新引入启动时的重量级导入
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.startup import measure_first_frame, measure_import, parse_importtime
+
+# 预算留有较大余量，只用于发现数量级上的退化
+IMPORT_BUDGET_SECONDS = 3.0
+FIRST_FRAME_BUDGET_SECONDS = 15.0
+
+
+def test_parse_importtime():
+    """解析 -X importtime 的输出格式。"""
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      2000 |       2500 | src.core\n"
+    )
+    assert parse_importtime(output) == {'_io': (120, 120), 'src.core': (2000, 2500)}
+
+
+def test_package_imports_are_lazy():
+    """导入包本身不会加载任何核心子模块。"""
+    result = measure_import('src.core')
+    assert not [m for m in result['modules'] if m.startswith('src.core.')]
+    assert result['wall_seconds'] < IMPORT_BUDGET_SECONDS
+
+
+def test_core_does_not_import_qt():
+    """核心模块与守护进程不依赖PyQt6。"""
+    for module in ('src.core.node', 'src.daemon'):
+        result = measure_import(module)
+        assert not [m for m in result['modules'] if m.startswith('PyQt6')]
+        assert result['wall_seconds'] < IMPORT_BUDGET_SECONDS
+
+
+@pytest.mark.skipif(importlib.util.find_spec('PyQt6') is None, reason="未安装PyQt6")
+def test_main_window_defers_core_modules():
+    """主窗口模块导入时不加载核心模块，核心模块在首帧之后才导入。"""
+    result = measure_import('src.ui.main_window')
+    assert not [m for m in result['modules'] if m.startswith('src.core.')]
+
+
+@pytest.mark.skipif(importlib.util.find_spec('PyQt6') is None, reason="未安装PyQt6")
+def test_first_frame_budget():
+    """从启动进程到主窗口首次绘制的墙钟时间在预算内。"""
+    result = measure_first_frame()
+    assert result['wall_seconds'] < FIRST_FRAME_BUDGET_SECONDS
+
+
+@pytest.mark.skipif(importlib.util.find_spec('PyQt6') is None, reason="未安装PyQt6")
+def test_startup_failure_is_reported_to_ui(monkeypatch):
+    """后台线程中启动网络服务失败时通过信号桥通知界面，而不是让线程静默退出。"""
+    from types import SimpleNamespace
+    from src.core import node as node_module
+    from src.ui.main_window import MainWindow
+
+    stopped = []
+
+    class _FailingNode:
+        def __init__(self, username, **kwargs):
+            pass
+
+        def start(self):
+            raise OSError("Address already in use")
+
+        def stop(self):
+            stopped.append(True)
+
+    monkeypatch.setattr(node_module, 'ChatNode', _FailingNode)
+    calls = []
+    window = SimpleNamespace(connect_signals=lambda node: None,
+                             bridge=SimpleNamespace(call=lambda slot, *args: calls.append((slot, args))),
+                             on_services_started='started', on_services_failed='failed')
+    MainWindow.init_modules(window, 'Alice')
+    assert calls == [('failed', ("Address already in use",))]
+    assert stopped == [True]
@@ -0,0 +1,147 @@
+"""
+多人分发测试
+一个发送方、多个接收方都在回环地址上，接收方之间互相提供分块
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.core import file_transfer as file_transfer_module
+from src.core.manifest import build_manifest
+from src.core.node import ChatNode
+from src.core.swarm import PieceSet, SwarmSession
+from src.core.transfer_manager import TransferState
+
+PIECE_SIZE = 64 * 1024
+
+
+def _wait_for(condition, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_piece_set_roundtrip():
+    pieces = PieceSet(11)
+    for index in (0, 3, 10):
+        pieces.add(index)
+    pieces.add(3)
+    assert len(pieces) == 3
+    copy = PieceSet.from_bytes(11, pieces.to_bytes())
+    assert [i for i in range(11) if i in copy] == [0, 3, 10]
+    assert not copy.complete
+    assert PieceSet(11, full=True).complete
+
+
+def test_session_pieces_follow_manifest(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'a' * 100 + b'b' * 50)
+    manifest = build_manifest(str(path), 100)
+    session = SwarmSession('x', str(path), 150, 100, manifest)
+    assert session.piece_count == 2 and session.have.complete
+    assert session.piece_range(1) == (100, 50)
+    assert session.verify(1, b'b' * 50)
+    assert not session.verify(1, b'c' * 50)
+
+
+def test_session_serves_only_pieces_it_has(tmp_path):
+    """接收方登记分发状态时文件还不存在，此时的请求按没有该分块回复，而不是让连接处理出错。"""
+    path = tmp_path / 'partial.bin'
+    session = SwarmSession('x', str(path), 150, 100)
+    left, right = socket.socketpair()
+    left.settimeout(5)
+    server = threading.Thread(target=session.serve, args=(right,), daemon=True)
+    server.start()
+
+    def request(index, size=1):
+        left.sendall(index.to_bytes(4, 'big'))
+        data = b''
+        while len(data) < size:
+            data += left.recv(size - len(data))
+        return data
+
+    try:
+        assert request(0xFFFFFFFF, 5) == (1).to_bytes(4, 'big') + b'\x00'
+        assert request(0) == b'0'
+        session.have.add(0)
+        # 位图中已有，但文件还没有创建
+        assert request(0) == b'0'
+        path.write_bytes(b'a' * 100 + b'\x00' * 50)
+        assert request(0, 101) == b'1' + b'a' * 100
+        assert request(1) == b'0'
+        assert session.bytes_served == 100
+    finally:
+        left.close()
+        server.join(timeout=5)
+        right.close()
+
+
+@pytest.fixture
+def swarm_nodes(tmp_path, monkeypatch):
+    sessions = []
+
+    class _RecordingSession(SwarmSession):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            sessions.append(self)
+
+    monkeypatch.setattr(file_transfer_module, 'SwarmSession', _RecordingSession)
+    port = free_udp_port()
+    nodes = [ChatNode(f"N{i}", local_ip="127.0.0.1", download_dir=str(tmp_path / f"N{i}"),
+                      interfaces=[LOOPBACK], discovery_port=port) for i in range(5)]
+    for node in nodes:
+        node.file_transfer.manifests.block_size = PIECE_SIZE
+        node.start()
+    yield nodes, sessions
+    for node in nodes:
+        node.stop()
+
+
+def test_distribution_shares_pieces_between_receivers(swarm_nodes, tmp_path):
+    nodes, sessions = swarm_nodes
+    seeder, receivers = nodes[0], nodes[1:]
+    source = tmp_path / 'dataset.bin'
+    source.write_bytes(os.urandom(PIECE_SIZE * 40 + 123))
+    for node in receivers:
+        node.file_transfer.file_request_received.connect(node.file_transfer.accept_file)
+
+    task = seeder.file_transfer.distribute_file(str(source), [n.local_member for n in receivers])
+    assert _wait_for(lambda: task.finished)
+    assert task.state == TransferState.COMPLETED
+    for node in receivers:
+        saved = tmp_path / node.local_member.username / 'dataset.bin'
+        assert saved.read_bytes() == source.read_bytes()
+
+    # 接收方之间互相提供了分块，发送方上传的数据少于逐个发送
+    seed_session = next(s for s in sessions if s.path == str(source))
+    peer_served = sum(s.bytes_served for s in sessions if s is not seed_session)
+    assert peer_served > 0
+    assert seed_session.bytes_served + peer_served >= source.stat().st_size * len(receivers)
+
+
+def test_rejecting_receiver_does_not_block_distribution(swarm_nodes, tmp_path):
+    nodes, _ = swarm_nodes
+    seeder, receivers = nodes[0], nodes[1:3]
+    source = tmp_path / 'notes.bin'
+    source.write_bytes(os.urandom(PIECE_SIZE * 3))
+    accepting, rejecting = receivers
+    accepting.file_transfer.file_request_received.connect(accepting.file_transfer.accept_file)
+    rejecting.file_transfer.file_request_received.connect(rejecting.file_transfer.reject_file)
+
+    task = seeder.file_transfer.distribute_file(str(source), [n.local_member for n in receivers])
+    assert _wait_for(lambda: task.finished)
+    assert task.state == TransferState.COMPLETED
+    assert (tmp_path / 'N1' / 'notes.bin').read_bytes() == source.read_bytes()
+    assert not (tmp_path / 'N2' / 'notes.bin').exists()
@@ -0,0 +1,112 @@
+"""
+TLS文件通道测试
+覆盖证书指纹固定、会话恢复，以及两个节点之间经TLS连接传输文件
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+pytest.importorskip('cryptography')
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import Member
+from src.core.node import ChatNode
+from src.core.tls_channel import TlsChannel, is_tls_hello
+
+
+def _serve(server: TlsChannel, listener: socket.socket, count: int):
+    """接收count个连接：完成握手后读一个字节并回复确认"""
+    for _ in range(count):
+        conn, _ = listener.accept()
+        try:
+            if not is_tls_hello(conn):
+                continue
+            tls_conn = server.wrap_server(conn)
+            tls_conn.recv(1)
+            tls_conn.sendall(b'1')
+            tls_conn.close()
+        except OSError:
+            conn.close()
+
+
+def test_sessions_are_resumed_and_certificates_pinned():
+    server, client = TlsChannel('server'), TlsChannel('client')
+    assert server.fingerprint != client.fingerprint
+    listener = socket.create_server(('127.0.0.1', 0))
+    addr = listener.getsockname()
+    thread = threading.Thread(target=_serve, args=(server, listener, 4), daemon=True)
+    thread.start()
+    try:
+        reused = []
+        for _ in range(3):
+            sock = client.wrap_client(socket.create_connection(addr), addr, server.fingerprint)
+            reused.append(sock.session_reused)
+            sock.sendall(b'x')
+            assert sock.recv(1) == b'1'
+            client.save_session(addr, server.fingerprint, sock)
+            sock.close()
+        # 第一次完整握手，之后都恢复会话
+        assert reused == [False, True, True]
+        assert client.stats() == {'handshakes': 3, 'resumed': 2, 'sessions': 1}
+
+        # 对方证书与通告的指纹不符时拒绝连接
+        with pytest.raises(ConnectionError):
+            client.wrap_client(socket.create_connection(addr), addr, client.fingerprint)
+    finally:
+        listener.close()
+        thread.join(timeout=5)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_nodes_transfer_files_over_tls(tmp_path):
+    port = free_udp_port()
+    alice, bob = (ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                           interfaces=[LOOPBACK], discovery_port=port, tls=True) for name in ('Alice', 'Bob'))
+    # 不复用连接，每次传输都新建连接，第二次应恢复会话
+    alice.file_transfer.pool.max_idle = 0
+    completed = []
+    bob.file_transfer.file_request_received.connect(bob.file_transfer.accept_file)
+    bob.file_transfer.transfer_completed.connect(lambda name, success: completed.append((name, success)))
+    streams = []
+    bob.file_transfer.secure.stream_from = lambda *args: streams.append(args)
+    alice.start()
+    bob.start()
+    try:
+        assert _wait_for(lambda: alice.member_manager.get_member_list())
+        peer, = alice.member_manager.get_member_list()
+        # 证书指纹随发现和加入消息通告
+        assert peer.tls_fingerprint == bob.file_transfer.tls.fingerprint
+        assert Member.from_dict(peer.to_dict()).tls_fingerprint == peer.tls_fingerprint
+
+        payloads = []
+        for name in ('first.bin', 'second.bin'):
+            source = tmp_path / name
+            payloads.append(os.urandom(2 * 1024 * 1024 + 5))
+            source.write_bytes(payloads[-1])
+            alice.file_transfer.send_file(str(source), peer)
+            assert _wait_for(lambda: (name, True) in completed, timeout=10)
+        assert (tmp_path / 'Bob' / 'first.bin').read_bytes() == payloads[0]
+        assert (tmp_path / 'Bob' / 'second.bin').read_bytes() == payloads[1]
+        assert alice.file_transfer.tls.stats()['resumed'] == 1
+        assert alice.file_transfer.tls.stats()['handshakes'] == 2
+        # 使用TLS时不再按会话密钥加密文件数据
+        assert streams == []
+    finally:
+        alice.stop()
+        bob.stop()
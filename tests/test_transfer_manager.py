@@ -0,0 +1,237 @@
+"""
+文件传输调度器测试
+"""
+
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import Member
+from src.common.rate_limit import TokenBucket
+from src.core.node import ChatNode
+from src.core.transfer_manager import (
+    PRIORITY_HIGH, PRIORITY_LOW, TransferDirection, TransferScheduler,
+    TransferState, TransferTask
+)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def _peer(name):
+    return Member(name, "127.0.0.1", 1, 2, node_id=name)
+
+
+def _task(peer, runner, priority=0, direction=TransferDirection.SEND):
+    return TransferTask(direction, 'f.bin', peer, 100, runner, priority=priority)
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(100, clock=lambda: now[0])
+    assert bucket.try_consume(100)
+    assert not bucket.try_consume(1)
+    now[0] = 0.5
+    assert bucket.try_consume(50)
+    # 透支后返回需要等待的时间
+    assert bucket.reserve(200) == 2.0
+    assert TokenBucket(0).reserve(10 ** 9) == 0.0
+
+
+def test_priority_order():
+    """只有一个发送线程时，排队任务按优先级执行，同优先级先到先执行。"""
+    scheduler = TransferScheduler(max_sends=1)
+    gate = threading.Event()
+    order = []
+
+    def runner(name):
+        def _run(task):
+            if name == 'first':
+                gate.wait(5)
+            order.append(name)
+            return True
+        return _run
+
+    scheduler.submit(_task(_peer('a'), runner('first')))
+    assert _wait_for(lambda: scheduler.tasks()[0].state == TransferState.RUNNING)
+    scheduler.submit(_task(_peer('b'), runner('low'), PRIORITY_LOW))
+    scheduler.submit(_task(_peer('c'), runner('normal-1')))
+    scheduler.submit(_task(_peer('d'), runner('high'), PRIORITY_HIGH))
+    scheduler.submit(_task(_peer('e'), runner('normal-2')))
+    gate.set()
+    assert _wait_for(lambda: len(order) == 5)
+    assert order == ['first', 'high', 'normal-1', 'normal-2', 'low']
+    scheduler.stop()
+
+
+def test_concurrency_caps():
+    """全局和单成员并发上限都生效，接收与发送使用独立的线程。"""
+    scheduler = TransferScheduler(max_sends=3, max_receives=1, max_per_peer=1)
+    gate = threading.Event()
+    running = []
+    peak = {}
+    lock = threading.Lock()
+
+    def runner(task):
+        with lock:
+            running.append(task)
+            key = (task.direction, task.peer_key)
+            peak[key] = max(peak.get(key, 0), sum(
+                1 for t in running if (t.direction, t.peer_key) == key))
+        gate.wait(5)
+        with lock:
+            running.remove(task)
+        return True
+
+    tasks = [scheduler.submit(_task(_peer(name), runner)) for name in ('a', 'a', 'b')]
+    assert _wait_for(lambda: len(running) == 2)
+    time.sleep(0.05)
+    assert len(running) == 2
+    assert tasks[1].state == TransferState.QUEUED
+    gate.set()
+    assert _wait_for(lambda: all(t.state == TransferState.COMPLETED for t in tasks))
+    assert max(peak.values()) == 1
+    scheduler.stop()
+
+
+def test_pause_resume_cancel():
+    scheduler = TransferScheduler(max_sends=1)
+    progress = []
+
+    def runner(task):
+        for _ in range(200):
+            task.checkpoint(1)
+            progress.append(task.transfer_id)
+            time.sleep(0.005)
+        return True
+
+    running = scheduler.submit(_task(_peer('a'), runner))
+    queued = scheduler.submit(_task(_peer('b'), runner))
+    assert _wait_for(lambda: len(progress) > 2)
+
+    assert scheduler.pause(running.transfer_id)
+    time.sleep(0.05)
+    count = len(progress)
+    time.sleep(0.1)
+    assert len(progress) <= count + 1
+    assert running.state == TransferState.PAUSED
+
+    # 排队中的任务取消后直接移除，不会执行
+    assert scheduler.cancel(queued.transfer_id)
+    assert queued.state == TransferState.CANCELLED
+
+    assert scheduler.resume(running.transfer_id)
+    assert running.state == TransferState.RUNNING
+    assert _wait_for(lambda: len(progress) > count + 5)
+    assert scheduler.cancel(running.transfer_id)
+    assert _wait_for(lambda: running.state == TransferState.CANCELLED)
+    assert queued.transfer_id not in progress
+    assert not scheduler.pause(running.transfer_id)
+    scheduler.stop()
+
+
+def test_file_transfer_bandwidth_limit_and_cancel(tmp_path):
+    """限速的文件发送可以被取消，双方都报告失败。"""
+    source = tmp_path / 'data.bin'
+    source.write_bytes(os.urandom(2 * 1024 * 1024))
+    port = free_udp_port()
+    nodes = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                      interfaces=[LOOPBACK], discovery_port=port) for name in "AB"]
+    sender, receiver = (node.file_transfer for node in nodes)
+    receiver.file_request_received.connect(receiver.accept_file)
+    sender.scheduler.set_bandwidth_limit(256 * 1024)
+    results = []
+    receiver.transfer_completed.connect(lambda name, ok: results.append(('recv', ok)))
+    sender.transfer_completed.connect(lambda name, ok: results.append(('send', ok)))
+    for node in nodes:
+        node.start()
+    try:
+        task = sender.send_file(str(source), nodes[1].local_member)
+        assert _wait_for(lambda: task.bytes_done > 0)
+        time.sleep(0.2)
+        # 限速 256KB/s，0.2秒后远未传完
+        assert task.bytes_done < 1024 * 1024
+        assert sender.cancel_transfer(task.transfer_id)
+        assert _wait_for(lambda: len(results) == 2)
+    finally:
+        for node in nodes:
+            node.stop()
+    assert task.state == TransferState.CANCELLED
+    assert sorted(results) == [('recv', False), ('send', False)]
+
+
+def test_dedicated_task_does_not_take_a_send_slot():
+    """独立执行的任务（多人分发的发送方）长时间运行时，普通发送仍能执行。"""
+    scheduler = TransferScheduler(max_sends=1)
+    gate = threading.Event()
+    seed = scheduler.submit(TransferTask(
+        TransferDirection.SEND, 'group.bin', None, 300, lambda t: gate.wait(5),
+        label='3名成员', dedicated=True))
+    assert _wait_for(lambda: seed.state == TransferState.RUNNING)
+    assert seed.to_dict()['peer'] == '3名成员'
+
+    task = scheduler.submit(_task(_peer('bob'), lambda t: True))
+    assert _wait_for(lambda: task.state == TransferState.COMPLETED)
+    assert seed.state == TransferState.RUNNING
+    gate.set()
+    assert _wait_for(lambda: seed.state == TransferState.COMPLETED)
+    scheduler.stop()
+
+
+def test_per_peer_cap_counts_directions_separately():
+    """同一成员的发送和接收分别计数，发送占满名额时接收仍可执行。"""
+    scheduler = TransferScheduler(max_sends=2, max_receives=2, max_per_peer=1)
+    gate = threading.Event()
+    peer = _peer('a')
+    send = scheduler.submit(_task(peer, lambda t: gate.wait(5)))
+    assert _wait_for(lambda: send.state == TransferState.RUNNING)
+    receive = scheduler.submit(_task(peer, lambda t: True, direction=TransferDirection.RECEIVE))
+    assert _wait_for(lambda: receive.state == TransferState.COMPLETED)
+    gate.set()
+    assert _wait_for(lambda: send.state == TransferState.COMPLETED)
+    scheduler.stop()
+
+
+def test_two_way_transfers_between_same_peers(tmp_path):
+    """两个成员同时互相发送多个文件，全部完成而不会互相等待。"""
+    port = free_udp_port()
+    nodes = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                      interfaces=[LOOPBACK], discovery_port=port) for name in "AB"]
+    completed, offers = [], []
+    for node in nodes:
+        node.file_transfer.file_request_received.connect(
+            lambda info, node=node: offers.append((node, info)))
+        node.file_transfer.transfer_completed.connect(lambda name, ok: completed.append(ok))
+    for node in nodes:
+        node.start()
+    try:
+        tasks = []
+        for sender, receiver in (nodes, nodes[::-1]):
+            for i in range(2):
+                source = tmp_path / f'{sender.local_member.username}{i}.bin'
+                source.write_bytes(os.urandom(3 * 1024 * 1024))
+                tasks.append(sender.file_transfer.send_file(str(source), receiver.local_member))
+        # 双方同时接受全部请求：各自的发送同时开始，都要等对方接收
+        assert _wait_for(lambda: len(offers) == 4)
+        for node, info in offers:
+            node.file_transfer.accept_file(info)
+        assert _wait_for(lambda: all(t.state == TransferState.COMPLETED for t in tasks), timeout=20)
+        assert _wait_for(lambda: len(completed) == 8) and all(completed)
+        for name, other in (('A', 'B'), ('B', 'A')):
+            for i in range(2):
+                assert (tmp_path / other / f'{name}{i}.bin').read_bytes() == \
+                    (tmp_path / f'{name}{i}.bin').read_bytes()
+    finally:
+        for node in nodes:
+            node.stop()
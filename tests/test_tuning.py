@@ -0,0 +1,90 @@
+"""
+传输参数调优测试
+覆盖块大小随速率的调整、对方速率记录，以及数据连接上的socket选项
+"""
+
+import os
+import socket
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.core.node import ChatNode
+from src.core.transfer_manager import TransferState
+from src.core.tuning import TransferTuner
+
+
+def test_chunk_size_follows_rate():
+    tuner = TransferTuner(chunk_min=16 * 1024, chunk_max=4 * 1024 * 1024, target_time=0.005)
+    assert tuner.chunk_for(0) == 16 * 1024
+    assert tuner.chunk_for(1e12) == 4 * 1024 * 1024
+    # 100MB/s × 5ms = 500KB，取不超过它的2的幂
+    assert tuner.chunk_for(100e6) == 256 * 1024
+    # 速率小幅波动时块大小不变
+    assert tuner.chunk_for(90e6) == tuner.chunk_for(100e6)
+
+
+def test_peer_rate_history():
+    tuner = TransferTuner(link_rate=1000)
+    assert tuner.peer_rate('10.0.0.1') == 1000
+    tuner.record('10.0.0.1', 5000)
+    tuner.record('10.0.0.2', 0)
+    assert tuner.peer_rate('10.0.0.1') == 5000
+    assert tuner.peer_rate('10.0.0.2') == 1000
+
+
+def test_configure_keeps_buffers_on_low_latency_link():
+    tuner = TransferTuner()
+    server = socket.create_server(('127.0.0.1', 0))
+    client = socket.create_connection(server.getsockname())
+    conn, _ = server.accept()
+    try:
+        default_rcvbuf = conn.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        tuning = tuner.configure(conn, '127.0.0.1', sending=False, rtt=0.0001)
+        assert tuning.nodelay
+        assert conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        # 回环上的带宽时延积很小，不覆盖系统默认（自动调整）的缓冲区
+        assert tuning.rcvbuf == default_rcvbuf
+        assert tuning.chunk_size == tuner.chunk_for(tuner.link_rate)
+
+        # 带宽时延积大时调大缓冲区
+        default_sndbuf = client.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        tuning = TransferTuner(link_rate=1e12).configure(client, '127.0.0.1', sending=True, rtt=0.05)
+        assert tuning.bdp > default_sndbuf
+        assert tuning.sndbuf > default_sndbuf
+    finally:
+        for sock in (client, conn, server):
+            sock.close()
+
+
+def test_transfer_reports_tuning(tmp_path):
+    port = free_udp_port()
+    nodes = [ChatNode(name, local_ip="127.0.0.1", download_dir=str(tmp_path / name),
+                      interfaces=[LOOPBACK], discovery_port=port) for name in ("A", "B")]
+    for node in nodes:
+        node.start()
+    try:
+        sender, receiver = nodes
+        source = tmp_path / 'data.bin'
+        source.write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+        receiver.file_transfer.file_request_received.connect(receiver.file_transfer.accept_file)
+        stats = []
+        sender.file_transfer.transfer_stats.connect(stats.append)
+
+        task = sender.file_transfer.send_file(str(source), receiver.local_member)
+        deadline = time.time() + 10
+        while not task.finished and time.time() < deadline:
+            time.sleep(0.02)
+        assert task.state == TransferState.COMPLETED
+        assert (tmp_path / 'B' / 'data.bin').read_bytes() == source.read_bytes()
+
+        tuning = task.to_dict()['tuning']
+        assert tuning['nodelay'] and tuning['chunk_size'] >= sender.file_transfer.tuner.chunk_min
+        assert stats and stats[-1].to_dict()['tuning'] is not None
+        assert sender.file_transfer.tuner.peer_rate('127.0.0.1') != sender.file_transfer.tuner.link_rate
+    finally:
+        for node in nodes:
+            node.stop()
@@ -0,0 +1,87 @@
+"""
+UDP发送合并测试
+覆盖按MTU打包、突发消息合并成少量数据报，以及接收方拆包分发
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+
+# 添加项目根目录到路径，再使用 src.* 形式导入
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.bench.metrics import LOOPBACK, free_udp_port
+from src.common.message_types import Member
+from src.common.packet import encode_packet, split_frames
+from src.common.utils import generate_node_id
+from src.core.message_dispatcher import MessageDispatcher
+from src.core.udp_batcher import UdpBatcher, pack_batches
+
+
+def _frame(seq, pad=100):
+    return encode_packet({'msg_type': 'P2P_MESSAGE', 'seq': seq, 'pad': 'x' * pad})
+
+
+def test_pack_batches_respects_mtu():
+    messages = [_frame(i) for i in range(30)]
+    datagrams = pack_batches(messages, 1400)
+    assert 1 < len(datagrams) < len(messages)
+    assert all(len(d) <= 1400 for d in datagrams)
+    unpacked = [json.loads(d[f.start:f.end]) for d in datagrams for f in split_frames(d)]
+    assert [m['seq'] for m in unpacked] == list(range(30))
+
+    # 超过mtu的消息单独成包
+    big = _frame(1, pad=2000)
+    assert pack_batches([_frame(0), big, _frame(2)], 1400) == [_frame(0), big, _frame(2)]
+
+
+def test_burst_is_coalesced():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(1)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    batcher = UdpBatcher(window=0.05)
+    batcher.start()
+    try:
+        for i in range(20):
+            batcher.send(sender, receiver.getsockname(), _frame(i, pad=0))
+        batcher.stop()
+        datagram = receiver.recv(4096)
+        assert [json.loads(datagram[f.start:f.end])['seq'] for f in split_frames(datagram)] == list(range(20))
+        assert (batcher.messages_sent, batcher.datagrams_sent) == (20, 1)
+    finally:
+        sender.close()
+        receiver.close()
+
+
+def _dispatcher(port, window):
+    member = Member('user', '127.0.0.1', 0, 0, generate_node_id())
+    dispatcher = MessageDispatcher(member, [LOOPBACK], port, batch_window=window)
+    received = []
+    dispatcher.p2p_message.connect(lambda message, addr: received.append(message))
+    dispatcher.start()
+    return dispatcher, received
+
+
+def test_dispatchers_exchange_batched_messages():
+    port = free_udp_port()
+    for window in (0.01, 0):
+        (a, _), (b, received) = _dispatcher(port, window), _dispatcher(port, window)
+        try:
+            for i in range(50):
+                a.send_message({'msg_type': 'P2P_MESSAGE', 'sender_id': a.local_member.node_id,
+                                'content': str(i)}, '127.0.0.1', b.local_member.udp_port)
+            deadline = time.time() + 5
+            while len(received) < 50 and time.time() < deadline:
+                time.sleep(0.01)
+            assert [m['content'] for m in received] == [str(i) for i in range(50)]
+            if window:
+                # 启用加密时另有一条密钥协商消息
+                assert a.batcher.datagrams_sent < 50 <= a.batcher.messages_sent
+            else:
+                assert a.batcher is None
+        finally:
+            a.stop()
+            b.stop()